@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Etiqueta, Proyecto, Pagina, Archivo, Comentario
+from .models import Etiqueta, Proyecto, Pagina, Archivo, Comentario, Job
 
 # Registra tus modelos aquí.
 admin.site.register(Etiqueta)
@@ -7,3 +7,4 @@ admin.site.register(Proyecto)
 admin.site.register(Pagina)
 admin.site.register(Archivo)
 admin.site.register(Comentario)
+admin.site.register(Job)
@@ -0,0 +1,28 @@
+"""
+Almacenamiento de archivos con nombres por contenido para las subidas de
+CKEditor (`CKEDITOR_STORAGE_BACKEND`).
+
+Cada archivo se guarda como `<directorio>/<sha256><extensión>`, así que la
+misma imagen pegada en varias páginas, o por varios usuarios, ocupa el disco
+una sola vez. El hash se calcula leyendo el archivo por trozos, sin cargarlo
+entero en memoria.
+"""
+import hashlib
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for trozo in content.chunks():
+            digest.update(trozo)
+        directorio, nombre = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(nombre)[1].lower()
+        name = posixpath.join(directorio, digest.hexdigest() + extension)
+        if self.exists(name):
+            return name
+        content.seek(0)
+        return super()._save(name, content)
@@ -0,0 +1,430 @@
+"""
+API JSON de solo lectura (v1) sobre proyectos, páginas, etiquetas y
+comentarios.
+
+Cada recurso declara sus campos y, para cada uno, las columnas que necesita:
+
+- `fields=titulo,slug` elige los campos de la respuesta y la consulta lee
+  solo esas columnas (`.only()`), con los JOIN que hagan falta.
+  `fields[<recurso>]=...` hace lo mismo para un recurso incluido.
+- `include=etiquetas,paginas` añade relaciones: las de un solo objeto por
+  JOIN (`select_related`) y las de varios con una consulta más por relación
+  (`prefetch_related`), nunca una por fila.
+- Los listados se paginan por id (keyset): `cursor` indica dónde continuar y
+  el coste no crece con la posición. `limite` fija el tamaño (máx. 100).
+
+La versión de cada respuesta (para ETag/Last-Modified, ver `condicional.py`)
+se calcula con una consulta agregada por recurso implicado, sin leer las
+filas. `volcar_proyecto` genera un proyecto completo en NDJSON, fila a fila,
+para sincronizar sin cargarlo entero en memoria.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import BadRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Prefetch, Q, Sum
+from django.http import Http404
+from django.urls import reverse
+
+from .models import Comentario, Etiqueta, Pagina, Proyecto
+
+VERSION = 'v1'
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 100
+# Filas que lee cada consulta del volcado NDJSON.
+FILAS_POR_LOTE = 500
+
+
+@dataclass(frozen=True)
+class Campo:
+    """Un campo de la respuesta: columnas que necesita y cómo obtener su valor."""
+    columnas: tuple
+    valor: object
+    # Relaciones de un solo objeto que hay que traer por JOIN.
+    relacionados: tuple = ()
+
+
+@dataclass(frozen=True)
+class Inclusion:
+    """
+    Relación que se puede pedir con `include=`. `inversa` es el camino desde
+    el modelo incluido hasta el principal.
+    """
+    recurso: str
+    inversa: str
+    muchos: bool = True
+
+
+@dataclass
+class Recurso:
+    nombre: str
+    modelo: type
+    campos: dict
+    por_defecto: tuple
+    # Filtros de la URL: parámetro -> (lookup del ORM, conversión del valor).
+    filtros: dict = field(default_factory=dict)
+    inclusiones: dict = field(default_factory=dict)
+    # Campo de fecha para Last-Modified, si el modelo lo tiene.
+    fecha: str = ''
+    # Agregados adicionales que cambian cuando cambia el contenido.
+    version_extra: dict = field(default_factory=dict)
+
+    def visibles(self, usuario):
+        return _VISIBILIDAD[self.nombre](self.modelo.objects.all(), usuario)
+
+
+def _columna(nombre, convertir=None):
+    if convertir is None:
+        return Campo((nombre,), lambda obj, request: getattr(obj, nombre))
+    return Campo((nombre,), lambda obj, request: convertir(getattr(obj, nombre)))
+
+
+def _fecha(nombre):
+    return _columna(nombre, lambda valor: valor.isoformat() if valor else None)
+
+
+def _url(nombre_url, **columnas):
+    """Campo con la URL absoluta de una vista; `columnas` mapea kwargs de la URL a atributos."""
+    def valor(obj, request):
+        kwargs = {}
+        for kwarg, ruta in columnas.items():
+            actual = obj
+            for parte in ruta.split('__'):
+                actual = getattr(actual, parte)
+            kwargs[kwarg] = actual
+        return request.build_absolute_uri(reverse(nombre_url, kwargs=kwargs))
+    relacionados = tuple({ruta.rsplit('__', 1)[0] for ruta in columnas.values() if '__' in ruta})
+    return Campo(tuple(columnas.values()), valor, relacionados)
+
+
+def _autor():
+    return Campo(('autor__username',), lambda obj, request: obj.autor.username, ('autor',))
+
+
+def _imagen(obj, request):
+    return request.build_absolute_uri(obj.imagen.url) if obj.imagen else None
+
+
+RECURSOS = {
+    'proyectos': Recurso(
+        'proyectos', Proyecto,
+        campos={
+            'id': _columna('id'),
+            'titulo': _columna('titulo'),
+            'slug': _columna('slug'),
+            'autor': _autor(),
+            'descripcion': _columna('descripcion'),
+            'extracto': _columna('extracto'),
+            'num_palabras': _columna('num_palabras'),
+            'imagen': Campo(('imagen',), _imagen),
+            'icono': _columna('icono'),
+            'es_publico': _columna('es_publico'),
+            'url': _url('proyecto_detalle', proyecto_slug='slug'),
+            'fecha_creacion': _fecha('fecha_creacion'),
+            'fecha_actualizacion': _fecha('fecha_actualizacion'),
+        },
+        por_defecto=('id', 'titulo', 'slug', 'autor', 'extracto', 'url', 'fecha_actualizacion'),
+        filtros={'autor': ('autor__username', str), 'etiqueta': ('etiquetas__nombre', str)},
+        inclusiones={
+            'etiquetas': Inclusion('etiquetas', 'proyectos'),
+            'paginas': Inclusion('paginas', 'proyecto'),
+        },
+        fecha='fecha_actualizacion',
+    ),
+    'paginas': Recurso(
+        'paginas', Pagina,
+        campos={
+            'id': _columna('id'),
+            'titulo': _columna('titulo'),
+            'slug': _columna('slug'),
+            'proyecto': Campo(('proyecto',), lambda obj, request: obj.proyecto_id),
+            'autor': _autor(),
+            'contenido': _columna('contenido'),
+            'extracto': _columna('extracto'),
+            'num_palabras': _columna('num_palabras'),
+            'es_publica': _columna('es_publica'),
+            'url': _url('pagina_detalle', proyecto_slug='proyecto__slug', pagina_slug='slug'),
+            'fecha_creacion': _fecha('fecha_creacion'),
+            'fecha_actualizacion': _fecha('fecha_actualizacion'),
+        },
+        por_defecto=('id', 'titulo', 'slug', 'proyecto', 'autor', 'extracto', 'url', 'fecha_actualizacion'),
+        filtros={'proyecto': ('proyecto_id', int), 'autor': ('autor__username', str),
+                 'etiqueta': ('etiquetas__nombre', str)},
+        inclusiones={
+            'proyecto': Inclusion('proyectos', 'paginas', muchos=False),
+            'etiquetas': Inclusion('etiquetas', 'paginas'),
+            'comentarios': Inclusion('comentarios', 'pagina'),
+        },
+        fecha='fecha_actualizacion',
+    ),
+    'etiquetas': Recurso(
+        'etiquetas', Etiqueta,
+        campos={
+            'id': _columna('id'),
+            'nombre': _columna('nombre'),
+            'num_proyectos': _columna('num_proyectos'),
+            'num_paginas': _columna('num_paginas'),
+            'url': _url('etiqueta_detalle', nombre='nombre'),
+        },
+        por_defecto=('id', 'nombre', 'num_proyectos', 'num_paginas', 'url'),
+        filtros={'nombre': ('nombre', str)},
+        version_extra={'usos_proyectos': Sum('num_proyectos'), 'usos_paginas': Sum('num_paginas')},
+    ),
+    'comentarios': Recurso(
+        'comentarios', Comentario,
+        campos={
+            'id': _columna('id'),
+            'pagina': Campo(('pagina',), lambda obj, request: obj.pagina_id),
+            'autor': _autor(),
+            'texto': _columna('texto'),
+            'comentario_padre': Campo(('comentario_padre',), lambda obj, request: obj.comentario_padre_id),
+            'hilo': _columna('hilo'),
+            'profundidad': _columna('profundidad'),
+            'fecha_creacion': _fecha('fecha_creacion'),
+        },
+        por_defecto=('id', 'pagina', 'autor', 'texto', 'comentario_padre', 'hilo', 'fecha_creacion'),
+        filtros={'pagina': ('pagina_id', int), 'hilo': ('hilo', int)},
+        fecha='fecha_creacion',
+    ),
+}
+
+
+def _propios(usuario, campo='autor'):
+    return Q(**{campo: usuario}) if usuario.is_authenticated else Q(pk__in=[])
+
+
+# Qué filas puede ver cada usuario: lo público y lo suyo.
+_VISIBILIDAD = {
+    'proyectos': lambda qs, usuario: qs.filter(Q(es_publico=True) | _propios(usuario)),
+    'paginas': lambda qs, usuario: qs.filter(
+        Q(es_publica=True, proyecto__es_publico=True) | _propios(usuario)),
+    'etiquetas': lambda qs, usuario: qs,
+    'comentarios': lambda qs, usuario: qs.filter(
+        Q(pagina__es_publica=True, pagina__proyecto__es_publico=True) | _propios(usuario, 'pagina__autor')),
+}
+
+
+def obtener_recurso(nombre):
+    try:
+        return RECURSOS[nombre]
+    except KeyError:
+        raise Http404(f'Recurso desconocido: {nombre}.') from None
+
+
+# --- Parámetros ---
+
+def _lista(valor):
+    return [parte.strip() for parte in (valor or '').split(',') if parte.strip()]
+
+
+def _elegir_campos(recurso, valor):
+    if not valor:
+        return recurso.por_defecto
+    nombres = _lista(valor)
+    desconocidos = [n for n in nombres if n not in recurso.campos]
+    if desconocidos:
+        raise BadRequest(f'Campos desconocidos en {recurso.nombre}: {", ".join(desconocidos)}.')
+    return tuple(nombres)
+
+
+@dataclass
+class Peticion:
+    """Parámetros de una petición a la API, ya validados."""
+    recurso: Recurso
+    campos: tuple
+    # Nombre de la inclusión -> campos del recurso incluido.
+    incluir: dict
+    filtros: dict
+    cursor: int = 0
+    limite: int = LIMITE_POR_DEFECTO
+
+
+def leer_peticion(recurso, parametros):
+    """Valida `fields`, `include`, los filtros, `cursor` y `limite`. Lanza BadRequest."""
+    incluir = {}
+    for nombre in _lista(parametros.get('include')):
+        if nombre not in recurso.inclusiones:
+            raise BadRequest(f'No se puede incluir "{nombre}" en {recurso.nombre}.')
+        incluido = RECURSOS[recurso.inclusiones[nombre].recurso]
+        incluir[nombre] = _elegir_campos(incluido, parametros.get(f'fields[{incluido.nombre}]'))
+    filtros = {}
+    for parametro, (lookup, convertir) in recurso.filtros.items():
+        if parametro in parametros:
+            try:
+                filtros[lookup] = convertir(parametros[parametro])
+            except ValueError:
+                raise BadRequest(f'Valor inválido para "{parametro}".') from None
+    limite = parametros.get('limite', '')
+    return Peticion(
+        recurso, _elegir_campos(recurso, parametros.get('fields')), incluir, filtros,
+        cursor=decodificar_cursor(parametros['cursor']) if parametros.get('cursor') else 0,
+        limite=min(int(limite), LIMITE_MAXIMO) if limite.isdigit() and int(limite) > 0 else LIMITE_POR_DEFECTO,
+    )
+
+
+def codificar_cursor(pk):
+    return base64.urlsafe_b64encode(f'{VERSION}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        version, pk = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        if version != VERSION:
+            raise ValueError(version)
+        return int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise BadRequest('Cursor de paginación inválido.') from exc
+
+
+# --- Consultas ---
+
+def _columnas(recurso, campos, prefijo=''):
+    """Columnas para `.only()` y relaciones para `select_related` de `campos`."""
+    columnas, relacionados = {prefijo + 'id'}, set()
+    for nombre in campos:
+        campo = recurso.campos[nombre]
+        columnas.update(prefijo + c for c in campo.columnas)
+        relacionados.update(prefijo + r for r in campo.relacionados)
+    return columnas, relacionados
+
+
+def consulta(peticion, usuario):
+    """
+    Queryset del recurso con los filtros, solo las columnas de los campos
+    pedidos y las relaciones incluidas precargadas, ordenado por id.
+    """
+    recurso = peticion.recurso
+    # Los nombres de etiqueta son únicos: filtrar por uno no repite filas.
+    queryset = recurso.visibles(usuario).filter(**peticion.filtros)
+    columnas, relacionados = _columnas(recurso, peticion.campos)
+    prefetch = []
+    for nombre, campos in peticion.incluir.items():
+        inclusion = recurso.inclusiones[nombre]
+        incluido = RECURSOS[inclusion.recurso]
+        if not inclusion.muchos:
+            mas_columnas, mas_relacionados = _columnas(incluido, campos, prefijo=f'{nombre}__')
+            columnas.update(mas_columnas | {nombre})
+            relacionados.update(mas_relacionados | {nombre})
+            continue
+        columnas_incluido, relacionados_incluido = _columnas(incluido, campos)
+        if incluido.modelo._meta.get_field(inclusion.inversa).many_to_one:
+            # Prefetch de una FK inversa: necesita la columna que apunta al principal.
+            columnas_incluido.add(inclusion.inversa)
+        sub = _con_relacionados(incluido.visibles(usuario), relacionados_incluido)
+        prefetch.append(Prefetch(nombre, queryset=sub.only(*columnas_incluido).order_by('pk')))
+    return (_con_relacionados(queryset, relacionados).only(*columnas)
+            .prefetch_related(*prefetch).order_by('pk'))
+
+
+def _con_relacionados(queryset, relacionados):
+    # `select_related()` sin argumentos seguiría todas las FK, con todas sus columnas.
+    return queryset.select_related(*relacionados) if relacionados else queryset
+
+
+def pagina(peticion, usuario):
+    """`(objetos, siguiente_cursor)` de un listado."""
+    objetos = list(consulta(peticion, usuario).filter(pk__gt=peticion.cursor)[:peticion.limite + 1])
+    if len(objetos) > peticion.limite:
+        objetos = objetos[:peticion.limite]
+        return objetos, codificar_cursor(objetos[-1].pk)
+    return objetos, None
+
+
+def version(peticion, usuario, **filtro):
+    """
+    `(ultima_modificacion, partes)` de lo que devolvería la petición, con
+    una consulta agregada por recurso (el principal y cada inclusión). None
+    si no hay ninguna fila.
+    """
+    recurso = peticion.recurso
+    base = recurso.visibles(usuario).filter(**peticion.filtros, **filtro)
+    principal = _agregar(recurso, base)
+    if not principal['total']:
+        return None
+    fechas, partes = [principal.get('ultima')], [tuple(sorted(principal.items()))]
+    for nombre in peticion.incluir:
+        inclusion = recurso.inclusiones[nombre]
+        incluido = RECURSOS[inclusion.recurso]
+        datos = _agregar(incluido, incluido.visibles(usuario).filter(
+            **{f'{inclusion.inversa}__in': base.values('pk')}))
+        fechas.append(datos.get('ultima'))
+        partes.append((nombre, *sorted(datos.items())))
+    fechas = [f for f in fechas if f is not None]
+    return (max(fechas) if fechas else None), tuple(partes)
+
+
+def _agregar(recurso, queryset):
+    agregados = {'total': Count('pk'), 'maximo': Max('pk'), **recurso.version_extra}
+    if recurso.fecha:
+        agregados['ultima'] = Max(recurso.fecha)
+    return queryset.aggregate(**agregados)
+
+
+# --- Serialización ---
+
+def serializar(objeto, recurso, campos, request, incluir=None):
+    datos = {nombre: recurso.campos[nombre].valor(objeto, request) for nombre in campos}
+    for nombre, campos_incluidos in (incluir or {}).items():
+        inclusion = recurso.inclusiones[nombre]
+        incluido = RECURSOS[inclusion.recurso]
+        if inclusion.muchos:
+            datos[nombre] = [serializar(o, incluido, campos_incluidos, request)
+                             for o in getattr(objeto, nombre).all()]
+        else:
+            relacionado = getattr(objeto, nombre)
+            datos[nombre] = serializar(relacionado, incluido, campos_incluidos, request) if relacionado else None
+    return datos
+
+
+def serializar_peticion(objeto, peticion, request):
+    return serializar(objeto, peticion.recurso, peticion.campos, request, peticion.incluir)
+
+
+# --- Volcado NDJSON ---
+
+def version_volcado(proyecto, usuario):
+    """`(ultima_modificacion, partes)` del volcado de `proyecto`."""
+    paginas = _agregar(RECURSOS['paginas'], RECURSOS['paginas'].visibles(usuario).filter(proyecto=proyecto))
+    comentarios = _agregar(RECURSOS['comentarios'],
+                           RECURSOS['comentarios'].visibles(usuario).filter(pagina__proyecto=proyecto))
+    fechas = [f for f in (proyecto.fecha_actualizacion, paginas['ultima'], comentarios['ultima']) if f]
+    return max(fechas), (proyecto.pk, proyecto.fecha_actualizacion,
+                         tuple(sorted(paginas.items())), tuple(sorted(comentarios.items())))
+
+
+def _linea(tipo, datos):
+    return json.dumps({'tipo': tipo, 'datos': datos}, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def volcar_proyecto(proyecto, request, desde=None):
+    """
+    Genera el proyecto, sus páginas (con contenido y etiquetas) y sus
+    comentarios como líneas NDJSON (`{"tipo": ..., "datos": ...}`). Las
+    filas se leen por lotes con `.iterator()`, así que la memoria no crece
+    con el tamaño del proyecto. Con `desde` solo se incluyen las páginas
+    actualizadas y los comentarios creados después de esa fecha.
+    """
+    usuario = request.user
+    proyectos = RECURSOS['proyectos']
+    yield _linea('proyecto', serializar(proyecto, proyectos, tuple(proyectos.campos), request,
+                                        {'etiquetas': ('id', 'nombre')}))
+
+    paginas = RECURSOS['paginas']
+    campos_pagina = tuple(paginas.campos)
+    peticion = Peticion(paginas, campos_pagina, {'etiquetas': ('id', 'nombre')}, {'proyecto': proyecto})
+    consulta_paginas = consulta(peticion, usuario)
+    if desde is not None:
+        consulta_paginas = consulta_paginas.filter(fecha_actualizacion__gt=desde)
+    for objeto in consulta_paginas.iterator(chunk_size=FILAS_POR_LOTE):
+        yield _linea('pagina', serializar_peticion(objeto, peticion, request))
+
+    comentarios = RECURSOS['comentarios']
+    peticion = Peticion(comentarios, tuple(comentarios.campos), {}, {'pagina__proyecto': proyecto})
+    consulta_comentarios = consulta(peticion, usuario)
+    if desde is not None:
+        consulta_comentarios = consulta_comentarios.filter(fecha_creacion__gt=desde)
+    for objeto in consulta_comentarios.iterator(chunk_size=FILAS_POR_LOTE):
+        yield _linea('comentario', serializar_peticion(objeto, peticion, request))
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class DocubaseAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'docubase_app'
+
+    def ready(self):
+        # Registra los receptores de señales (índice de búsqueda, etc.).
+        from . import signals  # noqa: F401
+        # Exige una caché compartida fuera de DEBUG (ver comprobaciones.py).
+        from . import comprobaciones  # noqa: F401
+        # Cronometra el renderizado de plantillas para MedicionMiddleware.
+        from . import rendimiento
+        rendimiento.instalar()
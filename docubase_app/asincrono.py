@@ -0,0 +1,57 @@
+"""
+Piezas para servir la aplicación bajo ASGI con las vistas asíncronas (ver
+`VISTAS_ASINCRONAS` en settings).
+
+Django adapta cada middleware que solo funciona en modo síncrono pasando el
+resto de la cadena, vista incluida, por un hilo: basta uno así para que las
+vistas asíncronas no aporten nada. Todos los de `MIDDLEWARE` tienen modo
+asíncrono salvo el de WhiteNoise, que aquí se sustituye por
+`EstaticosMiddleware`.
+
+Las plantillas de Django son síncronas y pueden tocar atributos perezosos
+(usuario, sesión, mensajes), así que `arender()` renderiza en un hilo, en un
+solo salto, después de que la vista haya leído sus datos con el ORM
+asíncrono. Lo mismo vale para las piezas con SQL crudo o caché de
+fragmentos, que se llaman con `sync_to_async`.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.shortcuts import render
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class EstaticosMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise con modo asíncrono. Buscar el archivo es consultar un
+    diccionario (o el disco, con `WHITENOISE_AUTOREFRESH` en desarrollo) y
+    la respuesta es un `FileResponse` que el servidor envía por trozos, así
+    que no hace falta un hilo para nada de ello.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.asincrono = iscoroutinefunction(self.get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self._acall(request)
+        return super().__call__(request)
+
+    def _buscar(self, request):
+        if self.autorefresh:
+            return self.find_file(request.path_info)
+        return self.files.get(request.path_info)
+
+    async def _acall(self, request):
+        static_file = self._buscar(request)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+async def arender(request, plantilla, contexto):
+    """`render()` para vistas asíncronas: renderiza en un hilo."""
+    return await sync_to_async(render)(request, plantilla, contexto)
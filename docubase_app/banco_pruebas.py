@@ -0,0 +1,492 @@
+"""
+Banco de pruebas de las vistas (comando `bench`).
+
+Recorre todas las rutas de `docubase_app/urls.py` con el cliente de pruebas
+de Django, rellenando sus parámetros con objetos reales de la base (lo
+normal es sembrarla antes con `seed_bench`). De cada ruta mide:
+
+- la distribución de la latencia (p50/p95/p99 de `repeticiones` peticiones,
+  después de `calentamiento` peticiones que llenan las cachés);
+- las consultas, las duplicadas y el tiempo en la base de datos, con
+  `rendimiento.observar()` en una petición aparte;
+- la memoria reservada durante la petición (pico y lo que queda retenido),
+  con `tracemalloc` en otra petición aparte, porque lo ralentiza todo.
+
+Las rutas que solo aceptan POST (responden 405 a un GET) se omiten: el banco
+no modifica datos. El resultado se puede guardar como JSON y comparar con
+uno anterior (`comparar()`), de modo que una regresión se ve como un número.
+
+`concurrencia()` (comando `bench_concurrencia`) mide otra cosa: el
+rendimiento con clientes simultáneos de las vistas de lectura que tienen
+versión asíncrona, con servidores reales sobre la misma base: gunicorn con
+workers síncronos y las vistas síncronas, y uvicorn con
+`VISTAS_ASINCRONAS=1`.
+"""
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.tokens import default_token_generator
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import api, rendimiento, sindicacion
+from .models import Archivo, Comentario, Etiqueta, Pagina, Proyecto, Revision, Subida
+
+VERSION = 1
+
+# Cadenas de consulta que se añaden a algunas rutas para que hagan trabajo real.
+CONSULTAS = {
+    'buscar_proyectos': 'q={busqueda}',
+    'proyectos_lista': 'etiqueta={busqueda}',
+}
+
+# Métricas que se comparan con la línea base: (nombre, relativa, umbral
+# absoluto). Las relativas empeoran si suben más de la tolerancia y del
+# umbral; las exactas (consultas), con cualquier subida.
+METRICAS = (
+    ('p50_ms', True, 1.0),
+    ('p95_ms', True, 2.0),
+    ('consultas', False, 0),
+    ('duplicadas', False, 0),
+    ('memoria_pico_kb', True, 64),
+)
+
+
+@dataclass
+class Caso:
+    nombre: str
+    url: str
+
+
+# --- Rutas ---
+
+def muestra(usuario):
+    """
+    Valores reales para los parámetros de las rutas: la página pública con
+    más revisiones (de `usuario` si tiene alguna), un adjunto y una etiqueta
+    de páginas públicas, etc.
+    """
+    paginas = Pagina.objects.filter(proyecto__es_publico=True).select_related('proyecto')
+    # Mejor una página del propio usuario, para que también respondan las vistas de edición.
+    propia = Q(proyecto__autor=usuario) if usuario else Q(pk__in=[])
+    pagina = (paginas.annotate(propia=ExpressionWrapper(propia, output_field=BooleanField()),
+                               num_revisiones=Count('revisiones'))
+              .order_by('-propia', '-num_revisiones', 'pk').first())
+    if pagina is None:
+        return None
+    revision = Revision.objects.filter(pagina=pagina).order_by('-numero').only('numero').first()
+    archivo = Archivo.objects.filter(pagina__proyecto__es_publico=True).only('archivo').first()
+    etiqueta = Etiqueta.objects.order_by('-num_paginas', 'nombre').first()
+    subida = Subida.objects.filter(usuario=usuario).only('pk').first() if usuario else None
+    valores = {
+        'proyecto_slug': pagina.proyecto.slug,
+        'pagina_slug': pagina.slug,
+        'numero': revision.numero if revision else None,
+        'ruta': archivo.archivo.name if archivo else None,
+        'nombre': etiqueta.nombre if etiqueta else None,
+        'subida_id': subida.pk if subida else None,
+        'busqueda': etiqueta.nombre if etiqueta else 'documentación',
+        'serie': 'paginas',
+        'bloque': pagina.pk // sindicacion.URLS_POR_SITEMAP,
+        'uidb64': urlsafe_base64_encode(force_bytes(usuario.pk)) if usuario else None,
+        'token': default_token_generator.make_token(usuario) if usuario else None,
+        # Un pk visible por recurso de la API; 'proyectos' sirve también para el volcado.
+        'pk': {
+            nombre: recurso.visibles(usuario or AnonymousUser()).values_list('pk', flat=True).order_by('pk').first()
+            for nombre, recurso in api.RECURSOS.items()
+        },
+    }
+    valores['pk']['proyectos'] = pagina.proyecto_id
+    return valores
+
+
+def casos(valores, patrones=None):
+    """
+    Devuelve `(casos, omitidos)`: un `Caso` por ruta (uno por recurso en las
+    de la API) y las rutas que no se pueden probar con el motivo.
+    """
+    if patrones is None:
+        from .urls import urlpatterns as patrones
+    resultado, omitidos = [], {}
+    for patron in patrones:
+        if not isinstance(patron, URLPattern):
+            continue
+        nombre = patron.name or str(patron.pattern)
+        parametros = list(patron.pattern.converters)
+        recursos = list(api.RECURSOS) if 'recurso' in parametros else [None]
+        for recurso in recursos:
+            kwargs = {}
+            for parametro in parametros:
+                if parametro == 'recurso':
+                    valor = recurso
+                elif parametro == 'pk':
+                    valor = valores['pk'].get(recurso or 'proyectos')
+                else:
+                    valor = valores.get(parametro)
+                kwargs[parametro] = valor
+            caso = f'{nombre}[{recurso}]' if recurso else nombre
+            faltan = [p for p, v in kwargs.items() if v is None]
+            if faltan:
+                omitidos[caso] = f'sin datos para {", ".join(faltan)}'
+                continue
+            url = reverse(patron.name, kwargs=kwargs) if patron.name else '/' + str(patron.pattern)
+            if nombre in CONSULTAS:
+                url += '?' + CONSULTAS[nombre].format(**valores)
+            resultado.append(Caso(caso, url))
+    return resultado, omitidos
+
+
+# --- Medición ---
+
+def _peticion(cliente, url):
+    """Hace un GET y consume la respuesta entera. Devuelve `(estado, bytes)`."""
+    respuesta = cliente.get(url)
+    if respuesta.streaming:
+        tamano = sum(len(trozo) for trozo in respuesta.streaming_content)
+    else:
+        tamano = len(respuesta.content)
+    respuesta.close()
+    return respuesta.status_code, tamano
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 3)
+
+
+def medir(cliente, url, repeticiones=20, calentamiento=2):
+    """Mide una URL. Devuelve None si solo admite POST."""
+    for _ in range(max(1, calentamiento)):
+        estado, _ = _peticion(cliente, url)
+        if estado == 405:
+            return None
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        estado, tamano = _peticion(cliente, url)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+
+    with rendimiento.observar() as medicion:
+        _peticion(cliente, url)
+
+    tracemalloc.start()
+    try:
+        _peticion(cliente, url)
+        retenida, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'estado': estado,
+        'bytes': tamano,
+        'p50_ms': _ms(rendimiento.percentil(tiempos, 50)),
+        'p95_ms': _ms(rendimiento.percentil(tiempos, 95)),
+        'p99_ms': _ms(rendimiento.percentil(tiempos, 99)),
+        'media_ms': _ms(sum(tiempos) / len(tiempos)),
+        'consultas': medicion.consultas,
+        'duplicadas': medicion.duplicadas,
+        'bd_ms': _ms(medicion.tiempo_bd),
+        'plantillas_ms': _ms(medicion.tiempos['plantillas']),
+        'cache_aciertos': medicion.contadores['cache_aciertos'],
+        'cache_fallos': medicion.contadores['cache_fallos'],
+        'memoria_pico_kb': round(pico / 1024, 1),
+        'memoria_retenida_kb': round(retenida / 1024, 1),
+    }
+
+
+def volumenes_actuales():
+    """Tamaño de la base medida, para no comparar mediciones de datos distintos."""
+    return {
+        'proyectos': Proyecto.objects.count(),
+        'paginas': Pagina.objects.count(),
+        'comentarios': Comentario.objects.count(),
+        'etiquetas': Etiqueta.objects.count(),
+        'adjuntos': Archivo.objects.count(),
+    }
+
+
+def ejecutar(usuario=None, repeticiones=20, calentamiento=2, filtros=(), progreso=None):
+    """
+    Mide todas las rutas (o las que contienen alguno de los `filtros`) como
+    `usuario`, o como anónimo si es None. `progreso`, si se indica, se llama
+    con el nombre y el resultado de cada caso. Devuelve el informe como dict.
+    """
+    valores = muestra(usuario)
+    if valores is None:
+        raise ValueError('No hay páginas públicas que medir: ejecuta antes seed_bench.')
+    lista, omitidos = casos(valores)
+    if filtros:
+        lista = [c for c in lista if any(f in c.nombre for f in filtros)]
+
+    resultados = {}
+    # El cliente de pruebas usa el host "testserver". El muestreo se apaga
+    # para que el middleware de medición no sume su propio coste.
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], RENDIMIENTO_MUESTREO=0):
+        cliente = Client(raise_request_exception=False)
+        if usuario is not None:
+            cliente.force_login(usuario)
+        for caso in lista:
+            resultado = medir(cliente, caso.url, repeticiones, calentamiento)
+            if resultado is None:
+                omitidos[caso.nombre] = 'solo admite POST'
+                continue
+            resultados[caso.nombre] = resultado
+            if progreso:
+                progreso(caso.nombre, resultado)
+
+    return {
+        'version': VERSION,
+        'fecha': timezone.now().isoformat(),
+        'debug': settings.DEBUG,
+        'usuario': usuario.username if usuario else None,
+        'filtros': list(filtros),
+        'repeticiones': repeticiones,
+        'volumenes': volumenes_actuales(),
+        'casos': resultados,
+        'omitidos': omitidos,
+    }
+
+
+# --- Comparación ---
+
+def comparar(actual, base, tolerancia=0.2):
+    """
+    Compara dos informes de `ejecutar()`. Devuelve `(cambios, avisos)`:
+    `cambios` es una lista de `(caso, metrica, antes, ahora, relativo,
+    empeora)` con las métricas que cambiaron, y `avisos` las diferencias
+    que hacen dudosa la comparación (otros datos, otro usuario, DEBUG...).
+    """
+    avisos = []
+    for clave in ('version', 'debug', 'usuario', 'volumenes'):
+        if actual.get(clave) != base.get(clave):
+            avisos.append(f'"{clave}" distinto: {base.get(clave)!r} -> {actual.get(clave)!r}')
+    if not actual.get('filtros'):
+        for caso in sorted(set(base['casos']) - set(actual['casos'])):
+            avisos.append(f'{caso}: ya no se mide')
+
+    cambios = []
+    for caso, ahora in actual['casos'].items():
+        antes = base['casos'].get(caso)
+        if antes is None:
+            avisos.append(f'{caso}: no está en la línea base')
+            continue
+        if antes['estado'] != ahora['estado']:
+            avisos.append(f'{caso}: estado {antes["estado"]} -> {ahora["estado"]}')
+        for metrica, relativa, umbral in METRICAS:
+            valor_antes, valor_ahora = antes.get(metrica), ahora.get(metrica)
+            if valor_antes is None or valor_ahora is None or valor_antes == valor_ahora:
+                continue
+            diferencia = valor_ahora - valor_antes
+            relativo = diferencia / valor_antes if valor_antes else None
+            if relativa:
+                empeora = diferencia > umbral and (relativo is None or relativo > tolerancia)
+            else:
+                empeora = diferencia > 0
+            cambios.append((caso, metrica, valor_antes, valor_ahora, relativo, empeora))
+    return cambios, avisos
+
+
+# --- Concurrencia ---
+
+# Las vistas que tienen versión asíncrona (ver `VISTAS_ASINCRONAS`).
+VISTAS_CONCURRENCIA = ('index', 'proyectos_lista', 'buscar_proyectos', 'proyecto_detalle', 'pagina_detalle')
+
+# Cómo se arranca cada servidor y con qué vistas: (orden, VISTAS_ASINCRONAS).
+SERVIDORES = {
+    'gunicorn': (['gunicorn', 'docubase_project.wsgi:application', '--workers', '{workers}',
+                  '--bind', '127.0.0.1:{puerto}', '--log-level', 'warning'], '0'),
+    'uvicorn': (['uvicorn', 'docubase_project.asgi:application', '--workers', '{workers}',
+                 '--host', '127.0.0.1', '--port', '{puerto}', '--log-level', 'warning', '--no-access-log'], '1'),
+}
+
+
+def urls_concurrencia(valores):
+    """Las URLs de `VISTAS_CONCURRENCIA`, con los parámetros de `muestra()`."""
+    lista, _ = casos(valores)
+    return [caso.url for caso in lista if caso.nombre in VISTAS_CONCURRENCIA]
+
+
+def _esperar(base, proceso, espera):
+    """Espera a que el servidor responda. Lanza RuntimeError si no arranca."""
+    partes = urlsplit(base)
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f'El servidor terminó al arrancar (código {proceso.returncode}).')
+        conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=1)
+        try:
+            conexion.request('GET', '/')
+            conexion.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+        finally:
+            conexion.close()
+    raise RuntimeError(f'El servidor no respondió en {espera} s.')
+
+
+@contextmanager
+def servidor(nombre, puerto, workers, espera=30):
+    """
+    Arranca el servidor `nombre` de `SERVIDORES` con la configuración de
+    este proceso (misma base de datos) y devuelve su URL base. Lo para al
+    salir del bloque. El muestreo de `rendimiento` se apaga para que no
+    sume su propio coste.
+    """
+    orden, asincronas = SERVIDORES[nombre]
+    if shutil.which(orden[0]) is None:
+        raise RuntimeError(f'{orden[0]} no está instalado.')
+    entorno = {**os.environ, 'VISTAS_ASINCRONAS': asincronas, 'RENDIMIENTO_MUESTREO': '0',
+               'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'docubase_project.settings')}
+    orden = [parte.format(workers=workers, puerto=puerto) for parte in orden]
+    proceso = subprocess.Popen(orden, env=entorno, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{puerto}'
+    try:
+        _esperar(base, proceso, espera)
+        yield base
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+            proceso.wait()
+
+
+def _calentar(base, urls):
+    """Pide cada URL una vez (llena las cachés) y comprueba que responde 200."""
+    partes = urlsplit(base)
+    conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=30)
+    try:
+        for url in urls:
+            conexion.request('GET', url)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status != 200:
+                raise RuntimeError(f'{url} responde {respuesta.status}.')
+    finally:
+        conexion.close()
+
+
+def carga(base, urls, clientes, duracion):
+    """
+    `clientes` hilos piden `urls` en bucle contra `base` durante `duracion`
+    segundos, cada uno con su conexión (que se reabre si el servidor la
+    cierra). Devuelve peticiones por segundo, percentiles de latencia y
+    errores. Un 304 o un 404 cuentan como error: el banco solo pide URLs
+    que deberían responder 200.
+    """
+    partes = urlsplit(base)
+    tiempos, errores = [], []
+    cerrojo = threading.Lock()
+    fin = time.monotonic() + duracion
+
+    def cliente(desplazamiento):
+        propios, fallos = [], []
+        conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=30)
+        i = desplazamiento
+        while time.monotonic() < fin:
+            url = urls[i % len(urls)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                conexion.request('GET', url)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+            except (OSError, http.client.HTTPException) as exc:
+                conexion.close()
+                fallos.append(type(exc).__name__)
+                continue
+            propios.append(time.perf_counter() - inicio)
+            if respuesta.status != 200:
+                fallos.append(str(respuesta.status))
+        conexion.close()
+        with cerrojo:
+            tiempos.extend(propios)
+            errores.extend(fallos)
+
+    inicio = time.monotonic()
+    hilos = [threading.Thread(target=cliente, args=(n,)) for n in range(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.monotonic() - inicio
+    tiempos.sort()
+    return {
+        'clientes': clientes,
+        'peticiones': len(tiempos),
+        'errores': len(errores),
+        'tipos_error': sorted(set(errores)),
+        'por_segundo': round(len(tiempos) / transcurrido, 1),
+        'p50_ms': _ms(rendimiento.percentil(tiempos, 50)) if tiempos else None,
+        'p95_ms': _ms(rendimiento.percentil(tiempos, 95)) if tiempos else None,
+        'p99_ms': _ms(rendimiento.percentil(tiempos, 99)) if tiempos else None,
+    }
+
+
+def concurrencia(servidores=tuple(SERVIDORES), niveles=(1, 8, 32), duracion=10, workers=2,
+                 puerto=8765, base=None, progreso=None):
+    """
+    Mide cada servidor de `servidores` con cada número de clientes de
+    `niveles`, después de una vuelta de calentamiento por las URLs. Con
+    `base` mide un servidor ya arrancado en esa URL (como 'externo'). Los
+    clientes son hilos de este proceso: en máquinas pequeñas conviene
+    arrancar el servidor aparte y medirlo desde otra con `base`.
+    """
+    valores = muestra(None)
+    if valores is None:
+        raise ValueError('No hay páginas públicas que medir: ejecuta antes seed_bench.')
+    urls = urls_concurrencia(valores)
+
+    def medir_en(nombre, url_base):
+        _calentar(url_base, urls)
+        medidos[nombre] = []
+        for clientes in niveles:
+            resultado = carga(url_base, urls, clientes, duracion)
+            medidos[nombre].append(resultado)
+            if progreso:
+                progreso(nombre, resultado)
+
+    medidos, omitidos = {}, {}
+    if base is not None:
+        medir_en('externo', base)
+    else:
+        for nombre in servidores:
+            try:
+                with servidor(nombre, puerto, workers) as url_base:
+                    medir_en(nombre, url_base)
+            except RuntimeError as exc:
+                medidos.pop(nombre, None)
+                omitidos[nombre] = str(exc)
+
+    return {
+        'version': VERSION,
+        'fecha': timezone.now().isoformat(),
+        'debug': settings.DEBUG,
+        'python': sys.version.split()[0],
+        'workers': workers,
+        'duracion': duracion,
+        'urls': urls,
+        'volumenes': volumenes_actuales(),
+        'servidores': medidos,
+        'omitidos': omitidos,
+    }
@@ -0,0 +1,405 @@
+"""
+Motor de búsqueda de texto completo de DocuBase.
+
+Mantiene un índice invertido persistente con un documento por cada `Proyecto`
+y cada `Pagina` (título, etiquetas, autor y cuerpo en texto plano). En SQLite
+el índice es una tabla virtual FTS5 y en PostgreSQL una tabla con una columna
+`tsvector` generada y un índice GIN; ambas se crean en la migración 0005.
+
+El índice se actualiza de forma incremental desde `signals.py` cada vez que se
+guarda o borra un objeto, y se puede reconstruir completo con
+`manage.py rebuild_search_index`.
+
+Con otros motores no hay índice: la búsqueda recorre las tablas con
+`icontains` (cada término en el título, el cuerpo, el autor o las etiquetas),
+sin orden por relevancia ni resaltado.
+"""
+import re
+from dataclasses import dataclass
+
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Pagina, Proyecto
+from .texto import html_a_texto
+
+TABLA = 'docubase_app_indice_busqueda'
+
+TIPO_PROYECTO = 'proyecto'
+TIPO_PAGINA = 'pagina'
+
+# Número máximo de términos que se aceptan en una consulta.
+MAX_TERMINOS = 12
+
+# Marcadores internos para resaltar coincidencias. Se usan caracteres de uso
+# privado para poder escapar el fragmento antes de convertirlos en <mark>.
+_INICIO_MARCA = '\ue000'
+_FIN_MARCA = '\ue001'
+
+_TERMINO = re.compile(r'\w+', re.UNICODE)
+
+
+# --- Construcción de documentos ---
+
+def documento_proyecto(proyecto):
+    """
+    Devuelve la tupla que se guarda en el índice para un proyecto.
+    Usa la caché de `prefetch_related('etiquetas')` si está disponible.
+    """
+    etiquetas = ' '.join(e.nombre for e in proyecto.etiquetas.all())
+    return (
+        TIPO_PROYECTO, proyecto.pk, proyecto.pk, proyecto.autor_id, True,
+        proyecto.titulo, etiquetas, proyecto.autor.username,
+        html_a_texto(proyecto.descripcion),
+    )
+
+
+def documento_pagina(pagina, etiquetas=None):
+    """
+    Devuelve la tupla que se guarda en el índice para una página. Se pueden
+    pasar los nombres de las `etiquetas` si ya se conocen (importaciones
+    masivas) para no consultarlos.
+    """
+    if etiquetas is None:
+        etiquetas = [e.nombre for e in pagina.etiquetas.all()]
+    etiquetas = ' '.join(etiquetas)
+    return (
+        TIPO_PAGINA, pagina.pk, pagina.proyecto_id, pagina.autor_id, pagina.es_publica,
+        pagina.titulo, etiquetas, pagina.autor.username,
+        html_a_texto(pagina.contenido),
+    )
+
+
+def terminos(texto):
+    """Separa la consulta del usuario en términos alfanuméricos."""
+    return _TERMINO.findall(texto or '')[:MAX_TERMINOS]
+
+
+# --- Backends ---
+
+class _BackendSQLite:
+    """Índice sobre una tabla virtual FTS5, ordenado con bm25()."""
+
+    # Pesos de bm25() en el orden de las columnas de la tabla; las columnas
+    # UNINDEXED llevan peso 0.
+    PESOS = '0, 0, 0, 0, 0, 10.0, 5.0, 2.0, 1.0'
+
+    def traducir(self, terms):
+        # Cada término entre comillas (para neutralizar la sintaxis de FTS5)
+        # y como prefijo; FTS5 los combina con AND implícito.
+        return ' '.join(f'"{t}"*' for t in terms)
+
+    @staticmethod
+    def _rowid(tipo, pk):
+        # El rowid se deriva del tipo y la clave del objeto (pares para
+        # proyectos, impares para páginas) para que borrar o reemplazar un
+        # documento sea una búsqueda por clave y no un recorrido de la tabla.
+        return pk * 2 + (1 if tipo == TIPO_PAGINA else 0)
+
+    def eliminar(self, cursor, tipo, ids):
+        cursor.executemany(
+            f'DELETE FROM {TABLA} WHERE rowid = %s',
+            [(self._rowid(tipo, pk),) for pk in ids],
+        )
+
+    def indexar(self, cursor, documentos):
+        filas = [(self._rowid(d[0], d[1]),) + tuple(d) for d in documentos]
+        cursor.executemany(f'DELETE FROM {TABLA} WHERE rowid = %s', [f[:1] for f in filas])
+        cursor.executemany(
+            f'INSERT INTO {TABLA} (rowid, tipo, objeto_id, proyecto_id, autor_id, publico, '
+            f'titulo, etiquetas, autor, cuerpo) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+            filas,
+        )
+
+    def vaciar(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLA}')
+
+    def contar(self, cursor, consulta, usuario_id):
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {TABLA} '
+            f'JOIN docubase_app_proyecto p ON p.id = {TABLA}.proyecto_id '
+            f'WHERE {TABLA} MATCH %s AND ((p.es_publico AND {TABLA}.publico) '
+            f'OR p.autor_id = %s OR {TABLA}.autor_id = %s)',
+            [consulta, usuario_id, usuario_id],
+        )
+        return cursor.fetchone()[0]
+
+    def buscar(self, cursor, consulta, usuario_id, limite, desplazamiento):
+        cursor.execute(
+            f'SELECT {TABLA}.tipo, {TABLA}.objeto_id, bm25({TABLA}, {self.PESOS}) AS rango, '
+            f"snippet({TABLA}, -1, %s, %s, '…', 24) "
+            f'FROM {TABLA} '
+            f'JOIN docubase_app_proyecto p ON p.id = {TABLA}.proyecto_id '
+            f'WHERE {TABLA} MATCH %s AND ((p.es_publico AND {TABLA}.publico) '
+            f'OR p.autor_id = %s OR {TABLA}.autor_id = %s) '
+            f'ORDER BY rango, {TABLA}.objeto_id LIMIT %s OFFSET %s',
+            [_INICIO_MARCA, _FIN_MARCA, consulta, usuario_id, usuario_id,
+             -1 if limite is None else limite, desplazamiento],
+        )
+        # bm25() devuelve valores más bajos para mejores coincidencias.
+        return [(tipo, pk, -rango, fragmento) for tipo, pk, rango, fragmento in cursor.fetchall()]
+
+
+class _BackendPostgres:
+    """Índice sobre una columna tsvector generada con índice GIN."""
+
+    CONFIGURACION = 'spanish'
+
+    def traducir(self, terms):
+        # Los términos solo contienen caracteres \w, así que no pueden inyectar
+        # operadores de tsquery; se buscan como prefijos unidos con AND.
+        return ' & '.join(f'{t}:*' for t in terms)
+
+    def eliminar(self, cursor, tipo, ids):
+        cursor.execute(
+            f'DELETE FROM {TABLA} WHERE tipo = %s AND objeto_id = ANY(%s)',
+            [tipo, list(ids)],
+        )
+
+    def indexar(self, cursor, documentos):
+        cursor.executemany(
+            f'INSERT INTO {TABLA} (tipo, objeto_id, proyecto_id, autor_id, publico, '
+            f'titulo, etiquetas, autor, cuerpo) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT (tipo, objeto_id) DO UPDATE SET '
+            f'proyecto_id = EXCLUDED.proyecto_id, autor_id = EXCLUDED.autor_id, '
+            f'publico = EXCLUDED.publico, titulo = EXCLUDED.titulo, '
+            f'etiquetas = EXCLUDED.etiquetas, autor = EXCLUDED.autor, cuerpo = EXCLUDED.cuerpo',
+            list(documentos),
+        )
+
+    def vaciar(self, cursor):
+        cursor.execute(f'TRUNCATE {TABLA}')
+
+    def contar(self, cursor, consulta, usuario_id):
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {TABLA} t '
+            f'JOIN docubase_app_proyecto p ON p.id = t.proyecto_id '
+            f'WHERE t.documento @@ to_tsquery(%s, %s) AND ((p.es_publico AND t.publico) '
+            f'OR p.autor_id = %s OR t.autor_id = %s)',
+            [self.CONFIGURACION, consulta, usuario_id, usuario_id],
+        )
+        return cursor.fetchone()[0]
+
+    def buscar(self, cursor, consulta, usuario_id, limite, desplazamiento):
+        # ts_headline es caro: se calcula solo sobre la página de resultados.
+        opciones = f'StartSel={_INICIO_MARCA}, StopSel={_FIN_MARCA}, MaxWords=30, MinWords=12'
+        cursor.execute(
+            f'SELECT r.tipo, r.objeto_id, r.rango, '
+            f'ts_headline(%s, r.cuerpo, to_tsquery(%s, %s), %s) FROM ('
+            f'  SELECT t.tipo, t.objeto_id, t.cuerpo, '
+            f'  ts_rank_cd(t.documento, to_tsquery(%s, %s)) AS rango '
+            f'  FROM {TABLA} t JOIN docubase_app_proyecto p ON p.id = t.proyecto_id '
+            f'  WHERE t.documento @@ to_tsquery(%s, %s) AND ((p.es_publico AND t.publico) '
+            f'  OR p.autor_id = %s OR t.autor_id = %s) '
+            f'  ORDER BY rango DESC, t.objeto_id LIMIT %s OFFSET %s'
+            f') r ORDER BY r.rango DESC, r.objeto_id',
+            [self.CONFIGURACION, self.CONFIGURACION, consulta, opciones,
+             self.CONFIGURACION, consulta, self.CONFIGURACION, consulta,
+             usuario_id, usuario_id, limite, desplazamiento],
+        )
+        return cursor.fetchall()
+
+
+_BACKENDS = {
+    'sqlite': _BackendSQLite(),
+    'postgresql': _BackendPostgres(),
+}
+
+
+def obtener_backend(conexion=None):
+    """
+    Devuelve el backend para el motor de la conexión, o None si el motor no
+    tiene índice de texto completo (en ese caso la indexación no hace nada).
+    """
+    return _BACKENDS.get((conexion or connection).vendor)
+
+
+# --- Mantenimiento del índice ---
+
+def indexar(documentos):
+    """Inserta o reemplaza los documentos dados en el índice."""
+    backend = obtener_backend()
+    documentos = list(documentos)
+    if backend is None or not documentos:
+        return
+    with connection.cursor() as cursor:
+        backend.indexar(cursor, documentos)
+
+
+def indexar_proyecto(proyecto):
+    indexar([documento_proyecto(proyecto)])
+
+
+def indexar_pagina(pagina):
+    indexar([documento_pagina(pagina)])
+
+
+def eliminar(tipo, ids):
+    """Quita del índice los documentos del tipo e ids dados."""
+    backend = obtener_backend()
+    if backend is None or not ids:
+        return
+    with connection.cursor() as cursor:
+        backend.eliminar(cursor, tipo, ids)
+
+
+def vaciar():
+    """Borra todos los documentos del índice."""
+    backend = obtener_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.vaciar(cursor)
+
+
+# --- Consultas ---
+
+@dataclass
+class Resultado:
+    """Un resultado de búsqueda ya hidratado con su objeto del ORM."""
+    tipo: str
+    objeto: object
+    rango: float
+    fragmento: str
+
+    @property
+    def es_pagina(self):
+        return self.tipo == TIPO_PAGINA
+
+    @property
+    def url(self):
+        if self.es_pagina:
+            return reverse('pagina_detalle', kwargs={
+                'proyecto_slug': self.objeto.proyecto.slug, 'pagina_slug': self.objeto.slug})
+        return reverse('proyecto_detalle', kwargs={'proyecto_slug': self.objeto.slug})
+
+
+def _resaltar(fragmento):
+    """Escapa el fragmento y convierte los marcadores internos en <mark>."""
+    seguro = escape(fragmento or '')
+    return mark_safe(seguro.replace(_INICIO_MARCA, '<mark>').replace(_FIN_MARCA, '</mark>'))
+
+
+class ConsultaBusqueda:
+    """
+    Consulta perezosa sobre el índice, compatible con `django.core.paginator.Paginator`:
+    `count()` ejecuta un COUNT y el slicing ejecuta la búsqueda con LIMIT/OFFSET.
+    """
+
+    def __init__(self, texto, usuario=None):
+        self.texto = texto or ''
+        self.usuario_id = usuario.pk if usuario is not None and usuario.is_authenticated else None
+        # El índice se lee de la misma base que los objetos (una réplica, si toca; ver `replicas.py`).
+        self.conexion = connections[router.db_for_read(Proyecto)]
+        self.backend = obtener_backend(self.conexion)
+        self.terminos = terminos(self.texto)
+        self.consulta = self.backend.traducir(self.terminos) if self.terminos and self.backend else None
+        self._total = None
+
+    def count(self):
+        if self.backend is None:
+            return self._contar_sin_indice()
+        if self.consulta is None:
+            return 0
+        if self._total is None:
+            with self.conexion.cursor() as cursor:
+                self._total = self.backend.contar(cursor, self.consulta, self.usuario_id)
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+        inicio = indice.start or 0
+        if self.backend is None:
+            return self._buscar_sin_indice(inicio, indice.stop)
+        if self.consulta is None or indice.stop is not None and indice.stop <= inicio:
+            return []
+        limite = (indice.stop - inicio) if indice.stop is not None else None
+        with self.conexion.cursor() as cursor:
+            filas = self.backend.buscar(cursor, self.consulta, self.usuario_id, limite, inicio)
+        return self._hidratar(filas)
+
+    def _hidratar(self, filas):
+        """Carga los objetos de una página de resultados con una consulta por tipo."""
+        ids_proyectos = [pk for tipo, pk, _, _ in filas if tipo == TIPO_PROYECTO]
+        ids_paginas = [pk for tipo, pk, _, _ in filas if tipo == TIPO_PAGINA]
+        # El HTML compilado no se muestra en los resultados.
+        proyectos = Proyecto.objects.select_related('autor').defer('descripcion_html').in_bulk(ids_proyectos)
+        paginas = (Pagina.objects.select_related('autor', 'proyecto')
+                   .defer('contenido_html', 'indice', 'proyecto__descripcion_html').in_bulk(ids_paginas))
+        resultados = []
+        for tipo, pk, rango, fragmento in filas:
+            objeto = (paginas if tipo == TIPO_PAGINA else proyectos).get(pk)
+            # Un documento huérfano (objeto borrado sin pasar por el ORM) se omite.
+            if objeto is not None:
+                resultados.append(Resultado(tipo, objeto, rango, _resaltar(fragmento)))
+        return resultados
+
+    # --- Sin índice (motores sin backend) ---
+
+    def _sin_indice(self):
+        """
+        Consultas de proyectos y páginas en las que aparece cada término, con
+        la misma visibilidad que el índice. Las etiquetas se buscan con una
+        subconsulta para que el JOIN no duplique filas.
+        """
+        proyectos = Proyecto.objects.filter(Q(es_publico=True) | Q(autor_id=self.usuario_id))
+        paginas = Pagina.objects.filter(
+            Q(proyecto__es_publico=True, es_publica=True)
+            | Q(proyecto__autor_id=self.usuario_id) | Q(autor_id=self.usuario_id))
+        for termino in self.terminos:
+            proyectos = proyectos.filter(
+                Q(titulo__icontains=termino) | Q(descripcion__icontains=termino)
+                | Q(autor__username__icontains=termino)
+                | Q(pk__in=Proyecto.etiquetas.through.objects
+                    .filter(etiqueta__nombre__icontains=termino).values('proyecto_id')))
+            paginas = paginas.filter(
+                Q(titulo__icontains=termino) | Q(contenido__icontains=termino)
+                | Q(autor__username__icontains=termino)
+                | Q(pk__in=Pagina.etiquetas.through.objects
+                    .filter(etiqueta__nombre__icontains=termino).values('pagina_id')))
+        return proyectos.order_by('pk'), paginas.order_by('pk')
+
+    def _contar_sin_indice(self):
+        if not self.terminos:
+            return 0
+        if self._total is None:
+            proyectos, paginas = self._sin_indice()
+            self._total = proyectos.count() + paginas.count()
+        return self._total
+
+    def _buscar_sin_indice(self, inicio, fin):
+        """Proyectos primero y después páginas, cada grupo por clave primaria."""
+        if not self.terminos or fin is not None and fin <= inicio:
+            return []
+        proyectos, paginas = self._sin_indice()
+        num_proyectos = proyectos.count()
+        resultados = []
+        if inicio < num_proyectos:
+            tope = num_proyectos if fin is None else min(fin, num_proyectos)
+            resultados += [
+                Resultado(TIPO_PROYECTO, proyecto, 0.0, _resaltar(proyecto.extracto))
+                for proyecto in proyectos.select_related('autor').defer('descripcion_html')[inicio:tope]
+            ]
+        if fin is None or fin > num_proyectos:
+            desde = max(inicio - num_proyectos, 0)
+            hasta = None if fin is None else fin - num_proyectos
+            resultados += [
+                Resultado(TIPO_PAGINA, pagina, 0.0, _resaltar(pagina.extracto))
+                for pagina in paginas.select_related('autor', 'proyecto')
+                .defer('contenido_html', 'indice', 'proyecto__descripcion_html')[desde:hasta]
+            ]
+        return resultados
+
+def buscar(texto, usuario=None):
+    """
+    Devuelve una `ConsultaBusqueda` ordenada por relevancia. Solo incluye
+    contenido público o del que `usuario` es autor.
+    """
+    return ConsultaBusqueda(texto, usuario)
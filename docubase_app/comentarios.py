@@ -0,0 +1,138 @@
+"""
+Comentarios anidados de las páginas.
+
+Recorrer `respuestas.all` desde la plantilla haría una consulta por
+comentario. En su lugar cada comentario guarda su posición en el árbol:
+
+- `ruta`: el id del comentario raíz, los de sus antepasados y el propio,
+  cada uno con `ANCHO_SEGMENTO` cifras y un `/` detrás. Como todos los
+  segmentos miden lo mismo, ordenar por la ruta recorre cada hilo en
+  profundidad: cada respuesta va justo detrás de su padre, y las hermanas
+  por orden de llegada.
+- `hilo`: el id del comentario raíz, que agrupa el hilo para paginar.
+- `profundidad`: el nivel en el árbol.
+
+La ruta necesita el id, así que al crear un comentario se inserta y se
+completa con un UPDATE. Las respuestas a partir de `PROFUNDIDAD_MAXIMA` se
+cuelgan del padre de su padre, para que la ruta quepa en su columna y la
+sangría no se salga de la página.
+
+La página muestra los hilos de `HILOS_POR_PAGINA` en `HILOS_POR_PAGINA`,
+paginados por `hilo`: una consulta para los ids de los hilos y otra para
+todos sus comentarios con su autor, tengan las respuestas que tengan.
+
+Si se borra un comentario, sus respuestas conservan su ruta y su hilo
+(solo `comentario_padre` pasa a NULL), así que siguen en su sitio.
+"""
+from django.db import transaction
+
+# Cifras de cada id en la ruta (ids de hasta 10^12).
+ANCHO_SEGMENTO = 12
+# Nivel máximo de anidamiento: (PROFUNDIDAD_MAXIMA + 1) segmentos caben en
+# los 255 caracteres de `ruta`.
+PROFUNDIDAD_MAXIMA = 8
+# Hilos (comentarios de primer nivel con sus respuestas) por página.
+HILOS_POR_PAGINA = 20
+
+# Campos que se leen para mostrar los comentarios.
+CAMPOS = ('texto', 'fecha_creacion', 'pagina', 'comentario_padre', 'ruta', 'hilo', 'profundidad', 'autor__username')
+
+
+def segmento(pk):
+    return f'{pk:0{ANCHO_SEGMENTO}d}/'
+
+
+def _posicion(comentario):
+    """
+    Devuelve `(prefijo, profundidad, hilo)` de `comentario` según su padre
+    (que no se vuelve a leer si ya está cargado). Si el padre está demasiado
+    hondo, el comentario pasa a responder al padre del padre, justo detrás.
+    `hilo` es None para los comentarios raíz (es su propio id).
+    """
+    padre = comentario.comentario_padre
+    if padre is None:
+        return '', 0, None
+    if padre.profundidad >= PROFUNDIDAD_MAXIMA:
+        comentario.comentario_padre_id = padre.comentario_padre_id
+        return padre.ruta[:-len(segmento(0))], padre.profundidad, padre.hilo
+    return padre.ruta, padre.profundidad + 1, padre.hilo
+
+
+def guardar_en_arbol(comentario, guardar):
+    """
+    Ejecuta `guardar()` y, si el comentario es nuevo, calcula su ruta, hilo
+    y profundidad a partir de `comentario_padre` y los guarda con un UPDATE.
+    """
+    if comentario.ruta:
+        guardar()
+        return
+    prefijo, profundidad, hilo = _posicion(comentario)
+    with transaction.atomic():
+        guardar()
+        comentario.ruta = prefijo + segmento(comentario.pk)
+        comentario.hilo = hilo or comentario.pk
+        comentario.profundidad = profundidad
+        type(comentario).objects.filter(pk=comentario.pk).update(
+            ruta=comentario.ruta, hilo=comentario.hilo, profundidad=comentario.profundidad)
+
+
+def colocar_lote(comentarios):
+    """
+    Calcula ruta, hilo y profundidad de comentarios creados con
+    `bulk_create` (que no pasa por `save()`) y los guarda con un
+    `bulk_update`. Cada padre tiene que ir en la lista antes que sus
+    respuestas, o estar ya colocado.
+    """
+    if not comentarios:
+        return
+    for comentario in comentarios:
+        prefijo, comentario.profundidad, hilo = _posicion(comentario)
+        comentario.ruta = prefijo + segmento(comentario.pk)
+        comentario.hilo = hilo or comentario.pk
+    type(comentarios[0]).objects.bulk_update(
+        comentarios, ['ruta', 'hilo', 'profundidad', 'comentario_padre'], batch_size=500)
+
+
+def _ids_hilos(pagina, desde, cantidad):
+    return (pagina.comentarios.filter(hilo__gt=desde).order_by('hilo')
+            .values_list('hilo', flat=True).distinct()[:cantidad + 1])
+
+
+def _comentarios_hilos(pagina, ids):
+    return (pagina.comentarios.filter(hilo__in=ids)
+            .select_related('autor').only(*CAMPOS).order_by('ruta'))
+
+
+def hilos(pagina, desde=0, cantidad=HILOS_POR_PAGINA):
+    """
+    Devuelve `(hilos, siguiente)`: los `cantidad` hilos de `pagina` que
+    siguen al hilo `desde`, cada uno como lista de comentarios en orden de
+    árbol, y el cursor de los siguientes (o None). Como mucho dos consultas.
+    """
+    ids = list(_ids_hilos(pagina, desde, cantidad))
+    siguiente = ids[cantidad - 1] if len(ids) > cantidad else None
+    if not ids:
+        return [], None
+    return agrupar(_comentarios_hilos(pagina, ids[:cantidad])), siguiente
+
+
+async def ahilos(pagina, desde=0, cantidad=HILOS_POR_PAGINA):
+    """Versión asíncrona de `hilos`, con el ORM asíncrono."""
+    ids = [hilo async for hilo in _ids_hilos(pagina, desde, cantidad)]
+    siguiente = ids[cantidad - 1] if len(ids) > cantidad else None
+    if not ids:
+        return [], None
+    return agrupar([c async for c in _comentarios_hilos(pagina, ids[:cantidad])]), siguiente
+
+
+def agrupar(comentarios):
+    """
+    Agrupa en hilos comentarios ya ordenados por ruta, en un solo recorrido.
+    Las respuestas de un comentario borrado siguen en su hilo y a su nivel.
+    """
+    resultado = []
+    for comentario in comentarios:
+        if not resultado or resultado[-1][0].hilo != comentario.hilo:
+            resultado.append([])
+        resultado[-1].append(comentario)
+    return resultado
@@ -0,0 +1,339 @@
+"""
+Compilación del HTML de CKEditor al guardar.
+
+`Pagina.save` y `Proyecto.save` pasan el HTML que escribe el usuario por
+`compilar()` y guardan el resultado (`contenido_html`, `descripcion_html`)
+junto con el índice de la página. Las plantillas solo pintan esos bytes: el
+trabajo se hace una vez por edición y no en cada visita.
+
+`compilar()`:
+
+- Sanea: solo deja las etiquetas y atributos de `ETIQUETAS` (lo que genera
+  CKEditor), quita scripts, estilos, manejadores `on*`, URLs `javascript:`
+  y propiedades CSS fuera de `PROPIEDADES_CSS`. Lo demás se desenvuelve
+  (se conserva el texto) o, en `ELIMINAR`, se quita con su contenido.
+- Da un `id` estable a cada título (h1-h6), a partir de su texto, y
+  devuelve el índice: `[{"nivel", "profundidad", "texto", "id"}, ...]`,
+  donde `profundidad` cuenta desde el título de menor nivel (0).
+- Añade `loading="lazy"` y `decoding="async"` a las imágenes y, si no
+  tienen `width`/`height`, las toma del estilo de CKEditor o de la propia
+  imagen (si está en el almacenamiento de media), para reservar su hueco.
+- Reescribe los enlaces internos: las URLs absolutas de este sitio pasan a
+  ser relativas a la raíz y las de páginas con un slug antiguo (ver
+  `SlugAntiguo`) apuntan al slug actual. Los enlaces con `target` llevan
+  `rel="noopener"`.
+
+Si cambian las reglas hay que subir `VERSION`: `compilar_contenido` vuelve a
+compilar las filas con una versión anterior.
+"""
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+
+VERSION = 2
+
+# Etiqueta -> atributos permitidos (además de GLOBALES).
+ETIQUETAS = {
+    'p': set(), 'div': set(), 'span': set(), 'br': set(), 'hr': set(),
+    'h1': set(), 'h2': set(), 'h3': set(), 'h4': set(), 'h5': set(), 'h6': set(),
+    'strong': set(), 'b': set(), 'em': set(), 'i': set(), 'u': set(), 's': set(), 'strike': set(),
+    'del': set(), 'ins': set(), 'sub': set(), 'sup': set(), 'small': set(), 'big': set(), 'mark': set(),
+    'code': set(), 'kbd': set(), 'samp': set(), 'var': set(), 'pre': set(), 'blockquote': {'cite'},
+    'q': {'cite'}, 'cite': set(), 'abbr': set(), 'address': set(),
+    'a': {'href', 'name', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'figure': set(), 'figcaption': set(),
+    'ul': {'type'}, 'ol': {'start', 'type', 'reversed'}, 'li': {'value'},
+    'dl': set(), 'dt': set(), 'dd': set(),
+    'table': {'border', 'cellpadding', 'cellspacing', 'summary', 'align', 'width'},
+    'caption': set(), 'thead': set(), 'tbody': set(), 'tfoot': set(), 'tr': set(),
+    'colgroup': {'span'}, 'col': {'span', 'width'},
+    'th': {'colspan', 'rowspan', 'scope', 'align', 'valign', 'width'},
+    'td': {'colspan', 'rowspan', 'align', 'valign', 'width'},
+}
+GLOBALES = {'class', 'id', 'title', 'lang', 'dir', 'style'}
+# Se quitan con todo su contenido.
+ELIMINAR = {'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template', 'svg', 'math',
+            'form', 'textarea', 'select', 'button', 'head', 'title'}
+VACIAS = {'br', 'hr', 'img', 'col', 'area', 'base', 'embed', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+PROPIEDADES_CSS = {
+    'text-align', 'vertical-align', 'color', 'background-color', 'font-size', 'font-family',
+    'font-weight', 'font-style', 'text-decoration', 'text-indent', 'line-height', 'list-style-type',
+    'width', 'height', 'max-width', 'float', 'margin', 'margin-left', 'margin-right', 'margin-top',
+    'margin-bottom', 'padding', 'border', 'border-width', 'border-style', 'border-color',
+    'border-collapse', 'border-spacing',
+}
+ESQUEMAS = {'', 'http', 'https', 'mailto', 'tel'}
+
+_TITULOS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+# Ids que usan las plantillas alrededor del contenido (ver page_detail.html):
+# un título "Comentarios" no puede quitarle el suyo a la sección.
+IDS_RESERVADOS = {'comentarios', 'comentar', 'respondiendo', 'contenido', 'indice'}
+_PREFIJOS_RESERVADOS = ('comentario-', 'id_')
+_CSS_PELIGROSO = re.compile(r'url\s*\(|expression\s*\(|javascript:|@import|\\', re.IGNORECASE)
+_PIXELES = re.compile(r'^\s*(\d+)(?:px)?\s*$')
+_ESPACIOS = re.compile(r'\s+')
+_RUTA_PAGINA = re.compile(r'^/proyectos/(?P<proyecto>[-\w]+)/(?P<pagina>[-\w]+)/(?P<resto>.*)$')
+
+
+def _estilo(valor):
+    """Deja solo las declaraciones CSS permitidas y sin URLs ni expresiones."""
+    declaraciones = []
+    for declaracion in valor.split(';'):
+        propiedad, separador, dato = declaracion.partition(':')
+        propiedad, dato = propiedad.strip().lower(), dato.strip()
+        if separador and propiedad in PROPIEDADES_CSS and dato and not _CSS_PELIGROSO.search(dato):
+            declaraciones.append(f'{propiedad}: {dato}')
+    return '; '.join(declaraciones)
+
+
+def _url_segura(valor):
+    # Los navegadores ignoran los espacios y controles dentro del esquema ("java\tscript:").
+    limpio = re.sub(r'[\x00-\x20]', '', valor)
+    try:
+        esquema = urlsplit(limpio).scheme.lower()
+    except ValueError:
+        return False
+    return esquema in ESQUEMAS
+
+
+def _hosts_propios():
+    return {h.lower() for h in settings.ALLOWED_HOSTS if h and not h.startswith('.') and h != '*'}
+
+
+def _relativa(url, hosts):
+    """URL absoluta de este sitio -> relativa a la raíz. Otras, sin cambios."""
+    try:
+        partes = urlsplit(url)
+    except ValueError:
+        return url
+    if partes.scheme in ('http', 'https') and (partes.hostname or '').lower() in hosts:
+        return urlunsplit(('', '', partes.path or '/', partes.query, partes.fragment))
+    return url
+
+
+def _dimensiones_media(src):
+    """`(ancho, alto)` de una imagen del almacenamiento de media, o None."""
+    if not src.startswith(settings.MEDIA_URL):
+        return None
+    nombre = src[len(settings.MEDIA_URL):].split('?')[0].split('#')[0]
+    try:
+        from PIL import Image
+        with default_storage.open(nombre, 'rb') as archivo, Image.open(archivo) as imagen:
+            # Pillow solo lee la cabecera para conocer el tamaño.
+            return imagen.size
+    except Exception:
+        # Ni Pillow, ni el archivo, ni una imagen válida: sin dimensiones.
+        return None
+
+
+class _Compilador(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.salida = []
+        self.abiertas = []
+        self.eliminando = 0
+        self.ids = set(IDS_RESERVADOS)
+        self.indice = []
+        self.titulo = None   # (nivel, atributos) del título abierto
+        self.texto_titulo = []
+        self.enlaces = []    # atributos de los enlaces a /proyectos/...
+        self.hosts = _hosts_propios()
+
+    # --- Atributos ---
+
+    def _atributos(self, etiqueta, atributos):
+        permitidos = ETIQUETAS[etiqueta] | GLOBALES
+        limpios = {}
+        for nombre, valor in atributos:
+            nombre = nombre.lower()
+            if nombre not in permitidos or nombre in limpios:
+                continue
+            valor = valor or ''
+            if nombre in ('href', 'src', 'cite'):
+                if not _url_segura(valor):
+                    continue
+                valor = _relativa(valor.strip(), self.hosts)
+            elif nombre == 'style':
+                valor = _estilo(valor)
+                if not valor:
+                    continue
+            elif nombre == 'id':
+                valor = slugify(valor)
+                if not valor or valor in self.ids or valor.startswith(_PREFIJOS_RESERVADOS):
+                    continue
+                self.ids.add(valor)
+            limpios[nombre] = valor
+
+        if etiqueta == 'a' and 'target' in limpios:
+            limpios['rel'] = ' '.join(sorted(set(limpios.get('rel', '').split()) | {'noopener'}))
+        if etiqueta == 'img':
+            self._imagen(limpios)
+        return limpios
+
+    def _imagen(self, atributos):
+        if 'src' not in atributos:
+            return
+        atributos.setdefault('alt', '')
+        atributos['loading'] = 'lazy'
+        atributos['decoding'] = 'async'
+        if 'width' in atributos and 'height' in atributos:
+            return
+        # CKEditor guarda el tamaño elegido en el estilo ("width:300px; height:200px").
+        estilo = dict(
+            (p.strip(), v.strip()) for p, _, v in (d.partition(':') for d in atributos.get('style', '').split(';')))
+        ancho, alto = _PIXELES.match(estilo.get('width', '')), _PIXELES.match(estilo.get('height', ''))
+        if ancho and alto:
+            atributos['width'], atributos['height'] = ancho.group(1), alto.group(1)
+            return
+        dimensiones = _dimensiones_media(atributos['src'])
+        if dimensiones:
+            atributos['width'], atributos['height'] = map(str, dimensiones)
+
+    # --- Eventos del parser ---
+
+    def _abrir(self, etiqueta, atributos, vacia):
+        if self.eliminando:
+            # Una vacía (embed) nunca tiene cierre: contarla dejaría el resto
+            # de la página dentro de lo que se elimina.
+            if etiqueta in ELIMINAR and not vacia and etiqueta not in VACIAS:
+                self.eliminando += 1
+            return
+        if etiqueta in ELIMINAR:
+            if not vacia and etiqueta not in VACIAS:
+                self.eliminando = 1
+            return
+        if etiqueta not in ETIQUETAS:
+            return
+        limpios = self._atributos(etiqueta, atributos)
+        if etiqueta in _TITULOS and self.titulo is None and not vacia:
+            self.titulo = (int(etiqueta[1]), limpios)
+            self.texto_titulo = []
+        if etiqueta == 'a' and limpios.get('href', '').startswith('/proyectos/'):
+            self.enlaces.append(limpios)
+        self.salida.append([etiqueta, limpios])
+        if etiqueta not in VACIAS and not vacia:
+            self.abiertas.append(etiqueta)
+
+    def handle_starttag(self, etiqueta, atributos):
+        self._abrir(etiqueta, atributos, False)
+
+    def handle_startendtag(self, etiqueta, atributos):
+        self._abrir(etiqueta, atributos, True)
+
+    def handle_endtag(self, etiqueta):
+        if self.eliminando:
+            if etiqueta in ELIMINAR and etiqueta not in VACIAS:
+                self.eliminando -= 1
+            return
+        if etiqueta not in self.abiertas:
+            return
+        # Cierra también las que quedaron abiertas dentro (HTML mal anidado).
+        while self.abiertas:
+            abierta = self.abiertas.pop()
+            self._cerrar(abierta)
+            if abierta == etiqueta:
+                break
+
+    def _cerrar(self, etiqueta):
+        if self.titulo is not None and etiqueta in _TITULOS:
+            self._registrar_titulo()
+        self.salida.append(f'</{etiqueta}>')
+
+    def _registrar_titulo(self):
+        nivel, atributos = self.titulo
+        texto = _ESPACIOS.sub(' ', ''.join(self.texto_titulo)).strip()
+        # Se respeta el id que ya tuviera, por si alguien enlaza a él.
+        identificador = atributos.get('id')
+        if not identificador:
+            base = slugify(texto) or 'seccion'
+            identificador, n = base, 1
+            while identificador in self.ids or identificador.startswith(_PREFIJOS_RESERVADOS):
+                n += 1
+                identificador = f'{base}-{n}'
+            self.ids.add(identificador)
+            atributos['id'] = identificador
+        if texto:
+            self.indice.append({'nivel': nivel, 'texto': texto, 'id': identificador})
+        self.titulo = None
+
+    def handle_data(self, datos):
+        if self.eliminando:
+            return
+        if self.titulo is not None:
+            self.texto_titulo.append(datos)
+        self.salida.append(escape(datos, quote=False))
+
+    def close(self):
+        super().close()
+        while self.abiertas:
+            self._cerrar(self.abiertas.pop())
+
+    # --- Resultado ---
+
+    def html(self):
+        trozos = []
+        for elemento in self.salida:
+            if isinstance(elemento, str):
+                trozos.append(elemento)
+                continue
+            etiqueta, atributos = elemento
+            texto = ''.join(f' {nombre}="{escape(valor)}"' for nombre, valor in atributos.items())
+            trozos.append(f'<{etiqueta}{texto}>')
+        return ''.join(trozos)
+
+
+def _actualizar_slugs(enlaces):
+    """
+    Apunta los enlaces a páginas con un slug antiguo al slug actual, con una
+    sola consulta para todos los enlaces del documento.
+    """
+    from .models import Pagina, SlugAntiguo
+
+    rutas = {}
+    for atributos in enlaces:
+        url = urlsplit(atributos['href'])
+        coincidencia = _RUTA_PAGINA.match(url.path)
+        if coincidencia:
+            rutas.setdefault((coincidencia['proyecto'], coincidencia['pagina']), []).append((atributos, url, coincidencia))
+    if not rutas:
+        return
+    condiciones = [(proyecto, slug) for proyecto, slug in rutas]
+    proyectos = {proyecto for proyecto, _ in condiciones}
+    slugs = {slug for _, slug in condiciones}
+    actuales = set(Pagina.objects.filter(proyecto__slug__in=proyectos, slug__in=slugs)
+                   .values_list('proyecto__slug', 'slug'))
+    antiguos = {
+        (proyecto, antiguo): actual
+        for proyecto, antiguo, actual in SlugAntiguo.objects.filter(proyecto__slug__in=proyectos, slug__in=slugs)
+        .values_list('proyecto__slug', 'slug', 'pagina__slug')
+    }
+    for clave, usos in rutas.items():
+        if clave in actuales or clave not in antiguos:
+            continue
+        for atributos, url, coincidencia in usos:
+            ruta = f'/proyectos/{clave[0]}/{antiguos[clave]}/{coincidencia["resto"]}'
+            atributos['href'] = urlunsplit(('', '', ruta, url.query, url.fragment))
+
+
+def compilar(html):
+    """
+    Devuelve `(html_compilado, indice)` para el HTML de CKEditor `html` (ver
+    el docstring del módulo).
+    """
+    if not html:
+        return '', []
+    compilador = _Compilador()
+    compilador.feed(html)
+    compilador.close()
+    if compilador.enlaces:
+        _actualizar_slugs(compilador.enlaces)
+    minimo = min((entrada['nivel'] for entrada in compilador.indice), default=1)
+    for entrada in compilador.indice:
+        entrada['profundidad'] = entrada['nivel'] - minimo
+    return compilador.html(), compilador.indice
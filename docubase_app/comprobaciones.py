@@ -0,0 +1,40 @@
+"""
+Comprobaciones del sistema (las ejecutan `check`, `migrate` y `runserver`).
+
+Las generaciones de `fragmentos.py` forman parte de las claves de caché y de
+los ETag, y las señales las incrementan (y borran el resumen de `panel.py`)
+en el proceso que escribe. En producción hay varios workers de gunicorn y un
+`run_worker` aparte: si la caché es local de cada proceso, una invalidación
+no llega a los demás y cada uno calcula ETags distintos. Por eso, con
+`EXIGIR_CACHE_COMPARTIDA` (que por defecto es lo contrario de DEBUG), esas
+cachés tienen que ser compartidas.
+"""
+from django.conf import settings
+from django.core import checks
+
+_LOCALES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def caches_compartidas():
+    """Alias de caché cuyas invalidaciones tienen que ver todos los procesos."""
+    return {
+        getattr(settings, 'FRAGMENTOS_CACHE_ALIAS', 'default'),
+        getattr(settings, 'PANEL_CACHE_ALIAS', 'default'),
+    }
+
+
+@checks.register(checks.Tags.caches)
+def comprobar_caches_compartidas(app_configs, **kwargs):
+    if not getattr(settings, 'EXIGIR_CACHE_COMPARTIDA', False):
+        return []
+    errores = []
+    for alias in sorted(caches_compartidas()):
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend in _LOCALES:
+            errores.append(checks.Error(
+                f'La caché "{alias}" es local de cada proceso ({backend}).',
+                hint='Las invalidaciones no llegarían a los demás workers. Usa un backend compartido: '
+                     'Redis, Memcached o django.core.cache.backends.db.DatabaseCache (con createcachetable).',
+                id='docubase_app.E001',
+            ))
+    return errores
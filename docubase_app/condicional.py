@@ -0,0 +1,109 @@
+"""
+Peticiones condicionales (ETag / Last-Modified / 304) para las vistas de
+documentación.
+
+Cada vista declara una función de "precomprobación" que, con una consulta
+barata sobre las fechas de actualización, devuelve un `Estado`. Si el cliente
+ya tiene esa versión, se responde 304 sin cargar el contenido ni renderizar
+plantillas. También se fija `Cache-Control`: `public` para visitantes anónimos
+y contenido público, `private` en cualquier otro caso; en ambos se pide
+revalidar (`no-cache`), que con el ETag es una petición muy barata.
+
+Las vistas asíncronas (ver `VISTAS_ASINCRONAS`) usan el mismo decorador con
+una precomprobación `async def`: se espera antes de llamar a `condition()`,
+cuyas funciones de ETag y fecha ya solo leen el `Estado` guardado.
+"""
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+@dataclass
+class Estado:
+    """Resultado de la precomprobación de una vista."""
+    ultima_modificacion: datetime
+    # Valores que identifican la versión del contenido (ids, fechas, conteos...).
+    partes: tuple
+    es_publico: bool = True
+    # Objeto ya leído por la precomprobación, para que la vista lo reutilice
+    # en lugar de volver a consultarlo.
+    objeto: object = None
+
+
+def _estado(request, precomprobar, args, kwargs):
+    """Ejecuta la precomprobación una sola vez por petición."""
+    if not hasattr(request, '_estado_condicional'):
+        request._estado_condicional = precomprobar(request, *args, **kwargs)
+    return request._estado_condicional
+
+
+def estado_precomprobado(request):
+    """El `Estado` que calculó la precomprobación de esta petición, o None."""
+    return getattr(request, '_estado_condicional', None)
+
+
+def _etag(request, estado):
+    """
+    ETag fuerte: hash de la versión del contenido, del usuario (la navegación y
+    los botones de edición cambian con él) y de la versión desplegada.
+    """
+    usuario = request.user.pk if request.user.is_authenticated else 0
+    crudo = '|'.join(str(p) for p in (*estado.partes, usuario, settings.VERSION_DESPLIEGUE))
+    return hashlib.sha256(crudo.encode()).hexdigest()[:32]
+
+
+def condicional(precomprobar):
+    """
+    Decorador para vistas GET. `precomprobar(request, *args, **kwargs)` debe
+    devolver un `Estado`, o None si el objeto no existe (la vista decidirá).
+    Si la vista es asíncrona, `precomprobar` también tiene que serlo.
+    """
+    def decorador(vista):
+        def etag_func(request, *args, **kwargs):
+            estado = _estado(request, precomprobar, args, kwargs)
+            return _etag(request, estado) if estado else None
+
+        def last_modified_func(request, *args, **kwargs):
+            estado = _estado(request, precomprobar, args, kwargs)
+            return estado.ultima_modificacion if estado else None
+
+        vista_condicional = condition(etag_func=etag_func, last_modified_func=last_modified_func)(vista)
+
+        if iscoroutinefunction(precomprobar):
+            @wraps(vista)
+            async def envoltura(request, *args, **kwargs):
+                # El ETag depende del usuario: se resuelve aquí, porque desde
+                # código asíncrono no se puede cargar el `request.user` perezoso.
+                request.user = await request.auser()
+                if not hasattr(request, '_estado_condicional'):
+                    request._estado_condicional = await precomprobar(request, *args, **kwargs)
+                response = await vista_condicional(request, *args, **kwargs)
+                return _fijar_cache(request, response, request._estado_condicional)
+            return envoltura
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            response = vista_condicional(request, *args, **kwargs)
+            return _fijar_cache(request, response, _estado(request, precomprobar, args, kwargs))
+        return envoltura
+    return decorador
+
+
+def _fijar_cache(request, response, estado):
+    if estado and response.status_code in (200, 304):
+        if estado.es_publico and not request.user.is_authenticated:
+            patch_cache_control(response, public=True, no_cache=True)
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def mas_reciente(*fechas):
+    """La fecha más reciente de las dadas, ignorando los None."""
+    return max(f for f in fechas if f is not None)
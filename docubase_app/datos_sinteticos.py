@@ -0,0 +1,333 @@
+"""
+Datos sintéticos para medir DocuBase a escala (comando `seed_bench`).
+
+`sembrar()` crea usuarios, etiquetas, proyectos, páginas con HTML parecido
+al que produce CKEditor, comentarios en hilos, adjuntos y algunas
+revisiones. Todo se escribe por lotes con `bulk_create`; las páginas pasan
+por `importacion.guardar_lote`, igual que una importación real. Como
+`bulk_create` no emite señales, aquí se hace lo que harían ellas: contadores
+de etiquetas, índice de búsqueda, posición de los comentarios en su árbol y
+referencias de los contenidos.
+
+Los textos salen de un `random.Random(semilla)`: con la misma semilla y los
+mismos volúmenes se genera la misma base, así que dos ejecuciones de `bench`
+sobre bases sembradas igual son comparables.
+"""
+import hashlib
+import random
+from collections import Counter
+from dataclasses import dataclass
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from . import busqueda, comentarios, compilacion, etiquetas, importacion, panel, revisiones
+from .models import Archivo, Comentario, Contenido, Proyecto
+from .slugs import asignar_slugs
+from .subidas import nombre_contenido, tipo_guardado
+from .texto import resumir
+
+# Prefijo de los usuarios sintéticos; el primero (`bench_0001`) es staff.
+PREFIJO = 'bench_'
+CONTRASENA = 'bench'
+
+# Contenidos distintos que comparten todos los adjuntos (deduplicados como
+# en las subidas reales).
+NUM_CONTENIDOS = 20
+
+# Nivel máximo de las respuestas generadas.
+PROFUNDIDAD_COMENTARIOS = 4
+
+PALABRAS = (
+    'instalación configuración despliegue servidor cliente base datos consulta índice caché '
+    'plantilla vista modelo migración usuario permiso proyecto página etiqueta búsqueda '
+    'documento versión revisión historial archivo adjunto imagen miniatura subida descarga '
+    'rendimiento latencia memoria proceso tarea cola trabajador señal evento registro '
+    'error excepción prueba integración entorno variable secreto token sesión cookie '
+    'cabecera respuesta petición ruta enlace formulario campo validación filtro orden '
+    'paginación cursor lote importación exportación copia seguridad réplica esquema '
+    'python django sqlite postgresql nginx docker api json markdown html css javascript'
+).split()
+
+LENGUAJES = ('python', 'bash', 'javascript', 'sql', 'json')
+EXTENSIONES = ('.pdf', '.png', '.zip', '.txt', '.csv')
+
+
+@dataclass
+class Volumenes:
+    """Cantidades que genera `sembrar()`. Las de página son medias."""
+    usuarios: int = 20
+    proyectos: int = 10
+    paginas: int = 50  # por proyecto
+    etiquetas: int = 40
+    comentarios: int = 5  # por página
+    adjuntos: int = 1  # por página
+    revisiones: int = 5  # de la primera página de cada proyecto
+    privados: float = 0.1  # fracción de proyectos privados
+
+
+# --- Textos ---
+
+def _frase(rng, minimo=6, maximo=16):
+    palabras = rng.choices(PALABRAS, k=rng.randint(minimo, maximo))
+    return ' '.join(palabras).capitalize()
+
+
+def _titulo(rng):
+    return _frase(rng, 2, 6)
+
+
+def _parrafo(rng):
+    partes = []
+    for _ in range(rng.randint(2, 5)):
+        frase = _frase(rng)
+        eleccion = rng.random()
+        if eleccion < 0.15:
+            frase = f'<strong>{frase}</strong>'
+        elif eleccion < 0.25:
+            frase = f'<em>{frase}</em>'
+        elif eleccion < 0.35:
+            palabra = rng.choice(PALABRAS)
+            frase = f'{frase}, ver <a href="https://docs.example.com/{palabra}">{palabra}</a>'
+        partes.append(frase + '.')
+    return f'<p>{" ".join(partes)}</p>'
+
+
+def _bloque(rng):
+    eleccion = rng.random()
+    if eleccion < 0.45:
+        return _parrafo(rng)
+    if eleccion < 0.6:
+        etiqueta = rng.choice(('ul', 'ol'))
+        items = ''.join(f'<li>{_frase(rng, 3, 8)}</li>' for _ in range(rng.randint(2, 6)))
+        return f'<{etiqueta}>{items}</{etiqueta}>'
+    if eleccion < 0.72:
+        lineas = '\n'.join(
+            f'{rng.choice(PALABRAS)}_{n} = {rng.choice(PALABRAS)!r}' for n in range(rng.randint(2, 10)))
+        return f'<pre><code class="language-{rng.choice(LENGUAJES)}">{lineas}</code></pre>'
+    if eleccion < 0.8:
+        return f'<blockquote><p>{_frase(rng)}.</p></blockquote>'
+    if eleccion < 0.9:
+        columnas = rng.randint(2, 4)
+        cabecera = ''.join(f'<th>{rng.choice(PALABRAS)}</th>' for _ in range(columnas))
+        filas = ''.join(
+            '<tr>' + ''.join(f'<td>{rng.choice(PALABRAS)}</td>' for _ in range(columnas)) + '</tr>'
+            for _ in range(rng.randint(2, 8)))
+        return f'<figure class="table"><table><thead><tr>{cabecera}</tr></thead><tbody>{filas}</tbody></table></figure>'
+    nombre = f'{rng.choice(PALABRAS)}-{rng.randint(1, 999)}.png'
+    return (f'<figure class="image"><img src="/media/uploads/{nombre}" alt="{rng.choice(PALABRAS)}">'
+            f'<figcaption>{_frase(rng, 3, 6)}</figcaption></figure>')
+
+
+def bloques_pagina(rng, minimo=6, maximo=30):
+    """Bloques HTML de una página: secciones con `<h2>`/`<h3>` y contenido variado."""
+    bloques = []
+    for _ in range(rng.randint(minimo, maximo)):
+        if not bloques or rng.random() < 0.15:
+            nivel = rng.choice((2, 2, 3))
+            bloques.append(f'<h{nivel}>{_titulo(rng)}</h{nivel}>')
+        bloques.append(_bloque(rng))
+    return bloques
+
+
+def _nombres_etiquetas(cantidad):
+    nombres = list(PALABRAS[:cantidad])
+    vuelta = 2
+    while len(nombres) < cantidad:
+        nombres.extend(f'{p}-{vuelta}' for p in PALABRAS[:cantidad - len(nombres)])
+        vuelta += 1
+    return nombres
+
+
+# --- Escritura ---
+
+def crear_usuarios(cantidad):
+    """
+    Devuelve `cantidad` usuarios sintéticos, creando los que falten con un
+    solo `bulk_create` (y un solo hash de contraseña, compartido).
+    """
+    nombres = [f'{PREFIJO}{n:04d}' for n in range(1, cantidad + 1)]
+    existentes = {u.username: u for u in User.objects.filter(username__in=nombres)}
+    contrasena = make_password(CONTRASENA)
+    User.objects.bulk_create([
+        User(username=nombre, password=contrasena, email=f'{nombre}@example.com', is_staff=(n == 0))
+        for n, nombre in enumerate(nombres) if nombre not in existentes
+    ])
+    por_nombre = {u.username: u for u in User.objects.filter(username__in=nombres)}
+    return [por_nombre[nombre] for nombre in nombres]
+
+
+def crear_proyectos(rng, volumenes, autores, nombres_etiquetas):
+    """Crea los proyectos con sus etiquetas y los añade al índice de búsqueda."""
+    proyectos, nombres_por_proyecto = [], []
+    for _ in range(volumenes.proyectos):
+        descripcion = ''.join(_parrafo(rng) for _ in range(rng.randint(1, 3)))
+        extracto, num_palabras = resumir(descripcion)
+        descripcion_html, _ = compilacion.compilar(descripcion)
+        proyectos.append(Proyecto(
+            titulo=_titulo(rng), descripcion=descripcion, extracto=extracto, num_palabras=num_palabras,
+            descripcion_html=descripcion_html, version_compilacion=compilacion.VERSION,
+            autor=rng.choice(autores), es_publico=rng.random() >= volumenes.privados,
+        ))
+        nombres_por_proyecto.append(rng.sample(nombres_etiquetas, min(len(nombres_etiquetas), rng.randint(0, 4))))
+
+    with transaction.atomic():
+        asignar_slugs(proyectos, Proyecto.objects.all())
+        proyectos = Proyecto.objects.bulk_create(proyectos)
+        por_nombre = etiquetas.obtener_o_crear(nombres_etiquetas)
+        Intermedia = Proyecto.etiquetas.through
+        filas = Intermedia.objects.bulk_create([
+            Intermedia(proyecto_id=proyecto.pk, etiqueta_id=por_nombre[nombre].pk)
+            for proyecto, nombres in zip(proyectos, nombres_por_proyecto)
+            for nombre in nombres
+        ])
+        etiquetas.ajustar_contadores('num_proyectos', etiquetas.contar_filas(filas))
+        busqueda.indexar(
+            busqueda.documento_proyecto(proyecto)
+            for proyecto in Proyecto.objects.filter(pk__in=[p.pk for p in proyectos])
+            .select_related('autor').prefetch_related('etiquetas')
+        )
+    return proyectos
+
+
+def crear_paginas(rng, proyecto, cantidad, nombres_etiquetas, tamano_lote):
+    """Crea `cantidad` páginas de `proyecto` con `importacion.guardar_lote`."""
+    documentos = (
+        {
+            'ruta': f'{n}.html',
+            'titulo': _titulo(rng),
+            'slug': '',
+            'html': ''.join(bloques_pagina(rng)),
+            'etiquetas': rng.sample(nombres_etiquetas, min(len(nombres_etiquetas), rng.randint(0, 3))),
+        }
+        for n in range(cantidad)
+    )
+    paginas = []
+    for lote in importacion.en_lotes(documentos, tamano_lote):
+        paginas.extend(importacion.guardar_lote(lote, proyecto, proyecto.autor))
+    return paginas
+
+
+def crear_comentarios(rng, paginas, usuarios, media):
+    """
+    Crea hilos de comentarios en `paginas`: un `bulk_create` por nivel del
+    árbol (las respuestas necesitan el id de su padre) y un `bulk_update`
+    con las rutas. Devuelve el número de comentarios.
+    """
+    niveles = [[] for _ in range(PROFUNDIDAD_COMENTARIOS + 1)]
+    for pagina in paginas:
+        creados = []
+        for _ in range(rng.randint(0, 2 * media)):
+            padre = rng.choice(creados) if creados and rng.random() < 0.4 else None
+            nivel = padre._nivel + 1 if padre is not None else 0
+            if nivel > PROFUNDIDAD_COMENTARIOS:
+                padre, nivel = None, 0
+            comentario = Comentario(texto=_frase(rng, 4, 40) + '.', autor=rng.choice(usuarios),
+                                    pagina=pagina, comentario_padre=padre)
+            comentario._nivel = nivel
+            niveles[nivel].append(comentario)
+            creados.append(comentario)
+    with transaction.atomic():
+        for nivel in niveles:
+            Comentario.objects.bulk_create(nivel, batch_size=500)
+        comentarios.colocar_lote([c for nivel in niveles for c in nivel])
+    return sum(len(nivel) for nivel in niveles)
+
+
+def crear_contenidos(rng):
+    """
+    Devuelve `NUM_CONTENIDOS` objetos `Contenido` (los mismos para una
+    semilla dada), escribiendo los ficheros de los que aún no existen.
+    """
+    datos = {}
+    for _ in range(NUM_CONTENIDOS):
+        bloque = rng.randbytes(rng.randint(1, 64) * 1024)
+        datos[hashlib.sha256(bloque).hexdigest()] = bloque
+    existentes = {c.sha256: c for c in Contenido.objects.filter(sha256__in=datos)}
+    nuevos = []
+    for digest, bloque in datos.items():
+        if digest not in existentes:
+            nombre = nombre_contenido(digest)
+            default_storage.delete(nombre)
+            nombre = default_storage.save(nombre, ContentFile(bloque))
+            nuevos.append(Contenido(sha256=digest, archivo=nombre, tamano=len(bloque)))
+    Contenido.objects.bulk_create(nuevos)
+    return list(Contenido.objects.filter(sha256__in=datos))
+
+
+def crear_adjuntos(rng, paginas, contenidos, media):
+    """Crea adjuntos de `paginas` repartidos entre `contenidos`. Devuelve cuántos."""
+    archivos = []
+    for pagina in paginas:
+        for _ in range(rng.randint(0, 2 * media)):
+            contenido = rng.choice(contenidos)
+            nombre = f'{rng.choice(PALABRAS)}-{rng.randint(1, 99)}{rng.choice(EXTENSIONES)}'
+            archivos.append(Archivo(
+                nombre=nombre, archivo=contenido.archivo.name, contenido=contenido,
+                tamano=contenido.tamano, tipo_mime=tipo_guardado(nombre),
+                subido_por_id=pagina.autor_id, pagina=pagina,
+            ))
+    with transaction.atomic():
+        Archivo.objects.bulk_create(archivos, batch_size=500)
+        # Un UPDATE por número de referencias distinto, como los contadores de etiquetas.
+        por_cantidad = {}
+        for contenido_id, cantidad in Counter(a.contenido_id for a in archivos).items():
+            por_cantidad.setdefault(cantidad, []).append(contenido_id)
+        for cantidad, ids in por_cantidad.items():
+            Contenido.objects.filter(pk__in=ids).update(referencias=F('referencias') + cantidad)
+    return len(archivos)
+
+
+def crear_revisiones(rng, pagina, cantidad):
+    """
+    Registra `cantidad` revisiones de `pagina` que van construyendo su
+    contenido actual: cada una añade unos bloques al final y la última
+    coincide con la página.
+    """
+    titulo, contenido = pagina.titulo, pagina.contenido
+    bloques = contenido.split('</p>')
+    cortes = sorted(rng.sample(range(1, len(bloques)), min(cantidad - 1, len(bloques) - 1))) if cantidad > 1 else []
+    creadas = 0
+    for corte in cortes:
+        pagina.contenido = '</p>'.join(bloques[:corte]) + '</p>'
+        creadas += revisiones.registrar(pagina, pagina.autor) is not None
+    pagina.titulo, pagina.contenido = titulo, contenido
+    creadas += revisiones.registrar(pagina, pagina.autor) is not None
+    return creadas
+
+
+def sembrar(volumenes, semilla=0, tamano_lote=500, progreso=None):
+    """
+    Genera los datos de `volumenes` y devuelve un Counter con lo creado por
+    tipo. `progreso`, si se indica, se llama con un texto tras cada paso.
+    """
+    rng = random.Random(semilla)
+    aviso = progreso or (lambda texto: None)
+    totales = Counter()
+
+    usuarios = crear_usuarios(volumenes.usuarios)
+    totales['usuarios'] = len(usuarios)
+    nombres_etiquetas = _nombres_etiquetas(volumenes.etiquetas)
+    proyectos = crear_proyectos(rng, volumenes, usuarios, nombres_etiquetas)
+    totales['proyectos'] = len(proyectos)
+    contenidos = crear_contenidos(rng) if volumenes.adjuntos else []
+    aviso(f'{len(usuarios)} usuarios y {len(proyectos)} proyectos.')
+
+    for proyecto in proyectos:
+        cantidad = rng.randint(volumenes.paginas // 2, volumenes.paginas * 3 // 2) if volumenes.paginas else 0
+        paginas = crear_paginas(rng, proyecto, cantidad, nombres_etiquetas, tamano_lote)
+        totales['paginas'] += len(paginas)
+        totales['comentarios'] += crear_comentarios(rng, paginas, usuarios, volumenes.comentarios)
+        totales['adjuntos'] += crear_adjuntos(rng, paginas, contenidos, volumenes.adjuntos)
+        if paginas and volumenes.revisiones:
+            totales['revisiones'] += crear_revisiones(rng, paginas[0], volumenes.revisiones)
+        aviso(f'  "{proyecto.titulo}": {len(paginas)} páginas.')
+
+    # Los resúmenes del panel de usuarios ya existentes pueden estar en caché.
+    panel.invalidar_resumen(*(u.pk for u in usuarios))
+    totales['etiquetas'] = len(nombres_etiquetas)
+    return totales
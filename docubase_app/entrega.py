@@ -0,0 +1,301 @@
+"""
+Entrega de archivos de media: imágenes de proyecto y sus miniaturas, adjuntos
+(`Archivo`) y subidas de CKEditor.
+
+- Visibilidad: cada ruta de media se resuelve al objeto al que pertenece y se
+  comprueba `es_publico`/`es_publica` (o que el usuario sea el dueño) antes
+  de servir nada. Lo que no pertenece a ningún objeto visible da 404.
+- Tipos: la media se sirve desde el origen de la aplicación y su nombre lo
+  elige quien la sube, así que un .html o un .svg con `<script>` sería XSS
+  almacenado. Solo se muestran en el navegador los tipos de `TIPOS_EN_LINEA`
+  (imágenes rasterizadas, PDF, audio y vídeo); el resto se descarga como
+  `application/octet-stream`. Todas las respuestas llevan además
+  `Content-Security-Policy: sandbox`.
+- Peticiones condicionales: ETag fuerte a partir del hash del contenido
+  cuando existe (contenidos y miniaturas, cuyo nombre ya es el hash) o de
+  nombre, tamaño y fecha; If-None-Match/If-Modified-Since responden 304.
+- Rangos: `Range: bytes=...` con un solo rango responde 206 con el trozo
+  pedido (vídeos, PDF grandes, descargas reanudadas); If-Range se respeta.
+- Descarga delegada: con `MEDIA_DESCARGA_DELEGADA = 'x-accel'` (nginx) o
+  `'x-sendfile'` (Apache, lighttpd) Django solo comprueba permisos y
+  devuelve una cabecera; el servidor web envía los bytes y resuelve los
+  rangos, así que el worker de gunicorn queda libre al instante. Sin
+  delegación, las respuestas completas usan `FileResponse` (el servidor WSGI
+  puede usar sendfile) y las parciales se envían por bloques.
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date
+
+from .models import Archivo, Proyecto
+
+# Bytes que se leen de cada vez al enviar un rango.
+TAMANO_BLOQUE = 64 * 1024
+# Segundos de caché para archivos públicos cuyo nombre no cambia con el contenido.
+MAX_AGE_PUBLICO = 60 * 60
+# Los archivos con el hash en el nombre no cambian nunca.
+MAX_AGE_INMUTABLE = 60 * 60 * 24 * 365
+
+# Tipos que el navegador puede mostrar sin ejecutar nada. SVG no está: puede
+# llevar scripts. Cualquier otro se sirve como descarga.
+TIPOS_EN_LINEA = frozenset({
+    'image/avif', 'image/bmp', 'image/gif', 'image/jpeg', 'image/png', 'image/webp',
+    'application/pdf',
+    'audio/aac', 'audio/flac', 'audio/mp4', 'audio/mpeg', 'audio/ogg', 'audio/wav', 'audio/webm', 'audio/x-wav',
+    'video/mp4', 'video/ogg', 'video/quicktime', 'video/webm',
+})
+TIPO_DESCARGA = 'application/octet-stream'
+
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+_HASH = re.compile(r'^([0-9a-f]{64})')
+
+
+class RangoNoSatisfacible(Exception):
+    pass
+
+
+@dataclass
+class Entrega:
+    """Lo que hace falta para servir un archivo ya autorizado."""
+    nombre: str                   # Nombre en el almacenamiento de media.
+    tipo: str = ''                # Content-Type; si falta, se deduce del nombre.
+    nombre_descarga: str = ''     # Nombre para Content-Disposition.
+    digest: str = ''              # SHA-256 del contenido, si se conoce.
+    publico: bool = False         # Visible para anónimos (cacheable en proxies).
+    inmutable: bool = False       # El nombre cambia si cambia el contenido.
+    tipo_confiable: bool = False  # El tipo lo fija el servidor: se sirve tal cual, en línea.
+
+
+# --- Resolución y visibilidad ---
+
+def _proyectos_visibles(usuario):
+    if usuario.is_authenticated:
+        return Q(es_publico=True) | Q(autor=usuario)
+    return Q(es_publico=True)
+
+
+def _archivos_visibles(usuario):
+    visibles = Q(pagina__es_publica=True, pagina__proyecto__es_publico=True)
+    if usuario.is_authenticated:
+        visibles |= (Q(subido_por=usuario) | Q(pagina__autor=usuario)
+                     | Q(pagina__proyecto__autor=usuario))
+    return visibles
+
+
+def _es_publico_archivo(archivo):
+    return bool(archivo.pagina_id and archivo.pagina.es_publica and archivo.pagina.proyecto.es_publico)
+
+
+def resolver(ruta, usuario):
+    """
+    Devuelve la `Entrega` de la ruta de media `ruta` si `usuario` puede verla,
+    o None. Cada caso hace como mucho una consulta.
+    """
+    ruta = posixpath.normpath(ruta)
+    if ruta.startswith(('..', '/')):
+        return None
+    carpeta, _, resto = ruta.partition('/')
+
+    if carpeta == 'proyectos_imagenes':
+        proyecto = (Proyecto.objects.filter(_proyectos_visibles(usuario), imagen=ruta)
+                    .only('es_publico', 'imagen_hash').first())
+        if proyecto is None:
+            return None
+        return Entrega(ruta, publico=proyecto.es_publico)
+
+    if carpeta == 'miniaturas':
+        coincidencia = _HASH.match(posixpath.basename(ruta))
+        if not coincidencia:
+            return None
+        proyecto = (Proyecto.objects.filter(_proyectos_visibles(usuario), imagen_hash=coincidencia.group(1))
+                    .order_by('-es_publico').only('es_publico').first())
+        if proyecto is None:
+            return None
+        return Entrega(ruta, publico=proyecto.es_publico, inmutable=True)
+
+    if carpeta in ('contenidos', 'archivos'):
+        filtro = {'contenido__archivo': ruta} if carpeta == 'contenidos' else {'archivo': ruta}
+        archivo = (Archivo.objects.filter(_archivos_visibles(usuario), **filtro)
+                   .select_related('contenido', 'pagina__proyecto')
+                   .order_by('-pagina__es_publica').first())
+        if archivo is None:
+            return None
+        return Entrega(
+            ruta, tipo=archivo.tipo_mime, nombre_descarga=archivo.nombre,
+            digest=archivo.contenido.sha256 if archivo.contenido_id else '',
+            publico=_es_publico_archivo(archivo), inmutable=carpeta == 'contenidos')
+
+    if carpeta == settings.CKEDITOR_UPLOAD_PATH.strip('/'):
+        # Las subidas de CKEditor están incrustadas en el contenido de las
+        # páginas y no se asocian a ningún objeto: son públicas.
+        coincidencia = _HASH.match(posixpath.basename(ruta))
+        return Entrega(ruta, digest=coincidencia.group(1) if coincidencia else '',
+                       publico=True, inmutable=bool(coincidencia))
+
+    return None
+
+
+# --- Rangos ---
+
+def parsear_rango(cabecera, tamano):
+    """
+    Devuelve `(inicio, fin)` (fin exclusivo) para una cabecera Range con un
+    solo rango de bytes, o None si hay que enviar el archivo entero (no hay
+    cabecera, tiene varios rangos o no se entiende). Lanza
+    `RangoNoSatisfacible` si el rango cae fuera del archivo.
+    """
+    coincidencia = _RANGO.match((cabecera or '').strip())
+    if not coincidencia or coincidencia.groups() == ('', ''):
+        return None
+    inicio, fin = coincidencia.groups()
+    if inicio == '':
+        # Sufijo: los últimos N bytes.
+        longitud = int(fin)
+        if longitud == 0:
+            raise RangoNoSatisfacible()
+        return max(0, tamano - longitud), tamano
+    inicio = int(inicio)
+    fin = min(int(fin) + 1, tamano) if fin else tamano
+    if inicio >= tamano or fin <= inicio:
+        raise RangoNoSatisfacible()
+    return inicio, fin
+
+
+def _leer_rango(archivo, inicio, fin):
+    try:
+        archivo.seek(inicio)
+        pendiente = fin - inicio
+        while pendiente:
+            bloque = archivo.read(min(TAMANO_BLOQUE, pendiente))
+            if not bloque:
+                break
+            pendiente -= len(bloque)
+            yield bloque
+    finally:
+        archivo.close()
+
+
+# --- Respuestas ---
+
+def _etag(entrega, tamano, modificado):
+    if entrega.digest:
+        return f'"{entrega.digest}"'
+    crudo = f'{entrega.nombre}|{tamano}|{modificado.timestamp() if modificado else ""}'
+    return '"%s"' % hashlib.sha256(crudo.encode()).hexdigest()[:32]
+
+
+def _ruta_local(nombre):
+    try:
+        return default_storage.path(nombre)
+    except NotImplementedError:
+        return None
+
+
+def tipo_de_entrega(entrega, ruta_local):
+    """
+    Devuelve `(content_type, en_linea)`. Un tipo fuera de `TIPOS_EN_LINEA`
+    (el guardado en `Archivo.tipo_mime` o el deducido del nombre) se cambia
+    por `TIPO_DESCARGA` y se sirve como adjunto.
+    """
+    tipo = entrega.tipo or mimetypes.guess_type(entrega.nombre_descarga or ruta_local)[0] or TIPO_DESCARGA
+    if entrega.tipo_confiable or tipo in TIPOS_EN_LINEA:
+        return tipo, True
+    return TIPO_DESCARGA, False
+
+
+def _cabeceras(response, entrega, etag, modificado, en_linea):
+    response['ETag'] = etag
+    if modificado:
+        response['Last-Modified'] = http_date(modificado.timestamp())
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Content-Type-Options'] = 'nosniff'
+    # Aunque el navegador llegue a interpretar el archivo, no ejecuta scripts
+    # ni comparte el origen de la aplicación (cookies, almacenamiento).
+    response['Content-Security-Policy'] = 'sandbox'
+    if not en_linea:
+        nombre = entrega.nombre_descarga or posixpath.basename(entrega.nombre)
+        response['Content-Disposition'] = content_disposition_header(True, nombre)
+    elif entrega.nombre_descarga:
+        response['Content-Disposition'] = content_disposition_header(False, entrega.nombre_descarga)
+    if entrega.publico and entrega.inmutable:
+        patch_cache_control(response, public=True, max_age=MAX_AGE_INMUTABLE, immutable=True)
+    elif entrega.publico:
+        patch_cache_control(response, public=True, max_age=MAX_AGE_PUBLICO)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def servir_ruta(request, ruta_local, entrega):
+    """
+    Sirve el archivo en disco `ruta_local` con ETag, Last-Modified, rangos y
+    descarga delegada según `MEDIA_DESCARGA_DELEGADA`.
+    """
+    estado = os.stat(ruta_local)
+    tamano = estado.st_size
+    modificado = datetime.fromtimestamp(int(estado.st_mtime), tz=dt_timezone.utc)
+    etag = _etag(entrega, tamano, modificado)
+    tipo, en_linea = tipo_de_entrega(entrega, ruta_local)
+
+    no_modificado = get_conditional_response(
+        request, etag=etag, last_modified=int(modificado.timestamp()))
+    if no_modificado is not None:
+        return _cabeceras(no_modificado, entrega, etag, modificado, en_linea)
+
+    # En la descarga delegada el servidor web envía los bytes, pero conserva
+    # las cabeceras de esta respuesta (tipo, Content-Disposition, CSP).
+    delegada = getattr(settings, 'MEDIA_DESCARGA_DELEGADA', '')
+    if delegada == 'x-accel':
+        # nginx: `location <prefijo> { internal; alias <MEDIA_ROOT>/; }`.
+        response = HttpResponse(content_type=tipo)
+        response['X-Accel-Redirect'] = settings.MEDIA_PREFIJO_INTERNO + quote(entrega.nombre)
+        return _cabeceras(response, entrega, etag, modificado, en_linea)
+    if delegada == 'x-sendfile':
+        response = HttpResponse(content_type=tipo)
+        response['X-Sendfile'] = ruta_local
+        return _cabeceras(response, entrega, etag, modificado, en_linea)
+
+    rango = None
+    if request.method == 'GET':
+        # If-Range: el rango solo vale si el archivo sigue siendo el mismo.
+        si_rango = request.headers.get('If-Range')
+        if not si_rango or si_rango == etag:
+            try:
+                rango = parsear_rango(request.headers.get('Range'), tamano)
+            except RangoNoSatisfacible:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{tamano}'
+                return _cabeceras(response, entrega, etag, modificado, en_linea)
+
+    if rango is None:
+        response = FileResponse(open(ruta_local, 'rb'), content_type=tipo)
+    else:
+        inicio, fin = rango
+        response = StreamingHttpResponse(
+            _leer_rango(open(ruta_local, 'rb'), inicio, fin), status=206, content_type=tipo)
+        response['Content-Length'] = str(fin - inicio)
+        response['Content-Range'] = f'bytes {inicio}-{fin - 1}/{tamano}'
+    return _cabeceras(response, entrega, etag, modificado, en_linea)
+
+
+def servir(request, entrega):
+    """Sirve una `Entrega` desde el almacenamiento de media."""
+    ruta_local = _ruta_local(entrega.nombre)
+    if ruta_local is None:
+        # Almacenamiento remoto (S3...): que el cliente descargue de allí.
+        return HttpResponseRedirect(default_storage.url(entrega.nombre))
+    if not os.path.isfile(ruta_local):
+        return None
+    return servir_ruta(request, ruta_local, entrega)
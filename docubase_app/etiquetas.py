@@ -0,0 +1,92 @@
+"""
+Operaciones por lotes sobre etiquetas.
+
+Las escrituras de etiquetas de un proyecto o una página se hacen con un
+número fijo de consultas, sin importar cuántas etiquetas tenga: una lectura
+de las existentes, un INSERT de las que faltan y una actualización por
+diferencias de la tabla intermedia.
+
+Cada etiqueta guarda cuántos proyectos y páginas la usan (`num_proyectos`,
+`num_paginas`). Los contadores se mantienen de forma incremental desde
+`signals.py`, así que las facetas no necesitan un GROUP BY por petición.
+"""
+from collections import Counter
+
+from django.db.models import F
+
+from .models import Etiqueta
+
+# Número de etiquetas que se muestran como facetas en el listado de proyectos.
+NUM_FACETAS = 15
+
+# Páginas recientes que se muestran en la vista de una etiqueta.
+NUM_PAGINAS_ETIQUETA = 10
+
+
+def normalizar(nombres):
+    """Limpia espacios, descarta vacíos y quita duplicados conservando el orden."""
+    vistos = {}
+    for nombre in nombres:
+        nombre = nombre.strip()[:Etiqueta._meta.get_field('nombre').max_length]
+        if nombre:
+            vistos.setdefault(nombre, None)
+    return list(vistos)
+
+
+def obtener_o_crear(nombres):
+    """
+    Devuelve un diccionario {nombre: Etiqueta} para todos los `nombres`.
+    Usa una consulta para las existentes, un único INSERT para las que faltan
+    y otra consulta para leer las recién creadas, en lugar de un
+    `get_or_create` por etiqueta.
+    """
+    nombres = normalizar(nombres)
+    if not nombres:
+        return {}
+    existentes = {e.nombre: e for e in Etiqueta.objects.filter(nombre__in=nombres)}
+    faltan = [n for n in nombres if n not in existentes]
+    if faltan:
+        # ignore_conflicts cubre el caso de que otra petición cree la misma
+        # etiqueta a la vez; por eso se vuelven a leer en lugar de usar los
+        # objetos devueltos por bulk_create (que no traen pk en todos los motores).
+        Etiqueta.objects.bulk_create([Etiqueta(nombre=n) for n in faltan], ignore_conflicts=True)
+        existentes.update({e.nombre: e for e in Etiqueta.objects.filter(nombre__in=faltan)})
+    return existentes
+
+
+def parsear(texto):
+    """Convierte 'python, django , api' en ['python', 'django', 'api']."""
+    return normalizar((texto or '').split(','))
+
+
+def asignar(instancia, nombres):
+    """
+    Deja en `instancia` (un Proyecto o una Página ya guardados) exactamente
+    las etiquetas `nombres`. `set()` compara con las actuales y solo borra e
+    inserta las filas de la tabla intermedia que cambian.
+    """
+    por_nombre = obtener_o_crear(nombres)
+    instancia.etiquetas.set(list(por_nombre.values()))
+
+
+def ajustar_contadores(campo, incrementos):
+    """
+    Suma a `campo` ('num_proyectos' o 'num_paginas') los incrementos dados
+    como {etiqueta_id: delta}, con un UPDATE por cada delta distinto.
+    """
+    por_delta = {}
+    for etiqueta_id, delta in incrementos.items():
+        if delta:
+            por_delta.setdefault(delta, []).append(etiqueta_id)
+    for delta, ids in por_delta.items():
+        Etiqueta.objects.filter(pk__in=ids).update(**{campo: F(campo) + delta})
+
+
+def contar_filas(filas):
+    """{etiqueta_id: número de filas} de una lista de filas de la tabla intermedia."""
+    return Counter(fila.etiqueta_id for fila in filas)
+
+
+def facetas():
+    """Etiquetas más usadas en proyectos, leídas de los contadores guardados."""
+    return Etiqueta.objects.filter(num_proyectos__gt=0).order_by('-num_proyectos', 'nombre')[:NUM_FACETAS]
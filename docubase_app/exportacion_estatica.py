@@ -0,0 +1,268 @@
+"""
+Exportación de los proyectos públicos a un sitio HTML estático.
+
+Cada proyecto público se renderiza con `project_detail.html` en
+`<destino>/proyectos/<proyecto>/index.html` y cada página pública con
+`page_detail.html` en `<destino>/proyectos/<proyecto>/<pagina>/index.html`,
+con todos sus comentarios (en un sitio estático no hay `?hilos=` que pida
+más), la misma estructura que las URLs de la aplicación, de modo que cualquier
+servidor de archivos o CDN puede servirlas. Los archivos de media que usan
+(imagen del proyecto y subidas de CKEditor) se copian a `<destino>/media/`.
+
+La exportación es incremental: `manifest.json` guarda, por objeto, una versión
+derivada de las fechas de actualización y el hash SHA-256 del HTML generado.
+En cada ejecución solo se renderiza lo que cambió, solo se reescriben los
+archivos cuyo contenido cambió y se borran los que ya no son públicos.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Count, Max, Q
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+
+from . import comentarios, fragmentos
+from .models import Pagina, Proyecto
+
+NOMBRE_MANIFIESTO = 'manifest.json'
+
+# Objetos que procesa cada tarea enviada al pool.
+OBJETOS_POR_TAREA = 50
+
+# Referencias a media en atributos, url(...) y listas `srcset` ("a.webp 320w, b.webp 640w").
+_REFERENCIA_MEDIA = re.compile(r'''(?:["'(]|,\s)%s([^"')\s?#,]+)''' % re.escape(settings.MEDIA_URL))
+
+
+# --- Manifiesto ---
+
+def leer_manifiesto(destino):
+    ruta = os.path.join(destino, NOMBRE_MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def escribir_atomico(ruta, datos):
+    """Escribe `datos` (bytes) en `ruta` mediante un temporal y un rename."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix='.tmp-')
+    with os.fdopen(descriptor, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+def escribir_manifiesto(destino, manifiesto):
+    datos = json.dumps(manifiesto, indent=1, sort_keys=True).encode('utf-8')
+    escribir_atomico(os.path.join(destino, NOMBRE_MANIFIESTO), datos)
+
+
+# --- Versiones (qué hay que volver a renderizar) ---
+
+def versiones_actuales():
+    """
+    Devuelve {clave: (version, url)} para todos los objetos públicos, sin
+    cargar el contenido. La versión de un proyecto incluye la última edición
+    y el número de sus páginas públicas, porque el proyecto las lista; la de
+    una página incluye la fecha del proyecto, cuyo título y slug muestra, y
+    el número y la fecha del último de sus comentarios y de sus adjuntos (la
+    generación de la caché no sirve aquí: en el proceso del comando empieza
+    de cero).
+    """
+    versiones = {}
+    proyectos = (
+        Proyecto.objects.filter(es_publico=True)
+        .annotate(
+            ultima_pagina=Max('paginas__fecha_actualizacion', filter=Q(paginas__es_publica=True)),
+            num_paginas=Count('paginas', filter=Q(paginas__es_publica=True)),
+        )
+        .values_list('pk', 'slug', 'fecha_actualizacion', 'ultima_pagina', 'num_paginas')
+    )
+    for pk, slug, fecha, ultima, num in proyectos.iterator():
+        url = reverse('proyecto_detalle', kwargs={'proyecto_slug': slug})
+        versiones[f'proyecto:{pk}'] = (f'{fecha.isoformat()}|{ultima and ultima.isoformat()}|{num}', url)
+
+    paginas = (
+        Pagina.objects.filter(es_publica=True, proyecto__es_publico=True)
+        # Dos JOIN en la misma consulta: los Count necesitan distinct.
+        .annotate(
+            num_comentarios=Count('comentarios', distinct=True),
+            ultimo_comentario=Max('comentarios__fecha_creacion'),
+            num_archivos=Count('archivos', distinct=True),
+            ultimo_archivo=Max('archivos__subido_en'),
+        )
+        .values_list('pk', 'slug', 'fecha_actualizacion', 'proyecto__slug', 'proyecto__fecha_actualizacion',
+                     'num_comentarios', 'ultimo_comentario', 'num_archivos', 'ultimo_archivo')
+    )
+    for pk, slug, fecha, proyecto_slug, fecha_proyecto, num, ultimo, num_archivos, ultimo_archivo in paginas.iterator():
+        url = reverse('pagina_detalle', kwargs={'proyecto_slug': proyecto_slug, 'pagina_slug': slug})
+        versiones[f'pagina:{pk}'] = (
+            f'{fecha.isoformat()}|{fecha_proyecto.isoformat()}|{num}|{ultimo and ultimo.isoformat()}'
+            f'|{num_archivos}|{ultimo_archivo and ultimo_archivo.isoformat()}', url)
+    return versiones
+
+
+def ruta_de_url(destino, url):
+    """Archivo donde se guarda la URL: /proyectos/a/ -> <destino>/proyectos/a/index.html"""
+    return os.path.join(destino, *url.strip('/').split('/'), 'index.html')
+
+
+# --- Renderizado (se ejecuta en los procesos del pool) ---
+
+def _inicializar_proceso():
+    # Con el método 'spawn' el proceso hijo no hereda Django configurado.
+    if not apps.ready:
+        django.setup()
+
+
+def _peticion(url):
+    """Petición anónima de mentira para las plantillas (request.path, user...)."""
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    return request
+
+
+def renderizar(clave, url):
+    """Renderiza el objeto `clave` ('proyecto:<pk>' o 'pagina:<pk>') y devuelve su HTML."""
+    tipo, pk = clave.split(':')
+    if tipo == 'proyecto':
+        proyecto = Proyecto.objects.select_related('autor').get(pk=pk)
+        paginas = proyecto.paginas.filter(es_publica=True).only('titulo', 'slug', 'fecha_actualizacion', 'proyecto')
+        plantilla = 'docubase_app/project_detail.html'
+        context = {'proyecto': proyecto, 'fragmentos': fragmentos.renderizar_proyecto(proyecto, paginas)}
+    else:
+        pagina = Pagina.objects.select_related('autor', 'proyecto').get(pk=pk)
+        plantilla = 'docubase_app/page_detail.html'
+        context = {'pagina': pagina, 'fragmento': fragmentos.renderizar_pagina(pagina),
+                   'hilos': _todos_los_hilos(pagina)}
+    return render_to_string(plantilla, context, request=_peticion(url))
+
+
+def _todos_los_hilos(pagina):
+    todos, siguiente = comentarios.hilos(pagina)
+    while siguiente is not None:
+        mas, siguiente = comentarios.hilos(pagina, desde=siguiente)
+        todos += mas
+    return todos
+
+
+def copiar_media(destino, nombre):
+    """Copia un archivo del almacenamiento de media si falta o cambió de tamaño."""
+    if not default_storage.exists(nombre):
+        return
+    ruta = os.path.join(destino, 'media', *nombre.split('/'))
+    if os.path.exists(ruta) and os.path.getsize(ruta) == default_storage.size(nombre):
+        return
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix='.tmp-')
+    with os.fdopen(descriptor, 'wb') as salida, default_storage.open(nombre, 'rb') as entrada:
+        shutil.copyfileobj(entrada, salida)
+    os.replace(temporal, ruta)
+
+
+def procesar_tarea(destino, trabajos, hashes_previos):
+    """
+    Renderiza una lista de `(clave, version, url)`, escribe los archivos cuyo
+    HTML cambió y copia la media que referencian. Devuelve las entradas del
+    manifiesto y cuántos archivos se escribieron.
+    """
+    entradas = {}
+    escritos = 0
+    for clave, version, url in trabajos:
+        html = renderizar(clave, url)
+        datos = html.encode('utf-8')
+        digest = hashlib.sha256(datos).hexdigest()
+        ruta = ruta_de_url(destino, url)
+        if digest != hashes_previos.get(clave) or not os.path.exists(ruta):
+            escribir_atomico(ruta, datos)
+            escritos += 1
+        for nombre in set(_REFERENCIA_MEDIA.findall(html)):
+            copiar_media(destino, nombre)
+        entradas[clave] = {'version': version, 'url': url, 'hash': digest}
+    return entradas, escritos
+
+
+def _procesar_tarea_en_pool(destino, trabajos, hashes_previos):
+    try:
+        return procesar_tarea(destino, trabajos, hashes_previos)
+    finally:
+        # Cierra la conexión del proceso hijo para no dejarla abierta en el pool.
+        connections.close_all()
+
+
+# --- Orquestación ---
+
+def exportar(destino, procesos=0, forzar=False, progreso=None):
+    """
+    Exporta el sitio estático a `destino`. Con `procesos` > 0 el renderizado
+    se reparte en un pool de procesos. `forzar` ignora el manifiesto.
+    Devuelve un diccionario con los contadores de la ejecución.
+    """
+    anterior = leer_manifiesto(destino)
+    actuales = versiones_actuales()
+
+    pendientes = [
+        (clave, version, url) for clave, (version, url) in actuales.items()
+        if forzar
+        or anterior.get(clave, {}).get('version') != version
+        or anterior[clave]['url'] != url
+        or not os.path.exists(ruta_de_url(destino, url))
+    ]
+    hashes_previos = {} if forzar else {
+        clave: entrada['hash'] for clave, entrada in anterior.items()
+        if clave in actuales and entrada['url'] == actuales[clave][1]
+    }
+    tareas = [pendientes[i:i + OBJETOS_POR_TAREA] for i in range(0, len(pendientes), OBJETOS_POR_TAREA)]
+
+    manifiesto = {clave: e for clave, e in anterior.items() if clave in actuales}
+    escritos = 0
+    if procesos > 0 and len(tareas) > 1:
+        # Las conexiones abiertas no deben compartirse con los procesos hijos.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso) as pool:
+            futuros = [pool.submit(_procesar_tarea_en_pool, destino, tarea, hashes_previos) for tarea in tareas]
+            for futuro in futuros:
+                entradas, n = futuro.result()
+                manifiesto.update(entradas)
+                escritos += n
+                if progreso:
+                    progreso(len(manifiesto), len(actuales))
+    else:
+        for tarea in tareas:
+            entradas, n = procesar_tarea(destino, tarea, hashes_previos)
+            manifiesto.update(entradas)
+            escritos += n
+            if progreso:
+                progreso(len(manifiesto), len(actuales))
+
+    # Borra las URLs que ya no son de ningún objeto público: lo que dejó de ser
+    # público o cambió de URL. Una URL que ahora es de otro objeto (una página
+    # nueva con el slug de una borrada) se conserva: su archivo ya es el nuevo.
+    borrados = 0
+    urls_actuales = {url for _, url in actuales.values()}
+    for entrada in anterior.values():
+        if entrada['url'] not in urls_actuales:
+            ruta = ruta_de_url(destino, entrada['url'])
+            if os.path.exists(ruta):
+                os.remove(ruta)
+                borrados += 1
+
+    escribir_manifiesto(destino, manifiesto)
+    return {
+        'total': len(actuales),
+        'renderizados': len(pendientes),
+        'escritos': escritos,
+        'borrados': borrados,
+    }
@@ -0,0 +1,395 @@
+"""
+Exportación de un proyecto entero a un ZIP, para tener una copia offline.
+
+El ZIP se genera según se envía: `ZipFile` escribe sobre un destino sin
+`seek` (`_Flujo`), así que usa descriptores de datos tras cada entrada y
+el generador entrega los bytes en cuanto se escriben. Las filas se leen con
+`.iterator()` y los archivos se copian del almacenamiento por bloques de
+`TAMANO_BLOQUE`: la memoria no depende del tamaño del proyecto.
+
+Contenido del ZIP:
+
+- `manifest.json`: el proyecto y, por página, su ruta en el ZIP, título,
+  slug, etiquetas, visibilidad y adjuntos. Va el primero.
+- `<slug>.html` o `<slug>.md` por página. En Markdown, con una cabecera
+  (front matter) con título, slug y etiquetas.
+- `media/<ruta>`: la media incrustada en las páginas (subidas de CKEditor,
+  imágenes) que el usuario puede ver. Los enlaces se reescriben a rutas
+  relativas para que funcionen sin conexión.
+- `adjuntos/<slug>/<id>-<nombre>`: los `Archivo` de cada página.
+
+Se reimporta con `import_docs`, que reconoce el manifiesto (ver
+`importacion.leer_manifiesto`): restaura slugs, etiquetas, visibilidad y la
+media que falte. Los adjuntos van en el ZIP como copia, pero no se vuelven a
+crear como `Archivo`.
+"""
+import json
+import mimetypes
+import posixpath
+import re
+import zipfile
+from html import escape
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import api, entrega
+from .models import Archivo
+
+VERSION_FORMATO = 1
+NOMBRE_MANIFIESTO = 'manifest.json'
+FORMATOS = ('html', 'markdown')
+CARPETA_MEDIA = 'media'
+CARPETA_ADJUNTOS = 'adjuntos'
+
+# Bytes que se copian de cada vez del almacenamiento al ZIP.
+TAMANO_BLOQUE = 64 * 1024
+FILAS_POR_LOTE = 500
+
+# Referencias a media en atributos, url(...) y listas `srcset`, como en
+# `exportacion_estatica`, pero con el prefijo para poder reescribirlo.
+_REFERENCIA_MEDIA = re.compile(r'''(["'(]|,\s)%s([^"')\s?#,]+)''' % re.escape(settings.MEDIA_URL))
+
+# Formatos que ya van comprimidos (imágenes, PDF, vídeo...) se guardan sin
+# volver a comprimir: deflate no gana nada y cuesta CPU.
+_TIPOS_COMPRIMIBLES = ('text/', 'application/json', 'application/xml', 'image/svg+xml')
+
+
+class _Flujo:
+    """
+    Destino de `ZipFile` que guarda lo escrito hasta que el generador lo
+    recoge con `vaciar()`. No tiene `tell`/`seek`, de modo que `ZipFile`
+    escribe en modo secuencial.
+    """
+    def __init__(self):
+        self._trozos = []
+
+    def write(self, datos):
+        self._trozos.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+
+def _fecha_zip(fecha):
+    return max(timezone.localtime(fecha).timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+def _info(nombre, fecha, comprimir=True):
+    info = zipfile.ZipInfo(nombre, date_time=_fecha_zip(fecha))
+    info.compress_type = zipfile.ZIP_DEFLATED if comprimir else zipfile.ZIP_STORED
+    return info
+
+
+def _comprimible(nombre, tipo=''):
+    # Los adjuntos de tipo no permitido en línea se guardan como octet-stream.
+    if not tipo or tipo == entrega.TIPO_DESCARGA:
+        tipo = mimetypes.guess_type(nombre)[0] or ''
+    return tipo.startswith(_TIPOS_COMPRIMIBLES)
+
+
+# --- HTML a Markdown ---
+
+# Elementos sin cierre.
+_VACIOS = {'area', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+# Elementos sin equivalente en Markdown: se copian como HTML, que Markdown admite.
+_CRUDOS = {'table', 'figure', 'iframe', 'video', 'audio', 'object', 'details', 'dl', 'u', 'sub', 'sup',
+           'del', 's', 'strike', 'span', 'font', 'mark', 'small', 'big', 'abbr', 'kbd', 'script', 'style'}
+_ESCAPAR_MARKDOWN = re.compile(r'([\\`*_\[\]])')
+_ESPACIOS = re.compile(r'\s+')
+_LINEAS_VACIAS = re.compile(r'\n{3,}')
+
+
+class _Nodo:
+    __slots__ = ('etiqueta', 'atributos', 'hijos', 'crudo')
+
+    def __init__(self, etiqueta, atributos=(), crudo=''):
+        self.etiqueta = etiqueta
+        self.atributos = dict(atributos)
+        self.hijos = []
+        self.crudo = crudo
+
+
+class _Arbol(HTMLParser):
+    """Árbol mínimo del HTML de CKEditor; tolera cierres que faltan o sobran."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.raiz = _Nodo(None)
+        self.pila = [self.raiz]
+
+    def handle_starttag(self, etiqueta, atributos):
+        nodo = _Nodo(etiqueta, atributos, self.get_starttag_text())
+        self.pila[-1].hijos.append(nodo)
+        if etiqueta not in _VACIOS:
+            self.pila.append(nodo)
+
+    def handle_startendtag(self, etiqueta, atributos):
+        self.pila[-1].hijos.append(_Nodo(etiqueta, atributos, self.get_starttag_text()))
+
+    def handle_endtag(self, etiqueta):
+        for i in range(len(self.pila) - 1, 0, -1):
+            if self.pila[i].etiqueta == etiqueta:
+                del self.pila[i:]
+                return
+
+    def handle_data(self, datos):
+        self.pila[-1].hijos.append(datos)
+
+
+def _html(nodo):
+    """Vuelve a escribir un nodo como HTML."""
+    if isinstance(nodo, str):
+        return escape(nodo, quote=False)
+    interior = ''.join(_html(hijo) for hijo in nodo.hijos)
+    if nodo.etiqueta in _VACIOS:
+        return nodo.crudo
+    return f'{nodo.crudo}{interior}</{nodo.etiqueta}>'
+
+
+def _texto(nodo):
+    if isinstance(nodo, str):
+        return nodo
+    return ''.join(_texto(hijo) for hijo in nodo.hijos)
+
+
+def _bloque(texto):
+    return f'\n\n{texto.strip()}\n\n'
+
+
+def _sangrar(texto, primera, resto):
+    lineas = texto.strip().split('\n')
+    return '\n'.join([primera + lineas[0]] + [(resto + l) if l else l for l in lineas[1:]])
+
+
+def _markdown(nodo):
+    if isinstance(nodo, str):
+        return _ESCAPAR_MARKDOWN.sub(r'\\\1', _ESPACIOS.sub(' ', nodo))
+    etiqueta = nodo.etiqueta
+    if etiqueta in _CRUDOS:
+        return _bloque(_html(nodo)) if etiqueta in {'table', 'figure', 'iframe', 'video', 'audio',
+                                                     'object', 'details', 'dl'} else _html(nodo)
+
+    if etiqueta in ('ul', 'ol'):
+        elementos = []
+        for numero, hijo in enumerate((h for h in nodo.hijos if not isinstance(h, str)), start=1):
+            marca = f'{numero}. ' if etiqueta == 'ol' else '- '
+            contenido = _markdown(hijo).strip()
+            # Sin párrafos en el elemento, la lista es compacta (sin <p> al
+            # volver a convertirla): sin líneas en blanco antes de una sublista.
+            if any(not isinstance(h, str) and h.etiqueta in ('p', 'pre', 'blockquote') for h in hijo.hijos):
+                contenido = _LINEAS_VACIAS.sub('\n\n', contenido)
+            else:
+                contenido = re.sub(r'\n{2,}', '\n', contenido)
+            # Python-Markdown pide cuatro espacios para lo que sigue en el elemento.
+            elementos.append(_sangrar(contenido, marca, '    '))
+        return _bloque('\n'.join(elementos))
+
+    interior = ''.join(_markdown(hijo) for hijo in nodo.hijos)
+    if etiqueta is None or etiqueta in ('li', 'body', 'html', 'section', 'article', 'main', 'header', 'footer'):
+        return interior
+    if etiqueta in ('p', 'div'):
+        return _bloque(interior)
+    if len(etiqueta) == 2 and etiqueta[0] == 'h' and etiqueta[1] in '123456':
+        return _bloque('#' * int(etiqueta[1]) + ' ' + _ESPACIOS.sub(' ', interior).strip())
+    if etiqueta == 'blockquote':
+        return _bloque(_sangrar(_LINEAS_VACIAS.sub('\n\n', interior), '> ', '> ').replace('\n\n', '\n>\n'))
+    if etiqueta == 'pre':
+        codigo = _texto(nodo).strip('\n')
+        return _bloque(f'```\n{codigo}\n```')
+    if etiqueta == 'hr':
+        return _bloque('---')
+    if etiqueta == 'br':
+        return '  \n'
+    if etiqueta == 'img':
+        alt = _ESCAPAR_MARKDOWN.sub(r'\\\1', nodo.atributos.get('alt') or '')
+        return f'![{alt}]({nodo.atributos.get("src") or ""})'
+    if not interior.strip():
+        return interior
+    if etiqueta in ('strong', 'b'):
+        return f'**{interior.strip()}**'
+    if etiqueta in ('em', 'i'):
+        return f'*{interior.strip()}*'
+    if etiqueta == 'code':
+        return f'`{_texto(nodo)}`'
+    if etiqueta == 'a' and nodo.atributos.get('href'):
+        return f'[{interior.strip()}]({nodo.atributos["href"]})'
+    return interior
+
+
+def html_a_markdown(html):
+    """
+    Convierte el HTML de CKEditor en Markdown. Lo que Markdown no puede
+    expresar (tablas, subrayado, estilos en línea...) se deja como HTML, así
+    que al importarlo de nuevo con `importacion.markdown_a_html` no se
+    pierde nada.
+    """
+    arbol = _Arbol()
+    arbol.feed(html or '')
+    arbol.close()
+    texto = _markdown(arbol.raiz)
+    lineas = [linea.rstrip() if not linea.endswith('  ') else linea for linea in texto.split('\n')]
+    return _LINEAS_VACIAS.sub('\n\n', '\n'.join(lineas)).strip() + '\n'
+
+
+# --- Documentos ---
+
+def _cabecera(pagina, etiquetas):
+    lineas = [f'titulo: {pagina.titulo}', f'slug: {pagina.slug}']
+    if etiquetas:
+        lineas.append(f'etiquetas: {", ".join(etiquetas)}')
+    return '---\n' + '\n'.join(lineas) + '\n---\n\n'
+
+
+def documento(pagina, contenido, etiquetas, formato):
+    """El archivo de una página, con `contenido` ya reescrito."""
+    if formato == 'markdown':
+        return _cabecera(pagina, etiquetas) + html_a_markdown(contenido)
+    return ('<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="utf-8">\n'
+            f'<title>{escape(pagina.titulo)}</title>\n</head>\n<body>\n{contenido}\n</body>\n</html>\n')
+
+
+def ruta_pagina(pagina, formato):
+    return f'{pagina.slug}.{"md" if formato == "markdown" else "html"}'
+
+
+def ruta_adjunto(pagina, archivo):
+    nombre = get_valid_filename(posixpath.basename(archivo.nombre)) or 'archivo'
+    return f'{CARPETA_ADJUNTOS}/{pagina.slug}/{archivo.pk}-{nombre}'
+
+
+# --- Consultas ---
+
+def paginas_visibles(proyecto, usuario):
+    return api.RECURSOS['paginas'].visibles(usuario).filter(proyecto=proyecto).order_by('pk')
+
+
+def _adjuntos():
+    return Prefetch('archivos', Archivo.objects.select_related('contenido').order_by('pk'))
+
+
+# --- Escritura ---
+
+def _manifiesto(proyecto, usuario, formato):
+    """
+    Genera el JSON del manifiesto por trozos: una página por línea, leídas
+    con `.iterator()`, sin construir la lista entera.
+    """
+    cabecera = json.dumps({
+        'formato': VERSION_FORMATO,
+        'generado': timezone.now(),
+        'contenido': formato,
+        'proyecto': {
+            'id': proyecto.pk,
+            'titulo': proyecto.titulo,
+            'slug': proyecto.slug,
+            'descripcion': proyecto.descripcion or '',
+            'es_publico': proyecto.es_publico,
+            'etiquetas': sorted(e.nombre for e in proyecto.etiquetas.all()),
+            'fecha_actualizacion': proyecto.fecha_actualizacion,
+        },
+    }, cls=DjangoJSONEncoder, ensure_ascii=False)
+    yield cabecera[:-1] + ', "paginas": [\n'
+    paginas = (paginas_visibles(proyecto, usuario)
+               .only('titulo', 'slug', 'es_publica', 'fecha_creacion', 'fecha_actualizacion')
+               .prefetch_related('etiquetas', _adjuntos()))
+    for i, pagina in enumerate(paginas.iterator(chunk_size=FILAS_POR_LOTE)):
+        datos = {
+            'ruta': ruta_pagina(pagina, formato),
+            'id': pagina.pk,
+            'titulo': pagina.titulo,
+            'slug': pagina.slug,
+            'etiquetas': sorted(e.nombre for e in pagina.etiquetas.all()),
+            'es_publica': pagina.es_publica,
+            'fecha_creacion': pagina.fecha_creacion,
+            'fecha_actualizacion': pagina.fecha_actualizacion,
+            'adjuntos': [{
+                'ruta': ruta_adjunto(pagina, archivo),
+                'nombre': archivo.nombre,
+                'tipo_mime': archivo.tipo_mime,
+                'tamano': archivo.tamano,
+                'sha256': archivo.contenido.sha256 if archivo.contenido_id else '',
+            } for archivo in pagina.archivos.all()],
+        }
+        yield (',\n' if i else '') + json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False)
+    yield '\n]}\n'
+
+
+def _copiar(zf, nombre_almacen, nombre_zip, fecha, tipo=''):
+    """Copia un archivo del almacenamiento al ZIP por bloques. Cede tras cada bloque."""
+    info = _info(nombre_zip, fecha, _comprimible(nombre_zip, tipo))
+    # Con el tamaño de antemano, `ZipFile` decide si la entrada necesita ZIP64.
+    info.file_size = default_storage.size(nombre_almacen)
+    with default_storage.open(nombre_almacen, 'rb') as entrada, zf.open(info, 'w') as salida:
+        while bloque := entrada.read(TAMANO_BLOQUE):
+            salida.write(bloque)
+            yield
+
+
+def _escribir(zf, proyecto, usuario, formato):
+    """Escribe las entradas del ZIP. Cede cada vez que hay bytes nuevos que enviar."""
+    with zf.open(_info(NOMBRE_MANIFIESTO, proyecto.fecha_actualizacion), 'w') as salida:
+        for trozo in _manifiesto(proyecto, usuario, formato):
+            salida.write(trozo.encode('utf-8'))
+            yield
+
+    media_escrita = set()
+    paginas = (paginas_visibles(proyecto, usuario)
+               .only('titulo', 'slug', 'contenido', 'fecha_actualizacion')
+               .prefetch_related('etiquetas', _adjuntos()))
+    for pagina in paginas.iterator(chunk_size=FILAS_POR_LOTE):
+        # Media incrustada que el usuario puede ver: se incluye y el enlace
+        # pasa a ser relativo. La que no, conserva la URL absoluta.
+        incluida = {}
+        for nombre in {c.group(2) for c in _REFERENCIA_MEDIA.finditer(pagina.contenido or '')} - media_escrita:
+            permitida = entrega.resolver(nombre, usuario)
+            if permitida and default_storage.exists(nombre):
+                incluida[nombre] = permitida
+        contenido = _REFERENCIA_MEDIA.sub(
+            lambda c: c.group(1) + (f'{CARPETA_MEDIA}/{c.group(2)}'
+                                    if c.group(2) in incluida or c.group(2) in media_escrita
+                                    else settings.MEDIA_URL + c.group(2)),
+            pagina.contenido or '')
+
+        etiquetas = sorted(e.nombre for e in pagina.etiquetas.all())
+        zf.writestr(_info(ruta_pagina(pagina, formato), pagina.fecha_actualizacion),
+                    documento(pagina, contenido, etiquetas, formato))
+        yield
+
+        for nombre, permitida in sorted(incluida.items()):
+            yield from _copiar(zf, nombre, f'{CARPETA_MEDIA}/{nombre}', pagina.fecha_actualizacion, permitida.tipo)
+            media_escrita.add(nombre)
+        for archivo in pagina.archivos.all():
+            if default_storage.exists(archivo.archivo.name):
+                yield from _copiar(zf, archivo.archivo.name, ruta_adjunto(pagina, archivo),
+                                   archivo.subido_en, archivo.tipo_mime)
+
+
+def generar_zip(proyecto, usuario, formato='html'):
+    """
+    Genera los bytes del ZIP de `proyecto` con lo que `usuario` puede ver
+    (ver el docstring del módulo). `formato` es 'html' o 'markdown'.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconocido: {formato}.')
+    flujo = _Flujo()
+    with zipfile.ZipFile(flujo, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for _ in _escribir(zf, proyecto, usuario, formato):
+            if datos := flujo.vaciar():
+                yield datos
+    # Directorio central, escrito al cerrar el ZIP.
+    yield flujo.vaciar()
+
+
+def nombre_zip(proyecto, formato):
+    return f'{proyecto.slug}-{formato}.zip'
@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Proyecto, Pagina, Etiqueta
+from .models import Proyecto, Pagina, Comentario
+from . import etiquetas
 from ckeditor.widgets import CKEditorWidget
 from django.core.exceptions import ValidationError
 
@@ -19,44 +20,62 @@ class CustomUserCreationForm(UserCreationForm):
             field.widget.attrs.update({'class': 'form-control'})
 
 
-class ProyectoForm(forms.ModelForm):
-    descripcion = forms.CharField(
-        widget=CKEditorWidget()
-    )
+class EtiquetasFormMixin(forms.Form):
+    """
+    Añade el campo `tags_texto` a un ModelForm cuyo modelo tiene `etiquetas`.
+
+    Las etiquetas se guardan en `save_m2m()` (o en `save()` con commit=True)
+    con `etiquetas.asignar`: un número fijo de consultas por guardado.
+    """
     tags_texto = forms.CharField(
         label="Etiquetas (separadas por comas)",
         required=False,
         widget=forms.TextInput(attrs={'class': 'form-control'})
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance and self.instance.pk:
+            nombres = self.instance.etiquetas.order_by('nombre').values_list('nombre', flat=True)
+            self.initial['tags_texto'] = ', '.join(nombres)
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        etiquetas.asignar(self.instance, etiquetas.parsear(self.cleaned_data.get('tags_texto')))
+
+
+class ProyectoForm(EtiquetasFormMixin, forms.ModelForm):
+    descripcion = forms.CharField(
+        widget=CKEditorWidget()
+    )
+
     class Meta:
         model = Proyecto
         fields = ['titulo', 'imagen', 'descripcion', 'tags_texto', 'icono', 'es_publico']
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        if self.instance and self.instance.pk:
-            self.initial['tags_texto'] = ', '.join(tag.nombre for tag in self.instance.etiquetas.all())
-
-    def save(self, commit=True):
-        # Llama al save() original, pero sin guardar las relaciones m2m todavía
-        instance = super().save(commit=commit)
-
-        if commit:
-            # Limpiamos las etiquetas existentes
-            instance.etiquetas.clear()
-            # Obtenemos las nuevas etiquetas del campo 'tags_texto'
-            tags_texto = self.cleaned_data.get('tags_texto', '')
-            if tags_texto:
-                tags_list = [tag.strip() for tag in tags_texto.split(',') if tag.strip()]
-                for tag_name in tags_list:
-                    etiqueta, created = Etiqueta.objects.get_or_create(nombre=tag_name)
-                    instance.etiquetas.add(etiqueta)
-
-        return instance
-
-class PaginaForm(forms.ModelForm):
+
+class PaginaForm(EtiquetasFormMixin, forms.ModelForm):
     class Meta:
         model = Pagina
-        fields = ['titulo', 'contenido']
-        widgets = {'titulo': forms.TextInput(attrs={'class': 'form-control'})}
\ No newline at end of file
+        fields = ['titulo', 'contenido', 'tags_texto']
+        widgets = {'titulo': forms.TextInput(attrs={'class': 'form-control'})}
+
+
+class ComentarioForm(forms.ModelForm):
+    """
+    Comentario o respuesta en `pagina`. El padre se valida contra los
+    comentarios de la misma página y se lee con los campos que necesita
+    `comentarios.guardar_en_arbol`, que así no vuelve a consultarlo.
+    """
+    class Meta:
+        model = Comentario
+        fields = ['texto', 'comentario_padre']
+        widgets = {
+            'texto': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+            'comentario_padre': forms.HiddenInput(),
+        }
+
+    def __init__(self, *args, pagina, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['comentario_padre'].queryset = pagina.comentarios.only(
+            'ruta', 'hilo', 'profundidad', 'comentario_padre')
@@ -0,0 +1,192 @@
+"""
+Caché de fragmentos renderizados para `pagina_detalle` y `proyecto_detalle`.
+
+Se cachea la parte de la página que es igual para todos los usuarios (el
+contenido, los datos del autor, la lista de páginas...). Lo que depende del
+usuario, como el botón "Editar", queda fuera y se pinta en cada petición.
+
+La clave de cada fragmento incluye el id del objeto, su `fecha_actualizacion`
+y un número de generación. Las señales (`signals.py`) incrementan la
+generación cuando cambia algo que el fragmento muestra pero que no modifica
+su fecha, como el título del proyecto en una página o el nombre de una
+etiqueta; las entradas antiguas dejan de leerse y caducan solas.
+
+El backend es el alias de caché `FRAGMENTOS_CACHE_ALIAS` de settings. Las
+generaciones solo sirven si todos los procesos ven la misma caché: locmem
+vale en desarrollo, pero en producción hace falta una compartida (Redis,
+Memcached, base de datos...; ver `comprobaciones.py`).
+
+Al renderizar un fragmento que falta, el objeto se lee de la base primaria y
+no de una réplica (ver `replicas.py`): la generación ya es la nueva, y una
+réplica atrasada dejaría guardado el contenido antiguo con la clave nueva.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import compilacion, rendimiento
+from .models import Pagina, Proyecto
+
+# Campos que necesita la parte no cacheada de cada vista. El resto del objeto
+# solo se carga cuando el fragmento no está en caché.
+CAMPOS_PAGINA = ('titulo', 'slug', 'autor', 'fecha_actualizacion', 'proyecto__slug')
+CAMPOS_PROYECTO = ('titulo', 'slug', 'autor', 'fecha_actualizacion', 'imagen_hash')
+
+_contadores = Counter()
+_cerrojo = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'FRAGMENTOS_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'FRAGMENTOS_CACHE_TTL', 60 * 60 * 24)
+
+
+def _contar(evento):
+    with _cerrojo:
+        _contadores[evento] += 1
+    if evento != 'invalidaciones':
+        # 'aciertos' -> 'cache_aciertos' en la medición de la petición.
+        rendimiento.contar(f'cache_{evento}')
+
+
+def estadisticas():
+    """Aciertos, fallos e invalidaciones de este proceso desde que arrancó."""
+    with _cerrojo:
+        aciertos, fallos = _contadores['aciertos'], _contadores['fallos']
+        return {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'invalidaciones': _contadores['invalidaciones'],
+            'tasa_aciertos': aciertos / (aciertos + fallos) if aciertos + fallos else None,
+        }
+
+
+# --- Generaciones ---
+
+def _clave_generacion(tipo, pk):
+    return f'frag:gen:{tipo}:{pk}'
+
+
+def _generaciones(*claves):
+    """
+    Lee varias generaciones con un solo acceso a la caché. Una generación que
+    no existe (o que la caché expulsó) se inicializa con la hora actual en
+    nanosegundos, nunca con 0, para no reutilizar fragmentos antiguos.
+    """
+    cache = _cache()
+    valores = cache.get_many(claves)
+    for clave in claves:
+        if clave not in valores:
+            cache.add(clave, time.time_ns(), None)
+            valores[clave] = cache.get(clave)
+    return [valores[clave] for clave in claves]
+
+
+def generacion(tipo, pk):
+    """Generación actual de un objeto, para incluirla en una versión o ETag."""
+    return _generaciones(_clave_generacion(tipo, pk))[0]
+
+
+def generaciones(*objetos):
+    """Como `generacion()` para varios pares (tipo, pk), con un solo acceso a la caché."""
+    return tuple(_generaciones(*(_clave_generacion(tipo, pk) for tipo, pk in objetos)))
+
+
+def invalidar(tipo, ids):
+    """
+    Incrementa la generación de los objetos dados ('pagina', 'proyecto' o
+    'comentarios', esta última por página; ver `views._precomprobar_pagina`).
+    """
+    cache = _cache()
+    for pk in set(ids):
+        clave = _clave_generacion(tipo, pk)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # No existía: una generación nueva equivale a invalidar.
+            cache.set(clave, time.time_ns(), None)
+        _contar('invalidaciones')
+
+
+# --- Renderizado ---
+
+def _compilar_si_falta(objeto, campo_html, campo_compilado):
+    # Filas guardadas antes de que existiera la compilación y que
+    # `compilar_contenido` aún no ha procesado: se compilan solo para pintarlas.
+    if not objeto.version_compilacion:
+        html, indice = compilacion.compilar(getattr(objeto, campo_html))
+        setattr(objeto, campo_compilado, html)
+        if hasattr(objeto, 'indice'):
+            objeto.indice = indice
+
+
+def renderizar_pagina(pagina):
+    """Renderiza el fragmento de una página sin pasar por la caché."""
+    _compilar_si_falta(pagina, 'contenido', 'contenido_html')
+    return render_to_string('docubase_app/page_detail_fragment.html', {'pagina': pagina})
+
+
+def renderizar_proyecto(proyecto, paginas):
+    """Renderiza los dos fragmentos de un proyecto: detalle y lista de páginas."""
+    _compilar_si_falta(proyecto, 'descripcion', 'descripcion_html')
+    context = {'proyecto': proyecto, 'paginas': paginas}
+    return {
+        'detalle': render_to_string('docubase_app/project_detail_fragment.html', context),
+        'paginas': render_to_string('docubase_app/project_pages_fragment.html', context),
+    }
+
+
+def _obtener(clave, renderizar):
+    cache = _cache()
+    valor = cache.get(clave)
+    if valor is None:
+        _contar('fallos')
+        valor = renderizar()
+        cache.set(clave, valor, _ttl())
+    else:
+        _contar('aciertos')
+    return valor
+
+
+def fragmento_pagina(pagina):
+    """
+    Devuelve el HTML cacheado del cuerpo de `pagina`. Basta con que `pagina`
+    tenga cargados CAMPOS_PAGINA; el contenido completo solo se lee si el
+    fragmento no está en caché.
+    """
+    gen_pagina, gen_proyecto = _generaciones(
+        _clave_generacion('pagina', pagina.pk), _clave_generacion('proyecto', pagina.proyecto_id))
+    clave = f'frag:pagina:{pagina.pk}:{pagina.fecha_actualizacion.timestamp()}:{gen_pagina}:{gen_proyecto}'
+
+    def renderizar():
+        completa = Pagina.objects.using(DEFAULT_DB_ALIAS).select_related('autor', 'proyecto').get(pk=pagina.pk)
+        return renderizar_pagina(completa)
+
+    return mark_safe(_obtener(clave, renderizar))
+
+
+def fragmentos_proyecto(proyecto):
+    """
+    Devuelve un diccionario con los fragmentos `detalle` y `paginas` de
+    `proyecto`, que basta con que tenga cargados CAMPOS_PROYECTO.
+    """
+    gen_proyecto, = _generaciones(_clave_generacion('proyecto', proyecto.pk))
+    # Las miniaturas se registran sin cambiar la fecha: su hash va en la clave.
+    clave = (f'frag:proyecto:{proyecto.pk}:{proyecto.fecha_actualizacion.timestamp()}:'
+             f'{proyecto.imagen_hash}:{gen_proyecto}')
+
+    def renderizar():
+        completo = Proyecto.objects.using(DEFAULT_DB_ALIAS).select_related('autor').get(pk=proyecto.pk)
+        paginas = completo.paginas.only('titulo', 'slug', 'fecha_actualizacion', 'proyecto')
+        return renderizar_proyecto(completo, paginas)
+
+    return {nombre: mark_safe(html) for nombre, html in _obtener(clave, renderizar).items()}
@@ -0,0 +1,338 @@
+"""
+Importación masiva de documentación (Markdown/HTML) a un proyecto.
+
+La importación es una tubería de generadores con memoria acotada:
+
+1. `leer_fuente` recorre un directorio, un .zip o un .tar(.gz) y produce los
+   archivos de uno en uno.
+2. `convertir_documento` separa el front matter, obtiene el título y convierte
+   el Markdown a HTML; se puede repartir en un pool de procesos.
+3. `importar` agrupa los documentos en lotes y escribe cada lote con
+   `bulk_create` (páginas y filas de la tabla intermedia de etiquetas), con los
+   slugs asignados de antemano por `slugs.asignar_slugs`.
+
+Solo hay en memoria un lote de documentos a la vez.
+
+Si la fuente es una exportación de `exportacion_proyecto` (tiene su
+`manifest.json`), solo se importan las páginas del manifiesto, con su slug,
+etiquetas y visibilidad, y la media incrustada (`media/...`) vuelve a
+apuntar a MEDIA_URL; la que falte en el almacenamiento se copia de la fuente.
+"""
+import json
+import os
+import posixpath
+import re
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import busqueda, compilacion, etiquetas
+from .models import Pagina
+from .slugs import asignar_slugs
+from .texto import resumir
+
+EXTENSIONES_MARKDOWN = {'.md', '.markdown'}
+EXTENSIONES_HTML = {'.html', '.htm'}
+
+_FRONT_MATTER = re.compile(r'\A---\s*\n(.*?)\n---\s*\n', re.DOTALL)
+_TITULO_MARKDOWN = re.compile(r'^#\s+(.+?)\s*#*\s*$', re.MULTILINE)
+_TITULO_HTML = re.compile(r'<(?:title|h1)[^>]*>(.*?)</(?:title|h1)>', re.IGNORECASE | re.DOTALL)
+_CUERPO_HTML = re.compile(r'<body[^>]*>(.*)</body>', re.IGNORECASE | re.DOTALL)
+
+# Manifiesto y carpeta de media de las exportaciones (ver exportacion_proyecto.py).
+NOMBRE_MANIFIESTO = 'manifest.json'
+CARPETA_MEDIA = 'media'
+_MEDIA_RELATIVA = re.compile(r'''(["'(]|,\s)%s/([^"')\s?#,]+)''' % CARPETA_MEDIA)
+
+
+def normalizar_slug(valor):
+    """
+    Slug válido para la URL a partir del que traiga el documento ("Mi Página"
+    pasa a "mi-pagina"). Vacío si no queda nada: entonces `slugs.base_para`
+    lo deriva del título.
+    """
+    return slugify(valor or '')[:200]
+
+
+def es_documento(nombre):
+    return PurePosixPath(nombre).suffix.lower() in EXTENSIONES_MARKDOWN | EXTENSIONES_HTML
+
+
+# --- 1. Lectura de la fuente ---
+
+def leer_fuente(ruta):
+    """
+    Genera tuplas `(ruta_relativa, bytes)` con los documentos de `ruta`, que
+    puede ser un directorio, un archivo .zip o un .tar/.tar.gz/.tgz. Los
+    archivos se leen de uno en uno y en orden alfabético.
+    """
+    if os.path.isdir(ruta):
+        for raiz, carpetas, archivos in os.walk(ruta):
+            carpetas.sort()
+            for nombre in sorted(archivos):
+                completo = os.path.join(raiz, nombre)
+                relativa = PurePosixPath(*os.path.relpath(completo, ruta).split(os.sep))
+                if es_documento(nombre):
+                    with open(completo, 'rb') as f:
+                        yield str(relativa), f.read()
+    elif zipfile.is_zipfile(ruta):
+        with zipfile.ZipFile(ruta) as archivo:
+            for info in sorted(archivo.infolist(), key=lambda i: i.filename):
+                if not info.is_dir() and es_documento(info.filename):
+                    yield info.filename, archivo.read(info)
+    elif tarfile.is_tarfile(ruta):
+        # Modo de flujo ('r|*'): el tar se lee secuencialmente sin índice.
+        with tarfile.open(ruta, 'r|*') as archivo:
+            for miembro in archivo:
+                if miembro.isfile() and es_documento(miembro.name):
+                    yield miembro.name, archivo.extractfile(miembro).read()
+    else:
+        raise ValueError(f'"{ruta}" no es un directorio, un .zip ni un .tar.')
+
+
+def leer_manifiesto(ruta):
+    """
+    Devuelve `{ruta_relativa: metadatos}` de las páginas del manifiesto de
+    una exportación (directorio o .zip), o None si la fuente no tiene.
+    """
+    try:
+        if os.path.isdir(ruta):
+            with open(os.path.join(ruta, NOMBRE_MANIFIESTO), 'rb') as f:
+                datos = f.read()
+        elif zipfile.is_zipfile(ruta):
+            with zipfile.ZipFile(ruta) as archivo:
+                datos = archivo.read(NOMBRE_MANIFIESTO)
+        else:
+            return None
+    except (OSError, KeyError):
+        return None
+    manifiesto = json.loads(datos)
+    return {pagina['ruta']: pagina for pagina in manifiesto.get('paginas', [])}
+
+
+def _abrir_en_fuente(ruta, nombre):
+    if os.path.isdir(ruta):
+        return open(os.path.join(ruta, *nombre.split('/')), 'rb')
+    archivo = zipfile.ZipFile(ruta)
+    try:
+        return archivo.open(nombre)
+    finally:
+        # El miembro abierto sigue siendo legible: ZipFile cierra el archivo
+        # subyacente cuando se cierra el último miembro.
+        archivo.close()
+
+
+def restaurar_media(ruta, nombres):
+    """
+    Copia al almacenamiento la media de la exportación `ruta` que no exista
+    ya (las subidas de CKEditor llevan el hash en el nombre, así que lo
+    normal al reimportar en la misma instalación es que no falte nada).
+    Devuelve el número de archivos copiados.
+    """
+    copiados = 0
+    for nombre in sorted(nombres):
+        nombre = posixpath.normpath(nombre)
+        if nombre.startswith(('..', '/')) or default_storage.exists(nombre):
+            continue
+        try:
+            entrada = _abrir_en_fuente(ruta, f'{CARPETA_MEDIA}/{nombre}')
+        except (OSError, KeyError):
+            continue
+        with entrada:
+            default_storage.save(nombre, File(entrada))
+        copiados += 1
+    return copiados
+
+
+def aplicar_manifiesto(documento, metadatos):
+    """
+    Completa un documento convertido con los datos del manifiesto y vuelve
+    a apuntar su media a MEDIA_URL. Devuelve los nombres de media que usa.
+    """
+    documento['titulo'] = metadatos.get('titulo', documento['titulo'])[:200]
+    if 'slug' in metadatos:
+        documento['slug'] = normalizar_slug(metadatos['slug'])
+    documento['etiquetas'] = metadatos.get('etiquetas', documento['etiquetas'])
+    documento['es_publica'] = metadatos.get('es_publica', True)
+    media = set()
+
+    def reescribir(coincidencia):
+        media.add(coincidencia.group(2))
+        return coincidencia.group(1) + settings.MEDIA_URL + coincidencia.group(2)
+
+    documento['html'] = _MEDIA_RELATIVA.sub(reescribir, documento['html'])
+    return media
+
+
+# --- 2. Conversión ---
+
+def separar_front_matter(texto):
+    """
+    Separa una cabecera opcional del tipo:
+
+        ---
+        titulo: Instalación
+        etiquetas: python, django
+        ---
+
+    Devuelve `(metadatos, resto)`.
+    """
+    coincidencia = _FRONT_MATTER.match(texto)
+    if not coincidencia:
+        return {}, texto
+    metadatos = {}
+    for linea in coincidencia.group(1).splitlines():
+        clave, separador, valor = linea.partition(':')
+        if separador:
+            metadatos[clave.strip().lower()] = valor.strip()
+    return metadatos, texto[coincidencia.end():]
+
+
+def markdown_a_html(texto):
+    """Convierte Markdown a HTML con la librería `markdown`."""
+    import markdown
+    return markdown.markdown(texto, extensions=['extra', 'sane_lists'], output_format='html')
+
+
+def convertir_documento(item):
+    """
+    Convierte un `(ruta_relativa, bytes)` en un diccionario con `ruta`,
+    `titulo`, `slug`, `html` y `etiquetas`. Es una función de módulo sin
+    estado para poder ejecutarse en un pool de procesos.
+    """
+    ruta, datos = item
+    texto = datos.decode('utf-8', errors='replace')
+    metadatos, cuerpo = separar_front_matter(texto)
+    titulo = metadatos.get('titulo') or metadatos.get('title')
+
+    if PurePosixPath(ruta).suffix.lower() in EXTENSIONES_MARKDOWN:
+        if not titulo:
+            coincidencia = _TITULO_MARKDOWN.search(cuerpo)
+            titulo = coincidencia and coincidencia.group(1)
+        html = markdown_a_html(cuerpo)
+    else:
+        if not titulo:
+            coincidencia = _TITULO_HTML.search(cuerpo)
+            titulo = coincidencia and resumir(coincidencia.group(1))[0]
+        coincidencia = _CUERPO_HTML.search(cuerpo)
+        html = coincidencia.group(1).strip() if coincidencia else cuerpo
+
+    etiquetas_texto = metadatos.get('etiquetas') or metadatos.get('tags') or ''
+    return {
+        'ruta': ruta,
+        'titulo': (titulo or PurePosixPath(ruta).stem.replace('-', ' ').replace('_', ' '))[:200],
+        'slug': normalizar_slug(metadatos.get('slug')),
+        'html': html,
+        'etiquetas': [e for e in etiquetas_texto.split(',') if e.strip()],
+    }
+
+
+def en_lotes(iterable, tamano):
+    """Agrupa un iterable en listas de como máximo `tamano` elementos."""
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def documentos_convertidos(fuente, tamano_lote, procesos=0):
+    """
+    Genera lotes de documentos convertidos. Con `procesos` > 0 la conversión
+    de cada lote se reparte en un pool de procesos; como se envía un lote
+    cada vez, la memoria sigue acotada aunque el pool sea más rápido que la
+    escritura en la base de datos.
+    """
+    if procesos <= 0:
+        for lote in en_lotes(fuente, tamano_lote):
+            yield [convertir_documento(item) for item in lote]
+        return
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        for lote in en_lotes(fuente, tamano_lote):
+            yield list(pool.map(convertir_documento, lote, chunksize=max(1, len(lote) // (procesos * 4))))
+
+
+# --- 3. Escritura ---
+
+def guardar_lote(documentos, proyecto, autor, etiquetas_por_carpeta=False):
+    """
+    Escribe un lote de documentos convertidos como páginas de `proyecto`:
+    un `bulk_create` de páginas, uno (como mucho) de etiquetas nuevas y uno de
+    la tabla intermedia. Calcula lo que haría `Pagina.save` (extracto,
+    contenido compilado) y los añade al índice de búsqueda, ya que
+    `bulk_create` no pasa por `save()` ni emite señales.
+    """
+    paginas = []
+    nombres_por_pagina = []
+    for doc in documentos:
+        extracto, num_palabras = resumir(doc['html'])
+        contenido_html, indice = compilacion.compilar(doc['html'])
+        paginas.append(Pagina(
+            titulo=doc['titulo'], slug=doc['slug'], contenido=doc['html'],
+            extracto=extracto, num_palabras=num_palabras, contenido_html=contenido_html,
+            indice=indice, version_compilacion=compilacion.VERSION,
+            autor=autor, proyecto=proyecto, es_publica=doc.get('es_publica', True),
+        ))
+        nombres = list(doc['etiquetas'])
+        if etiquetas_por_carpeta:
+            nombres.extend(PurePosixPath(doc['ruta']).parent.parts)
+        nombres_por_pagina.append(etiquetas.normalizar(nombres))
+
+    with transaction.atomic():
+        asignar_slugs(paginas, Pagina.objects.filter(proyecto=proyecto))
+        # Con ids en el RETURNING (PostgreSQL, SQLite >= 3.35) bulk_create
+        # devuelve los objetos con su pk, necesario para la tabla intermedia.
+        paginas = Pagina.objects.bulk_create(paginas)
+
+        por_nombre = etiquetas.obtener_o_crear(n for nombres in nombres_por_pagina for n in nombres)
+        Intermedia = Pagina.etiquetas.through
+        filas = Intermedia.objects.bulk_create([
+            Intermedia(pagina_id=pagina.pk, etiqueta_id=por_nombre[nombre].pk)
+            for pagina, nombres in zip(paginas, nombres_por_pagina)
+            for nombre in nombres
+        ])
+        # bulk_create no emite m2m_changed: los contadores se ajustan aquí.
+        etiquetas.ajustar_contadores('num_paginas', etiquetas.contar_filas(filas))
+
+        for pagina in paginas:
+            # Evita una consulta por página al construir el documento de búsqueda.
+            pagina.autor = autor
+        busqueda.indexar(
+            busqueda.documento_pagina(pagina, nombres)
+            for pagina, nombres in zip(paginas, nombres_por_pagina)
+        )
+    return paginas
+
+
+def importar(ruta, proyecto, autor, tamano_lote=500, procesos=0,
+             etiquetas_por_carpeta=False, progreso=None):
+    """
+    Importa todos los documentos de `ruta` en `proyecto`. `progreso`, si se
+    indica, se llama tras cada lote con el total de páginas importadas.
+    Devuelve el número de páginas creadas.
+    """
+    total = 0
+    manifiesto = leer_manifiesto(ruta)
+    fuente = leer_fuente(ruta)
+    if manifiesto is not None:
+        fuente = (item for item in fuente if item[0] in manifiesto)
+    for documentos in documentos_convertidos(fuente, tamano_lote, procesos):
+        if manifiesto is not None:
+            media = set()
+            for doc in documentos:
+                media |= aplicar_manifiesto(doc, manifiesto[doc['ruta']])
+            restaurar_media(ruta, media)
+        guardar_lote(documentos, proyecto, autor, etiquetas_por_carpeta)
+        total += len(documentos)
+        if progreso:
+            progreso(total)
+    if total:
+        # Refleja la importación en la fecha de actualización del proyecto.
+        proyecto.save(update_fields=['fecha_actualizacion'])
+    return total
@@ -0,0 +1,120 @@
+"""
+Listados de proyectos con paginación por cursor (keyset).
+
+En lugar de OFFSET, cada página continúa a partir del último par
+(fecha_actualizacion, id) visto, así que el coste de pedir la página N no
+crece con N. El cursor es opaco para el cliente y lo comparten la vista HTML,
+el scroll infinito y la variante JSON de `proyectos_lista`.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.exceptions import BadRequest
+from django.db.models import Prefetch, Q
+from django.urls import reverse
+
+from . import miniaturas
+from .models import Etiqueta, Proyecto
+
+# Proyectos por página en `proyectos_lista`.
+TAMANO_PAGINA = 24
+
+# Columnas que realmente pintan las tarjetas. El texto sale del extracto
+# precalculado, así que la columna `descripcion` no se lee.
+CAMPOS_TARJETA = ('titulo', 'slug', 'imagen', 'imagen_hash', 'imagen_anchos', 'extracto',
+                  'fecha_actualizacion', 'autor__username')
+
+
+def proyectos_para_tarjetas():
+    """
+    Queryset de proyectos públicos listo para pintar tarjetas sin consultas
+    N+1: autor por JOIN, etiquetas precargadas en una sola consulta y solo
+    las columnas necesarias.
+    """
+    return (
+        Proyecto.objects.filter(es_publico=True)
+        .select_related('autor')
+        .only(*CAMPOS_TARJETA)
+        .prefetch_related(Prefetch('etiquetas', queryset=Etiqueta.objects.order_by('nombre')))
+        .order_by('-fecha_actualizacion', '-id')
+    )
+
+
+def filtrar_por_etiquetas(queryset, nombres):
+    """
+    Restringe `queryset` a los proyectos que tienen todas las etiquetas
+    `nombres`. Cada filtro encadenado añade su propio JOIN, así que un
+    proyecto debe coincidir con cada etiqueta y no aparece duplicado.
+    """
+    for nombre in nombres:
+        queryset = queryset.filter(etiquetas__nombre=nombre)
+    return queryset
+
+
+def codificar_cursor(proyecto):
+    """Convierte la posición de un proyecto en un cursor opaco para URLs."""
+    crudo = f'{proyecto.fecha_actualizacion.isoformat()}|{proyecto.pk}'
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Devuelve el par (fecha_actualizacion, id) de un cursor. Lanza
+    `BadRequest` (HTTP 400) si el cursor está mal formado.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split('|')
+        return datetime.fromisoformat(fecha), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise BadRequest('Cursor de paginación inválido.') from exc
+
+
+def _desde_cursor(queryset, cursor):
+    if cursor:
+        fecha, pk = decodificar_cursor(cursor)
+        queryset = queryset.filter(
+            Q(fecha_actualizacion__lt=fecha) | Q(fecha_actualizacion=fecha, id__lt=pk))
+    return queryset
+
+
+def _recortar(objetos, tamano):
+    if len(objetos) > tamano:
+        objetos = objetos[:tamano]
+        return objetos, codificar_cursor(objetos[-1])
+    return objetos, None
+
+
+def pagina_por_cursor(queryset, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Devuelve `(objetos, siguiente_cursor)` para la página que sigue a `cursor`.
+    `queryset` debe estar ordenado por ('-fecha_actualizacion', '-id').
+    `siguiente_cursor` es None cuando no hay más resultados.
+    """
+    # Se pide un elemento de más solo para saber si existe otra página.
+    return _recortar(list(_desde_cursor(queryset, cursor)[:tamano + 1]), tamano)
+
+
+async def apagina_por_cursor(queryset, cursor=None, tamano=TAMANO_PAGINA):
+    """Versión asíncrona de `pagina_por_cursor`, con el ORM asíncrono."""
+    return _recortar([objeto async for objeto in _desde_cursor(queryset, cursor)[:tamano + 1]], tamano)
+
+
+def proyecto_a_dict(proyecto, request=None):
+    """Representación JSON de una tarjeta de proyecto."""
+    absoluta = request.build_absolute_uri if request is not None else str
+    imagen = absoluta(proyecto.imagen.url) if proyecto.imagen else None
+    variantes = miniaturas.variantes(proyecto)
+    return {
+        'titulo': proyecto.titulo,
+        'slug': proyecto.slug,
+        'url': reverse('proyecto_detalle', kwargs={'proyecto_slug': proyecto.slug}),
+        'autor': proyecto.autor.username,
+        'imagen': imagen,
+        # Miniaturas JPEG por ancho, o {} si aún no se han generado.
+        'miniaturas': {ancho: absoluta(url) for url, ancho in variantes.get('jpg', [])},
+        'extracto': proyecto.extracto,
+        'etiquetas': [e.nombre for e in proyecto.etiquetas.all()],
+        'fecha_actualizacion': proyecto.fecha_actualizacion.isoformat(),
+    }
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from docubase_app.models import Pagina, Proyecto
+from docubase_app.texto import resumir
+
+
+class Command(BaseCommand):
+    """
+    Calcula el extracto en texto plano y el número de palabras de los
+    proyectos y páginas existentes.
+
+    Recorre las tablas por bloques de clave primaria (keyset), así que la
+    memoria no depende del tamaño del corpus, y escribe cada bloque con un
+    único `bulk_update` sin modificar `fecha_actualizacion`.
+    """
+    help = 'Rellena los extractos precalculados de proyectos y páginas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Número de filas que se procesan por bloque (por defecto 500).')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        for modelo, campo_html in ((Proyecto, 'descripcion'), (Pagina, 'contenido')):
+            total = self._rellenar(modelo, campo_html, lote)
+            self.stdout.write(self.style.SUCCESS(
+                f'{modelo._meta.verbose_name_plural}: {total} filas actualizadas.'))
+
+    def _rellenar(self, modelo, campo_html, lote):
+        total = 0
+        ultimo_pk = 0
+        while True:
+            # Solo se cargan la clave y la columna HTML de cada fila.
+            bloque = list(
+                modelo.objects.filter(pk__gt=ultimo_pk)
+                .order_by('pk')
+                .only('pk', campo_html)[:lote]
+            )
+            if not bloque:
+                return total
+            for objeto in bloque:
+                objeto.extracto, objeto.num_palabras = resumir(getattr(objeto, campo_html))
+            modelo.objects.bulk_update(bloque, ['extracto', 'num_palabras'])
+            total += len(bloque)
+            ultimo_pk = bloque[-1].pk
+            self.stdout.write(f'  {modelo.__name__}: {total} filas procesadas...')
@@ -0,0 +1,98 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from docubase_app import banco_pruebas, datos_sinteticos
+
+
+class Command(BaseCommand):
+    """
+    Mide todas las rutas de la aplicación con el cliente de pruebas
+    (latencia, consultas y memoria) y compara el resultado con una línea
+    base guardada, para que las regresiones se vean como números. Solo hace
+    peticiones GET: no modifica datos.
+    """
+    help = 'Mide la latencia, las consultas y la memoria de cada vista.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--usuario', default=f'{datos_sinteticos.PREFIJO}0001',
+            help='Usuario con el que se hacen las peticiones (por defecto, el staff de seed_bench).')
+        parser.add_argument(
+            '--anonimo', action='store_true',
+            help='Hace las peticiones sin iniciar sesión.')
+        parser.add_argument(
+            '--repeticiones', type=int, default=20,
+            help='Peticiones medidas por ruta (por defecto 20).')
+        parser.add_argument(
+            '--calentamiento', type=int, default=2,
+            help='Peticiones previas sin medir, para llenar las cachés (por defecto 2).')
+        parser.add_argument(
+            '--solo', action='append', default=[],
+            help='Mide solo los casos cuyo nombre contiene este texto (se puede repetir).')
+        parser.add_argument('--guardar', help='Guarda el resultado en este archivo JSON.')
+        parser.add_argument('--comparar', help='Línea base JSON con la que comparar el resultado.')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.2,
+            help='Subida relativa de latencia o memoria que se considera regresión (por defecto 0.2).')
+        parser.add_argument(
+            '--estricto', action='store_true',
+            help='Termina con error si alguna métrica empeora respecto a la línea base.')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones tiene que ser al menos 1.')
+        base = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as f:
+                    base = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'No se puede leer la línea base: {exc}')
+
+        usuario = None
+        if not options['anonimo']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f'El usuario "{options["usuario"]}" no existe (usa --anonimo o ejecuta seed_bench).')
+
+        self.stdout.write(f'{"caso":<40} {"estado":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+                          f'{"consultas":>9} {"dup":>4} {"pico KB":>9}')
+        try:
+            informe = banco_pruebas.ejecutar(
+                usuario, options['repeticiones'], options['calentamiento'], options['solo'],
+                progreso=self._mostrar)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for caso, motivo in sorted(informe['omitidos'].items()):
+            self.stdout.write(self.style.WARNING(f'  omitido {caso}: {motivo}'))
+
+        if options['guardar']:
+            with open(options['guardar'], 'w', encoding='utf-8') as f:
+                json.dump(informe, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Resultado guardado en {options["guardar"]}.')
+
+        if base is None:
+            self.stdout.write(self.style.SUCCESS(f'{len(informe["casos"])} casos medidos.'))
+            return
+        cambios, avisos = banco_pruebas.comparar(informe, base, options['tolerancia'])
+        for aviso in avisos:
+            self.stdout.write(self.style.WARNING(f'  aviso: {aviso}'))
+        peores = [c for c in cambios if c[5]]
+        for caso, metrica, antes, ahora, relativo, empeora in cambios:
+            cambio = f'{relativo:+.0%}' if relativo is not None else 'nuevo'
+            linea = f'  {caso:<40} {metrica:<16} {antes:>10} -> {ahora:<10} {cambio}'
+            self.stdout.write(self.style.ERROR(linea) if empeora else linea)
+        if peores:
+            mensaje = f'{len(peores)} métricas empeoran respecto a la línea base.'
+            if options['estricto']:
+                raise CommandError(mensaje)
+            self.stdout.write(self.style.WARNING(mensaje))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a la línea base.'))
+
+    def _mostrar(self, caso, r):
+        self.stdout.write(f'{caso:<40} {r["estado"]:>6} {r["p50_ms"]:>9} {r["p95_ms"]:>9} {r["p99_ms"]:>9} '
+                          f'{r["consultas"]:>9} {r["duplicadas"]:>4} {r["memoria_pico_kb"]:>9}')
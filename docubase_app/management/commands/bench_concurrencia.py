@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from docubase_app import banco_pruebas
+
+
+class Command(BaseCommand):
+    """
+    Compara el rendimiento con clientes simultáneos de las vistas de lectura
+    servidas por gunicorn (workers síncronos, vistas síncronas) y por
+    uvicorn (ASGI, `VISTAS_ASINCRONAS=1`), sobre la misma base de datos.
+    Cada servidor se arranca como subproceso con la configuración actual:
+    hay que sembrar antes la base con `seed_bench` y medir con la de
+    producción (`RENDER=1`, sin DEBUG). Solo hace peticiones GET anónimas.
+    """
+    help = 'Mide peticiones por segundo y latencia con clientes simultáneos bajo gunicorn y uvicorn.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servidor', action='append', choices=list(banco_pruebas.SERVIDORES),
+            help='Servidor que se mide (se puede repetir; por defecto, todos).')
+        parser.add_argument(
+            '--clientes', action='append', type=int,
+            help='Número de clientes simultáneos (se puede repetir; por defecto 1, 8 y 32).')
+        parser.add_argument(
+            '--duracion', type=float, default=10,
+            help='Segundos de carga por número de clientes (por defecto 10).')
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Procesos de cada servidor (por defecto 2).')
+        parser.add_argument(
+            '--puerto', type=int, default=8765,
+            help='Puerto local en el que se arrancan los servidores (por defecto 8765).')
+        parser.add_argument(
+            '--url', help='Mide un servidor ya arrancado en esta URL en lugar de arrancarlos.')
+        parser.add_argument('--guardar', help='Guarda el resultado en este archivo JSON.')
+
+    def handle(self, *args, **options):
+        niveles = options['clientes'] or (1, 8, 32)
+        if min(niveles) < 1:
+            raise CommandError('--clientes tiene que ser al menos 1.')
+        self.stdout.write(f'{"servidor":<10} {"clientes":>8} {"pet/s":>9} {"p50 ms":>9} {"p95 ms":>9} '
+                          f'{"p99 ms":>9} {"errores":>8}')
+        try:
+            informe = banco_pruebas.concurrencia(
+                options['servidor'] or tuple(banco_pruebas.SERVIDORES), niveles, options['duracion'],
+                options['workers'], options['puerto'], options['url'], progreso=self._mostrar)
+        except (ValueError, RuntimeError) as exc:
+            raise CommandError(str(exc))
+        for nombre, motivo in sorted(informe['omitidos'].items()):
+            self.stdout.write(self.style.WARNING(f'  omitido {nombre}: {motivo}'))
+        if informe['debug']:
+            self.stdout.write(self.style.WARNING(
+                '  aviso: DEBUG está activo (falta RENDER=1); las cifras no representan producción.'))
+
+        if options['guardar']:
+            with open(options['guardar'], 'w', encoding='utf-8') as f:
+                json.dump(informe, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Resultado guardado en {options["guardar"]}.')
+        self.stdout.write(self.style.SUCCESS(f'{len(informe["servidores"])} servidores medidos.'))
+
+    def _mostrar(self, nombre, r):
+        linea = (f'{nombre:<10} {r["clientes"]:>8} {r["por_segundo"]:>9} {r["p50_ms"]!s:>9} '
+                 f'{r["p95_ms"]!s:>9} {r["p99_ms"]!s:>9} {r["errores"]:>8}')
+        self.stdout.write(self.style.ERROR(linea) if r['errores'] else linea)
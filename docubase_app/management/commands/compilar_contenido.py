@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from docubase_app import compilacion, fragmentos
+from docubase_app.models import Pagina, Proyecto
+
+
+class Command(BaseCommand):
+    """
+    Vuelve a compilar el HTML de proyectos y páginas (ver `compilacion.py`)
+    cuyo `version_compilacion` es anterior a `compilacion.VERSION`: las filas
+    previas a la compilación y las compiladas con reglas antiguas.
+
+    Recorre las tablas por bloques de clave primaria, escribe cada bloque con
+    un `bulk_update` sin tocar `fecha_actualizacion` e invalida los
+    fragmentos cacheados de esas filas. El sitio estático no lo nota (sus
+    versiones salen de las fechas): después hay que ejecutar
+    `export_static --forzar`.
+    """
+    help = 'Compila el HTML saneado, las anclas y el índice de proyectos y páginas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Número de filas que se procesan por bloque (por defecto 500).')
+        parser.add_argument(
+            '--todo', action='store_true',
+            help='Compila también las filas que ya están en la versión actual.')
+
+    def handle(self, *args, **options):
+        for modelo, tipo, campo_html, campos in (
+            (Proyecto, 'proyecto', 'descripcion', ['descripcion_html']),
+            (Pagina, 'pagina', 'contenido', ['contenido_html', 'indice']),
+        ):
+            total = self._compilar(modelo, tipo, campo_html, campos, options['lote'], options['todo'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{modelo._meta.verbose_name_plural}: {total} filas compiladas.'))
+
+    def _compilar(self, modelo, tipo, campo_html, campos, lote, todo):
+        consulta = modelo.objects.all()
+        if not todo:
+            consulta = consulta.filter(version_compilacion__lt=compilacion.VERSION)
+        total = 0
+        ultimo_pk = 0
+        while True:
+            bloque = list(
+                consulta.filter(pk__gt=ultimo_pk)
+                .order_by('pk')
+                .only('pk', campo_html)[:lote]
+            )
+            if not bloque:
+                return total
+            for objeto in bloque:
+                html, indice = compilacion.compilar(getattr(objeto, campo_html))
+                setattr(objeto, campos[0], html)
+                if 'indice' in campos:
+                    objeto.indice = indice
+                objeto.version_compilacion = compilacion.VERSION
+            modelo.objects.bulk_update(bloque, [*campos, 'version_compilacion'])
+            # bulk_update no emite señales: los fragmentos cacheados se invalidan aquí.
+            fragmentos.invalidar(tipo, [objeto.pk for objeto in bloque])
+            total += len(bloque)
+            ultimo_pk = bloque[-1].pk
+            self.stdout.write(f'  {modelo.__name__}: {total} filas procesadas...')
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from docubase_app import exportacion_proyecto
+from docubase_app.models import Proyecto
+
+
+class Command(BaseCommand):
+    """
+    Exporta un proyecto a un ZIP con sus páginas (HTML o Markdown), la media
+    incrustada, los adjuntos y un manifiesto. El ZIP se escribe según se
+    genera (ver `exportacion_proyecto.py`) y se puede volver a importar con
+    `import_docs`.
+    """
+    help = 'Exporta un proyecto entero a un archivo ZIP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('proyecto', help='Slug del proyecto.')
+        parser.add_argument('destino', help='Archivo .zip que se crea.')
+        parser.add_argument(
+            '--formato', choices=exportacion_proyecto.FORMATOS, default='html',
+            help='Formato de las páginas (por defecto html).')
+        parser.add_argument(
+            '--usuario',
+            help='Exporta lo que ve este usuario (por defecto, el autor del proyecto: todo).')
+
+    def handle(self, *args, **options):
+        try:
+            proyecto = Proyecto.objects.get(slug=options['proyecto'])
+        except Proyecto.DoesNotExist:
+            raise CommandError(f'El proyecto "{options["proyecto"]}" no existe.')
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f'El usuario "{options["usuario"]}" no existe.')
+        else:
+            usuario = proyecto.autor
+
+        total = 0
+        with open(options['destino'], 'wb') as destino:
+            for trozo in exportacion_proyecto.generar_zip(proyecto, usuario, options['formato']):
+                destino.write(trozo)
+                total += len(trozo)
+        self.stdout.write(self.style.SUCCESS(
+            f'Proyecto "{proyecto.titulo}" exportado a {options["destino"]} ({total / 1024 ** 2:.1f} MB).'))
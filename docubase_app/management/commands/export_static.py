@@ -0,0 +1,35 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from docubase_app import exportacion_estatica
+
+
+class Command(BaseCommand):
+    """
+    Genera un sitio HTML estático con los proyectos y páginas públicos para
+    servirlo desde un servidor de archivos o una CDN. Las ejecuciones
+    sucesivas solo renderizan lo que cambió (ver `exportacion_estatica.py`).
+    Los archivos estáticos (CSS, JS) se publican aparte con `collectstatic`.
+    """
+    help = 'Exporta los proyectos públicos a HTML estático de forma incremental.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('destino', help='Directorio donde se escribe el sitio.')
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count() or 1,
+            help='Procesos de renderizado (0 = en el proceso actual).')
+        parser.add_argument(
+            '--forzar', action='store_true',
+            help='Renderiza todo de nuevo ignorando el manifiesto.')
+
+    def handle(self, *args, **options):
+        resultado = exportacion_estatica.exportar(
+            options['destino'],
+            procesos=options['procesos'],
+            forzar=options['forzar'],
+            progreso=lambda hechos, total: self.stdout.write(f'  {hechos}/{total} objetos exportados...'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Exportación completada: {resultado["renderizados"]} de {resultado["total"]} objetos '
+            f'renderizados, {resultado["escritos"]} archivos escritos y {resultado["borrados"]} borrados.'))
@@ -0,0 +1,31 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from docubase_app import miniaturas
+
+
+class Command(BaseCommand):
+    """
+    Genera las miniaturas WebP/JPEG de las imágenes de proyecto que aún no
+    las tienen, por ejemplo las subidas antes de existir `miniaturas.py`. Las
+    variantes que ya existen (mismo hash de contenido) no se regeneran.
+    """
+    help = 'Genera en paralelo las miniaturas de las imágenes de proyecto existentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count() or 1,
+            help='Procesos de generación (0 = en el proceso actual).')
+        parser.add_argument(
+            '--forzar', action='store_true',
+            help='Procesa también los proyectos que ya tienen miniaturas.')
+
+    def handle(self, *args, **options):
+        generados, total = miniaturas.rellenar(
+            procesos=options['procesos'],
+            forzar=options['forzar'],
+            progreso=lambda hechos, total: self.stdout.write(f'  {hechos}/{total} imágenes procesadas...'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Miniaturas generadas para {generados} de {total} proyectos.'))
@@ -0,0 +1,69 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from docubase_app import importacion
+from docubase_app.models import Proyecto
+
+
+class Command(BaseCommand):
+    """
+    Importa un árbol de archivos Markdown/HTML (directorio, .zip o .tar) como
+    páginas de un proyecto. Escribe por lotes con `bulk_create`, así que sirve
+    para migrar wikis de decenas de miles de páginas.
+    """
+    help = 'Importa documentación Markdown/HTML a un proyecto de DocuBase.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fuente', help='Directorio, archivo .zip o .tar(.gz) con los documentos.')
+        parser.add_argument('--autor', required=True, help='Usuario al que se asignan las páginas.')
+        parser.add_argument(
+            '--proyecto',
+            help='Slug de un proyecto existente. Si no se indica, se crea uno nuevo.')
+        parser.add_argument(
+            '--titulo',
+            help='Título del proyecto nuevo (por defecto, el nombre de la fuente).')
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Número de páginas que se escriben por lote (por defecto 500).')
+        parser.add_argument(
+            '--procesos', type=int, default=0,
+            help='Procesos para convertir Markdown a HTML (0 = en el proceso actual).')
+        parser.add_argument(
+            '--etiquetas-por-carpeta', action='store_true',
+            help='Añade como etiquetas los nombres de las carpetas de cada archivo.')
+
+    def handle(self, *args, **options):
+        fuente = options['fuente']
+        if not os.path.exists(fuente):
+            raise CommandError(f'La fuente "{fuente}" no existe.')
+
+        try:
+            autor = User.objects.get(username=options['autor'])
+        except User.DoesNotExist:
+            raise CommandError(f'El usuario "{options["autor"]}" no existe.')
+
+        if options['proyecto']:
+            try:
+                proyecto = Proyecto.objects.get(slug=options['proyecto'])
+            except Proyecto.DoesNotExist:
+                raise CommandError(f'El proyecto "{options["proyecto"]}" no existe.')
+        else:
+            nombre = os.path.basename(os.path.normpath(fuente)).split('.')[0]
+            proyecto = Proyecto.objects.create(titulo=options['titulo'] or nombre, autor=autor)
+            self.stdout.write(f'Proyecto "{proyecto.titulo}" creado ({proyecto.slug}).')
+
+        try:
+            total = importacion.importar(
+                fuente, proyecto, autor,
+                tamano_lote=options['lote'],
+                procesos=options['procesos'],
+                etiquetas_por_carpeta=options['etiquetas_por_carpeta'],
+                progreso=lambda n: self.stdout.write(f'  {n} páginas importadas...'),
+            )
+        except (ValueError, ImportError) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Importación completada: {total} páginas en "{proyecto.titulo}".'))
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from docubase_app import subidas
+from docubase_app.models import Subida
+
+
+class Command(BaseCommand):
+    """
+    Borra las subidas por trozos que no se completaron y llevan tiempo sin
+    recibir datos, junto con su archivo parcial, y los registros de las ya
+    completadas (el `Archivo` creado se conserva).
+    """
+    help = 'Elimina las subidas por trozos abandonadas y sus archivos parciales.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas', type=int, default=24,
+            help='Horas sin actividad tras las que una subida se da por abandonada.')
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(hours=options['horas'])
+        abandonadas = 0
+        for subida in Subida.objects.filter(fecha_actualizacion__lt=limite).iterator():
+            if not subida.archivo_id:
+                subidas.eliminar_parcial(subida)
+                abandonadas += 1
+        Subida.objects.filter(fecha_actualizacion__lt=limite).delete()
+        self.stdout.write(self.style.SUCCESS(f'{abandonadas} subidas abandonadas eliminadas.'))
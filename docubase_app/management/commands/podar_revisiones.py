@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from docubase_app import revisiones
+from docubase_app.models import Revision
+
+
+class Command(BaseCommand):
+    """
+    Borra las revisiones antiguas de las páginas, conservando siempre las
+    más recientes de cada una, y opcionalmente recompacta las cadenas de
+    deltas con el `REVISIONES_INTERVALO_COMPLETA` actual.
+    """
+    help = 'Elimina revisiones antiguas de las páginas y recompacta su historial.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--conservar', type=int, default=50,
+            help='Revisiones más recientes que se conservan siempre en cada página.')
+        parser.add_argument(
+            '--dias', type=int, default=None,
+            help='Solo borra revisiones con más de estos días (por defecto, cualquiera fuera de --conservar).')
+        parser.add_argument(
+            '--compactar', action='store_true',
+            help='Vuelve a codificar las revisiones que quedan con el intervalo actual.')
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(days=options['dias']) if options['dias'] is not None else None
+        paginas = Revision.objects.values_list('pagina_id', flat=True).distinct().order_by('pagina_id')
+        borradas = compactadas = 0
+        for pagina_id in paginas.iterator():
+            borradas += revisiones.podar(pagina_id, options['conservar'], antes_de)
+            if options['compactar']:
+                compactadas += revisiones.compactar(pagina_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'{borradas} revisiones eliminadas, {compactadas} recompactadas.'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from docubase_app import busqueda
+from docubase_app.models import Pagina, Proyecto
+
+
+class Command(BaseCommand):
+    """
+    Reconstruye desde cero el índice de búsqueda de texto completo.
+    Recorre proyectos y páginas por lotes para mantener acotado el uso de memoria.
+    """
+    help = 'Reconstruye el índice de búsqueda de proyectos y páginas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Número de filas que se leen e indexan por lote (por defecto 500).')
+
+    def handle(self, *args, **options):
+        if busqueda.obtener_backend() is None:
+            raise CommandError(
+                f'El motor "{connection.vendor}" no tiene índice de texto completo.')
+
+        lote = options['lote']
+        with transaction.atomic():
+            busqueda.vaciar()
+            total_proyectos = self._indexar(
+                Proyecto.objects.select_related('autor').prefetch_related('etiquetas'),
+                busqueda.documento_proyecto, lote)
+            total_paginas = self._indexar(
+                Pagina.objects.select_related('autor').prefetch_related('etiquetas'),
+                busqueda.documento_pagina, lote)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido: {total_proyectos} proyectos y {total_paginas} páginas.'))
+
+    def _indexar(self, queryset, construir, lote):
+        """Indexa el queryset en bloques de `lote` documentos."""
+        total = 0
+        documentos = []
+        for objeto in queryset.order_by('pk').iterator(chunk_size=lote):
+            documentos.append(construir(objeto))
+            if len(documentos) >= lote:
+                busqueda.indexar(documentos)
+                total += len(documentos)
+                documentos = []
+        busqueda.indexar(documentos)
+        return total + len(documentos)
@@ -0,0 +1,47 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from docubase_app import tareas
+
+
+class Command(BaseCommand):
+    """
+    Ejecuta los trabajos de la cola persistente (ver `tareas.py`): reindexado
+    de la búsqueda, miniaturas, etc. Se pueden lanzar varios workers a la vez;
+    cada trabajo lo reclama uno solo. SIGTERM o Ctrl+C terminan el lote en
+    curso y salen.
+    """
+    help = 'Procesa los trabajos en segundo plano de la cola de DocuBase.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia', type=int, default=4,
+            help='Trabajos que se ejecutan a la vez.')
+        parser.add_argument(
+            '--procesos', action='store_true',
+            help='Usa un pool de procesos en lugar de hilos (tareas de CPU, como las miniaturas).')
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help='Segundos de espera cuando la cola está vacía.')
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Termina en cuanto la cola queda vacía.')
+
+    def handle(self, *args, **options):
+        detenido = []
+
+        def detener(*_):
+            detenido.append(True)
+
+        signal.signal(signal.SIGTERM, detener)
+        signal.signal(signal.SIGINT, detener)
+        self.stdout.write('Worker iniciado. Esperando trabajos...')
+        total = tareas.trabajar(
+            concurrencia=options['concurrencia'],
+            procesos=options['procesos'],
+            intervalo=options['intervalo'],
+            una_vez=options['una_vez'],
+            detener=lambda: bool(detenido),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Worker detenido tras procesar {total} trabajos.'))
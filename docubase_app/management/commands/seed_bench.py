@@ -0,0 +1,39 @@
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand
+
+from docubase_app import datos_sinteticos
+
+
+class Command(BaseCommand):
+    """
+    Llena la base de datos con datos sintéticos (usuarios, proyectos,
+    páginas, etiquetas, comentarios, adjuntos y revisiones) para medir la
+    aplicación a escala con `bench`. Escribe por lotes con `bulk_create`.
+    """
+    help = 'Genera datos sintéticos para el banco de pruebas.'
+
+    def add_arguments(self, parser):
+        por_defecto = datos_sinteticos.Volumenes()
+        for campo in fields(datos_sinteticos.Volumenes):
+            parser.add_argument(
+                f'--{campo.name}', type=campo.type, default=getattr(por_defecto, campo.name),
+                help=f'Por defecto {getattr(por_defecto, campo.name)}.')
+        parser.add_argument(
+            '--semilla', type=int, default=0,
+            help='Semilla de los datos aleatorios: la misma semilla genera los mismos textos.')
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Número de páginas que se escriben por lote (por defecto 500).')
+
+    def handle(self, *args, **options):
+        volumenes = datos_sinteticos.Volumenes(
+            **{campo.name: options[campo.name] for campo in fields(datos_sinteticos.Volumenes)})
+        totales = datos_sinteticos.sembrar(
+            volumenes, semilla=options['semilla'], tamano_lote=options['lote'],
+            progreso=self.stdout.write)
+        resumen = ', '.join(f'{cantidad} {tipo}' for tipo, cantidad in totales.items())
+        self.stdout.write(self.style.SUCCESS(f'Datos generados: {resumen}.'))
+        self.stdout.write(
+            f'Los usuarios son {datos_sinteticos.PREFIJO}0001... (contraseña "{datos_sinteticos.CONTRASENA}"); '
+            f'el primero es staff.')
@@ -0,0 +1,49 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from docubase_app import replicas
+
+
+class Command(BaseCommand):
+    """
+    Copia la base primaria SQLite en las réplicas SQLite de
+    `DATABASE_REPLICAS`, para probar en local el reparto de lecturas (ver
+    `replicas.py`). Usa la copia en caliente de SQLite, así que el servidor
+    puede seguir en marcha. Con `--cada N` repite la copia cada N segundos:
+    es una replicación con hasta N segundos de retraso.
+    """
+    help = 'Pone al día las réplicas SQLite locales copiando la base primaria.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada', type=float,
+            help='Repite la copia cada tantos segundos, hasta que se interrumpa.')
+
+    def handle(self, *args, **options):
+        if connections[replicas.PRIMARIA].vendor != 'sqlite':
+            raise CommandError('La base primaria no es SQLite: las réplicas reales se replican solas.')
+        destinos = [alias for alias in replicas.replicas() if connections[alias].vendor == 'sqlite']
+        if not destinos:
+            raise CommandError('No hay réplicas SQLite en DATABASE_REPLICAS.')
+        while True:
+            # El latido primero, para que la copia diga hasta cuándo llega.
+            replicas.latir()
+            for alias in destinos:
+                self._copiar(alias)
+            self.stdout.write(f'Réplicas al día: {", ".join(destinos)}.')
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
+
+    def _copiar(self, alias):
+        origen = sqlite3.connect(settings.DATABASES[replicas.PRIMARIA]['NAME'])
+        destino = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+        try:
+            origen.backup(destino)
+        finally:
+            destino.close()
+            origen.close()
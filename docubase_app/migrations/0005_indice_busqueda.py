@@ -0,0 +1,71 @@
+# Índice de texto completo para proyectos y páginas (ver docubase_app/busqueda.py).
+
+from django.db import migrations
+
+SQLITE_CREAR = """
+CREATE VIRTUAL TABLE docubase_app_indice_busqueda USING fts5(
+    tipo UNINDEXED,
+    objeto_id UNINDEXED,
+    proyecto_id UNINDEXED,
+    autor_id UNINDEXED,
+    publico UNINDEXED,
+    titulo,
+    etiquetas,
+    autor,
+    cuerpo,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+POSTGRES_CREAR = [
+    """
+    CREATE TABLE docubase_app_indice_busqueda (
+        id bigserial PRIMARY KEY,
+        tipo varchar(10) NOT NULL,
+        objeto_id bigint NOT NULL,
+        proyecto_id bigint NOT NULL,
+        autor_id integer NOT NULL,
+        publico boolean NOT NULL,
+        titulo text NOT NULL,
+        etiquetas text NOT NULL,
+        autor text NOT NULL,
+        cuerpo text NOT NULL,
+        documento tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('spanish', titulo), 'A') ||
+            setweight(to_tsvector('spanish', etiquetas), 'B') ||
+            setweight(to_tsvector('simple', autor), 'C') ||
+            setweight(to_tsvector('spanish', cuerpo), 'D')
+        ) STORED,
+        UNIQUE (tipo, objeto_id)
+    )
+    """,
+    "CREATE INDEX docubase_app_indice_busqueda_documento ON docubase_app_indice_busqueda USING gin (documento)",
+    "CREATE INDEX docubase_app_indice_busqueda_proyecto ON docubase_app_indice_busqueda (proyecto_id)",
+]
+
+
+def crear_indice(apps, schema_editor):
+    """Crea la tabla del índice según el motor de base de datos."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREAR)
+    elif vendor == 'postgresql':
+        for sql in POSTGRES_CREAR:
+            schema_editor.execute(sql)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS docubase_app_indice_busqueda')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0004_alter_pagina_slug_alter_proyecto_etiquetas'),
+    ]
+
+    operations = [
+        # El índice se llena con `manage.py rebuild_search_index` tras migrar.
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
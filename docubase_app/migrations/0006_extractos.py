@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0005_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagina',
+            name='extracto',
+            field=models.CharField(blank=True, editable=False, max_length=303),
+        ),
+        migrations.AddField(
+            model_name='pagina',
+            name='num_palabras',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='extracto',
+            field=models.CharField(blank=True, editable=False, max_length=303),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='num_palabras',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0006_extractos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pagina',
+            index=models.Index(fields=['autor', '-fecha_actualizacion'], name='pagina_autor_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:53
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def calcular_contadores(apps, schema_editor):
+    """Calcula una vez los contadores; a partir de aquí las señales los mantienen."""
+    Etiqueta = apps.get_model('docubase_app', 'Etiqueta')
+    etiquetas = Etiqueta.objects.annotate(
+        total_proyectos=Count('proyectos', distinct=True),
+        total_paginas=Count('paginas', distinct=True),
+    )
+    for etiqueta in etiquetas:
+        etiqueta.num_proyectos = etiqueta.total_proyectos
+        etiqueta.num_paginas = etiqueta.total_paginas
+    Etiqueta.objects.bulk_update(etiquetas, ['num_proyectos', 'num_paginas'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0007_pagina_autor_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etiqueta',
+            name='num_paginas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='etiqueta',
+            name='num_proyectos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0008_contadores_etiquetas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyecto',
+            name='imagen_anchos',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='imagen_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0011_subidas_por_contenido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Revision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField()),
+                ('base', models.PositiveIntegerField()),
+                ('es_completa', models.BooleanField(default=False)),
+                ('datos', models.BinaryField()),
+                ('titulo', models.CharField(max_length=200)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('nota', models.CharField(blank=True, max_length=200)),
+                ('tamano', models.PositiveIntegerField(default=0)),
+                ('anadidos', models.PositiveIntegerField(default=0)),
+                ('eliminados', models.PositiveIntegerField(default=0)),
+                ('autor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('pagina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisiones', to='docubase_app.pagina')),
+            ],
+            options={
+                'ordering': ['-numero'],
+                'constraints': [models.UniqueConstraint(fields=('pagina', 'numero'), name='revision_pagina_numero_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copias de `comentarios.py` en el momento de esta migración: la migración
+# no debe cambiar si el código de la aplicación cambia después.
+ANCHO_SEGMENTO = 12
+PROFUNDIDAD_MAXIMA = 8
+
+
+def segmento(pk):
+    return f'{pk:0{ANCHO_SEGMENTO}d}/'
+
+
+def calcular_rutas(apps, schema_editor):
+    """Coloca en el árbol los comentarios existentes; los nuevos se colocan al guardarlos."""
+    Comentario = apps.get_model('docubase_app', 'Comentario')
+    comentarios = {c.pk: c for c in Comentario.objects.only('comentario_padre', 'ruta').order_by('pk')}
+
+    def colocar(comentario, visitados=()):
+        if comentario.ruta:
+            return
+        padre = comentarios.get(comentario.comentario_padre_id)
+        if padre is not None and padre.pk not in visitados:
+            colocar(padre, (*visitados, comentario.pk))
+        else:
+            padre = None
+        if padre is not None and padre.profundidad >= PROFUNDIDAD_MAXIMA:
+            comentario.comentario_padre_id = padre.comentario_padre_id
+            prefijo, comentario.profundidad = padre.ruta[:-len(segmento(0))], padre.profundidad
+        else:
+            prefijo = padre.ruta if padre is not None else ''
+            comentario.profundidad = padre.profundidad + 1 if padre is not None else 0
+        comentario.ruta = prefijo + segmento(comentario.pk)
+        comentario.hilo = padre.hilo if padre is not None else comentario.pk
+
+    for comentario in comentarios.values():
+        colocar(comentario)
+    Comentario.objects.bulk_update(
+        comentarios.values(), ['comentario_padre', 'ruta', 'hilo', 'profundidad'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0012_revisiones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comentario',
+            name='hilo',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='comentario',
+            name='profundidad',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comentario',
+            name='ruta',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['pagina', 'hilo', 'ruta'], name='comentario_hilo_ruta_idx'),
+        ),
+        migrations.RunPython(calcular_rutas, migrations.RunPython.noop),
+    ]
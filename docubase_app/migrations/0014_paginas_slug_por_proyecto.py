@@ -0,0 +1,131 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:36
+
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import slugify
+
+_CON_SUFIJO = re.compile(r'^(?P<base>.+)-\d+$')
+
+
+def siguiente_libre(base, ocupados):
+    """
+    Copia de `slugs.siguiente_libre` en el momento de esta migración: `base`
+    si está libre o `base-n` con el menor n >= 1 que no esté en `ocupados`.
+    """
+    num = 0
+    slug = base
+    while slug in ocupados:
+        num += 1
+        slug = f'{base}-{num}'
+    return slug, num
+
+
+def acortar_slugs(apps, schema_editor):
+    """
+    Con los slugs únicos solo dentro de cada proyecto, las páginas que
+    recibieron un sufijo por coincidir con una de otro proyecto recuperan el
+    slug libre más corto en el suyo. El slug anterior se guarda en
+    SlugAntiguo para que las URLs ya publicadas redirijan, y ninguna otra
+    página del proyecto lo toma en esta migración.
+    """
+    Pagina = apps.get_model('docubase_app', 'Pagina')
+    SlugAntiguo = apps.get_model('docubase_app', 'SlugAntiguo')
+    por_proyecto = defaultdict(list)
+    for pagina in Pagina.objects.only('proyecto', 'slug', 'titulo').order_by('pk').iterator():
+        por_proyecto[pagina.proyecto_id].append(pagina)
+
+    cambiadas, antiguos = [], []
+    for proyecto_id, paginas in por_proyecto.items():
+        ocupados = {pagina.slug for pagina in paginas}
+        for pagina in paginas:
+            coincidencia = _CON_SUFIJO.match(pagina.slug)
+            base = slugify(pagina.titulo) or 'pagina'
+            if not coincidencia or coincidencia.group('base') != base:
+                continue
+            nuevo, _ = siguiente_libre(base, ocupados - {pagina.slug})
+            if nuevo != pagina.slug:
+                antiguos.append(SlugAntiguo(proyecto_id=proyecto_id, slug=pagina.slug, pagina_id=pagina.pk))
+                pagina.slug = nuevo
+                ocupados.add(nuevo)
+                cambiadas.append(pagina)
+    Pagina.objects.bulk_update(cambiadas, ['slug'], batch_size=500)
+    SlugAntiguo.objects.bulk_create(antiguos, batch_size=500)
+
+
+def restaurar_slugs(apps, schema_editor):
+    """
+    Vuelve a slugs únicos en toda la tabla: las páginas recuperan su slug
+    antiguo y las que aún coinciden con otra reciben un sufijo.
+    """
+    Pagina = apps.get_model('docubase_app', 'Pagina')
+    SlugAntiguo = apps.get_model('docubase_app', 'SlugAntiguo')
+    paginas = {pagina.pk: pagina for pagina in Pagina.objects.only('slug').order_by('pk')}
+    originales = {pk: pagina.slug for pk, pagina in paginas.items()}
+    for antiguo in SlugAntiguo.objects.order_by('pk'):
+        paginas[antiguo.pagina_id].slug = antiguo.slug
+    vistos = set()
+    for pagina in paginas.values():
+        if pagina.slug in vistos:
+            pagina.slug, _ = siguiente_libre(pagina.slug, vistos)
+        vistos.add(pagina.slug)
+    cambiadas = [pagina for pk, pagina in paginas.items() if pagina.slug != originales[pk]]
+    Pagina.objects.bulk_update(cambiadas, ['slug'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0013_comentarios_arbol'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlugAntiguo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(db_index=False, max_length=255)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='pagina',
+            name='proyecto',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='paginas', to='docubase_app.proyecto'),
+        ),
+        migrations.AlterField(
+            model_name='pagina',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='pagina',
+            index=models.Index(fields=['proyecto', '-fecha_actualizacion'], name='pagina_proyecto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(condition=models.Q(('es_publico', True)), fields=['-fecha_actualizacion', '-id'], name='proyecto_publico_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pagina',
+            constraint=models.UniqueConstraint(fields=('proyecto', 'slug'), name='pagina_proyecto_slug_unico'),
+        ),
+        migrations.AddField(
+            model_name='slugantiguo',
+            name='pagina',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slugs_antiguos', to='docubase_app.pagina'),
+        ),
+        migrations.AddField(
+            model_name='slugantiguo',
+            name='proyecto',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='docubase_app.proyecto'),
+        ),
+        migrations.AddConstraint(
+            model_name='slugantiguo',
+            constraint=models.UniqueConstraint(fields=('proyecto', 'slug'), name='slug_antiguo_proyecto_slug_unico'),
+        ),
+        migrations.RunPython(acortar_slugs, restaurar_slugs),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0014_paginas_slug_por_proyecto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagina',
+            name='contenido_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pagina',
+            name='indice',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pagina',
+            name='version_compilacion',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='descripcion_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='version_compilacion',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
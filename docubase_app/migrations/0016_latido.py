@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docubase_app', '0015_contenido_compilado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Latido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+            ],
+        ),
+    ]
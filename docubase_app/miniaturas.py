@@ -0,0 +1,196 @@
+"""
+Miniaturas responsivas de `Proyecto.imagen`.
+
+Por cada imagen subida se generan versiones redimensionadas y recomprimidas en
+WebP y JPEG a varios anchos (`ANCHOS`), que las plantillas sirven con
+`srcset`/`sizes` (etiqueta `imagen_responsive` de `templatetags/imagenes.py`)
+para que el navegador descargue solo el tamaño que necesita.
+
+Las variantes se guardan en el almacenamiento de media como
+
+    miniaturas/<hh>/<hash>-<ancho>.<webp|jpg>
+
+donde `<hash>` es el SHA-256 del contenido de la imagen: dos proyectos con la
+misma imagen comparten variantes, y una variante que ya existe no se vuelve a
+generar. Mientras no están listas, `imagen_hash` está vacío y las plantillas
+usan la imagen original.
+
+La generación no se hace en la petición que sube la imagen: la señal
+post_save encola la tarea 'miniaturas' (ver `tareas.py`). El comando
+`generar_miniaturas` rellena las de las imágenes existentes.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+from . import fragmentos
+from .models import Proyecto
+
+logger = logging.getLogger(__name__)
+
+# Anchos (en píxeles) de las variantes. Nunca se amplía una imagen: solo se
+# generan los anchos menores que el original (o el original, si es más
+# pequeño que todos).
+ANCHOS = tuple(getattr(settings, 'MINIATURAS_ANCHOS', (320, 640, 960, 1280)))
+
+# Formatos de salida: (extensión, formato de Pillow, opciones de guardado).
+FORMATOS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+def nombre_variante(digest, ancho, extension):
+    return f'miniaturas/{digest[:2]}/{digest}-{ancho}.{extension}'
+
+
+def anchos_para(ancho_original):
+    """Anchos a generar para una imagen de `ancho_original` píxeles."""
+    return [a for a in ANCHOS if a < ancho_original] or [ancho_original]
+
+
+def hash_contenido(archivo):
+    """SHA-256 del contenido de un archivo abierto, leído por bloques."""
+    digest = hashlib.sha256()
+    archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+        digest.update(bloque)
+    archivo.seek(0)
+    return digest.hexdigest()
+
+
+def _preparar(imagen, extension):
+    """Pasa la imagen a un modo que admita el formato de salida."""
+    if extension == 'jpg' and imagen.mode not in ('RGB', 'L'):
+        # JPEG no tiene transparencia: se compone sobre fondo blanco.
+        fondo = Image.new('RGB', imagen.size, 'white')
+        rgba = imagen.convert('RGBA')
+        fondo.paste(rgba, mask=rgba.getchannel('A'))
+        return fondo
+    if extension == 'webp' and imagen.mode not in ('RGB', 'RGBA'):
+        return imagen.convert('RGBA' if 'A' in imagen.getbands() else 'RGB')
+    return imagen
+
+
+def generar_variantes(archivo):
+    """
+    Genera (si faltan) las variantes del archivo de imagen abierto `archivo`.
+    Devuelve `(hash, anchos)`.
+    """
+    digest = hash_contenido(archivo)
+    with Image.open(archivo) as original:
+        original = ImageOps.exif_transpose(original)
+        anchos = anchos_para(original.width)
+        for ancho in anchos:
+            pendientes = [
+                (extension, formato, opciones) for extension, formato, opciones in FORMATOS
+                if not default_storage.exists(nombre_variante(digest, ancho, extension))
+            ]
+            if not pendientes:
+                continue
+            alto = max(1, round(original.height * ancho / original.width))
+            reducida = original.resize((ancho, alto), Image.Resampling.LANCZOS)
+            for extension, formato, opciones in pendientes:
+                salida = io.BytesIO()
+                _preparar(reducida, extension).save(salida, formato, **opciones)
+                default_storage.save(nombre_variante(digest, ancho, extension), ContentFile(salida.getvalue()))
+    return digest, anchos
+
+
+def generar_para_proyecto(proyecto_id):
+    """
+    Genera las miniaturas de la imagen actual del proyecto y las registra.
+    Devuelve True si el proyecto quedó con miniaturas.
+    """
+    proyecto = Proyecto.objects.filter(pk=proyecto_id).only('imagen').first()
+    if proyecto is None or not proyecto.imagen:
+        return False
+    nombre = proyecto.imagen.name
+    with proyecto.imagen.open('rb') as archivo:
+        digest, anchos = generar_variantes(archivo)
+    # Solo se registra si la imagen no cambió mientras se generaba. `update()`
+    # no toca `fecha_actualizacion`: el contenido del proyecto es el mismo, y
+    # el proyecto no debe subir en el listado. Las versiones del listado y del
+    # detalle (ver `views._version_lista`) y la clave del fragmento incluyen
+    # `imagen_hash`, así que no dependen de esta invalidación.
+    actualizados = Proyecto.objects.filter(pk=proyecto_id, imagen=nombre).update(
+        imagen_hash=digest, imagen_anchos=anchos)
+    if actualizados:
+        fragmentos.invalidar('proyecto', [proyecto_id])
+    return bool(actualizados)
+
+
+def _inicializar_proceso():
+    # Con el método 'spawn' el proceso hijo no hereda Django configurado.
+    if not apps.ready:
+        django.setup()
+
+
+def _generar_lote(ids):
+    """Genera las miniaturas de varios proyectos; se ejecuta en el pool."""
+    try:
+        generados = 0
+        for proyecto_id in ids:
+            try:
+                generados += generar_para_proyecto(proyecto_id)
+            except Exception:
+                logger.exception('No se pudieron generar las miniaturas del proyecto %s', proyecto_id)
+        return generados, len(ids)
+    finally:
+        connections.close_all()
+
+
+def rellenar(procesos=0, forzar=False, tamano_lote=20, progreso=None):
+    """
+    Genera las miniaturas de los proyectos con imagen que no las tienen (o de
+    todos, con `forzar`). Con `procesos` > 0 los lotes se reparten en un pool
+    de procesos. Devuelve `(generados, total)`.
+    """
+    proyectos = Proyecto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+    if not forzar:
+        proyectos = proyectos.filter(imagen_hash='')
+    ids = list(proyectos.order_by('pk').values_list('pk', flat=True))
+    lotes = [ids[i:i + tamano_lote] for i in range(0, len(ids), tamano_lote)]
+
+    generados = hechos = 0
+    if procesos > 0 and len(lotes) > 1:
+        # Las conexiones abiertas no deben compartirse con los procesos hijos.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso) as pool:
+            resultados = pool.map(_generar_lote, lotes)
+            for n, total_lote in resultados:
+                generados, hechos = generados + n, hechos + total_lote
+                if progreso:
+                    progreso(hechos, len(ids))
+    else:
+        for lote in lotes:
+            for proyecto_id in lote:
+                generados += generar_para_proyecto(proyecto_id)
+                hechos += 1
+            if progreso:
+                progreso(hechos, len(ids))
+    return generados, len(ids)
+
+
+def variantes(proyecto):
+    """
+    Diccionario {extensión: [(url, ancho), ...]} con las miniaturas del
+    proyecto, o {} si aún no existen.
+    """
+    if not proyecto.imagen_hash:
+        return {}
+    return {
+        extension: [
+            (default_storage.url(nombre_variante(proyecto.imagen_hash, ancho, extension)), ancho)
+            for ancho in proyecto.imagen_anchos
+        ]
+        for extension, _, _ in FORMATOS
+    }
@@ -1,7 +1,14 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from ckeditor.fields import RichTextField
-from django.utils.text import slugify
+
+from . import compilacion
+from .comentarios import guardar_en_arbol
+from .slugs import guardar_con_slug_unico
+from .texto import LONGITUD_EXTRACTO, resumir
 
 class Etiqueta(models.Model):
     """
@@ -9,6 +16,10 @@ class Etiqueta(models.Model):
     Ejemplos: 'Python', 'Django', 'API', 'Tutorial'.
     """
     nombre = models.CharField(max_length=50, unique=True)
+    # Número de proyectos y páginas que usan la etiqueta. Se mantienen de forma
+    # incremental desde signals.py (ver etiquetas.py).
+    num_proyectos = models.PositiveIntegerField(default=0, editable=False)
+    num_paginas = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         """Representación en cadena del modelo, muestra el nombre de la etiqueta."""
@@ -24,8 +35,20 @@ class Proyecto(models.Model):
     slug = models.SlugField(unique=True, max_length=255, blank=True)
     # Imagen de portada opcional para el proyecto.
     imagen = models.ImageField(upload_to='proyectos_imagenes/', blank=True, null=True)
+    # Hash SHA-256 del contenido de la imagen y anchos de las miniaturas ya
+    # generadas (ver `miniaturas.py`). Vacíos mientras no estén listas.
+    imagen_hash = models.CharField(max_length=64, blank=True, editable=False)
+    imagen_anchos = models.JSONField(default=list, blank=True, editable=False)
     # Descripción enriquecida usando CKEditor.
     descripcion = RichTextField(blank=True, null=True)
+    # Texto plano precalculado de la descripción, para las tarjetas de los listados.
+    # Se calculan en save(); así los listados no necesitan leer `descripcion`.
+    extracto = models.CharField(max_length=LONGITUD_EXTRACTO + 3, blank=True, editable=False)
+    num_palabras = models.PositiveIntegerField(default=0, editable=False)
+    # Descripción saneada y lista para pintar, compilada en save() (ver
+    # `compilacion.py`), y la versión de las reglas con que se compiló.
+    descripcion_html = models.TextField(blank=True, editable=False)
+    version_compilacion = models.PositiveSmallIntegerField(default=0, editable=False)
     # El usuario que creó el proyecto. Si se borra el usuario, se borran sus proyectos.
     autor = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='proyectos')
@@ -39,29 +62,51 @@ class Proyecto(models.Model):
     # Nombre de un ícono (ej. de FontAwesome) para representar el proyecto.
     icono = models.CharField(max_length=50, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # `index` y `proyectos_lista`: públicos por fecha, con el id como
+            # desempate del cursor (ver `listados.py`). Parcial porque Django
+            # escribe `es_publico=True` como `WHERE es_publico`, que un índice
+            # que empiece por la columna no siempre aprovecha.
+            models.Index(fields=['-fecha_actualizacion', '-id'], condition=models.Q(es_publico=True),
+                         name='proyecto_publico_fecha_idx'),
+        ]
+
     def __str__(self):
         """Representación en cadena, muestra el título del proyecto."""
         return self.titulo
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Recuerda la imagen leída para saber en save() si cambió.
+        instancia._imagen_cargada = instancia.__dict__.get('imagen')
+        return instancia
+
     def save(self, *args, **kwargs):
         """
         Sobrescribe el método save para generar un slug único antes de guardar.
         """
-        # Si el objeto es nuevo y no tiene slug, lo genera a partir del título.
-        if not self.slug:
-            self.slug = slugify(self.titulo)
-        
-        # Lógica para asegurar que el slug sea único.
-        # Si ya existe un proyecto con este slug (excluyendo el propio objeto si se está actualizando),
-        # se le añade un sufijo numérico.
-        original_slug = self.slug
-        num = 1
-        # .exclude(pk=self.pk) es crucial para evitar conflictos al guardar un objeto existente.
-        while Proyecto.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-            self.slug = f'{original_slug}-{num}'
-            num += 1
-        
-        super().save(*args, **kwargs)
+        # Recalcula el extracto en texto plano a partir de la descripción.
+        self.extracto, self.num_palabras = resumir(self.descripcion)
+        self.descripcion_html, _ = compilacion.compilar(self.descripcion)
+        self.version_compilacion = compilacion.VERSION
+
+        # Si la imagen cambió, las miniaturas anteriores ya no valen; las
+        # nuevas se generan fuera de la petición (señal post_save).
+        self._imagen_cambiada = False
+        if 'imagen' in self.__dict__:
+            nombre = self.imagen.name or ''
+            if nombre != (getattr(self, '_imagen_cargada', None) or ''):
+                self.imagen_hash, self.imagen_anchos = '', []
+                self._imagen_cambiada = bool(nombre)
+
+        # Si el objeto es nuevo y no tiene slug, se genera a partir del título.
+        # Si el slug ya lo usa otro proyecto, se le añade un sufijo numérico
+        # (ver `slugs.py`: una sola consulta y reintento ante colisiones).
+        guardar_con_slug_unico(self, lambda: super(Proyecto, self).save(*args, **kwargs))
+        if 'imagen' in self.__dict__:
+            self._imagen_cargada = self.imagen.name
 
 
 class Pagina(models.Model):
@@ -70,40 +115,127 @@ class Pagina(models.Model):
     Puede ser un artículo, un tutorial, una guía, etc.
     """
     titulo = models.CharField(max_length=200)
-    slug = models.SlugField(unique=True, max_length=255, blank=True)
+    # Único dentro de su proyecto (ver Meta): cada proyecto puede tener su
+    # propia "introduccion".
+    slug = models.SlugField(max_length=255, blank=True)
     # Contenido principal de la página, editable con CKEditor.
     contenido = RichTextField(blank=True, null=True)
+    # Texto plano precalculado del contenido (ver Proyecto.extracto).
+    extracto = models.CharField(max_length=LONGITUD_EXTRACTO + 3, blank=True, editable=False)
+    num_palabras = models.PositiveIntegerField(default=0, editable=False)
+    # Contenido compilado (ver Proyecto.descripcion_html) y el índice de sus
+    # títulos: [{"nivel": 2, "texto": "...", "id": "..."}, ...].
+    contenido_html = models.TextField(blank=True, editable=False)
+    indice = models.JSONField(default=list, blank=True, editable=False)
+    version_compilacion = models.PositiveSmallIntegerField(default=0, editable=False)
     # El usuario que creó la página.
     autor = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='paginas')
-    # El proyecto al que pertenece esta página.
+    # El proyecto al que pertenece esta página. Sin índice propio: lo cubren
+    # los índices compuestos de Meta, que empiezan por el proyecto.
     proyecto = models.ForeignKey(
-        Proyecto, on_delete=models.CASCADE, related_name='paginas')
+        Proyecto, on_delete=models.CASCADE, related_name='paginas', db_index=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     es_publica = models.BooleanField(default=True)
     etiquetas = models.ManyToManyField(Etiqueta, related_name='paginas')
 
+    class Meta:
+        indexes = [
+            # Panel "Editadas recientemente" del dashboard.
+            models.Index(fields=['autor', '-fecha_actualizacion'], name='pagina_autor_fecha_idx'),
+            # Páginas de un proyecto por fecha, y su última edición (ETag del proyecto).
+            models.Index(fields=['proyecto', '-fecha_actualizacion'], name='pagina_proyecto_fecha_idx'),
+        ]
+        constraints = [
+            # También es el índice con el que se busca una página por su URL.
+            models.UniqueConstraint(fields=['proyecto', 'slug'], name='pagina_proyecto_slug_unico'),
+        ]
+
     def save(self, *args, **kwargs):
         """
-        Genera un slug único basado en el título de la página antes de guardar.
+        Genera un slug único dentro del proyecto, basado en el título de la
+        página, antes de guardar.
         """
-        if not self.slug:
-            self.slug = slugify(self.titulo)
+        self.extracto, self.num_palabras = resumir(self.contenido)
+        self.contenido_html, self.indice = compilacion.compilar(self.contenido)
+        self.version_compilacion = compilacion.VERSION
 
-        # Lógica para asegurar que el slug sea único.
-        original_slug = self.slug
-        num = 1
-        while Pagina.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-            self.slug = f'{original_slug}-{num}'
-            num += 1
-
-        super().save(*args, **kwargs)
+        guardar_con_slug_unico(self, lambda: super(Pagina, self).save(*args, **kwargs),
+                               Pagina.objects.filter(proyecto_id=self.proyecto_id))
 
     def __str__(self):
         """Representación en cadena, muestra el título de la página."""
         return self.titulo
 
+class SlugAntiguo(models.Model):
+    """
+    Slug que tuvo una página de un proyecto. Las URLs con ese slug
+    redirigen de forma permanente a las de la página con su slug actual.
+    """
+    proyecto = models.ForeignKey(Proyecto, on_delete=models.CASCADE, related_name='+', db_index=False)
+    slug = models.SlugField(max_length=255, db_index=False)
+    pagina = models.ForeignKey(Pagina, on_delete=models.CASCADE, related_name='slugs_antiguos')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['proyecto', 'slug'], name='slug_antiguo_proyecto_slug_unico'),
+        ]
+
+    def __str__(self):
+        return self.slug
+
+
+class Revision(models.Model):
+    """
+    Una versión guardada del contenido de una página (ver `revisiones.py`).
+    `datos` es el contenido completo comprimido (`es_completa`) o, en las
+    demás, un delta comprimido respecto a la revisión anterior; `base` es el
+    número de la revisión completa de la que parte la cadena de deltas.
+    """
+    pagina = models.ForeignKey(Pagina, on_delete=models.CASCADE, related_name='revisiones')
+    # Número correlativo dentro de la página, empezando en 1.
+    numero = models.PositiveIntegerField()
+    base = models.PositiveIntegerField()
+    es_completa = models.BooleanField(default=False)
+    datos = models.BinaryField()
+    titulo = models.CharField(max_length=200)
+    autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    fecha = models.DateTimeField(default=timezone.now)
+    nota = models.CharField(max_length=200, blank=True)
+    # Resumen para el historial, que así no descomprime nada.
+    tamano = models.PositiveIntegerField(default=0)
+    anadidos = models.PositiveIntegerField(default=0)
+    eliminados = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-numero']
+        constraints = [
+            models.UniqueConstraint(fields=['pagina', 'numero'], name='revision_pagina_numero_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.pagina_id} #{self.numero}'
+
+
+class Contenido(models.Model):
+    """
+    Los bytes de un archivo subido, guardados una sola vez por hash SHA-256
+    (ver `subidas.py`). Varios `Archivo` con el mismo contenido, aunque los
+    suban usuarios distintos, comparten un `Contenido`; `referencias` cuenta
+    cuántos lo usan y, al llegar a cero, la tarea 'purgar_contenido' borra
+    el archivo del disco.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    archivo = models.FileField(upload_to='contenidos/')
+    tamano = models.PositiveBigIntegerField()
+    referencias = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
 class Archivo(models.Model):
     """
     Representa un archivo (como una imagen o un documento) que puede ser
@@ -111,6 +243,12 @@ class Archivo(models.Model):
     """
     nombre = models.CharField(max_length=255)
     archivo = models.FileField(upload_to='archivos/')
+    # Contenido deduplicado del archivo. `archivo` apunta al mismo fichero. Es
+    # nulo en los archivos anteriores a las subidas por contenido.
+    contenido = models.ForeignKey(
+        Contenido, on_delete=models.PROTECT, related_name='archivos', blank=True, null=True)
+    tamano = models.PositiveBigIntegerField(default=0)
+    tipo_mime = models.CharField(max_length=100, blank=True)
     subido_por = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='archivos')
     subido_en = models.DateTimeField(auto_now_add=True)
@@ -121,6 +259,27 @@ class Archivo(models.Model):
     def __str__(self):
         return self.nombre
 
+
+class Subida(models.Model):
+    """
+    Una subida por trozos en curso (ver `subidas.py`). Los bytes recibidos se
+    van añadiendo a un archivo parcial; `recibido` indica desde dónde debe
+    continuar el cliente si la conexión se corta.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subidas')
+    pagina = models.ForeignKey(Pagina, on_delete=models.CASCADE, related_name='subidas', blank=True, null=True)
+    nombre = models.CharField(max_length=255)
+    tamano = models.PositiveBigIntegerField()
+    recibido = models.PositiveBigIntegerField(default=0)
+    # El archivo creado al completar la subida.
+    archivo = models.OneToOneField(Archivo, on_delete=models.CASCADE, blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.nombre} ({self.recibido}/{self.tamano})'
+
 # 5. Modelo para los Comentarios
 class Comentario(models.Model):
     """
@@ -139,7 +298,80 @@ class Comentario(models.Model):
     # no se borra, sino que su campo `comentario_padre` se establece en NULL.
     comentario_padre = models.ForeignKey(
         'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='respuestas')
+    # Posición en el árbol (ver `comentarios.py`): la ruta materializada son
+    # los ids de los antepasados y el propio, con ancho fijo, así que ordenar
+    # por ella recorre cada hilo en orden. `hilo` es el id del comentario raíz.
+    ruta = models.CharField(max_length=255, blank=True, editable=False)
+    hilo = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    profundidad = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Hilos de una página y sus comentarios en orden de árbol.
+            models.Index(fields=['pagina', 'hilo', 'ruta'], name='comentario_hilo_ruta_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Guarda el comentario y, si es nuevo, calcula su posición en el árbol
+        (ver `comentarios.py`).
+        """
+        guardar_en_arbol(self, lambda: super(Comentario, self).save(*args, **kwargs))
+
+    def __str__(self):
+        """Representación en cadena para identificar el comentario en el admin, sin consultas."""
+        return f"Comentario {self.pk} en la página {self.pagina_id}"
+
+
+# 6. Cola de tareas en segundo plano
+class Job(models.Model):
+    """
+    Una tarea pendiente de la cola persistente (ver `tareas.py`). Las
+    peticiones solo insertan la fila; el comando `run_worker` la ejecuta.
+    Al terminar con éxito la fila se borra; las que agotan sus intentos se
+    quedan como 'fallido' para poder revisarlas.
+    """
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    FALLIDO = 'fallido'
+    ESTADOS = [(PENDIENTE, 'Pendiente'), (EN_CURSO, 'En curso'), (FALLIDO, 'Fallido')]
+
+    # Nombre de la tarea registrada con `tareas.tarea` y sus argumentos.
+    tarea = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=dict, blank=True)
+    # Clave de deduplicación: como mucho hay un trabajo pendiente por clave, así
+    # que varias ediciones seguidas de la misma página generan un único trabajo.
+    clave = models.CharField(max_length=200, null=True, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=5)
+    # No se ejecuta antes de esta fecha (reintentos con espera creciente).
+    ejecutar_despues = models.DateTimeField(default=timezone.now)
+    # Mientras está 'en_curso', si el worker muere, otro puede reclamarlo
+    # pasada esta fecha.
+    bloqueado_hasta = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'ejecutar_despues'], name='job_estado_fecha_idx')]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['clave'], condition=models.Q(estado='pendiente'), name='job_clave_pendiente_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.tarea} ({self.estado})'
+
+
+# 7. Latido para medir el retraso de las réplicas
+class Latido(models.Model):
+    """
+    Una sola fila cuya fecha se actualiza en la base primaria cada
+    `REPLICAS_INTERVALO` segundos (ver `replicas.py`). Leída en una réplica,
+    dice hasta qué momento llega lo replicado.
+    """
+    fecha = models.DateTimeField()
 
     def __str__(self):
-        """Representación en cadena para identificar el comentario en el admin."""
-        return f"Comentario de {self.autor.username} en {self.pagina.titulo}"
+        return self.fecha.isoformat()
@@ -0,0 +1,116 @@
+"""
+Consultas del panel de control (`views.dashboard`).
+
+Los totales por proyecto se calculan con subconsultas correlacionadas dentro
+de una única consulta, en lugar de un COUNT por fila desde la plantilla. Se
+usan subconsultas y no `Count()` sobre varios JOIN porque estos multiplican
+las filas (páginas x comentarios x archivos) y falsean los totales.
+
+El resumen del usuario se guarda en la caché `PANEL_CACHE_ALIAS`, que tiene
+que ser compartida por todos los procesos (ver `comprobaciones.py`): las
+señales lo borran en el proceso que escribe, y los demás workers deben
+dejar de verlo también.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from . import rendimiento
+from .models import Archivo, Comentario, Pagina, Proyecto
+
+# Proyectos por página en el panel.
+PROYECTOS_POR_PAGINA = 20
+
+# Número de páginas en el panel "Editadas recientemente".
+NUM_PAGINAS_RECIENTES = 8
+
+# Segundos que se guarda el resumen de cada usuario (se invalida al escribir).
+TTL_RESUMEN = 60 * 60
+
+
+def _contar(modelo, campo_proyecto):
+    """Subconsulta con el número de filas de `modelo` de cada proyecto."""
+    subconsulta = (
+        modelo.objects.filter(**{campo_proyecto: OuterRef('pk')})
+        .order_by()
+        .values(campo_proyecto)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(subconsulta, output_field=IntegerField()), 0)
+
+
+def proyectos_con_totales(usuario):
+    """
+    Proyectos de `usuario` con `num_paginas`, `num_comentarios`,
+    `num_archivos` y `ultima_edicion` (la página editada más recientemente),
+    todo en una consulta.
+    """
+    ultima_edicion = (
+        Pagina.objects.filter(proyecto=OuterRef('pk'))
+        .order_by('-fecha_actualizacion')
+        .values('fecha_actualizacion')[:1]
+    )
+    return (
+        Proyecto.objects.filter(autor=usuario)
+        .only('titulo', 'slug', 'fecha_actualizacion', 'es_publico')
+        .annotate(
+            num_paginas=_contar(Pagina, 'proyecto'),
+            num_comentarios=_contar(Comentario, 'pagina__proyecto'),
+            num_archivos=_contar(Archivo, 'pagina__proyecto'),
+            ultima_edicion=Subquery(ultima_edicion),
+        )
+        .order_by('-fecha_actualizacion', '-id')
+    )
+
+
+def paginas_recientes(usuario):
+    """
+    Últimas páginas editadas por `usuario`. Usa el índice
+    (autor, fecha_actualizacion) de `Pagina`.
+    """
+    return (
+        Pagina.objects.filter(autor=usuario)
+        .select_related('proyecto')
+        .only('titulo', 'slug', 'fecha_actualizacion', 'proyecto__titulo', 'proyecto__slug')
+        .order_by('-fecha_actualizacion')[:NUM_PAGINAS_RECIENTES]
+    )
+
+
+def _cache():
+    return caches[getattr(settings, 'PANEL_CACHE_ALIAS', 'default')]
+
+
+def _clave_resumen(usuario_id):
+    return f'panel:resumen:{usuario_id}'
+
+
+def resumen(usuario):
+    """
+    Totales del usuario (proyectos, páginas, comentarios recibidos y
+    palabras escritas). Se guardan en caché hasta que `invalidar_resumen`
+    los borra tras una escritura.
+    """
+    clave = _clave_resumen(usuario.pk)
+    datos = _cache().get(clave)
+    rendimiento.contar('cache_fallos' if datos is None else 'cache_aciertos')
+    if datos is None:
+        proyectos = Proyecto.objects.filter(autor=usuario).aggregate(total=Count('pk'))
+        paginas = Pagina.objects.filter(proyecto__autor=usuario).aggregate(
+            total=Count('pk'), palabras=Coalesce(Sum('num_palabras'), 0), ultima=Max('fecha_actualizacion'))
+        comentarios = Comentario.objects.filter(pagina__proyecto__autor=usuario).aggregate(total=Count('pk'))
+        datos = {
+            'proyectos': proyectos['total'],
+            'paginas': paginas['total'],
+            'palabras': paginas['palabras'],
+            'comentarios': comentarios['total'],
+            'ultima_edicion': paginas['ultima'],
+        }
+        _cache().set(clave, datos, TTL_RESUMEN)
+    return datos
+
+
+def invalidar_resumen(*usuario_ids):
+    """Borra de la caché el resumen de los usuarios dados."""
+    _cache().delete_many([_clave_resumen(pk) for pk in set(usuario_ids) if pk is not None])
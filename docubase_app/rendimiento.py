@@ -0,0 +1,291 @@
+"""
+Medición del rendimiento de cada petición.
+
+`MedicionMiddleware` mide una muestra de las peticiones
+(`RENDIMIENTO_MUESTREO`, entre 0 y 1) y para cada una registra:
+
+- el número de consultas SQL y el tiempo total en la base de datos, con
+  `connection.execute_wrapper` en todas las conexiones;
+- las consultas duplicadas (mismo SQL con los mismos parámetros), el síntoma
+  habitual de un N+1;
+- el tiempo de renderizado de plantillas (solo la más externa, para no
+  contar dos veces las anidadas);
+- los aciertos y fallos de caché que anoten los módulos con `contar()`.
+
+El resultado se envía en la cabecera `Server-Timing` (la muestran las
+herramientas de desarrollo del navegador; solo con `RENDIMIENTO_SERVER_TIMING`,
+que por defecto solo está activo en desarrollo, porque cualquier cliente la
+vería), en una línea JSON del logger
+`docubase_app.rendimiento` y en unas estadísticas por nombre de URL que
+consulta `estadisticas_rendimiento` (p50/p95/p99 de los últimos
+`RENDIMIENTO_VENTANA` tiempos de este proceso).
+
+Las peticiones que no entran en la muestra solo pagan un `random()`. El
+estado de la petición vive en una ContextVar, así que `contar()` y
+`medir()` no hacen nada fuera de una petición medida.
+
+El middleware funciona en los dos modos (WSGI y ASGI): bajo ASGI no obliga a
+Django a pasar la petición por un hilo. Las conexiones son de cada hilo y el
+ORM asíncrono consulta desde el hilo de `sync_to_async` de la petición, así
+que `aobservar()` instala allí los envoltorios (dos saltos de hilo por
+petición medida).
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_actual = ContextVar('medicion_rendimiento', default=None)
+
+# Tiempos recientes por nombre de URL (de este proceso).
+_tiempos = defaultdict(lambda: deque(maxlen=_ventana()))
+_totales = defaultdict(Counter)
+_cerrojo = threading.Lock()
+
+
+def _muestreo():
+    return getattr(settings, 'RENDIMIENTO_MUESTREO', 1.0)
+
+
+def _ventana():
+    return getattr(settings, 'RENDIMIENTO_VENTANA', 1000)
+
+
+def _umbral_duplicadas():
+    return getattr(settings, 'RENDIMIENTO_UMBRAL_DUPLICADAS', 5)
+
+
+class Medicion:
+    """Lo que se mide durante una petición."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_bd = 0.0
+        self.repeticiones = Counter()
+        # Tiempos por nombre de `medir()` ('plantillas', ...).
+        self.tiempos = Counter()
+        self.contadores = Counter()
+        self._abiertas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Envoltorio de `execute_wrapper`: cuenta y cronometra cada consulta."""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_bd += time.perf_counter() - inicio
+            self.consultas += 1
+            self.repeticiones[(sql, repr(params))] += 1
+
+    @property
+    def duplicadas(self):
+        """Consultas que repiten otra anterior idéntica."""
+        return sum(n - 1 for n in self.repeticiones.values() if n > 1)
+
+    def mas_repetidas(self, cuantas=3):
+        return [(sql, n) for (sql, _), n in self.repeticiones.most_common(cuantas) if n > 1]
+
+
+# --- Ganchos para el resto de módulos ---
+
+def contar(nombre, cantidad=1):
+    """Suma `cantidad` al contador `nombre` de la petición medida, si la hay."""
+    medicion = _actual.get()
+    if medicion is not None:
+        medicion.contadores[nombre] += cantidad
+
+
+@contextmanager
+def medir(nombre):
+    """
+    Cronometra el bloque y lo suma al tiempo `nombre` de la petición medida.
+    Si el bloque se anida dentro de otro del mismo nombre, solo cuenta el
+    más externo.
+    """
+    medicion = _actual.get()
+    if medicion is None:
+        yield
+        return
+    medicion._abiertas[nombre] += 1
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion._abiertas[nombre] -= 1
+        if not medicion._abiertas[nombre]:
+            medicion.tiempos[nombre] += time.perf_counter() - inicio
+
+
+def instalar():
+    """Mide el renderizado de las plantillas de Django. Se llama una vez al arrancar."""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_medido', False):
+        return
+    render_original = Template.render
+
+    def render(self, *args, **kwargs):
+        with medir('plantillas'):
+            return render_original(self, *args, **kwargs)
+
+    render._medido = True
+    Template.render = render
+
+
+@contextmanager
+def observar():
+    """
+    Mide todo lo que ocurre dentro del bloque (consultas en todas las
+    conexiones, `medir()` y `contar()`) y devuelve la `Medicion`.
+    """
+    medicion = Medicion()
+    token = _actual.set(medicion)
+    try:
+        with ExitStack() as pila:
+            _envolver_conexiones(pila, medicion)
+            yield medicion
+    finally:
+        _actual.reset(token)
+
+
+@asynccontextmanager
+async def aobservar():
+    """`observar()` para código asíncrono (ver el docstring del módulo)."""
+    medicion = Medicion()
+    token = _actual.set(medicion)
+    pila = ExitStack()
+    try:
+        await sync_to_async(_envolver_conexiones)(pila, medicion)
+        try:
+            yield medicion
+        finally:
+            await sync_to_async(pila.close)()
+    finally:
+        _actual.reset(token)
+
+
+def _envolver_conexiones(pila, medicion):
+    for alias in connections:
+        pila.enter_context(connections[alias].execute_wrapper(medicion))
+
+
+# --- Middleware ---
+
+class MedicionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self._acall(request)
+        if random.random() >= _muestreo():
+            return self.get_response(request)
+        with observar() as medicion:
+            response = self.get_response(request)
+        return self._terminar(request, response, medicion)
+
+    async def _acall(self, request):
+        if random.random() >= _muestreo():
+            return await self.get_response(request)
+        async with aobservar() as medicion:
+            response = await self.get_response(request)
+        return self._terminar(request, response, medicion)
+
+    def _terminar(self, request, response, medicion):
+        total = time.perf_counter() - medicion.inicio
+        ruta = request.resolver_match.view_name if request.resolver_match else '(sin ruta)'
+        if getattr(settings, 'RENDIMIENTO_SERVER_TIMING', False):
+            response['Server-Timing'] = _server_timing(medicion, total)
+        _registrar(ruta, request, response, medicion, total)
+        return response
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 2)
+
+
+def _server_timing(medicion, total):
+    partes = [
+        f'total;dur={_ms(total)}',
+        f'db;dur={_ms(medicion.tiempo_bd)};desc="{medicion.consultas} consultas, {medicion.duplicadas} duplicadas"',
+    ]
+    partes += [f'{nombre};dur={_ms(segundos)}' for nombre, segundos in sorted(medicion.tiempos.items())]
+    aciertos, fallos = medicion.contadores['cache_aciertos'], medicion.contadores['cache_fallos']
+    if aciertos or fallos:
+        partes.append(f'cache;desc="{aciertos} aciertos, {fallos} fallos"')
+    return ', '.join(partes)
+
+
+def _registrar(ruta, request, response, medicion, total):
+    datos = {
+        'ruta': ruta,
+        'metodo': request.method,
+        'estado': response.status_code,
+        'total_ms': _ms(total),
+        'bd_ms': _ms(medicion.tiempo_bd),
+        'consultas': medicion.consultas,
+        'duplicadas': medicion.duplicadas,
+        **{f'{nombre}_ms': _ms(segundos) for nombre, segundos in medicion.tiempos.items()},
+        **medicion.contadores,
+    }
+    if medicion.duplicadas >= _umbral_duplicadas():
+        datos['mas_repetidas'] = [{'sql': sql[:200], 'veces': n} for sql, n in medicion.mas_repetidas()]
+        logger.warning(json.dumps(datos, ensure_ascii=False))
+    else:
+        logger.info(json.dumps(datos, ensure_ascii=False))
+    with _cerrojo:
+        _tiempos[ruta].append(total)
+        acumulado = _totales[ruta]
+        acumulado['peticiones'] += 1
+        acumulado['consultas'] += medicion.consultas
+        acumulado['duplicadas'] += medicion.duplicadas
+        acumulado['bd_ms'] += _ms(medicion.tiempo_bd)
+
+
+# --- Estadísticas ---
+
+def percentil(ordenados, p):
+    """Percentil `p` (0-100) de una lista ordenada, por el método del rango más cercano."""
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+def estadisticas():
+    """
+    Por nombre de URL: peticiones medidas, p50/p95/p99 del tiempo total
+    (sobre las últimas `RENDIMIENTO_VENTANA`) y medias de consultas,
+    duplicadas y tiempo en la base de datos. Solo de este proceso.
+    """
+    with _cerrojo:
+        copia = {ruta: sorted(tiempos) for ruta, tiempos in _tiempos.items()}
+        totales = {ruta: dict(acumulado) for ruta, acumulado in _totales.items()}
+    resultado = {}
+    for ruta, tiempos in sorted(copia.items()):
+        acumulado, n = totales[ruta], totales[ruta]['peticiones']
+        resultado[ruta] = {
+            'peticiones': n,
+            'p50_ms': _ms(percentil(tiempos, 50)),
+            'p95_ms': _ms(percentil(tiempos, 95)),
+            'p99_ms': _ms(percentil(tiempos, 99)),
+            'consultas_media': round(acumulado['consultas'] / n, 2),
+            'duplicadas_media': round(acumulado['duplicadas'] / n, 2),
+            'bd_ms_media': round(acumulado['bd_ms'] / n, 2),
+        }
+    return {'muestreo': _muestreo(), 'rutas': resultado}
@@ -0,0 +1,285 @@
+"""
+Reparto de las lecturas entre la base primaria y sus réplicas.
+
+`RouterReplicas` (en `DATABASE_ROUTERS`) manda todas las escrituras a la
+primaria ('default'). Las lecturas van a una réplica solo cuando
+`ReplicasMiddleware` lo permite para la petición en curso:
+
+- la petición es GET o HEAD y la vista no está marcada con `usar_primaria`
+  (los formularios de edición: lo que se edita tiene que ser lo último);
+- el cliente no está en su ventana de primaria fija. Cuando una petición
+  escribe, la respuesta lleva la cookie `COOKIE` durante `ventana_primaria()`
+  segundos y mientras tanto las lecturas de ese cliente van a la primaria,
+  así que ve sus propios cambios. Es una cookie y no un dato de sesión
+  porque la sesión también se lee de la base;
+- hay alguna réplica sana.
+
+Fuera de una petición (comandos, `run_worker`) y dentro de una transacción,
+todo va a la primaria. Cada petición elige una réplica al azar y hace todas
+sus lecturas en ella, y los objetos relacionados se leen de la misma base
+que el objeto del que parten.
+
+Salud y retraso: cada `REPLICAS_INTERVALO` segundos, la primera petición
+que llega a un proceso escribe la hora en el `Latido` de la primaria y lee
+el de cada réplica (`comprobar()`). Una réplica que falla, o cuyo latido va
+más de `REPLICAS_RETRASO_MAXIMO` segundos por detrás, queda fuera hasta la
+siguiente comprobación; si no queda ninguna, se lee de la primaria. Como el
+retraso solo se mide cada intervalo, una réplica admitida puede ir hasta
+`REPLICAS_RETRASO_MAXIMO + REPLICAS_INTERVALO` segundos por detrás: esa es
+la duración de la ventana de primaria fija. Conviene poner un tiempo de
+conexión corto en las URLs de las réplicas (`?connect_timeout=2` en
+PostgreSQL), porque la comprobación se hace dentro de una petición.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, connections
+from django.utils import timezone
+
+from .models import Latido
+
+logger = logging.getLogger(__name__)
+
+PRIMARIA = DEFAULT_DB_ALIAS
+# Cookie de la ventana de primaria fija.
+COOKIE = 'docubase_primaria'
+METODOS_LECTURA = ('GET', 'HEAD')
+
+_peticion = ContextVar('replicas_peticion', default=None)
+
+# Salud de cada réplica vista por este proceso.
+_salud = {}
+_ultima_comprobacion = 0.0
+_comprobando = threading.Lock()
+
+
+def replicas():
+    """Alias de las réplicas configuradas (ver `REPLICAS` en settings)."""
+    return getattr(settings, 'REPLICAS', [])
+
+
+def _retraso_maximo():
+    return getattr(settings, 'REPLICAS_RETRASO_MAXIMO', 30)
+
+
+def _intervalo():
+    return getattr(settings, 'REPLICAS_INTERVALO', 5)
+
+
+def ventana_primaria():
+    """Segundos que un cliente lee de la primaria después de escribir."""
+    return _retraso_maximo() + _intervalo()
+
+
+@dataclass
+class Salud:
+    """Resultado de la última comprobación de una réplica."""
+    sana: bool
+    # Segundos que va por detrás de la primaria, o None si no se pudo medir.
+    retraso: float | None
+    comprobada: datetime
+    error: str = ''
+
+
+@dataclass
+class _Peticion:
+    """
+    Reparto de la petición en curso. Es mutable a propósito: el ORM
+    asíncrono consulta desde otro hilo con una copia del contexto, pero el
+    objeto es el mismo, así que sus escrituras también se anotan aquí.
+    """
+    # Réplica de la que se lee, o None si todo va a la primaria.
+    replica: str | None
+    escrituras: bool = False
+
+
+# --- Router ---
+
+class RouterReplicas:
+    def db_for_read(self, model, **hints):
+        peticion = _peticion.get()
+        if peticion is None or peticion.replica is None:
+            return PRIMARIA
+        # Lo relacionado con un objeto se lee de la base de la que salió el objeto.
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            return instancia._state.db
+        # Dentro de una transacción hay que ver lo que ella misma ha escrito.
+        if connections[PRIMARIA].in_atomic_block:
+            return PRIMARIA
+        return peticion.replica
+
+    def db_for_write(self, model, **hints):
+        peticion = _peticion.get()
+        if peticion is not None:
+            peticion.escrituras = True
+        return PRIMARIA
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por la replicación.
+        return db == PRIMARIA
+
+
+# --- Salud y retraso ---
+
+def _toca_comprobar():
+    return bool(replicas()) and time.monotonic() - _ultima_comprobacion >= _intervalo()
+
+
+def _medir(alias, ahora):
+    try:
+        fecha = Latido.objects.using(alias).filter(pk=1).values_list('fecha', flat=True).first()
+    except DatabaseError as exc:
+        # La conexión puede haber quedado inservible: la siguiente consulta abre otra.
+        connections[alias].close()
+        return Salud(False, None, ahora, str(exc))
+    if fecha is None:
+        return Salud(False, None, ahora, 'sin latido')
+    retraso = max(0.0, (ahora - fecha).total_seconds())
+    return Salud(retraso <= _retraso_maximo(), retraso, ahora)
+
+
+def latir(ahora=None):
+    """Escribe la hora (o `ahora`) en el latido de la primaria."""
+    ahora = ahora or timezone.now()
+    try:
+        if not Latido.objects.using(PRIMARIA).filter(pk=1).update(fecha=ahora):
+            Latido.objects.using(PRIMARIA).create(pk=1, fecha=ahora)
+    except IntegrityError:
+        # Otro proceso lo creó a la vez: su fecha vale igual.
+        pass
+
+
+def comprobar():
+    """
+    Escribe el latido en la primaria y mide la salud y el retraso de cada
+    réplica. Si otro hilo ya está comprobando, no hace nada: mientras tanto
+    vale el estado anterior.
+    """
+    global _ultima_comprobacion
+    if not _comprobando.acquire(blocking=False):
+        return
+    try:
+        _ultima_comprobacion = time.monotonic()
+        ahora = timezone.now()
+        try:
+            latir(ahora)
+        except DatabaseError:
+            logger.exception('No se pudo escribir el latido en la base primaria.')
+        for alias in replicas():
+            salud = _medir(alias, ahora)
+            if _salud.get(alias, salud).sana != salud.sana:
+                logger.warning('Réplica %s %s (retraso %s s%s).', alias, 'sana' if salud.sana else 'descartada',
+                               salud.retraso, f', {salud.error}' if salud.error else '')
+            _salud[alias] = salud
+    finally:
+        _comprobando.release()
+
+
+def sanas():
+    """Réplicas que pasaron la última comprobación."""
+    return [alias for alias in replicas() if alias in _salud and _salud[alias].sana]
+
+
+def estado():
+    """Salud y retraso de cada réplica según este proceso, para las estadísticas."""
+    return {
+        'ventana_primaria_s': ventana_primaria(),
+        'retraso_maximo_s': _retraso_maximo(),
+        'replicas': {
+            alias: {
+                'sana': salud.sana,
+                'retraso_s': round(salud.retraso, 3) if salud.retraso is not None else None,
+                'comprobada': salud.comprobada.isoformat(),
+                'error': salud.error,
+            } if (salud := _salud.get(alias)) else None
+            for alias in replicas()
+        },
+    }
+
+
+# --- Middleware y decorador ---
+
+def _elegir(request):
+    if request.method not in METODOS_LECTURA or COOKIE in request.COOKIES:
+        return None
+    candidatas = sanas()
+    return random.choice(candidatas) if candidatas else None
+
+
+def _terminar(request, response, peticion):
+    if peticion.escrituras:
+        response.set_cookie(COOKIE, '1', max_age=ventana_primaria(), httponly=True, samesite='Lax',
+                            secure=request.is_secure())
+    return response
+
+
+class ReplicasMiddleware:
+    """
+    Decide de qué base lee cada petición y, si escribe, abre la ventana de
+    primaria fija del cliente. Sin réplicas configuradas no hace nada.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self._acall(request)
+        if not replicas():
+            return self.get_response(request)
+        if _toca_comprobar():
+            comprobar()
+        peticion = _Peticion(_elegir(request))
+        token = _peticion.set(peticion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        return _terminar(request, response, peticion)
+
+    async def _acall(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        if _toca_comprobar():
+            await sync_to_async(comprobar)()
+        peticion = _Peticion(_elegir(request))
+        token = _peticion.set(peticion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        return _terminar(request, response, peticion)
+
+
+def usar_primaria(vista):
+    """
+    Decorador para vistas cuyas lecturas tienen que ver lo último aunque la
+    petición sea GET: los formularios de edición (lo que se muestra es lo
+    que se guardará) y el estado de las subidas. Debe ir por fuera de
+    `login_required`, para que también el usuario se lea de la primaria.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        peticion = _peticion.get()
+        if peticion is not None:
+            peticion.replica = None
+        return vista(request, *args, **kwargs)
+    return envoltura
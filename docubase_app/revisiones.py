@@ -0,0 +1,275 @@
+"""
+Historial de revisiones de `Pagina` con deltas comprimidos.
+
+Cada guardado desde las vistas añade una `Revision`. Guardar el contenido
+completo en cada una haría crecer la tabla con el tamaño de la página por
+cada edición, así que la mayoría de revisiones guardan solo un delta respecto
+a la anterior:
+
+- El contenido se trocea tras cada `>` y cada salto de línea, de modo que el
+  HTML de CKEditor (a menudo en pocas líneas muy largas) da trozos pequeños.
+- El delta es la lista de operaciones de `difflib.SequenceMatcher` sobre esos
+  trozos: un entero positivo copia n trozos de la revisión anterior, uno
+  negativo se salta n, y una cadena es texto insertado. Se guarda como JSON
+  comprimido con zlib, así que ocupa en proporción al cambio.
+- Cada `INTERVALO_COMPLETA` revisiones (o antes, si los deltas acumulados
+  ya pesan más que el contenido) se guarda una revisión completa. Cualquier
+  revisión se reconstruye desde la última completa aplicando como mucho
+  `INTERVALO_COMPLETA` deltas, leídos con una sola consulta.
+
+El comando `podar_revisiones` borra las revisiones antiguas (convirtiendo en
+completa la primera que se conserva) y recompacta las cadenas de deltas.
+"""
+import difflib
+import json
+import re
+import zlib
+from itertools import zip_longest
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Pagina, Revision
+
+# Máximo de deltas que se aplican para reconstruir una revisión.
+INTERVALO_COMPLETA = getattr(settings, 'REVISIONES_INTERVALO_COMPLETA', 20)
+# Líneas sin cambios que se muestran alrededor de cada cambio al comparar.
+LINEAS_CONTEXTO = 3
+
+_CORTE = re.compile(r'(?<=[>\n])')
+
+
+def trocear(texto):
+    """Divide el texto tras cada `>` y cada salto de línea. `''.join()` lo recompone."""
+    return [t for t in _CORTE.split(texto or '') if t]
+
+
+# --- Deltas ---
+
+def calcular_delta(anterior, nuevo):
+    """
+    Devuelve `(operaciones, anadidos, eliminados)`: el delta que convierte
+    `anterior` en `nuevo` y los caracteres añadidos y eliminados.
+    """
+    a, b = trocear(anterior), trocear(nuevo)
+    operaciones, anadidos, eliminados = [], 0, 0
+    for etiqueta, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if etiqueta == 'equal':
+            operaciones.append(i2 - i1)
+            continue
+        if i2 > i1:
+            operaciones.append(i1 - i2)
+            eliminados += sum(len(t) for t in a[i1:i2])
+        if j2 > j1:
+            insertado = ''.join(b[j1:j2])
+            operaciones.append(insertado)
+            anadidos += len(insertado)
+    return operaciones, anadidos, eliminados
+
+
+def aplicar_delta(anterior, operaciones):
+    """Aplica a `anterior` las operaciones de `calcular_delta`."""
+    trozos = trocear(anterior)
+    resultado, posicion = [], 0
+    for operacion in operaciones:
+        if isinstance(operacion, str):
+            resultado.append(operacion)
+        elif operacion > 0:
+            resultado.extend(trozos[posicion:posicion + operacion])
+            posicion += operacion
+        else:
+            posicion -= operacion
+    return ''.join(resultado)
+
+
+def _comprimir_completa(texto):
+    return zlib.compress(texto.encode('utf-8'), 9)
+
+
+def _comprimir_delta(operaciones):
+    return zlib.compress(json.dumps(operaciones, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def _decodificar(es_completa, datos, anterior):
+    datos = zlib.decompress(bytes(datos)).decode('utf-8')
+    return datos if es_completa else aplicar_delta(anterior, json.loads(datos))
+
+
+# --- Reconstrucción ---
+
+def _cadena(pagina_id, numero):
+    """
+    Filas `(numero, base, es_completa, datos)` desde la revisión completa
+    de la que depende `numero` hasta ella. Normalmente una consulta: la base
+    está como mucho `INTERVALO_COMPLETA` revisiones atrás (salvo si el
+    intervalo se redujo sin recompactar).
+    """
+    columnas = ('numero', 'base', 'es_completa', 'datos')
+    revisiones = Revision.objects.filter(pagina_id=pagina_id, numero__lte=numero).order_by('numero')
+    filas = list(revisiones.filter(numero__gte=numero - INTERVALO_COMPLETA).values_list(*columnas))
+    if not filas or filas[-1][0] != numero:
+        raise Revision.DoesNotExist(f'La página {pagina_id} no tiene la revisión {numero}.')
+    base = filas[-1][1]
+    if filas[0][0] > base:
+        filas = list(revisiones.filter(numero__gte=base).values_list(*columnas))
+    return [fila for fila in filas if fila[0] >= base]
+
+
+def _estado(pagina_id, numero):
+    """
+    `(contenido, acumulado)` de la revisión `numero`: su contenido y los
+    bytes de los deltas de su cadena desde la última revisión completa.
+    """
+    texto, acumulado = '', 0
+    for _, _, es_completa, datos in _cadena(pagina_id, numero):
+        texto = _decodificar(es_completa, datos, texto)
+        acumulado = 0 if es_completa else acumulado + len(datos)
+    return texto, acumulado
+
+
+def reconstruir(pagina_id, numero):
+    """Contenido de la revisión `numero` de la página."""
+    return _estado(pagina_id, numero)[0]
+
+
+def _nueva(pagina_id, ultima, texto_ultima, acumulado, titulo, texto, autor, nota=''):
+    """
+    Crea (sin guardar) la revisión siguiente a `ultima`, o la primera. Es
+    completa si no hay anterior, si la cadena ya tiene `INTERVALO_COMPLETA`
+    deltas o si los deltas desde la última completa (`acumulado` bytes) más
+    el nuevo pesan más que el propio contenido.
+    """
+    numero = ultima.numero + 1 if ultima else 1
+    revision = Revision(pagina_id=pagina_id, numero=numero, titulo=titulo[:200], autor=autor,
+                        nota=nota[:200], tamano=len(texto))
+    if ultima is None:
+        revision.anadidos = len(texto)
+        return _completa(revision, texto)
+    operaciones, revision.anadidos, revision.eliminados = calcular_delta(texto_ultima, texto)
+    revision.datos = _comprimir_delta(operaciones)
+    if numero - ultima.base > INTERVALO_COMPLETA or acumulado + len(revision.datos) > revision.tamano:
+        return _completa(revision, texto)
+    revision.base = ultima.base
+    return revision
+
+
+def _completa(revision, texto):
+    revision.es_completa, revision.base = True, revision.numero
+    revision.datos = _comprimir_completa(texto)
+    return revision
+
+
+# --- API del módulo ---
+
+def registrar(pagina, autor, anterior=None, nota=''):
+    """
+    Añade una revisión con el título y contenido actuales de `pagina`, si
+    cambiaron respecto a la última. `anterior`, si se indica, es el
+    `(titulo, contenido)` que tenía la página antes de editarla: si no
+    coincide con la última revisión (páginas importadas o editadas desde el
+    admin) se registra primero, para que el historial no pierda ese estado.
+    Devuelve la revisión creada o None.
+    """
+    with transaction.atomic():
+        # Bloquea la página: dos guardados simultáneos no pueden numerar igual.
+        Pagina.objects.select_for_update().filter(pk=pagina.pk).values_list('pk').first()
+        ultima = (Revision.objects.filter(pagina_id=pagina.pk).order_by('-numero')
+                  .only('numero', 'base', 'titulo').first())
+        texto_ultima, acumulado = _estado(pagina.pk, ultima.numero) if ultima else (None, 0)
+
+        if anterior is not None:
+            titulo_anterior, texto_anterior = anterior[0], anterior[1] or ''
+            if ultima is None or (ultima.titulo, texto_ultima) != (titulo_anterior, texto_anterior):
+                ultima = _nueva(pagina.pk, ultima, texto_ultima, acumulado, titulo_anterior, texto_anterior,
+                                None, nota='Cambios anteriores al historial')
+                ultima.save()
+                texto_ultima = texto_anterior
+                acumulado = 0 if ultima.es_completa else acumulado + len(ultima.datos)
+
+        texto = pagina.contenido or ''
+        if ultima is not None and ultima.titulo == pagina.titulo and texto_ultima == texto:
+            return None
+        revision = _nueva(pagina.pk, ultima, texto_ultima, acumulado, pagina.titulo, texto, autor, nota)
+        revision.save()
+        return revision
+
+
+def restaurar(pagina, numero, autor):
+    """Vuelve la página al título y contenido de la revisión `numero`."""
+    revision = Revision.objects.only('titulo').get(pagina_id=pagina.pk, numero=numero)
+    pagina.titulo = revision.titulo
+    pagina.contenido = reconstruir(pagina.pk, numero)
+    pagina.save()
+    return registrar(pagina, autor, nota=f'Restaurada la revisión {numero}')
+
+
+def comparar(anterior, nuevo, contexto=LINEAS_CONTEXTO):
+    """
+    Filas para mostrar dos versiones lado a lado. Cada fila es un diccionario
+    con `tipo` ('igual', 'cambio', 'eliminado', 'anadido' o 'salto' entre
+    grupos de cambios), `izquierda`/`derecha` y sus números de línea.
+    """
+    a = [t.rstrip('\n') for t in trocear(anterior)]
+    b = [t.rstrip('\n') for t in trocear(nuevo)]
+    filas = []
+    tipos = {'equal': 'igual', 'replace': 'cambio', 'delete': 'eliminado', 'insert': 'anadido'}
+    for grupo in difflib.SequenceMatcher(None, a, b).get_grouped_opcodes(contexto):
+        if filas:
+            filas.append({'tipo': 'salto'})
+        for etiqueta, i1, i2, j1, j2 in grupo:
+            pares = zip_longest(range(i1, i2), range(j1, j2))
+            for i, j in pares:
+                filas.append({
+                    'tipo': tipos[etiqueta],
+                    'izquierda': a[i] if i is not None else None, 'num_izquierda': i + 1 if i is not None else None,
+                    'derecha': b[j] if j is not None else None, 'num_derecha': j + 1 if j is not None else None,
+                })
+    return filas
+
+
+# --- Poda y compactación ---
+
+def podar(pagina_id, conservar, antes_de=None):
+    """
+    Borra las revisiones más antiguas de la página, salvo las `conservar`
+    más recientes y, si se indica `antes_de`, las posteriores a esa fecha. La
+    primera revisión que queda pasa a ser completa. Devuelve cuántas borró.
+    """
+    with transaction.atomic():
+        candidatas = Revision.objects.filter(pagina_id=pagina_id).order_by('-numero')[conservar:]
+        candidatas = Revision.objects.filter(pk__in=list(candidatas.values_list('pk', flat=True)))
+        if antes_de is not None:
+            candidatas = candidatas.filter(fecha__lt=antes_de)
+        corte = max(candidatas.values_list('numero', flat=True), default=None)
+        if corte is None:
+            return 0
+        primera = Revision.objects.filter(pagina_id=pagina_id, numero=corte + 1).first()
+        if primera is not None and not primera.es_completa:
+            primera.datos = _comprimir_completa(reconstruir(pagina_id, primera.numero))
+            primera.es_completa = True
+            primera.save(update_fields=['datos', 'es_completa'])
+            Revision.objects.filter(pagina_id=pagina_id, numero__gt=corte, base__lte=corte).update(base=corte + 1)
+        borradas, _ = Revision.objects.filter(pagina_id=pagina_id, numero__lte=corte).delete()
+    return borradas
+
+
+def compactar(pagina_id):
+    """
+    Vuelve a codificar todas las revisiones de la página con el
+    `INTERVALO_COMPLETA` actual (por ejemplo, tras cambiarlo). Recorre las
+    revisiones en orden aplicando cada delta una sola vez. Devuelve cuántas
+    revisiones cambiaron.
+    """
+    with transaction.atomic():
+        revisiones = list(Revision.objects.select_for_update().filter(pagina_id=pagina_id).order_by('numero'))
+        cambiadas, anterior, texto_anterior, acumulado = [], None, None, 0
+        for revision in revisiones:
+            texto = _decodificar(revision.es_completa, revision.datos, texto_anterior or '')
+            nueva = _nueva(pagina_id, anterior, texto_anterior, acumulado, revision.titulo, texto, None)
+            if (nueva.es_completa, nueva.base) != (revision.es_completa, revision.base):
+                revision.es_completa, revision.base, revision.datos = nueva.es_completa, nueva.base, nueva.datos
+                cambiadas.append(revision)
+            acumulado = 0 if revision.es_completa else acumulado + len(revision.datos)
+            anterior, texto_anterior = revision, texto
+        Revision.objects.bulk_update(cambiadas, ['es_completa', 'base', 'datos'], batch_size=100)
+    return len(cambiadas)
@@ -0,0 +1,211 @@
+"""
+Señales de los modelos de DocuBase.
+
+Encolan el trabajo lento posterior al guardado (reindexar la búsqueda,
+generar miniaturas; ver `tareas.py`), mantienen los contadores de uso de las
+etiquetas e invalidan la caché de fragmentos y los resúmenes del panel cada
+vez que se guarda o borra un proyecto, una página, una etiqueta, un
+comentario o un archivo, o cambian las etiquetas de un objeto.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import busqueda, etiquetas, fragmentos, panel, subidas, tareas
+from .models import Archivo, Comentario, Etiqueta, Pagina, Proyecto
+
+
+def _encolar_indexado(tipo, ids):
+    # La clave agrupa en un único trabajo las ediciones seguidas de un objeto.
+    for pk in ids:
+        tareas.encolar('indexar', clave=f'indexar:{tipo}:{pk}', tipo=tipo, pk=pk)
+
+
+@receiver(post_save, sender=Proyecto)
+def indexar_proyecto(sender, instance, raw=False, **kwargs):
+    # `raw` es True al cargar fixtures; el índice se reconstruye aparte.
+    if not raw:
+        _encolar_indexado(busqueda.TIPO_PROYECTO, [instance.pk])
+
+
+@receiver(post_save, sender=Pagina)
+def indexar_pagina(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _encolar_indexado(busqueda.TIPO_PAGINA, [instance.pk])
+
+
+@receiver(post_delete, sender=Proyecto)
+def desindexar_proyecto(sender, instance, **kwargs):
+    busqueda.eliminar(busqueda.TIPO_PROYECTO, [instance.pk])
+
+
+@receiver(post_delete, sender=Pagina)
+def desindexar_pagina(sender, instance, **kwargs):
+    busqueda.eliminar(busqueda.TIPO_PAGINA, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Proyecto.etiquetas.through)
+@receiver(m2m_changed, sender=Pagina.etiquetas.through)
+def reindexar_etiquetas(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Vuelve a indexar los objetos cuyas etiquetas cambiaron."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        modelo, ids = type(instance), [instance.pk]
+    elif pk_set:
+        # Cambio hecho desde la etiqueta (etiqueta.proyectos.add(...)):
+        # `model` es Proyecto o Pagina y `pk_set` los objetos afectados.
+        modelo, ids = model, pk_set
+    else:
+        return
+    _encolar_indexado(busqueda.TIPO_PROYECTO if modelo is Proyecto else busqueda.TIPO_PAGINA, ids)
+
+
+@receiver(post_save, sender=Proyecto)
+def programar_miniaturas(sender, instance, raw=False, **kwargs):
+    # `_imagen_cambiada` lo fija Proyecto.save() al detectar una imagen nueva.
+    if not raw and getattr(instance, '_imagen_cambiada', False):
+        tareas.encolar('miniaturas', clave=f'miniaturas:{instance.pk}', proyecto_id=instance.pk)
+
+
+# --- Caché de fragmentos ---
+
+@receiver(post_save, sender=Proyecto)
+@receiver(post_delete, sender=Proyecto)
+def invalidar_fragmentos_proyecto(sender, instance, **kwargs):
+    # Las claves de las páginas incluyen la generación de su proyecto, así que
+    # esto invalida también las páginas que muestran su título.
+    fragmentos.invalidar('proyecto', [instance.pk])
+
+
+@receiver(post_save, sender=Pagina)
+@receiver(post_delete, sender=Pagina)
+def invalidar_fragmentos_pagina(sender, instance, **kwargs):
+    # El proyecto lista sus páginas, así que también cambia su fragmento.
+    fragmentos.invalidar('pagina', [instance.pk])
+    fragmentos.invalidar('proyecto', [instance.proyecto_id])
+
+
+@receiver(post_save, sender=Comentario)
+@receiver(post_delete, sender=Comentario)
+def invalidar_comentarios(sender, instance, **kwargs):
+    # Los comentarios se pintan fuera del fragmento cacheado: basta con
+    # cambiar la versión que usa el ETag de la página.
+    fragmentos.invalidar('comentarios', [instance.pagina_id])
+
+
+@receiver(post_save, sender=Etiqueta)
+@receiver(pre_delete, sender=Etiqueta)
+def invalidar_fragmentos_etiqueta(sender, instance, **kwargs):
+    # Al borrar se usa pre_delete: después ya no quedan filas en la tabla intermedia.
+    fragmentos.invalidar('proyecto', instance.proyectos.values_list('pk', flat=True))
+    fragmentos.invalidar('pagina', instance.paginas.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Proyecto.etiquetas.through)
+@receiver(m2m_changed, sender=Pagina.etiquetas.through)
+def invalidar_fragmentos_etiquetas(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        tipo, ids = ('proyecto' if model is Proyecto else 'pagina'), pk_set or []
+    else:
+        tipo, ids = ('proyecto' if isinstance(instance, Proyecto) else 'pagina'), [instance.pk]
+    fragmentos.invalidar(tipo, ids)
+
+
+# --- Contadores de uso de etiquetas ---
+
+def _campo_objeto(modelo):
+    """Nombre del campo del objeto en la tabla intermedia ('proyecto' o 'pagina')."""
+    return 'proyecto' if modelo is Proyecto else 'pagina'
+
+
+def _campo_contador(modelo):
+    return 'num_proyectos' if modelo is Proyecto else 'num_paginas'
+
+
+@receiver(m2m_changed, sender=Proyecto.etiquetas.through)
+@receiver(m2m_changed, sender=Pagina.etiquetas.through)
+def actualizar_contadores_etiquetas(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Ajusta `num_proyectos`/`num_paginas` con un UPDATE ... SET n = n ± k por
+    cada cambio de la tabla intermedia, sin recontar.
+    """
+    modelo_objeto = model if reverse else type(instance)
+    campo_objeto = _campo_objeto(modelo_objeto)
+
+    if action == 'post_add' and pk_set:
+        # En post_add `pk_set` solo contiene las filas que se insertaron de verdad.
+        incrementos = {instance.pk: len(pk_set)} if reverse else dict.fromkeys(pk_set, 1)
+    elif action in ('pre_remove', 'pre_clear'):
+        # `remove()` puede recibir ids que no estaban asociados y `clear()` no
+        # dice qué borra: se leen las filas que existen antes del DELETE.
+        if reverse:
+            filas = sender.objects.filter(etiqueta=instance)
+            if action == 'pre_remove':
+                filas = filas.filter(**{f'{campo_objeto}__in': pk_set})
+            incrementos = {instance.pk: -filas.count()}
+        else:
+            filas = sender.objects.filter(**{campo_objeto: instance})
+            if action == 'pre_remove':
+                filas = filas.filter(etiqueta__in=pk_set)
+            incrementos = dict.fromkeys(filas.values_list('etiqueta_id', flat=True), -1)
+    else:
+        return
+    etiquetas.ajustar_contadores(_campo_contador(modelo_objeto), incrementos)
+
+
+@receiver(pre_delete, sender=Proyecto)
+@receiver(pre_delete, sender=Pagina)
+def descontar_etiquetas(sender, instance, **kwargs):
+    # El borrado en cascada de la tabla intermedia no emite m2m_changed.
+    ids = instance.etiquetas.values_list('pk', flat=True)
+    etiquetas.ajustar_contadores(_campo_contador(sender), dict.fromkeys(ids, -1))
+
+
+@receiver(post_save, sender=Archivo)
+@receiver(post_delete, sender=Archivo)
+def invalidar_fragmentos_archivo(sender, instance, **kwargs):
+    # La página lista sus adjuntos.
+    if instance.pagina_id is not None:
+        fragmentos.invalidar('pagina', [instance.pagina_id])
+
+
+# --- Contenido deduplicado de los archivos ---
+
+@receiver(post_delete, sender=Archivo)
+def soltar_contenido(sender, instance, **kwargs):
+    if instance.contenido_id is not None:
+        subidas.soltar_contenido(instance.contenido_id)
+        # El borrado del fichero, si ya nadie lo usa, se hace fuera de la petición.
+        tareas.encolar('purgar_contenido', clave=f'purgar_contenido:{instance.contenido_id}',
+                       contenido_id=instance.contenido_id)
+
+
+# --- Resúmenes del panel de control ---
+
+def _autores_de_proyecto(*proyecto_ids):
+    return Proyecto.objects.filter(pk__in=proyecto_ids).values_list('autor_id', flat=True)
+
+
+@receiver(post_save, sender=Proyecto)
+@receiver(post_delete, sender=Proyecto)
+def invalidar_resumen_proyecto(sender, instance, **kwargs):
+    panel.invalidar_resumen(instance.autor_id)
+
+
+@receiver(post_save, sender=Pagina)
+@receiver(post_delete, sender=Pagina)
+def invalidar_resumen_pagina(sender, instance, **kwargs):
+    # Si el proyecto ya se borró (borrado en cascada), su propia señal invalida.
+    panel.invalidar_resumen(*_autores_de_proyecto(instance.proyecto_id))
+
+
+@receiver(post_save, sender=Comentario)
+@receiver(post_delete, sender=Comentario)
+@receiver(post_save, sender=Archivo)
+@receiver(post_delete, sender=Archivo)
+def invalidar_resumen_adjunto(sender, instance, **kwargs):
+    if instance.pagina_id is not None:
+        autores = Proyecto.objects.filter(paginas=instance.pagina_id).values_list('autor_id', flat=True)
+        panel.invalidar_resumen(*autores)
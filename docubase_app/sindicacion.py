@@ -0,0 +1,240 @@
+"""
+Sitemaps, feeds Atom y feed de cambios, para crawlers y réplicas.
+
+Sin ellos, un crawler tiene que recorrer `proyectos_lista` y cada
+`proyecto_detalle` (HTML completo) para descubrir qué cambió. Estas
+respuestas se generan fila a fila con `.iterator()` y se envían con
+`StreamingHttpResponse`, así que la memoria no crece con el número de
+páginas:
+
+- `sitemap.xml` es un índice de sitemaps. Cada sitemap cubre un bloque de
+  `URLS_POR_SITEMAP` ids (el máximo del protocolo) de proyectos o de
+  páginas públicos: aunque haya huecos nunca pasa del límite, y los bloques
+  existentes no se mueven al crear objetos nuevos.
+- `proyectos/<slug>/feed.atom`: las últimas `ENTRADAS_FEED` páginas
+  públicas de un proyecto público.
+- `api/v1/cambios/?desde=<fecha ISO>`: NDJSON, como el volcado de la API,
+  con los proyectos y páginas visibles actualizados después de `desde`, en
+  orden de fecha, y una última línea `fin` con la fecha que hay que pasar
+  como `desde` en la siguiente llamada.
+
+Las versiones (para ETag y Last-Modified, ver `condicional.py`) salen de la
+última `fecha_actualizacion` y del número de filas, con una consulta
+agregada: un crawler que vuelve recibe un 304 sin que se lea ninguna fila.
+"""
+import heapq
+import json
+from dataclasses import dataclass
+from xml.sax.saxutils import escape, quoteattr
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Max
+from django.urls import reverse
+
+from . import api
+from .models import Pagina, Proyecto
+
+# Máximo de URLs por sitemap según sitemaps.org.
+URLS_POR_SITEMAP = 50_000
+ENTRADAS_FEED = 50
+# Filas que lee cada consulta de los sitemaps y del feed de cambios.
+FILAS_POR_LOTE = 2000
+
+
+def _plantilla_url(nombre, *parametros):
+    """
+    Ruta de la vista `nombre` como plantilla de `str.format` con un hueco
+    por parámetro: un `reverse()` por fila costaría más que leer la fila.
+    """
+    # Marcas numéricas, que pasan por cualquier conversor (int, slug, str...).
+    marcas = {parametro: str(987654321000 + i) for i, parametro in enumerate(parametros)}
+    ruta = reverse(nombre, kwargs=marcas)
+    for i, marca in enumerate(marcas.values()):
+        ruta = ruta.replace(marca, f'{{{i}}}')
+    return ruta
+
+
+@dataclass
+class Serie:
+    """Objetos que van en los sitemaps: consulta, columnas de la URL y vista."""
+    consulta: object
+    columnas: tuple
+    vista: str
+    parametros: tuple
+
+
+SERIES = {
+    'proyectos': Serie(lambda: Proyecto.objects.filter(es_publico=True),
+                       ('slug',), 'proyecto_detalle', ('proyecto_slug',)),
+    'paginas': Serie(lambda: Pagina.objects.filter(es_publica=True, proyecto__es_publico=True),
+                     ('proyecto__slug', 'slug'), 'pagina_detalle', ('proyecto_slug', 'pagina_slug')),
+}
+
+
+def _fecha(fecha):
+    return fecha.isoformat(timespec='seconds')
+
+
+def _version(consulta):
+    """`(ultima, total)` de un queryset con `fecha_actualizacion`."""
+    datos = consulta.aggregate(ultima=Max('fecha_actualizacion'), total=Count('pk'))
+    return datos['ultima'], datos['total']
+
+
+def _mas_reciente(*fechas):
+    fechas = [f for f in fechas if f is not None]
+    return max(fechas) if fechas else None
+
+
+# --- Sitemaps ---
+
+def _en_bloque(consulta, bloque):
+    return consulta.filter(pk__gte=bloque * URLS_POR_SITEMAP, pk__lt=(bloque + 1) * URLS_POR_SITEMAP)
+
+
+def version_indice():
+    """`(ultima_modificacion, partes)` del índice de sitemaps, o None si está vacío."""
+    versiones = {nombre: _version(serie.consulta()) for nombre, serie in SERIES.items()}
+    ultima = _mas_reciente(*(ultima for ultima, _ in versiones.values()))
+    return (ultima, tuple(sorted(versiones.items()))) if ultima else None
+
+
+def version_sitemap(nombre, bloque):
+    """`(ultima_modificacion, partes)` de un sitemap, o None si no existe o está vacío."""
+    serie = SERIES.get(nombre)
+    if serie is None:
+        return None
+    ultima, total = _version(_en_bloque(serie.consulta(), bloque))
+    return (ultima, (nombre, bloque, ultima, total)) if total else None
+
+
+def generar_indice(base):
+    """Índice de sitemaps: uno por bloque con objetos, con su última modificación."""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    plantilla = base + _plantilla_url('sitemap', 'serie', 'bloque')
+    for nombre, serie in SERIES.items():
+        bloques = (serie.consulta().annotate(bloque=F('pk') / URLS_POR_SITEMAP)
+                   .values('bloque').annotate(ultima=Max('fecha_actualizacion')).order_by('bloque'))
+        for fila in bloques.iterator():
+            yield (f'<sitemap><loc>{escape(plantilla.format(nombre, fila["bloque"]))}</loc>'
+                   f'<lastmod>{_fecha(fila["ultima"])}</lastmod></sitemap>\n')
+    yield '</sitemapindex>\n'
+
+
+def generar_sitemap(nombre, bloque, base):
+    """Las URLs de un bloque de una serie, en orden de id."""
+    serie = SERIES[nombre]
+    plantilla = base + _plantilla_url(serie.vista, *serie.parametros)
+    filas = (_en_bloque(serie.consulta(), bloque).order_by('pk')
+             .values_list(*serie.columnas, 'fecha_actualizacion'))
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for *partes, fecha in filas.iterator(chunk_size=FILAS_POR_LOTE):
+        yield f'<url><loc>{escape(plantilla.format(*partes))}</loc><lastmod>{_fecha(fecha)}</lastmod></url>\n'
+    yield '</urlset>\n'
+
+
+# --- Feed Atom de un proyecto ---
+
+def paginas_feed(proyecto):
+    return Pagina.objects.filter(proyecto=proyecto, es_publica=True)
+
+
+def version_feed(proyecto):
+    """`(ultima_modificacion, partes)` del feed de `proyecto` (público)."""
+    ultima, total = _version(paginas_feed(proyecto))
+    return (_mas_reciente(proyecto.fecha_actualizacion, ultima),
+            (proyecto.pk, proyecto.fecha_actualizacion, ultima, total))
+
+
+def generar_feed(proyecto, ultima, request):
+    """
+    Feed Atom con las últimas páginas de `proyecto`. El id de cada entrada
+    es una URI `tag:` con el id de la página, así que no cambia si cambia
+    su slug.
+    """
+    base = request.build_absolute_uri('/')[:-1]
+    dominio = request.get_host().split(':')[0]
+    url_proyecto = base + reverse('proyecto_detalle', kwargs={'proyecto_slug': proyecto.slug})
+    plantilla = base + _plantilla_url('pagina_detalle', 'proyecto_slug', 'pagina_slug')
+    yield ('<?xml version="1.0" encoding="utf-8"?>\n'
+           '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+           f'<title>{escape(proyecto.titulo)}</title>\n'
+           f'<subtitle>{escape(proyecto.extracto)}</subtitle>\n'
+           f'<link rel="self" href={quoteattr(request.build_absolute_uri())}/>\n'
+           f'<link rel="alternate" type="text/html" href={quoteattr(url_proyecto)}/>\n'
+           f'<id>{escape(url_proyecto)}</id>\n'
+           f'<updated>{_fecha(ultima)}</updated>\n')
+    paginas = (paginas_feed(proyecto).select_related('autor')
+               .only('titulo', 'slug', 'extracto', 'fecha_creacion', 'fecha_actualizacion', 'autor__username')
+               .order_by('-fecha_actualizacion', '-pk')[:ENTRADAS_FEED])
+    for pagina in paginas.iterator():
+        yield ('<entry>'
+               f'<title>{escape(pagina.titulo)}</title>'
+               f'<link rel="alternate" type="text/html" href={quoteattr(plantilla.format(proyecto.slug, pagina.slug))}/>'
+               f'<id>tag:{dominio},{pagina.fecha_creacion:%Y-%m-%d}:pagina:{pagina.pk}</id>'
+               f'<published>{_fecha(pagina.fecha_creacion)}</published>'
+               f'<updated>{_fecha(pagina.fecha_actualizacion)}</updated>'
+               f'<author><name>{escape(pagina.autor.username)}</name></author>'
+               f'<summary>{escape(pagina.extracto)}</summary>'
+               '</entry>\n')
+    yield '</feed>\n'
+
+
+# --- Feed de cambios ---
+
+def _cambiados(nombre, usuario, desde, hasta=None):
+    consulta = api.RECURSOS[nombre].visibles(usuario)
+    if desde is not None:
+        consulta = consulta.filter(fecha_actualizacion__gt=desde)
+    if hasta is not None:
+        consulta = consulta.filter(fecha_actualizacion__lte=hasta)
+    return consulta
+
+
+def version_cambios(usuario, desde):
+    """
+    `(hasta, partes)`: la fecha del último cambio visible posterior a
+    `desde`, que es el final de esta respuesta y el `desde` de la
+    siguiente, o None si no hay ninguno.
+    """
+    versiones = {nombre: _version(_cambiados(nombre, usuario, desde)) for nombre in SERIES}
+    ultima = _mas_reciente(*(ultima for ultima, _ in versiones.values()))
+    return (ultima, (desde, *sorted(versiones.items()))) if ultima else None
+
+
+def _linea(tipo, datos):
+    return json.dumps({'tipo': tipo, 'datos': datos}, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def generar_cambios(usuario, desde, hasta, request):
+    """
+    Proyectos y páginas visibles para `usuario` con fecha en (`desde`,
+    `hasta`], mezclados en orden de fecha sin cargarlos (`heapq.merge` de
+    dos consultas ordenadas), y una línea `fin` con `hasta`. `hasta` va con
+    microsegundos, no truncado a milisegundos como las fechas de las filas:
+    si no, la siguiente llamada repetiría el último cambio.
+    """
+    base = request.build_absolute_uri('/')[:-1]
+    url_proyecto = base + _plantilla_url('proyecto_detalle', 'proyecto_slug')
+    url_pagina = base + _plantilla_url('pagina_detalle', 'proyecto_slug', 'pagina_slug')
+    if hasta is not None:
+        proyectos = (
+            ('proyecto', {'id': pk, 'titulo': titulo, 'url': url_proyecto.format(slug), 'fecha_actualizacion': fecha})
+            for pk, titulo, slug, fecha in _cambiados('proyectos', usuario, desde, hasta)
+            .order_by('fecha_actualizacion', 'pk').values_list('pk', 'titulo', 'slug', 'fecha_actualizacion')
+            .iterator(chunk_size=FILAS_POR_LOTE)
+        )
+        paginas = (
+            ('pagina', {'id': pk, 'titulo': titulo, 'proyecto': proyecto_id,
+                        'url': url_pagina.format(proyecto_slug, slug), 'fecha_actualizacion': fecha})
+            for pk, titulo, slug, proyecto_id, proyecto_slug, fecha in _cambiados('paginas', usuario, desde, hasta)
+            .order_by('fecha_actualizacion', 'pk')
+            .values_list('pk', 'titulo', 'slug', 'proyecto_id', 'proyecto__slug', 'fecha_actualizacion')
+            .iterator(chunk_size=FILAS_POR_LOTE)
+        )
+        for tipo, datos in heapq.merge(proyectos, paginas, key=lambda cambio: cambio[1]['fecha_actualizacion']):
+            yield _linea(tipo, datos)
+    fin = hasta or desde
+    yield _linea('fin', {'hasta': fin.isoformat() if fin else None})
@@ -0,0 +1,103 @@
+"""
+Asignación de slugs únicos.
+
+En lugar de probar `base`, `base-1`, `base-2`, ... con una consulta cada vez,
+se leen de una sola vez todos los slugs que empiezan por `base` y se elige el
+primer sufijo libre en memoria. Si dos guardados concurrentes eligen el mismo
+slug, la restricción UNIQUE de la base de datos rechaza uno de ellos y ese
+guardado se reintenta con un slug nuevo.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Número de veces que se reintenta un guardado que chocó con otro slug.
+MAX_INTENTOS = 5
+
+# Número de bases que se consultan juntas en el modo por lotes.
+BASES_POR_CONSULTA = 200
+
+
+def base_para(instancia):
+    """
+    Slug base de un objeto: el que ya tiene o uno derivado del título. Si el
+    título no produce ningún carácter válido se usa el nombre del modelo.
+    """
+    return instancia.slug or slugify(instancia.titulo) or type(instancia).__name__.lower()
+
+
+def siguiente_libre(base, ocupados, desde=0):
+    """
+    Devuelve `(slug, n)`: `base` si está libre o `base-n` con el menor
+    n >= max(desde, 1) que no esté en `ocupados`.
+    """
+    num = desde
+    slug = base if num == 0 else f'{base}-{num}'
+    while slug in ocupados:
+        num += 1
+        slug = f'{base}-{num}'
+    return slug, num
+
+
+def slugs_ocupados(queryset, bases, excluir_pk=None):
+    """
+    Devuelve el conjunto de slugs de `queryset` que empiezan por alguna de las
+    `bases`, con una consulta por cada BASES_POR_CONSULTA bases.
+    """
+    bases = sorted(set(bases))
+    if excluir_pk is not None:
+        queryset = queryset.exclude(pk=excluir_pk)
+    ocupados = set()
+    for i in range(0, len(bases), BASES_POR_CONSULTA):
+        grupo = bases[i:i + BASES_POR_CONSULTA]
+        filtro = reduce(or_, (Q(slug__startswith=base) for base in grupo))
+        ocupados.update(queryset.filter(filtro).values_list('slug', flat=True))
+    return ocupados
+
+
+def guardar_con_slug_unico(instancia, guardar, queryset=None):
+    """
+    Asigna a `instancia` un slug único dentro de `queryset` (por defecto,
+    todos los objetos de su modelo) y la guarda llamando a `guardar()`.
+
+    El guardado se hace en un savepoint: si falla por una colisión de slug
+    con un guardado concurrente, se recalcula el slug y se reintenta.
+    """
+    if queryset is None:
+        queryset = type(instancia)._default_manager.all()
+    base = base_para(instancia)
+    for intento in range(MAX_INTENTOS):
+        ocupados = slugs_ocupados(queryset, [base], excluir_pk=instancia.pk)
+        instancia.slug, _ = siguiente_libre(base, ocupados)
+        try:
+            with transaction.atomic():
+                guardar()
+            return
+        except IntegrityError:
+            # Solo se reintenta si el error se debe a que otro guardado tomó
+            # el mismo slug entre la consulta y el INSERT/UPDATE.
+            colision = queryset.filter(slug=instancia.slug).exclude(pk=instancia.pk).exists()
+            if not colision or intento == MAX_INTENTOS - 1:
+                raise
+
+
+def asignar_slugs(instancias, queryset):
+    """
+    Asigna slugs únicos a una lista de objetos sin guardar (por ejemplo, antes
+    de un `bulk_create`). Hace una consulta por cada BASES_POR_CONSULTA bases
+    distintas, no una por objeto, y evita también colisiones entre los propios
+    objetos del lote.
+    """
+    bases = [base_para(instancia) for instancia in instancias]
+    ocupados = slugs_ocupados(queryset, bases)
+    # Para cada base se recuerda el siguiente sufijo a probar, de modo que
+    # mil páginas "Introducción" no vuelvan a recorrer los sufijos ya usados.
+    siguiente = {}
+    for instancia, base in zip(instancias, bases):
+        instancia.slug, num = siguiente_libre(base, ocupados, siguiente.get(base, 0))
+        siguiente[base] = num + 1
+        ocupados.add(instancia.slug)
+    return instancias
@@ -0,0 +1,282 @@
+"""
+Subidas por trozos, reanudables y deduplicadas por contenido para `Archivo`.
+
+El cliente crea una `Subida` indicando nombre y tamaño, y después envía el
+archivo en trozos (`PUT` con `Content-Range: bytes inicio-fin/total`). Cada
+trozo se copia del cuerpo de la petición al archivo parcial en bloques de
+`TAMANO_BLOQUE`, sin cargarlo entero en memoria, y actualiza un SHA-256
+incremental. Si la conexión se corta, el cliente consulta `recibido` y
+continúa desde ahí.
+
+El SHA-256 en curso de cada subida se guarda en memoria del proceso; si el
+siguiente trozo lo atiende otro proceso (o tras un reinicio), se reconstruye
+leyendo una vez el archivo parcial.
+
+Al completarse, el archivo se guarda una sola vez por hash en
+`contenidos/<hh>/<sha256>` (modelo `Contenido`). Si el mismo contenido ya
+existía, solo se suma una referencia y se descarta el parcial. Al borrar un
+`Archivo` se resta la referencia y, si llega a cero, la tarea
+'purgar_contenido' borra el fichero.
+
+El nombre lo elige el cliente, así que `Archivo.tipo_mime` solo guarda el
+tipo deducido de la extensión si está en `entrega.TIPOS_EN_LINEA`; cualquier
+otro se guarda como `application/octet-stream`.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .entrega import TIPO_DESCARGA, TIPOS_EN_LINEA
+from .models import Archivo, Contenido, Subida
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos del archivo parcial.
+    fcntl = None
+
+# Bytes que se leen y escriben de cada vez al copiar un trozo.
+TAMANO_BLOQUE = 64 * 1024
+# Tamaño de trozo que se sugiere al cliente y máximo que se acepta por petición.
+TAMANO_TROZO = getattr(settings, 'SUBIDAS_TAMANO_TROZO', 8 * 1024 * 1024)
+# Tamaño máximo de un archivo.
+TAMANO_MAXIMO = getattr(settings, 'SUBIDAS_TAMANO_MAXIMO', 2 * 1024 ** 3)
+# Número de SHA-256 en curso que se conservan en memoria por proceso.
+MAX_HASHES_EN_MEMORIA = 256
+
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+_hashes = OrderedDict()
+_cerrojo = threading.Lock()
+
+
+class ErrorSubida(Exception):
+    """Trozo rechazado. `estado` es el código HTTP que debe devolverse."""
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def directorio_parciales():
+    return getattr(settings, 'SUBIDAS_DIR', os.path.join(settings.BASE_DIR, 'subidas_parciales'))
+
+
+def ruta_parcial(subida):
+    return os.path.join(directorio_parciales(), f'{subida.pk}.part')
+
+
+def nombre_contenido(digest):
+    return f'contenidos/{digest[:2]}/{digest}'
+
+
+def tipo_guardado(nombre):
+    """Tipo MIME que se guarda para un archivo llamado `nombre` (elegido por el cliente)."""
+    tipo = mimetypes.guess_type(nombre)[0]
+    return tipo if tipo in TIPOS_EN_LINEA else TIPO_DESCARGA
+
+
+def parsear_content_range(cabecera):
+    """'bytes 0-1023/5000' -> (0, 1024, 5000). Lanza ErrorSubida si no es válida."""
+    coincidencia = _CONTENT_RANGE.match(cabecera or '')
+    if not coincidencia:
+        raise ErrorSubida('Falta la cabecera Content-Range o no es válida.')
+    inicio, fin, total = (int(g) for g in coincidencia.groups())
+    if fin < inicio:
+        raise ErrorSubida('Content-Range no válido.')
+    return inicio, fin + 1, total
+
+
+# --- SHA-256 incremental ---
+
+def _hash_en_curso(subida):
+    """
+    El SHA-256 de los primeros `subida.recibido` bytes. Se toma de memoria si
+    está al día y, si no, se recalcula leyendo el archivo parcial.
+    """
+    with _cerrojo:
+        guardado = _hashes.pop(subida.pk, None)
+    if guardado and guardado[0] == subida.recibido:
+        return guardado[1]
+    digest = hashlib.sha256()
+    pendiente = subida.recibido
+    if pendiente:
+        with open(ruta_parcial(subida), 'rb') as f:
+            while pendiente:
+                bloque = f.read(min(TAMANO_BLOQUE, pendiente))
+                if not bloque:
+                    break
+                digest.update(bloque)
+                pendiente -= len(bloque)
+    return digest
+
+
+def _guardar_hash(subida, digest):
+    with _cerrojo:
+        _hashes[subida.pk] = (subida.recibido, digest)
+        while len(_hashes) > MAX_HASHES_EN_MEMORIA:
+            _hashes.popitem(last=False)
+
+
+# --- API del módulo ---
+
+def crear(usuario, nombre, tamano, pagina=None):
+    if tamano < 0 or tamano > TAMANO_MAXIMO:
+        raise ErrorSubida(f'El archivo supera el tamaño máximo ({TAMANO_MAXIMO} bytes).', 413)
+    os.makedirs(directorio_parciales(), exist_ok=True)
+    subida = Subida.objects.create(
+        usuario=usuario, pagina=pagina, nombre=os.path.basename(nombre)[:255] or 'archivo', tamano=tamano)
+    open(ruta_parcial(subida), 'wb').close()
+    if tamano == 0:
+        completar(subida, hashlib.sha256())
+    return subida
+
+
+def recibir_trozo(subida, inicio, longitud, flujo):
+    """
+    Añade al archivo parcial los `longitud` bytes que empiezan en `inicio`,
+    leídos de `flujo` (el cuerpo de la petición). Si `inicio` no coincide con
+    lo ya recibido, lanza ErrorSubida 409 para que el cliente se resitúe.
+    Devuelve la subida actualizada.
+    """
+    if subida.archivo_id:
+        raise ErrorSubida('La subida ya está completa.', 409)
+    if inicio != subida.recibido:
+        raise ErrorSubida(f'Se esperaba el byte {subida.recibido}.', 409)
+    if longitud > TAMANO_TROZO or inicio + longitud > subida.tamano:
+        raise ErrorSubida('El trozo es demasiado grande.', 413)
+
+    with open(ruta_parcial(subida), 'r+b') as parcial:
+        if fcntl:
+            try:
+                fcntl.flock(parcial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ErrorSubida('Ya se está recibiendo un trozo de esta subida.', 409)
+        # La subida se leyó antes del cerrojo: una petición repetida o atrasada
+        # puede llegar aquí cuando otra ya avanzó, y truncar perdería sus bytes.
+        subida.recibido, subida.archivo_id = (
+            Subida.objects.filter(pk=subida.pk).values_list('recibido', 'archivo_id').get())
+        if subida.archivo_id:
+            raise ErrorSubida('La subida ya está completa.', 409)
+        if inicio != subida.recibido:
+            raise ErrorSubida(f'Se esperaba el byte {subida.recibido}.', 409)
+        digest = _hash_en_curso(subida)
+        # Descarta restos de un trozo anterior que se cortó a medias.
+        parcial.truncate(inicio)
+        parcial.seek(inicio)
+        pendiente = longitud
+        while pendiente:
+            bloque = flujo.read(min(TAMANO_BLOQUE, pendiente))
+            if not bloque:
+                break
+            parcial.write(bloque)
+            digest.update(bloque)
+            pendiente -= len(bloque)
+        parcial.flush()
+
+    recibido = inicio + longitud - pendiente
+    # UPDATE condicional: si otro proceso avanzó la subida entretanto, gana él.
+    actualizadas = Subida.objects.filter(pk=subida.pk, recibido=inicio).update(
+        recibido=recibido, fecha_actualizacion=timezone.now())
+    if not actualizadas:
+        raise ErrorSubida('La subida cambió mientras se recibía el trozo.', 409)
+    subida.recibido = recibido
+    if recibido == subida.tamano:
+        completar(subida, digest)
+    else:
+        _guardar_hash(subida, digest)
+    return subida
+
+
+def _ruta_local(nombre):
+    """Ruta en disco de `nombre`, o None si el almacenamiento no es local (S3...)."""
+    try:
+        return default_storage.path(nombre)
+    except NotImplementedError:
+        return None
+
+
+def _guardar_contenido(ruta, digest, tamano):
+    """
+    Devuelve el `Contenido` con hash `digest`, creándolo a partir del archivo
+    `ruta` si no existe, con una referencia más.
+    """
+    existente = Contenido.objects.select_for_update().filter(sha256=digest).first()
+    if existente is None:
+        # Se escribe siempre, aunque el fichero exista: puede ser el resto de
+        # un contenido que se está purgando.
+        nombre = nombre_contenido(digest)
+        destino = _ruta_local(nombre)
+        if destino:
+            # Almacenamiento en disco: basta con mover el parcial.
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(ruta, destino)
+        else:
+            default_storage.delete(nombre)
+            with open(ruta, 'rb') as f:
+                nombre = default_storage.save(nombre, File(f))
+        try:
+            with transaction.atomic():
+                return Contenido.objects.create(sha256=digest, archivo=nombre, tamano=tamano, referencias=1)
+        except IntegrityError:
+            # Otra subida con el mismo contenido lo creó a la vez.
+            existente = Contenido.objects.select_for_update().get(sha256=digest)
+    Contenido.objects.filter(pk=existente.pk).update(referencias=F('referencias') + 1)
+    return existente
+
+
+def completar(subida, digest):
+    """Convierte la subida terminada en un `Archivo` con contenido deduplicado."""
+    ruta = ruta_parcial(subida)
+    with transaction.atomic():
+        contenido = _guardar_contenido(ruta, digest.hexdigest(), subida.tamano)
+        archivo = Archivo.objects.create(
+            nombre=subida.nombre, archivo=contenido.archivo.name, contenido=contenido,
+            tamano=subida.tamano, tipo_mime=tipo_guardado(subida.nombre),
+            subido_por_id=subida.usuario_id, pagina_id=subida.pagina_id,
+        )
+        Subida.objects.filter(pk=subida.pk).update(archivo=archivo)
+        subida.archivo = archivo
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    with _cerrojo:
+        _hashes.pop(subida.pk, None)
+    return archivo
+
+
+def soltar_contenido(contenido_id):
+    """Resta una referencia a un contenido (al borrar un Archivo)."""
+    Contenido.objects.filter(pk=contenido_id, referencias__gt=0).update(referencias=F('referencias') - 1)
+
+
+def purgar_contenido(contenido_id):
+    """
+    Borra el contenido y su fichero si ya nadie lo referencia. El fichero se
+    borra con la fila bloqueada, de modo que una subida simultánea del mismo
+    contenido espera y después lo vuelve a escribir.
+    """
+    with transaction.atomic():
+        contenido = Contenido.objects.select_for_update().filter(
+            pk=contenido_id, referencias=0).first()
+        if contenido is None or contenido.archivos.exists():
+            return False
+        default_storage.delete(contenido.archivo.name)
+        contenido.delete()
+    return True
+
+
+def eliminar_parcial(subida):
+    """Borra el archivo parcial de una subida abandonada."""
+    with _cerrojo:
+        _hashes.pop(subida.pk, None)
+    ruta = ruta_parcial(subida)
+    if os.path.exists(ruta):
+        os.remove(ruta)
@@ -0,0 +1,273 @@
+"""
+Cola de tareas en segundo plano respaldada por la base de datos.
+
+El trabajo que no hace falta para responder a la petición (reindexar la
+búsqueda, generar miniaturas...) se encola como una fila `Job` desde las
+señales del guardado. Dentro de `transaction.atomic()` la fila va en la misma
+transacción que el guardado: si se deshace, el trabajo desaparece con ella,
+y si se confirma, ningún reinicio lo pierde. Las vistas no usan
+ATOMIC_REQUESTS, así que fuera de un bloque atómico el guardado y el trabajo
+se confirman por separado; si el proceso muere entre los dos, el trabajo se
+pierde (`rebuild_search_index` y `generar_miniaturas` lo recuperan). El
+comando `run_worker` reclama y ejecuta los trabajos.
+
+- Reclamar: en PostgreSQL con `SELECT ... FOR UPDATE SKIP LOCKED`, de modo que
+  varios workers no se bloquean entre sí. En SQLite, que no tiene bloqueos de
+  fila, con un UPDATE condicional por trabajo (`WHERE estado = 'pendiente'`):
+  SQLite serializa las escrituras y solo un worker ve la fila actualizada.
+- Deduplicar: un trabajo con `clave` no se inserta si ya hay otro pendiente
+  con la misma clave (índice único parcial + INSERT que ignora conflictos).
+- Reintentar: un fallo vuelve a dejar el trabajo pendiente con una espera
+  exponencial (`ESPERA_BASE * 2^intentos`, con algo de azar) hasta agotar
+  `max_intentos`; entonces queda como 'fallido'.
+- Recuperar: un trabajo 'en_curso' cuyo `bloqueado_hasta` pasó (el worker
+  murió) se puede reclamar otra vez.
+
+Con `TAREAS_SINCRONAS = True` (por defecto en desarrollo) las tareas se
+ejecutan en el acto, sin cola ni worker.
+"""
+import logging
+import random
+import time
+import traceback
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import busqueda, miniaturas, subidas
+from .models import Job, Pagina, Proyecto
+
+logger = logging.getLogger(__name__)
+
+# Segundos de la primera espera tras un fallo; se duplica en cada intento.
+ESPERA_BASE = 10
+ESPERA_MAXIMA = 60 * 60
+# Tiempo que un worker tiene reservado un trabajo antes de que otro lo recupere.
+DURACION_BLOQUEO = timedelta(minutes=10)
+
+_registro = {}
+
+
+def tarea(nombre):
+    """Decorador que registra una función como tarea con el nombre dado."""
+    def decorador(funcion):
+        _registro[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def sincronas():
+    return getattr(settings, 'TAREAS_SINCRONAS', False)
+
+
+def ejecutar(nombre, argumentos):
+    """Ejecuta la tarea registrada `nombre` con los argumentos dados."""
+    return _registro[nombre](**argumentos)
+
+
+def encolar(nombre, clave=None, retraso=0, max_intentos=5, **argumentos):
+    """
+    Encola la tarea `nombre`. Si `clave` coincide con la de un trabajo aún
+    pendiente, no se añade otro: el pendiente ya hará el trabajo, pues las
+    tareas leen el estado actual de la base de datos al ejecutarse.
+    """
+    if nombre not in _registro:
+        raise ValueError(f'Tarea desconocida: {nombre}')
+    if sincronas():
+        ejecutar(nombre, argumentos)
+        return
+    Job.objects.bulk_create([Job(
+        tarea=nombre, argumentos=argumentos, clave=clave, max_intentos=max_intentos,
+        ejecutar_despues=timezone.now() + timedelta(seconds=retraso),
+    )], ignore_conflicts=True)
+
+
+# --- Reclamar ---
+
+def _disponibles(ahora):
+    return Job.objects.filter(
+        Q(estado=Job.PENDIENTE, ejecutar_despues__lte=ahora)
+        | Q(estado=Job.EN_CURSO, bloqueado_hasta__lt=ahora)
+    ).order_by('ejecutar_despues', 'id')
+
+
+def reclamar(cantidad):
+    """
+    Marca como 'en_curso' hasta `cantidad` trabajos listos y los devuelve.
+    Cada trabajo reclamado suma un intento.
+    """
+    ahora = timezone.now()
+    valores = {'estado': Job.EN_CURSO, 'bloqueado_hasta': ahora + DURACION_BLOQUEO, 'intentos': F('intentos') + 1}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            trabajos = list(_disponibles(ahora).select_for_update(skip_locked=True)[:cantidad])
+            if trabajos:
+                Job.objects.filter(pk__in=[t.pk for t in trabajos]).update(**valores)
+    else:
+        trabajos = []
+        for candidato in _disponibles(ahora)[:cantidad]:
+            # Solo uno de los workers que compiten consigue actualizar la fila.
+            actualizadas = Job.objects.filter(
+                pk=candidato.pk, estado=candidato.estado, bloqueado_hasta=candidato.bloqueado_hasta,
+            ).update(**valores)
+            if actualizadas:
+                trabajos.append(candidato)
+    for trabajo in trabajos:
+        trabajo.intentos += 1
+    return trabajos
+
+
+# --- Ejecutar y registrar el resultado ---
+
+def ejecutar_trabajo(nombre, argumentos):
+    """
+    Ejecuta una tarea dentro del worker (en un hilo o un proceso del pool).
+    Devuelve None si terminó bien o el traceback del error.
+    """
+    try:
+        ejecutar(nombre, argumentos)
+        return None
+    except Exception:
+        return traceback.format_exc()
+
+
+def _ejecutar_en_pool(nombre, argumentos):
+    try:
+        return ejecutar_trabajo(nombre, argumentos)
+    finally:
+        # Cada hilo o proceso del pool tiene sus propias conexiones.
+        connections.close_all()
+
+
+def espera(intentos):
+    """Segundos hasta el siguiente intento tras `intentos` fallidos."""
+    segundos = min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** (intentos - 1))
+    return segundos * random.uniform(0.8, 1.2)
+
+
+def registrar_resultado(trabajo, error):
+    """Borra el trabajo si terminó bien; si falló, lo reprograma o lo da por fallido."""
+    if error is None:
+        Job.objects.filter(pk=trabajo.pk).delete()
+        return
+    logger.warning('La tarea %s (job %s) falló en el intento %s:\n%s',
+                   trabajo.tarea, trabajo.pk, trabajo.intentos, error)
+    if trabajo.intentos >= trabajo.max_intentos:
+        Job.objects.filter(pk=trabajo.pk).update(estado=Job.FALLIDO, ultimo_error=error, bloqueado_hasta=None)
+        return
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=trabajo.pk).update(
+                estado=Job.PENDIENTE, ultimo_error=error, bloqueado_hasta=None,
+                ejecutar_despues=timezone.now() + timedelta(seconds=espera(trabajo.intentos)))
+    except IntegrityError:
+        # Mientras se ejecutaba se encoló otro trabajo con la misma clave, que
+        # hará lo mismo con datos más recientes: este sobra.
+        Job.objects.filter(pk=trabajo.pk).delete()
+
+
+# --- Worker ---
+
+def _inicializar_proceso():
+    # Con el método 'spawn' el proceso hijo no hereda Django configurado.
+    if not apps.ready:
+        django.setup()
+
+
+def _crear_pool(concurrencia, procesos):
+    if procesos:
+        # Las conexiones abiertas no deben compartirse con los procesos hijos.
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=concurrencia, initializer=_inicializar_proceso)
+    return ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='tareas')
+
+
+def procesar_lote(pool, cantidad):
+    """
+    Reclama hasta `cantidad` trabajos, los ejecuta en `pool` y registra sus
+    resultados. Devuelve cuántos trabajos procesó. Si el pool está roto,
+    devuelve los trabajos a la cola y lanza `BrokenExecutor`.
+    """
+    trabajos = reclamar(cantidad)
+    futuros, roto = {}, None
+    for trabajo in trabajos:
+        try:
+            futuros[pool.submit(_ejecutar_en_pool, trabajo.tarea, trabajo.argumentos)] = trabajo
+        except BrokenExecutor as error:
+            # El pool ya no acepta trabajos: este vuelve a la cola con su espera.
+            roto = error
+            registrar_resultado(trabajo, traceback.format_exc())
+    for futuro in as_completed(futuros):
+        try:
+            error = futuro.result()
+        except Exception:
+            # El fallo es del pool y no de la tarea (p. ej. BrokenProcessPool
+            # porque un proceso murió): se registra como un fallo más.
+            error = traceback.format_exc()
+        registrar_resultado(futuros[futuro], error)
+    if roto is not None:
+        raise roto
+    return len(trabajos)
+
+
+def trabajar(concurrencia=4, procesos=False, intervalo=1.0, una_vez=False, detener=None):
+    """
+    Bucle del worker: ejecuta trabajos en un pool de `concurrencia` hilos (o
+    procesos, con `procesos=True`, para tareas que usan mucha CPU). Si no hay
+    trabajo espera `intervalo` segundos. Con `una_vez` termina cuando la cola
+    queda vacía; `detener`, si se indica, es una función que devuelve True
+    para salir del bucle. Devuelve el número de trabajos procesados.
+    """
+    total = 0
+    pool = _crear_pool(concurrencia, procesos)
+    try:
+        while not (detener and detener()):
+            try:
+                procesados = procesar_lote(pool, concurrencia)
+            except BrokenExecutor:
+                logger.exception('El pool de tareas se rompió; se crea otro.')
+                pool.shutdown(wait=False)
+                pool = _crear_pool(concurrencia, procesos)
+                continue
+            total += procesados
+            if not procesados:
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+    finally:
+        pool.shutdown()
+    return total
+
+
+# --- Tareas de DocuBase ---
+
+@tarea('indexar')
+def indexar(tipo, pk):
+    """Vuelve a indexar un proyecto o una página en la búsqueda."""
+    modelo = Proyecto if tipo == busqueda.TIPO_PROYECTO else Pagina
+    objeto = modelo.objects.select_related('autor').filter(pk=pk).first()
+    if objeto is None:
+        # Se borró después de encolar; la señal post_delete ya lo quitó del índice.
+        return
+    if tipo == busqueda.TIPO_PROYECTO:
+        busqueda.indexar_proyecto(objeto)
+    else:
+        busqueda.indexar_pagina(objeto)
+
+
+@tarea('miniaturas')
+def generar_miniaturas(proyecto_id):
+    """Genera las miniaturas de la imagen de un proyecto."""
+    miniaturas.generar_para_proyecto(proyecto_id)
+
+
+@tarea('purgar_contenido')
+def purgar_contenido(contenido_id):
+    """Borra un contenido subido que ya no usa ningún archivo."""
+    subidas.purgar_contenido(contenido_id)
@@ -0,0 +1,34 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from docubase_app import miniaturas
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen_responsive(proyecto, sizes='100vw', clase='', alt=None):
+    """
+    Pinta la imagen de `proyecto` con sus miniaturas (ver `miniaturas.py`):
+    un <picture> con una fuente WebP y un <img> JPEG de respaldo, ambos con
+    `srcset`/`sizes`, y carga diferida. Si las miniaturas aún no existen,
+    pinta la imagen original, también con carga diferida.
+
+    Uso: {% imagen_responsive proyecto sizes="(min-width: 992px) 25vw, 100vw" clase="card-img-top" %}
+    """
+    if not proyecto.imagen:
+        return ''
+    alt = proyecto.titulo if alt is None else alt
+    variantes = miniaturas.variantes(proyecto)
+    if not variantes:
+        return format_html('<img src="{}" class="{}" alt="{}" loading="lazy" decoding="async">',
+                           proyecto.imagen.url, clase, alt)
+
+    def srcset(extension):
+        return format_html_join(', ', '{} {}w', variantes[extension])
+
+    jpeg = variantes['jpg']
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" loading="lazy" decoding="async"></picture>',
+        srcset('webp'), sizes, jpeg[-1][0], srcset('jpg'), sizes, clase, alt)
@@ -1,7 +1,6 @@
 from django import template
-from django.utils.html import strip_tags
-from html import unescape
-import re
+
+from docubase_app.texto import html_a_texto, truncar
 
 register = template.Library()
 
@@ -13,18 +12,9 @@ def clean_description(value, chars=120):
     """
     if not value:
         return ""
-    
-    # 1. Remover etiquetas HTML
-    clean_text = strip_tags(value)
-    
-    # 2. Decodificar caracteres HTML (como &aacute; -> á)
-    clean_text = unescape(clean_text)
-    
-    # 3. Remover espacios extras y saltos de línea
-    clean_text = re.sub(r'\s+', ' ', clean_text).strip()
-    
-    # 4. Truncar a cierto número de caracteres
-    if len(clean_text) > chars:
-        return clean_text[:chars] + '...'
-    
-    return clean_text
\ No newline at end of file
+
+    # Remueve etiquetas, decodifica entidades y colapsa espacios en un solo paso.
+    clean_text = html_a_texto(value)
+
+    # Trunca a cierto número de caracteres
+    return truncar(clean_text, chars)
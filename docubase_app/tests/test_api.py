@@ -0,0 +1,185 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import BadRequest
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from docubase_app import api, etiquetas
+from docubase_app.models import Comentario, Pagina, Proyecto
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        self.luis = User.objects.create_user('luis', password='x')
+        self.publico = Proyecto.objects.create(titulo='Público', descripcion='d', autor=self.ana, es_publico=True)
+        self.privado = Proyecto.objects.create(titulo='Privado', descripcion='d', autor=self.ana, es_publico=False)
+        self.paginas = []
+        for i in range(7):
+            pagina = Pagina.objects.create(titulo=f'pag {i}', contenido='<p>c</p>', autor=self.ana,
+                                           proyecto=self.publico, es_publica=True)
+            etiquetas.asignar(pagina, ['a', 'b'])
+            Comentario.objects.create(texto=f'hola {i}', autor=self.luis, pagina=pagina)
+            self.paginas.append(pagina)
+        self.oculta = Pagina.objects.create(titulo='oculta', contenido='x', autor=self.ana,
+                                            proyecto=self.publico, es_publica=False)
+        Comentario.objects.create(texto='en oculta', autor=self.luis, pagina=self.oculta)
+        self.en_privado = Pagina.objects.create(titulo='en privado', contenido='x', autor=self.ana,
+                                                proyecto=self.privado, es_publica=True)
+
+    def _titulos(self, url, **kwargs):
+        respuesta = self.client.get(url, **kwargs)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return [fila.get('titulo', fila.get('texto')) for fila in respuesta.json()['datos']]
+
+    def test_cursor_recorre_el_listado_entero(self):
+        pk = self.paginas[3].pk
+        self.assertEqual(api.decodificar_cursor(api.codificar_cursor(pk)), pk)
+
+        vistos, url = [], '/api/v1/paginas/?limite=3&fields=titulo'
+        while url:
+            datos = self.client.get(url).json()
+            self.assertLessEqual(len(datos['datos']), 3)
+            vistos += [fila['titulo'] for fila in datos['datos']]
+            url = datos['siguiente']
+            if url:
+                self.assertIn(f"cursor={datos['siguiente_cursor']}", url)
+        self.assertEqual(vistos, [p.titulo for p in self.paginas])
+
+    def test_cursor_invalido_da_400(self):
+        otra_version = base64.urlsafe_b64encode(b'v0|3').decode().rstrip('=')
+        sin_numero = base64.urlsafe_b64encode(b'v1|x').decode().rstrip('=')
+        for cursor in ('%%%', 'no-es-base64!', otra_version, sin_numero):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(BadRequest):
+                    api.decodificar_cursor(cursor)
+                respuesta = self.client.get('/api/v1/paginas/', {'cursor': cursor})
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn('error', respuesta.json())
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/v1/paginas/?fields=titulo,nada').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/paginas/?include=autor').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/paginas/?proyecto=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/nada/').status_code, 404)
+        # Un límite fuera de rango se acota.
+        self.assertEqual(len(self._titulos('/api/v1/paginas/?limite=0')), 7)
+        self.assertEqual(api.leer_peticion(api.RECURSOS['paginas'], {'limite': '1000'}).limite, api.LIMITE_MAXIMO)
+
+    def test_fields_lee_solo_sus_columnas(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            datos = self.client.get('/api/v1/paginas/?fields=titulo,slug').json()['datos']
+        self.assertEqual(set(datos[0]), {'titulo', 'slug'})
+        columnas = capturadas.captured_queries[-1]['sql'].split(' FROM ')[0]
+        self.assertEqual(columnas, 'SELECT "docubase_app_pagina"."id", "docubase_app_pagina"."titulo", '
+                                   '"docubase_app_pagina"."slug"')
+
+        # `url` necesita el slug del proyecto: un JOIN y solo esa columna del proyecto.
+        with CaptureQueriesContext(connection) as capturadas:
+            datos = self.client.get('/api/v1/paginas/?fields=url').json()['datos']
+        self.assertTrue(datos[0]['url'].endswith(f'/proyectos/{self.publico.slug}/{self.paginas[0].slug}/'))
+        columnas = capturadas.captured_queries[-1]['sql'].split(' FROM ')[0]
+        self.assertIn('"docubase_app_proyecto"."slug"', columnas)
+        self.assertNotIn('"descripcion"', columnas)
+        self.assertNotIn('"contenido"', columnas)
+        self.assertNotIn('auth_user', columnas)
+
+    def test_include_con_un_numero_fijo_de_consultas(self):
+        url = ('/api/v1/paginas/?fields=titulo&include=proyecto,etiquetas,comentarios'
+               '&fields[proyectos]=titulo&fields[etiquetas]=nombre&fields[comentarios]=texto&limite=')
+        # Versión: una consulta agregada por recurso (4). Datos: páginas con su
+        # proyecto por JOIN y un prefetch por relación de varios (3).
+        with self.assertNumQueries(7):
+            pocas = self.client.get(url + '2').json()['datos']
+        with self.assertNumQueries(7):
+            todas = self.client.get(url + '50').json()['datos']
+        self.assertEqual(len(pocas), 2)
+        self.assertEqual(len(todas), 7)
+        self.assertEqual(todas[0], {
+            'titulo': 'pag 0', 'proyecto': {'titulo': 'Público'},
+            'etiquetas': [{'nombre': 'a'}, {'nombre': 'b'}], 'comentarios': [{'texto': 'hola 0'}],
+        })
+
+    def test_solo_se_ven_las_filas_publicas_y_las_propias(self):
+        self.assertEqual(self._titulos('/api/v1/proyectos/'), ['Público'])
+        self.assertNotIn('oculta', self._titulos('/api/v1/paginas/'))
+        self.assertNotIn('en privado', self._titulos('/api/v1/paginas/'))
+        self.assertNotIn('en oculta', self._titulos('/api/v1/comentarios/'))
+        self.assertEqual(self.client.get(f'/api/v1/proyectos/{self.privado.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/v1/paginas/{self.oculta.pk}/').status_code, 404)
+        incluidas = self.client.get(f'/api/v1/proyectos/{self.publico.pk}/?include=paginas').json()
+        self.assertEqual(len(incluidas['datos']['paginas']), 7)
+        self.assertEqual(self.client.get(f'/api/v1/proyectos/{self.privado.pk}/volcado/').status_code, 404)
+
+        # Otro usuario tampoco las ve; el autor sí.
+        self.client.force_login(self.luis)
+        self.assertEqual(self._titulos('/api/v1/proyectos/'), ['Público'])
+        self.assertEqual(len(self._titulos('/api/v1/paginas/')), 7)
+        self.client.force_login(self.ana)
+        self.assertEqual(self._titulos('/api/v1/proyectos/'), ['Público', 'Privado'])
+        self.assertIn('oculta', self._titulos('/api/v1/paginas/'))
+        self.assertIn('en oculta', self._titulos('/api/v1/comentarios/'))
+        self.assertEqual(self.client.get(f'/api/v1/proyectos/{self.privado.pk}/').status_code, 200)
+
+    def test_revalidacion_con_304(self):
+        url = '/api/v1/paginas/?fields=titulo&include=comentarios&limite=3'
+        respuesta = self.client.get(url)
+        etag = respuesta['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+        # Otros parámetros son otra versión.
+        self.assertEqual(self.client.get(url + '&fields[comentarios]=id', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Un comentario nuevo en una página incluida cambia la versión.
+        Comentario.objects.create(texto='otro', autor=self.luis, pagina=self.paginas[0])
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+        detalle = f'/api/v1/paginas/{self.paginas[1].pk}/'
+        etag = self.client.get(detalle)['ETag']
+        self.assertEqual(self.client.get(detalle, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Pagina.objects.get(pk=self.paginas[1].pk).save()
+        self.assertEqual(self.client.get(detalle, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def _volcado(self, **parametros):
+        respuesta = self.client.get(f'/api/v1/proyectos/{self.publico.pk}/volcado/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('application/x-ndjson'))
+        return respuesta, [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+
+    def test_volcado_ndjson(self):
+        respuesta, lineas = self._volcado()
+        self.assertEqual([l['tipo'] for l in lineas], ['proyecto'] + ['pagina'] * 7 + ['comentario'] * 7)
+        self.assertEqual(lineas[0]['datos']['titulo'], 'Público')
+        self.assertEqual(lineas[1]['datos']['contenido'], '<p>c</p>')
+        self.assertEqual(lineas[1]['datos']['etiquetas'], [{'id': e.pk, 'nombre': e.nombre}
+                                                          for e in self.paginas[0].etiquetas.order_by('pk')])
+        etag = respuesta['ETag']
+        volcado = f'/api/v1/proyectos/{self.publico.pk}/volcado/'
+        self.assertEqual(self.client.get(volcado, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(volcado, {'desde': 'ayer'}).status_code, 400)
+
+        # El autor también recibe lo que no es público.
+        self.client.force_login(self.ana)
+        self.assertIn('oculta', [l['datos'].get('titulo') for l in self._volcado()[1]])
+
+    def test_volcado_desde_una_fecha(self):
+        antes = timezone.now() - timedelta(days=2)
+        Pagina.objects.update(fecha_actualizacion=antes)
+        Comentario.objects.update(fecha_creacion=antes)
+        corte = timezone.now() - timedelta(days=1)
+        self.paginas[2].titulo = 'cambiada'
+        self.paginas[2].save()
+        Comentario.objects.create(texto='nuevo', autor=self.luis, pagina=self.paginas[4])
+
+        _, lineas = self._volcado(desde=corte.isoformat())
+        self.assertEqual([(l['tipo'], l['datos'].get('titulo', l['datos'].get('texto'))) for l in lineas],
+                         [('proyecto', 'Público'), ('pagina', 'cambiada'), ('comentario', 'nuevo')])
+        _, lineas = self._volcado(desde=timezone.now().isoformat())
+        self.assertEqual([l['tipo'] for l in lineas], ['proyecto'])
@@ -0,0 +1,86 @@
+import importlib
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches, resolve
+
+import docubase_app.urls
+from docubase_app import busqueda
+from docubase_app.models import Comentario, Pagina, Proyecto, SlugAntiguo
+
+
+def _recargar_urls():
+    # urls.py elige las vistas al importarse según VISTAS_ASINCRONAS. El
+    # URLconf raíz guarda el resolver del include() con sus patrones ya
+    # leídos, así que también se recarga.
+    importlib.reload(docubase_app.urls)
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class VistasAsincronasTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Las limpiezas van en orden inverso: primero se quita el ajuste y
+        # después se recargan las URLs con las vistas síncronas.
+        cls.addClassCleanup(_recargar_urls)
+        cls.enterClassContext(override_settings(VISTAS_ASINCRONAS=True))
+        _recargar_urls()
+
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyecto = Proyecto.objects.create(titulo='Alfa', descripcion='<p>desc python</p>', autor=self.ana)
+        self.pagina = Pagina.objects.create(titulo='P', contenido='<h2>Uno</h2><p>python</p>', autor=self.ana,
+                                            proyecto=self.proyecto)
+        Comentario.objects.create(pagina=self.pagina, autor=self.ana, texto='hola')
+        busqueda.indexar_proyecto(self.proyecto)
+        busqueda.indexar_pagina(self.pagina)
+        self.url = f'/proyectos/{self.proyecto.slug}/{self.pagina.slug}/'
+
+    def test_las_urls_usan_las_vistas_asincronas(self):
+        for url, nombre in [('/', 'aindex'), ('/proyectos/', 'aproyectos_lista'), ('/buscar/', 'abuscar_proyectos'),
+                            ('/proyectos/alfa/', 'aproyecto_detalle'), ('/proyectos/alfa/p/', 'apagina_detalle')]:
+            with self.subTest(url=url):
+                vista = resolve(url).func
+                self.assertEqual(vista.__name__, nombre)
+                self.assertTrue(iscoroutinefunction(vista))
+
+    async def test_vistas_de_lectura(self):
+        for url, texto in [('/', 'Alfa'), ('/proyectos/', 'Alfa'), ('/proyectos/?formato=json', 'alfa'),
+                           ('/proyectos/alfa/', 'desc'), (self.url, 'hola'), ('/buscar/?q=python', 'Alfa')]:
+            with self.subTest(url=url):
+                respuesta = await self.async_client.get(url)
+                self.assertContains(respuesta, texto)
+        self.assertEqual((await self.async_client.get('/proyectos/alfa/nada/')).status_code, 404)
+        self.assertEqual((await self.async_client.get('/proyectos/nada/')).status_code, 404)
+
+    async def test_detalle_revalida_con_304(self):
+        respuesta = await self.async_client.get(self.url)
+        self.assertContains(respuesta, 'hola')
+        self.assertIn('public', respuesta['Cache-Control'])
+        respuesta = await self.async_client.get(self.url, headers={'If-None-Match': respuesta['ETag']})
+        self.assertEqual(respuesta.status_code, 304)
+
+        # Un comentario nuevo cambia la versión.
+        await Comentario.objects.acreate(pagina=self.pagina, autor=self.ana, texto='otro')
+        nueva = await self.async_client.get(self.url, headers={'If-None-Match': respuesta['ETag']})
+        self.assertContains(nueva, 'otro')
+
+        proyecto = await self.async_client.get('/proyectos/alfa/')
+        respuesta = await self.async_client.get('/proyectos/alfa/', headers={'If-None-Match': proyecto['ETag']})
+        self.assertEqual(respuesta.status_code, 304)
+
+    async def test_con_sesion_la_respuesta_es_privada(self):
+        await self.async_client.aforce_login(self.ana)
+        respuesta = await self.async_client.get(self.url)
+        self.assertContains(respuesta, 'comentario')
+        self.assertIn('private', respuesta['Cache-Control'])
+
+    async def test_slug_antiguo_redirige(self):
+        await SlugAntiguo.objects.acreate(proyecto=self.proyecto, slug='viejo', pagina=self.pagina)
+        respuesta = await self.async_client.get('/proyectos/alfa/viejo/?hilos=0')
+        self.assertEqual(respuesta.status_code, 301)
+        self.assertEqual(respuesta['Location'], self.url + '?hilos=0')
@@ -0,0 +1,57 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from docubase_app import banco_pruebas, comentarios
+from docubase_app.models import Comentario, Contenido, Etiqueta, Proyecto
+
+
+class BancoPruebasTests(TestCase):
+    def setUp(self):
+        self.temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temporal)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=self.temporal, TAREAS_SINCRONAS=True, RENDIMIENTO_MUESTREO=0.0))
+        call_command('seed_bench', proyectos=3, paginas=6, usuarios=4, comentarios=6, adjuntos=2,
+                     revisiones=4, stdout=io.StringIO())
+
+    def test_los_datos_sinteticos_son_coherentes(self):
+        self.assertEqual(Proyecto.objects.count(), 3)
+        for comentario in Comentario.objects.select_related('comentario_padre'):
+            self.assertTrue(comentario.ruta.endswith(comentarios.segmento(comentario.pk)))
+            padre = comentario.comentario_padre
+            if padre is None:
+                self.assertEqual(comentario.hilo, comentario.pk)
+            else:
+                self.assertTrue(comentario.ruta.startswith(padre.ruta))
+                self.assertEqual((comentario.hilo, comentario.profundidad), (padre.hilo, padre.profundidad + 1))
+        for etiqueta in Etiqueta.objects.all():
+            self.assertEqual(etiqueta.num_paginas, etiqueta.paginas.count())
+            self.assertEqual(etiqueta.num_proyectos, etiqueta.proyectos.count())
+        for contenido in Contenido.objects.all():
+            self.assertEqual(contenido.referencias, contenido.archivos.count())
+
+    def test_bench_guarda_y_compara_una_linea_base(self):
+        base = os.path.join(self.temporal, 'base.json')
+        call_command('bench', repeticiones=2, guardar=base, stdout=io.StringIO())
+        with open(base, encoding='utf-8') as f:
+            informe = json.load(f)
+        for caso, resultado in informe['casos'].items():
+            self.assertLess(resultado['estado'], 500, caso)
+            self.assertIn('consultas', resultado)
+
+        salida = io.StringIO()
+        call_command('bench', repeticiones=2, comparar=base, solo=['pagina'], stdout=salida)
+        self.assertIn('pagina', salida.getvalue())
+
+    def test_comparar_marca_las_regresiones(self):
+        base = {'casos': {'a': {'estado': 200, 'consultas': 3}}}
+        actual = {'casos': {'a': {'estado': 200, 'consultas': 5}, 'b': {'estado': 200}}}
+        cambios, avisos = banco_pruebas.comparar(actual, base)
+        self.assertIn(('a', 'consultas', 3, 5, 2 / 3, True), cambios)
+        self.assertIn('b: no está en la línea base', avisos)
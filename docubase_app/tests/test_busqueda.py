@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from docubase_app import busqueda
+from docubase_app.models import Etiqueta, Pagina, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='x')
+        cls.proyecto = Proyecto.objects.create(
+            titulo='Guía Django', descripcion='<p>Framework <b>web</b> rápido</p>', autor=cls.ana)
+        cls.etiqueta = Etiqueta.objects.create(nombre='python')
+        cls.proyecto.etiquetas.add(cls.etiqueta)
+        cls.pagina = Pagina.objects.create(
+            titulo='Introducción', contenido='<p>Instalación de django con pip</p>',
+            autor=cls.ana, proyecto=cls.proyecto)
+        cls.privado = Proyecto.objects.create(titulo='Secreto django', autor=cls.ana, es_publico=False)
+
+    def _titulos(self, consulta):
+        return sorted(resultado.objeto.titulo for resultado in consulta[:])
+
+    def test_solo_muestra_lo_publico_a_los_anonimos(self):
+        consulta = busqueda.buscar('django')
+        self.assertEqual(consulta.count(), 2)
+        self.assertEqual(self._titulos(consulta), ['Guía Django', 'Introducción'])
+        self.assertEqual(busqueda.buscar('django', self.ana).count(), 3)
+
+    def test_busca_en_etiquetas_y_resalta(self):
+        self.assertEqual(busqueda.buscar('python').count(), 1)
+        resultado = busqueda.buscar('pip')[0]
+        self.assertIn('<mark>pip</mark>', resultado.fragmento)
+
+    def test_la_sintaxis_del_motor_no_rompe_la_consulta(self):
+        respuesta = self.client.get('/buscar/', {'q': '"AND OR ( NEAR'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.client.get('/buscar/').context['total'], 0)
+
+    def test_el_indice_sigue_a_los_cambios(self):
+        self.etiqueta.proyectos.remove(self.proyecto)
+        self.assertEqual(busqueda.buscar('python').count(), 0)
+        self.pagina.delete()
+        self.assertEqual(busqueda.buscar('instalacion').count(), 0)
+        call_command('rebuild_search_index', lote=1, stdout=mock.Mock())
+        self.assertEqual(busqueda.buscar('django', self.ana).count(), 2)
+
+    def test_sin_indice_busca_con_icontains(self):
+        with mock.patch.dict(busqueda._BACKENDS, clear=True):
+            consulta = busqueda.buscar('django')
+            self.assertEqual(consulta.count(), 2)
+            self.assertEqual(self._titulos(consulta), ['Guía Django', 'Introducción'])
+            # Proyectos primero; el corte puede caer entre los dos grupos.
+            self.assertEqual([r.tipo for r in consulta[1:2]], [busqueda.TIPO_PAGINA])
+            self.assertEqual(busqueda.buscar('python django').count(), 1)
+            self.assertEqual(busqueda.buscar('django', self.ana).count(), 3)
+            self.assertEqual(busqueda.buscar('').count(), 0)
+            respuesta = self.client.get('/buscar/', {'q': 'pip'})
+            self.assertEqual(respuesta.context['total'], 1)
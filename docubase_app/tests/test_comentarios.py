@@ -0,0 +1,139 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from docubase_app import comentarios
+from docubase_app.models import Comentario, Pagina, Proyecto
+
+
+class ArbolComentariosTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        proyecto = Proyecto.objects.create(titulo='P', descripcion='d', autor=self.ana, es_publico=True)
+        self.pagina = Pagina.objects.create(titulo='x', contenido='y', autor=self.ana, proyecto=proyecto,
+                                            es_publica=True)
+        self.url = f'/proyectos/{proyecto.slug}/{self.pagina.slug}/'
+
+    def _comentar(self, texto, padre=None):
+        return Comentario.objects.create(texto=texto, autor=self.ana, pagina=self.pagina, comentario_padre=padre)
+
+    def _textos(self, hilo):
+        return [c.texto for c in hilo]
+
+    def test_orden_por_ruta_en_profundidad(self):
+        a = self._comentar('a')
+        b = self._comentar('b')
+        a1 = self._comentar('a1', a)
+        b1 = self._comentar('b1', b)
+        a2 = self._comentar('a2', a)
+        self._comentar('a1x', a1)
+        self._comentar('a2x', a2)
+        # Más de diez hermanas: el ancho fijo evita que '10' vaya antes que '9'.
+        for i in range(12):
+            self._comentar(f'b1-{i:02d}', b1)
+
+        hilos, siguiente = comentarios.hilos(self.pagina)
+        self.assertIsNone(siguiente)
+        self.assertEqual([self._textos(h) for h in hilos], [
+            ['a', 'a1', 'a1x', 'a2', 'a2x'],
+            ['b', 'b1'] + [f'b1-{i:02d}' for i in range(12)],
+        ])
+        self.assertEqual([c.profundidad for c in hilos[0]], [0, 1, 2, 1, 2])
+        self.assertEqual({c.hilo for c in hilos[1]}, {b.pk})
+        self.assertEqual(Comentario.objects.get(texto='a2x').ruta,
+                         comentarios.segmento(a.pk) + comentarios.segmento(a2.pk)
+                         + comentarios.segmento(Comentario.objects.get(texto='a2x').pk))
+
+    def test_pasada_la_profundidad_maxima_responde_al_abuelo(self):
+        padre = self._comentar('raiz')
+        cadena = [padre]
+        for i in range(comentarios.PROFUNDIDAD_MAXIMA + 3):
+            padre = self._comentar(f'c{i}', padre)
+            cadena.append(padre)
+        cadena = [Comentario.objects.get(pk=c.pk) for c in cadena]
+
+        self.assertEqual([c.profundidad for c in cadena],
+                         list(range(comentarios.PROFUNDIDAD_MAXIMA + 1)) + [comentarios.PROFUNDIDAD_MAXIMA] * 3)
+        tope = cadena[comentarios.PROFUNDIDAD_MAXIMA]
+        for comentario in cadena[comentarios.PROFUNDIDAD_MAXIMA + 1:]:
+            # Cuelga del padre del comentario más hondo y va justo detrás de él.
+            self.assertEqual(comentario.comentario_padre_id, tope.comentario_padre_id)
+            self.assertEqual(comentario.ruta.count('/'), comentarios.PROFUNDIDAD_MAXIMA + 1)
+            self.assertLessEqual(len(comentario.ruta), Comentario._meta.get_field('ruta').max_length)
+        hilos, _ = comentarios.hilos(self.pagina)
+        self.assertEqual(self._textos(hilos[0]), [c.texto for c in cadena])
+
+    def test_paginacion_de_hilos_con_cursor(self):
+        raices = [self._comentar(f'r{i}') for i in range(comentarios.HILOS_POR_PAGINA + 5)]
+        self._comentar('respuesta', raices[-1])
+
+        hilos, siguiente = comentarios.hilos(self.pagina)
+        self.assertEqual(len(hilos), comentarios.HILOS_POR_PAGINA)
+        self.assertEqual(siguiente, raices[comentarios.HILOS_POR_PAGINA - 1].pk)
+        mas, fin = comentarios.hilos(self.pagina, desde=siguiente)
+        self.assertIsNone(fin)
+        self.assertEqual([h[0].texto for h in mas], [f'r{i}' for i in range(comentarios.HILOS_POR_PAGINA, len(raices))])
+        self.assertEqual(self._textos(mas[-1]), [raices[-1].texto, 'respuesta'])
+
+        # Justo `cantidad` hilos: no hay siguiente.
+        self.assertIsNone(comentarios.hilos(self.pagina, cantidad=len(raices))[1])
+        self.assertEqual(async_to_sync(comentarios.ahilos)(self.pagina, desde=siguiente)[1], None)
+
+        respuesta = self.client.get(self.url)
+        self.assertContains(respuesta, f'?hilos={siguiente}#comentarios')
+        respuesta = self.client.get(self.url, {'hilos': siguiente})
+        self.assertContains(respuesta, 'respuesta')
+        self.assertNotContains(respuesta, '?hilos=')
+
+    def test_dos_consultas_con_cualquier_numero_de_respuestas(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(comentarios.hilos(self.pagina), ([], None))
+        raices = [self._comentar(f'r{i}') for i in range(3)]
+        with self.assertNumQueries(2):
+            comentarios.hilos(self.pagina)
+        padre = raices[0]
+        for i in range(30):
+            padre = self._comentar(f'c{i}', padre if i % 3 else raices[1])
+        with self.assertNumQueries(2):
+            hilos, _ = comentarios.hilos(self.pagina)
+            # El autor viene en la misma consulta.
+            self.assertEqual({c.autor.username for h in hilos for c in h}, {'ana'})
+
+    def test_borrar_un_comentario_conserva_sus_respuestas_en_su_sitio(self):
+        raiz = self._comentar('raiz')
+        medio = self._comentar('medio', raiz)
+        self._comentar('hoja', medio)
+        self._comentar('otra', raiz)
+        medio.delete()
+        hilos, _ = comentarios.hilos(self.pagina)
+        self.assertEqual(self._textos(hilos[0]), ['raiz', 'hoja', 'otra'])
+        self.assertEqual(hilos[0][1].profundidad, 2)
+        self.assertIsNone(hilos[0][1].comentario_padre_id)
+
+    def test_colocar_lote_coincide_con_guardar(self):
+        raiz = Comentario(texto='raiz', autor=self.ana, pagina=self.pagina)
+        Comentario.objects.bulk_create([raiz])
+        respuestas = [Comentario(texto=f'r{i}', autor=self.ana, pagina=self.pagina, comentario_padre=raiz)
+                      for i in range(3)]
+        Comentario.objects.bulk_create(respuestas)
+        padre, cadena = respuestas[0], []
+        for i in range(comentarios.PROFUNDIDAD_MAXIMA + 1):
+            padre = Comentario(texto=f'c{i}', autor=self.ana, pagina=self.pagina, comentario_padre=padre)
+            Comentario.objects.bulk_create([padre])
+            cadena.append(padre)
+        comentarios.colocar_lote([raiz] + respuestas + cadena)
+        comentarios.colocar_lote([])
+
+        hilos, _ = comentarios.hilos(self.pagina)
+        self.assertEqual(self._textos(hilos[0]),
+                         ['raiz', 'r0'] + [f'c{i}' for i in range(comentarios.PROFUNDIDAD_MAXIMA + 1)] + ['r1', 'r2'])
+        ultimo = Comentario.objects.get(pk=cadena[-1].pk)
+        self.assertEqual(ultimo.profundidad, comentarios.PROFUNDIDAD_MAXIMA)
+        # Los dos que pasan del máximo cuelgan del mismo padre que el más hondo.
+        self.assertEqual(ultimo.comentario_padre_id, cadena[-4].pk)
+        self.assertEqual(cadena[-2].comentario_padre_id, cadena[-4].pk)
+        self.assertEqual({c.hilo for c in hilos[0]}, {raiz.pk})
+
+        # Un comentario nuevo creado con save() se coloca igual en el mismo árbol.
+        self._comentar('nueva', Comentario.objects.get(pk=respuestas[2].pk))
+        self.assertEqual(self._textos(comentarios.hilos(self.pagina)[0][0])[-1], 'nueva')
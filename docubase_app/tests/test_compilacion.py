@@ -0,0 +1,100 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from docubase_app import compilacion
+from docubase_app.models import Pagina, Proyecto, SlugAntiguo
+
+
+class SaneadoTests(SimpleTestCase):
+    def test_quita_scripts_manejadores_y_urls_peligrosas(self):
+        html, _ = compilacion.compilar(
+            '<p onclick="x()" style="color: red; position: fixed">hola<script>alert(1)</script></p>'
+            '<a href="javascript:alert(1)">a</a><img src="x.png" onerror="y()">')
+        self.assertNotIn('script', html)
+        self.assertNotIn('onclick', html)
+        self.assertNotIn('onerror', html)
+        self.assertNotIn('javascript:', html)
+        self.assertNotIn('position', html)
+        self.assertIn('color: red', html)
+
+    def test_desenvuelve_las_etiquetas_desconocidas(self):
+        html, _ = compilacion.compilar('<p><blink>texto</blink></p>')
+        self.assertEqual(html, '<p>texto</p>')
+
+    def test_un_embed_dentro_de_object_no_se_lleva_el_resto(self):
+        html, indice = compilacion.compilar(
+            '<p>antes</p><object data="v.swf"><param name="movie" value="v.swf"><embed src="v.swf"></object>'
+            '<h2>Instalar</h2><p>resto</p>')
+        self.assertEqual(html, '<p>antes</p><h2 id="instalar">Instalar</h2><p>resto</p>')
+        self.assertEqual([entrada['id'] for entrada in indice], ['instalar'])
+
+    def test_un_embed_con_cierre_explicito(self):
+        html, _ = compilacion.compilar('<object><embed src="v.swf"></embed></object><p>resto</p>')
+        self.assertEqual(html, '<p>resto</p>')
+
+    def test_ids_de_titulos_unicos_y_sin_chocar_con_la_plantilla(self):
+        _, indice = compilacion.compilar('<h2>Uno</h2><h3>Dos</h3><h2>Uno</h2><h2>Comentarios</h2>')
+        self.assertEqual([entrada['id'] for entrada in indice], ['uno', 'dos', 'uno-2', 'comentarios-2'])
+        self.assertEqual([entrada['profundidad'] for entrada in indice], [0, 1, 0, 0])
+
+    def test_enlaces_con_target_llevan_noopener(self):
+        html, _ = compilacion.compilar('<a href="https://example.com" target="_blank">x</a>')
+        self.assertIn('rel="noopener"', html)
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class CompilarAlGuardarTests(TestCase):
+    def setUp(self):
+        temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temporal)
+        self.enterContext(override_settings(MEDIA_ROOT=temporal))
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyecto = Proyecto.objects.create(
+            titulo='A', autor=self.ana, descripcion='<p onclick="x">desc<script>1</script></p>')
+
+    def test_imagenes_enlaces_internos_e_indice(self):
+        imagen = io.BytesIO()
+        Image.new('RGB', (64, 48)).save(imagen, 'PNG')
+        default_storage.save('uploads/f.png', ContentFile(imagen.getvalue()))
+        destino = Pagina.objects.create(titulo='Destino', contenido='x', autor=self.ana, proyecto=self.proyecto)
+        SlugAntiguo.objects.create(proyecto=self.proyecto, slug='viejo', pagina=destino)
+        pagina = Pagina.objects.create(titulo='P', autor=self.ana, proyecto=self.proyecto, contenido=(
+            '<h2>Uno</h2><p>x<img src="/media/uploads/f.png"></p><h3>Dos</h3>'
+            '<p><a href="http://localhost/proyectos/a/viejo/#s">v</a></p>'))
+        pagina.refresh_from_db()
+        self.assertIn('width="64" height="48"', pagina.contenido_html)
+        self.assertIn('loading="lazy"', pagina.contenido_html)
+        self.assertIn('href="/proyectos/a/destino/#s"', pagina.contenido_html)
+        self.assertContains(self.client.get('/proyectos/a/p/'), 'href="#dos"')
+        respuesta = self.client.get('/proyectos/a/')
+        self.assertNotContains(respuesta, 'onclick')
+        self.assertNotContains(respuesta, '<script>1')
+
+    def test_compilar_contenido_recompila_las_versiones_antiguas(self):
+        pagina = Pagina.objects.create(titulo='P', autor=self.ana, proyecto=self.proyecto,
+                                       contenido='<h2>T</h2><script>x</script>')
+        Pagina.objects.filter(pk=pagina.pk).update(
+            contenido_html='<p>viejo</p>', indice=[], version_compilacion=compilacion.VERSION - 1)
+        call_command('compilar_contenido', stdout=io.StringIO())
+        pagina.refresh_from_db()
+        self.assertEqual(pagina.version_compilacion, compilacion.VERSION)
+        self.assertEqual(pagina.contenido_html, '<h2 id="t">T</h2>')
+        salida = io.StringIO()
+        call_command('compilar_contenido', stdout=salida)
+        self.assertIn('0 filas', salida.getvalue())
+
+    def test_sin_compilar_nunca_se_sirve_el_html_en_bruto(self):
+        pagina = Pagina.objects.create(titulo='P', autor=self.ana, proyecto=self.proyecto,
+                                       contenido='<h2>T</h2><script>x</script>')
+        Pagina.objects.filter(pk=pagina.pk).update(contenido_html='', indice=[], version_compilacion=0)
+        respuesta = self.client.get('/proyectos/a/p/')
+        self.assertNotContains(respuesta, '<script>x')
+        self.assertContains(respuesta, 'id="t"')
@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase, override_settings
+
+from docubase_app import comprobaciones
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+BASE_DE_DATOS = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}
+
+
+class CachesCompartidasTests(SimpleTestCase):
+    def _ids(self):
+        return [error.id for error in comprobaciones.comprobar_caches_compartidas(None)]
+
+    @override_settings(EXIGIR_CACHE_COMPARTIDA=True, CACHES={'default': LOCMEM, 'fragmentos': LOCMEM})
+    def test_cache_local_es_un_error_si_se_exige(self):
+        self.assertEqual(self._ids(), ['docubase_app.E001'])
+
+    @override_settings(EXIGIR_CACHE_COMPARTIDA=False, CACHES={'default': LOCMEM, 'fragmentos': LOCMEM})
+    def test_cache_local_si_no_se_exige(self):
+        self.assertEqual(self._ids(), [])
+
+    @override_settings(EXIGIR_CACHE_COMPARTIDA=True, CACHES={'default': LOCMEM, 'fragmentos': BASE_DE_DATOS})
+    def test_cache_compartida(self):
+        self.assertEqual(self._ids(), [])
+
+    @override_settings(EXIGIR_CACHE_COMPARTIDA=True, CACHES={'default': LOCMEM, 'fragmentos': BASE_DE_DATOS},
+                       PANEL_CACHE_ALIAS='default')
+    def test_la_cache_del_panel_tambien_debe_ser_compartida(self):
+        self.assertEqual(self._ids(), ['docubase_app.E001'])
@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from docubase_app.models import Archivo, Etiqueta, Pagina, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class PeticionesCondicionalesTests(TestCase):
+    URLS = ('/proyectos/guia/intro/', '/proyectos/guia/', '/proyectos/', '/proyectos/?formato=json')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='x')
+        cls.proyecto = Proyecto.objects.create(titulo='Guía', descripcion='<p>desc</p>', autor=cls.ana)
+        cls.pagina = Pagina.objects.create(titulo='Intro', contenido='<p>cuerpo</p>', autor=cls.ana,
+                                           proyecto=cls.proyecto)
+
+    def _revalidar(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_revalidar_sin_cambios_da_304_con_una_consulta(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertIn('public', respuesta['Cache-Control'])
+                with self.assertNumQueries(1):
+                    revalidada = self._revalidar(url, respuesta['ETag'])
+                self.assertEqual(revalidada.status_code, 304)
+                self.assertEqual(revalidada['Cache-Control'], respuesta['Cache-Control'])
+
+    def test_los_cambios_invalidan_el_etag(self):
+        etag_proyecto = self.client.get('/proyectos/guia/')['ETag']
+        etag_pagina = self.client.get('/proyectos/guia/intro/')['ETag']
+        Pagina.objects.create(titulo='Otra', autor=self.ana, proyecto=self.proyecto)
+        self.assertEqual(self._revalidar('/proyectos/guia/', etag_proyecto).status_code, 200)
+        self.pagina.contenido = '<p>nuevo</p>'
+        self.pagina.save()
+        self.assertContains(self._revalidar('/proyectos/guia/intro/', etag_pagina), 'nuevo')
+
+    def test_un_adjunto_nuevo_invalida_el_etag_de_la_pagina(self):
+        etag = self.client.get('/proyectos/guia/intro/')['ETag']
+        Archivo.objects.create(nombre='manual.pdf', archivo='archivos/manual.pdf', pagina=self.pagina,
+                               subido_por=self.ana)
+        self.assertContains(self._revalidar('/proyectos/guia/intro/', etag), 'manual.pdf')
+
+    def test_renombrar_una_etiqueta_invalida_los_etags(self):
+        etiqueta = Etiqueta.objects.create(nombre='python')
+        self.proyecto.etiquetas.add(etiqueta)
+        self.pagina.etiquetas.add(etiqueta)
+        etags = {url: self.client.get(url)['ETag'] for url in self.URLS[:2]}
+        etiqueta.nombre = 'django'
+        etiqueta.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self._revalidar(url, etag).status_code, 200)
+
+    def test_el_etag_depende_del_usuario(self):
+        etag = self.client.get('/proyectos/guia/intro/')['ETag']
+        self.client.force_login(self.ana)
+        respuesta = self._revalidar('/proyectos/guia/intro/', etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('private', respuesta['Cache-Control'])
+
+    def test_objeto_inexistente_da_404(self):
+        self.assertEqual(self.client.get('/proyectos/guia/no-existe/').status_code, 404)
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from docubase_app import entrega, subidas
+from docubase_app.models import Archivo, Pagina, Proyecto
+
+SCRIPT = b'<html><script>alert(document.cookie)</script></html>'
+
+
+class ParsearRangoTests(SimpleTestCase):
+    def test_rangos_validos(self):
+        self.assertEqual(entrega.parsear_rango('bytes=0-9', 100), (0, 10))
+        self.assertEqual(entrega.parsear_rango('bytes=90-', 100), (90, 100))
+        self.assertEqual(entrega.parsear_rango('bytes=-30', 100), (70, 100))
+        self.assertEqual(entrega.parsear_rango('bytes=-300', 100), (0, 100))
+        self.assertEqual(entrega.parsear_rango('bytes=50-500', 100), (50, 100))
+
+    def test_sin_rango_o_varios_rangos_sirven_todo(self):
+        for cabecera in (None, '', 'bytes=-', 'bytes=0-1,5-6', 'items=0-1', 'bytes=a-b'):
+            with self.subTest(cabecera=cabecera):
+                self.assertIsNone(entrega.parsear_rango(cabecera, 100))
+
+    def test_rangos_no_satisfacibles(self):
+        for cabecera in ('bytes=100-', 'bytes=150-200', 'bytes=-0', 'bytes=9-3'):
+            with self.subTest(cabecera=cabecera), self.assertRaises(entrega.RangoNoSatisfacible):
+                entrega.parsear_rango(cabecera, 100)
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class EntregaMediaTests(TestCase):
+    def setUp(self):
+        temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temporal)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=os.path.join(temporal, 'media'), SUBIDAS_DIR=os.path.join(temporal, 'parciales')))
+        self.ana = User.objects.create_user('ana', password='x')
+        self.beto = User.objects.create_user('beto', password='x')
+        self.proyecto = Proyecto.objects.create(titulo='Público', descripcion='d', autor=self.ana)
+        self.publica = Pagina.objects.create(titulo='A', contenido='x', autor=self.ana, proyecto=self.proyecto)
+        self.oculta = Pagina.objects.create(titulo='B', contenido='x', autor=self.ana, proyecto=self.proyecto,
+                                            es_publica=False)
+        self.privado = Proyecto.objects.create(titulo='Privado', descripcion='d', autor=self.ana, es_publico=False)
+
+    def _archivo(self, nombre, datos, pagina, **campos):
+        ruta = default_storage.save(f'archivos/{nombre}', ContentFile(datos))
+        return Archivo.objects.create(nombre=nombre, archivo=ruta, tamano=len(datos), pagina=pagina,
+                                      subido_por=campos.pop('subido_por', self.ana), **campos)
+
+    def _resuelve(self, ruta, usuario):
+        return entrega.resolver(ruta, usuario) is not None
+
+    # --- Visibilidad ---
+
+    def test_visibilidad_de_adjuntos(self):
+        publico = self._archivo('a.pdf', b'%PDF', self.publica).archivo.name
+        oculto = self._archivo('b.pdf', b'%PDF', self.oculta).archivo.name
+        de_beto = self._archivo('c.pdf', b'%PDF', self.oculta, subido_por=self.beto).archivo.name
+        cualquiera = User.objects.create_user('carla')
+        casos = [
+            (publico, AnonymousUser(), True),
+            (oculto, AnonymousUser(), False),
+            (oculto, cualquiera, False),
+            (oculto, self.ana, True),
+            (de_beto, self.beto, True),
+            ('archivos/no-existe.pdf', self.ana, False),
+        ]
+        for ruta, usuario, visible in casos:
+            with self.subTest(ruta=ruta, usuario=str(usuario)):
+                self.assertEqual(self._resuelve(ruta, usuario), visible)
+        self.assertTrue(entrega.resolver(publico, AnonymousUser()).publico)
+        self.assertFalse(entrega.resolver(oculto, self.ana).publico)
+
+    def test_visibilidad_de_imagenes_y_miniaturas(self):
+        digest = 'ab' * 32
+        Proyecto.objects.filter(pk=self.proyecto.pk).update(imagen='proyectos_imagenes/p.png')
+        Proyecto.objects.filter(pk=self.privado.pk).update(imagen='proyectos_imagenes/q.png', imagen_hash=digest)
+        self.assertTrue(self._resuelve('proyectos_imagenes/p.png', AnonymousUser()))
+        self.assertFalse(self._resuelve('proyectos_imagenes/q.png', AnonymousUser()))
+        self.assertTrue(self._resuelve('proyectos_imagenes/q.png', self.ana))
+        miniatura = f'miniaturas/ab/{digest}-320.webp'
+        self.assertFalse(self._resuelve(miniatura, self.beto))
+        resuelta = entrega.resolver(miniatura, self.ana)
+        self.assertTrue(resuelta.inmutable)
+        self.assertFalse(resuelta.publico)
+        self.assertFalse(self._resuelve('miniaturas/ab/sin-hash.webp', self.ana))
+
+    def test_rutas_fuera_de_la_media_conocida(self):
+        for ruta in ('../settings.py', 'archivos/../../secreto', '/etc/passwd', 'otra/cosa.txt', 'subidas_parciales/x'):
+            with self.subTest(ruta=ruta):
+                self.assertFalse(self._resuelve(ruta, self.ana))
+        self.assertTrue(entrega.resolver('uploads/' + 'cd' * 32 + '.png', AnonymousUser()).inmutable)
+
+    # --- Tipos y descarga forzada ---
+
+    def test_html_subido_se_descarga_y_no_se_muestra(self):
+        # El caso de la revisión: un .html con <script> subido por trozos a una página pública.
+        self.client.force_login(self.ana)
+        respuesta = self.client.post('/subidas/', {'nombre': 'x.html', 'tamano': len(SCRIPT),
+                                                   'pagina': self.publica.pk})
+        self.client.put(respuesta.json()['url'], SCRIPT, content_type='application/octet-stream',
+                        HTTP_CONTENT_RANGE=f'bytes 0-{len(SCRIPT) - 1}/{len(SCRIPT)}')
+        subidas._hashes.clear()
+        self.client.logout()
+        archivo = Archivo.objects.get()
+        respuesta = self.client.get('/media/' + archivo.archivo.name)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/octet-stream')
+        self.assertTrue(respuesta['Content-Disposition'].startswith('attachment'))
+        self.assertIn('x.html', respuesta['Content-Disposition'])
+        self.assertEqual(respuesta['Content-Security-Policy'], 'sandbox')
+
+    def test_tipos_en_linea_y_forzados(self):
+        casos = [
+            ('foto.png', 'image/png', 'image/png', 'inline'),
+            ('manual.pdf', 'application/pdf', 'application/pdf', 'inline'),
+            ('video.mp4', 'video/mp4', 'video/mp4', 'inline'),
+            ('dibujo.svg', 'image/svg+xml', 'application/octet-stream', 'attachment'),
+            # Un tipo guardado antes de esta comprobación no se cree.
+            ('pagina.htm', 'text/html', 'application/octet-stream', 'attachment'),
+            ('notas.txt', '', 'application/octet-stream', 'attachment'),
+        ]
+        for nombre, guardado, servido, disposicion in casos:
+            with self.subTest(nombre=nombre):
+                archivo = self._archivo(nombre, b'datos', self.publica, tipo_mime=guardado)
+                respuesta = self.client.get('/media/' + archivo.archivo.name)
+                self.assertEqual(respuesta['Content-Type'], servido)
+                self.assertTrue(respuesta['Content-Disposition'].startswith(disposicion))
+                self.assertEqual(respuesta['Content-Security-Policy'], 'sandbox')
+                self.assertEqual(respuesta['X-Content-Type-Options'], 'nosniff')
+
+    def test_subida_de_ckeditor_svg_se_descarga(self):
+        nombre = default_storage.save('uploads/' + hashlib.sha256(SCRIPT).hexdigest() + '.svg', ContentFile(SCRIPT))
+        respuesta = self.client.get('/media/' + nombre)
+        self.assertEqual(respuesta['Content-Type'], 'application/octet-stream')
+        self.assertTrue(respuesta['Content-Disposition'].startswith('attachment'))
+
+    def test_descarga_delegada_con_las_mismas_cabeceras(self):
+        archivo = self._archivo('x.html', SCRIPT, self.publica, tipo_mime='text/html')
+        for delegada, cabecera in (('x-accel', 'X-Accel-Redirect'), ('x-sendfile', 'X-Sendfile')):
+            with self.subTest(delegada=delegada), override_settings(MEDIA_DESCARGA_DELEGADA=delegada):
+                respuesta = self.client.get('/media/' + archivo.archivo.name)
+                self.assertIn(cabecera, respuesta)
+                self.assertEqual(respuesta.content, b'')
+                self.assertEqual(respuesta['Content-Type'], 'application/octet-stream')
+                self.assertTrue(respuesta['Content-Disposition'].startswith('attachment'))
+                self.assertEqual(respuesta['Content-Security-Policy'], 'sandbox')
+
+    # --- Peticiones condicionales y rangos ---
+
+    def test_rangos_if_range_y_304(self):
+        datos = bytes(range(256)) * 4
+        url = '/media/' + self._archivo('datos.pdf', datos, self.publica, tipo_mime='application/pdf').archivo.name
+        completa = self.client.get(url)
+        self.assertEqual(b''.join(completa.streaming_content), datos)
+        etag = completa['ETag']
+        self.assertIn('public', completa['Cache-Control'])
+
+        parcial = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(parcial['Content-Range'], f'bytes 10-19/{len(datos)}')
+        self.assertEqual(b''.join(parcial.streaming_content), datos[10:20])
+
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=-4', HTTP_IF_RANGE=etag).status_code, 206)
+        # Con un If-Range antiguo se envía el archivo entero.
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=-4', HTTP_IF_RANGE='"otro"').status_code, 200)
+
+        fuera = self.client.get(url, HTTP_RANGE=f'bytes={len(datos)}-')
+        self.assertEqual(fuera.status_code, 416)
+        self.assertEqual(fuera['Content-Range'], f'bytes */{len(datos)}')
+
+        no_modificada = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada['Content-Security-Policy'], 'sandbox')
+
+    def test_privado_no_se_cachea_y_da_404_a_otros(self):
+        url = '/media/' + self._archivo('b.pdf', b'%PDF', self.oculta).archivo.name
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.ana)
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('private', respuesta['Cache-Control'])
@@ -0,0 +1,108 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from docubase_app import etiquetas
+from docubase_app.models import Etiqueta, Pagina, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class ContadoresEtiquetasTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyectos = [Proyecto.objects.create(titulo=f'P{i}', descripcion='d', autor=self.ana) for i in range(3)]
+        self.pagina = Pagina.objects.create(titulo='x', contenido='y', autor=self.ana, proyecto=self.proyectos[0])
+
+    def _contadores(self):
+        return {e.nombre: (e.num_proyectos, e.num_paginas) for e in Etiqueta.objects.all()}
+
+    def _esperado_tras(self, esperado):
+        self.assertEqual({n: c for n, c in self._contadores().items() if c != (0, 0)}, esperado)
+
+    def test_asignar_crea_las_que_faltan_y_cuenta(self):
+        etiquetas.asignar(self.proyectos[0], ['python', ' django ', 'python', ''])
+        etiquetas.asignar(self.proyectos[1], etiquetas.parsear('python, api'))
+        etiquetas.asignar(self.pagina, ['python'])
+        self._esperado_tras({'python': (2, 1), 'django': (1, 0), 'api': (1, 0)})
+
+        # Solo cambian las filas que difieren.
+        etiquetas.asignar(self.proyectos[0], ['django', 'rust'])
+        self._esperado_tras({'python': (1, 1), 'django': (1, 0), 'api': (1, 0), 'rust': (1, 0)})
+
+    def test_asignar_con_un_numero_fijo_de_consultas(self):
+        def consultas(nombres, proyecto):
+            with CaptureQueriesContext(connection) as capturadas:
+                etiquetas.asignar(proyecto, nombres)
+            return len(capturadas)
+        self.assertEqual(consultas([f'a{i}' for i in range(3)], self.proyectos[0]),
+                         consultas([f'b{i}' for i in range(30)], self.proyectos[1]))
+
+    def test_add_remove_clear_directos_e_inversos(self):
+        python, django = Etiqueta.objects.create(nombre='python'), Etiqueta.objects.create(nombre='django')
+        self.proyectos[0].etiquetas.add(python, django)
+        self.proyectos[0].etiquetas.add(python)
+        python.proyectos.add(self.proyectos[1], self.proyectos[2])
+        self._esperado_tras({'python': (3, 0), 'django': (1, 0)})
+
+        # `remove` de algo que no estaba asociado no descuenta.
+        django.proyectos.remove(self.proyectos[0], self.proyectos[1])
+        self.proyectos[1].etiquetas.remove(django)
+        self._esperado_tras({'python': (3, 0)})
+
+        self.proyectos[0].etiquetas.clear()
+        self._esperado_tras({'python': (2, 0)})
+        python.proyectos.clear()
+        self._esperado_tras({})
+
+    def test_borrar_proyectos_paginas_y_etiquetas(self):
+        etiquetas.asignar(self.proyectos[0], ['python'])
+        etiquetas.asignar(self.proyectos[1], ['python'])
+        etiquetas.asignar(self.pagina, ['python', 'guia'])
+        # El borrado en cascada de la página no emite m2m_changed.
+        self.proyectos[0].delete()
+        self._esperado_tras({'python': (1, 0)})
+
+        Etiqueta.objects.get(nombre='python').delete()
+        self.assertFalse(self.proyectos[1].etiquetas.exists())
+        self.assertEqual(list(etiquetas.facetas()), [])
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class VistasEtiquetasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ana = User.objects.create_user('ana', password='x')
+        for i in range(etiquetas.NUM_FACETAS + 2):
+            proyecto = Proyecto.objects.create(titulo=f'P{i}', descripcion='d', autor=ana)
+            etiquetas.asignar(proyecto, [f'e{j}' for j in range(i + 1)])
+        cls.privado = Proyecto.objects.create(titulo='Privado', descripcion='d', autor=ana, es_publico=False)
+        etiquetas.asignar(cls.privado, ['c/c++'])
+        publico = Proyecto.objects.create(titulo='Público', descripcion='d', autor=ana)
+        etiquetas.asignar(publico, ['c/c++'])
+        pagina = Pagina.objects.create(titulo='Punteros', contenido='y', autor=ana, proyecto=publico)
+        etiquetas.asignar(pagina, ['c/c++'])
+        oculta = Pagina.objects.create(titulo='Oculta', contenido='y', autor=ana, proyecto=publico, es_publica=False)
+        etiquetas.asignar(oculta, ['c/c++'])
+
+    def test_facetas_ordenadas_por_uso(self):
+        nombres = [e.nombre for e in etiquetas.facetas()]
+        self.assertEqual(len(nombres), etiquetas.NUM_FACETAS)
+        self.assertEqual(nombres[:3], ['e0', 'e1', 'e2'])
+
+    def test_lista_filtrada_conserva_la_seleccion_fuera_de_las_facetas(self):
+        respuesta = self.client.get('/proyectos/', {'etiqueta': ['e15', 'e16']})
+        self.assertEqual([p.titulo for p in respuesta.context['proyectos']], ['P16'])
+        facetas = respuesta.context['facetas']
+        activas = [f['etiqueta'].nombre for f in facetas if f['activa']]
+        self.assertEqual(sorted(activas), ['e15', 'e16'])
+        quitar_e16 = next(f for f in facetas if f['etiqueta'].nombre == 'e16')
+        self.assertEqual(quitar_e16['url'], '?etiqueta=e15')
+
+    def test_pagina_de_etiqueta(self):
+        respuesta = self.client.get('/etiquetas/c/c++/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([p.titulo for p in respuesta.context['proyectos']], ['Público'])
+        self.assertEqual([p.titulo for p in respuesta.context['paginas']], ['Punteros'])
+        self.assertContains(respuesta, 'Usada en 2 proyectos')
+        self.assertEqual(self.client.get('/etiquetas/no-existe/').status_code, 404)
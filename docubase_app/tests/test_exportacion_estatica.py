@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from docubase_app import comentarios, exportacion_estatica
+from docubase_app.models import Archivo, Comentario, Pagina, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class ExportacionEstaticaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='x')
+        cls.proyecto = Proyecto.objects.create(titulo='Guía', descripcion='<p>x</p>', autor=cls.ana)
+        for i in range(3):
+            Pagina.objects.create(titulo=f'P{i}', contenido='<p>c</p>', autor=cls.ana, proyecto=cls.proyecto)
+        Proyecto.objects.create(titulo='Privado', autor=cls.ana, es_publico=False)
+
+    def setUp(self):
+        self.destino = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.destino)
+
+    def _ruta(self, *partes):
+        return os.path.join(self.destino, 'proyectos', *partes, 'index.html')
+
+    def test_exporta_solo_lo_publico_y_despues_solo_lo_cambiado(self):
+        resultado = exportacion_estatica.exportar(self.destino)
+        self.assertEqual((resultado['total'], resultado['escritos']), (4, 4))
+        self.assertTrue(os.path.exists(self._ruta('guia', 'p0')))
+        self.assertFalse(os.path.exists(self._ruta('privado')))
+        self.assertEqual(exportacion_estatica.exportar(self.destino)['renderizados'], 0)
+
+        pagina = Pagina.objects.get(titulo='P1')
+        pagina.contenido = '<p>nuevo</p>'
+        pagina.save()
+        Pagina.objects.filter(titulo='P2').update(es_publica=False)
+        resultado = exportacion_estatica.exportar(self.destino)
+        self.assertEqual(resultado['borrados'], 1)
+        self.assertFalse(os.path.exists(self._ruta('guia', 'p2')))
+        with open(self._ruta('guia', 'p1'), encoding='utf-8') as f:
+            self.assertIn('nuevo', f.read())
+
+    def test_no_borra_una_url_reutilizada_por_otro_objeto(self):
+        exportacion_estatica.exportar(self.destino)
+        Pagina.objects.get(titulo='P0').delete()
+        Pagina.objects.create(titulo='P0', contenido='<p>otra</p>', autor=self.ana, proyecto=self.proyecto)
+        resultado = exportacion_estatica.exportar(self.destino)
+        self.assertEqual(resultado['borrados'], 0)
+        with open(self._ruta('guia', 'p0'), encoding='utf-8') as f:
+            self.assertIn('otra', f.read())
+
+    def test_exporta_todos_los_comentarios_y_rerenderiza_al_comentar(self):
+        pagina = Pagina.objects.get(titulo='P0')
+        for i in range(comentarios.HILOS_POR_PAGINA + 1):
+            Comentario.objects.create(texto=f'hilo {i}', autor=self.ana, pagina=pagina)
+        exportacion_estatica.exportar(self.destino)
+        with open(self._ruta('guia', 'p0'), encoding='utf-8') as f:
+            html = f.read()
+        self.assertIn(f'hilo {comentarios.HILOS_POR_PAGINA}', html)
+        self.assertNotIn('Todavía no hay comentarios', html)
+
+        Comentario.objects.create(texto='respuesta nueva', autor=self.ana, pagina=pagina,
+                                  comentario_padre=Comentario.objects.first())
+        resultado = exportacion_estatica.exportar(self.destino)
+        self.assertEqual((resultado['renderizados'], resultado['escritos']), (1, 1))
+        with open(self._ruta('guia', 'p0'), encoding='utf-8') as f:
+            self.assertIn('respuesta nueva', f.read())
+
+    def test_rerenderiza_al_adjuntar_y_borrar_archivos(self):
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(self.destino, 'almacen')))
+        pagina = Pagina.objects.get(titulo='P0')
+        exportacion_estatica.exportar(self.destino)
+        archivo = Archivo.objects.create(nombre='manual.pdf', archivo=SimpleUploadedFile('manual.pdf', b'%PDF'),
+                                         subido_por=self.ana, pagina=pagina)
+        resultado = exportacion_estatica.exportar(self.destino)
+        self.assertEqual((resultado['renderizados'], resultado['escritos']), (1, 1))
+        with open(self._ruta('guia', 'p0'), encoding='utf-8') as f:
+            self.assertIn('manual.pdf', f.read())
+
+        archivo.delete()
+        resultado = exportacion_estatica.exportar(self.destino)
+        self.assertEqual(resultado['renderizados'], 1)
+        with open(self._ruta('guia', 'p0'), encoding='utf-8') as f:
+            self.assertNotIn('manual.pdf', f.read())
@@ -0,0 +1,131 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from docubase_app import etiquetas, exportacion_proyecto
+from docubase_app.models import Archivo, Pagina, Proyecto
+
+HTML = ('<h2>Intro</h2><p>Hola <strong>mundo</strong> y <em>más</em> snake_case '
+        '<a href="https://x.org">enlace</a>.</p>'
+        '<p><img alt="fig" src="/media/uploads/abc.png"> <img alt="falta" src="/media/uploads/falta.png"></p>'
+        '<ul><li>uno</li><li>dos<ul><li>dos.a</li></ul></li></ul>'
+        '<pre><code>x = 1\n  y = 2</code></pre>'
+        '<table><tr><td>a &amp; b</td></tr></table>')
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class ExportacionProyectoTests(TestCase):
+    def setUp(self):
+        self.temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temporal)
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(self.temporal, 'media')))
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyecto = Proyecto.objects.create(titulo='Manual', descripcion='d', autor=self.ana)
+        self.pagina = Pagina.objects.create(titulo='Uno: dos', contenido=HTML, autor=self.ana, proyecto=self.proyecto)
+        etiquetas.asignar(self.pagina, ['python'])
+        Pagina.objects.create(titulo='Oculta', contenido='<p>x</p>', autor=self.ana, proyecto=self.proyecto,
+                              es_publica=False)
+        self.imagen = b'\x89PNG' + b'0' * 100
+        default_storage.save('uploads/abc.png', ContentFile(self.imagen))
+        self.datos_adjunto = os.urandom(200 * 1024)
+        nombre = default_storage.save('archivos/informe.bin', ContentFile(self.datos_adjunto))
+        self.adjunto = Archivo.objects.create(nombre='../informe final.bin', archivo=nombre, subido_por=self.ana,
+                                              pagina=self.pagina, tamano=len(self.datos_adjunto))
+
+    def _zip(self, formato='html'):
+        respuesta = self.client.get(f'/proyectos/{self.proyecto.slug}/exportar.zip', {'formato': formato})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        self.assertIn(f'{self.proyecto.slug}-{formato}.zip', respuesta['Content-Disposition'])
+        zf = zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertIsNone(zf.testzip())
+        return zf
+
+    def test_zip_html_con_manifiesto_media_y_adjuntos(self):
+        zf = self._zip()
+        nombres = zf.namelist()
+        self.assertEqual(nombres[0], 'manifest.json')
+        manifiesto = json.loads(zf.read('manifest.json'))
+        self.assertEqual(manifiesto['formato'], exportacion_proyecto.VERSION_FORMATO)
+        self.assertEqual(manifiesto['proyecto']['slug'], self.proyecto.slug)
+        # Un visitante no recibe la página oculta.
+        self.assertEqual([p['slug'] for p in manifiesto['paginas']], ['uno-dos'])
+        pagina = manifiesto['paginas'][0]
+        self.assertEqual((pagina['ruta'], pagina['titulo'], pagina['etiquetas']),
+                         ('uno-dos.html', 'Uno: dos', ['python']))
+
+        html = zf.read('uno-dos.html').decode()
+        self.assertIn('<title>Uno: dos</title>', html)
+        self.assertIn('src="media/uploads/abc.png"', html)
+        # La media que no existe conserva la URL absoluta.
+        self.assertIn('src="/media/uploads/falta.png"', html)
+        self.assertEqual(zf.read('media/uploads/abc.png'), self.imagen)
+        self.assertNotIn('media/uploads/falta.png', nombres)
+
+        adjunto, = pagina['adjuntos']
+        self.assertEqual(adjunto['ruta'], f'adjuntos/uno-dos/{self.adjunto.pk}-informe_final.bin')
+        self.assertEqual(adjunto['tamano'], len(self.datos_adjunto))
+        self.assertEqual(zf.read(adjunto['ruta']), self.datos_adjunto)
+        self.assertEqual(zf.getinfo(adjunto['ruta']).compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(zf.getinfo('uno-dos.html').compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_zip_markdown(self):
+        zf = self._zip('markdown')
+        markdown = zf.read('uno-dos.md').decode()
+        self.assertTrue(markdown.startswith('---\ntitulo: Uno: dos\nslug: uno-dos\netiquetas: python\n---\n'))
+        self.assertIn('## Intro', markdown)
+        self.assertIn('**mundo**', markdown)
+        self.assertIn('snake\\_case', markdown)
+        self.assertIn('![fig](media/uploads/abc.png)', markdown)
+        self.assertIn('    - dos.a', markdown)
+        self.assertIn('<table>', markdown)
+        self.assertEqual(self.client.get(f'/proyectos/{self.proyecto.slug}/exportar.zip',
+                                         {'formato': 'pdf'}).status_code, 400)
+
+    def test_proyecto_privado(self):
+        Proyecto.objects.filter(pk=self.proyecto.pk).update(es_publico=False)
+        self.assertEqual(self.client.get(f'/proyectos/{self.proyecto.slug}/exportar.zip').status_code, 404)
+        self.client.force_login(self.ana)
+        respuesta = self.client.get(f'/proyectos/{self.proyecto.slug}/exportar.zip')
+        self.assertIn('private', respuesta['Cache-Control'])
+        manifiesto = json.loads(zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+                                .read('manifest.json'))
+        self.assertEqual([p['slug'] for p in manifiesto['paginas']], ['uno-dos', 'oculta'])
+
+    def test_se_reimporta_con_import_docs(self):
+        for formato in exportacion_proyecto.FORMATOS:
+            with self.subTest(formato=formato):
+                ruta = os.path.join(self.temporal, f'exportado-{formato}.zip')
+                call_command('export_project', self.proyecto.slug, ruta, formato=formato, stdout=io.StringIO())
+                # La media se restaura desde el ZIP si falta.
+                default_storage.delete('uploads/abc.png')
+                copia = Proyecto.objects.create(titulo=f'Copia {formato}', descripcion='d', autor=self.ana)
+                call_command('import_docs', ruta, autor='ana', proyecto=copia.slug, stdout=io.StringIO())
+
+                paginas = {p.slug: p for p in copia.paginas.all()}
+                self.assertEqual(set(paginas), {'uno-dos', 'oculta'})
+                self.assertFalse(paginas['oculta'].es_publica)
+                pagina = paginas['uno-dos']
+                self.assertEqual(pagina.titulo, 'Uno: dos')
+                self.assertEqual(list(pagina.etiquetas.values_list('nombre', flat=True)), ['python'])
+                self.assertIn('src="/media/uploads/abc.png"', pagina.contenido)
+                self.assertIn('src="/media/uploads/falta.png"', pagina.contenido)
+                self.assertIn('a &amp; b', pagina.contenido)
+                with default_storage.open('uploads/abc.png') as imagen:
+                    self.assertEqual(imagen.read(), self.imagen)
+                if formato == 'html':
+                    self.assertEqual(pagina.contenido.strip(), HTML)
+                else:
+                    self.assertIn('<strong>mundo</strong>', pagina.contenido)
+                    self.assertIn('<li>dos.a</li>', pagina.contenido)
+                # Los adjuntos viajan como copia, no se vuelven a crear.
+                self.assertFalse(Archivo.objects.filter(pagina__proyecto=copia).exists())
@@ -0,0 +1,103 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from docubase_app import importacion
+from docubase_app.models import Etiqueta, Pagina, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class ImportarDocumentosTests(TestCase):
+    def setUp(self):
+        self.temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temporal)
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(self.temporal, 'media')))
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyecto = Proyecto.objects.create(titulo='Wiki', descripcion='d', autor=self.ana)
+
+    def _escribir(self, archivos, carpeta='fuente'):
+        raiz = os.path.join(self.temporal, carpeta)
+        for nombre, contenido in archivos.items():
+            ruta = os.path.join(raiz, *nombre.split('/'))
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(ruta, 'wb') as f:
+                f.write(contenido.encode() if isinstance(contenido, str) else contenido)
+        return raiz
+
+    def _importar(self, fuente, *argumentos):
+        call_command('import_docs', fuente, '--autor', 'ana', '--proyecto', self.proyecto.slug,
+                     *argumentos, stdout=io.StringIO())
+        return {p.slug: p for p in Pagina.objects.filter(proyecto=self.proyecto)}
+
+    def test_directorio_con_front_matter_y_html(self):
+        fuente = self._escribir({
+            'guia/instalacion.md': '---\ntitulo: Instalación\netiquetas: python, Django\n---\n# Otro\n\nTexto *fuerte*.\n',
+            'guia/uso.html': '<html><head><title>Uso &amp; más</title></head><body><p>Hola</p></body></html>',
+            'leeme.txt': 'no es un documento',
+        })
+        paginas = self._importar(fuente, '--etiquetas-por-carpeta')
+        self.assertEqual(set(paginas), {'instalacion', 'uso-mas'})
+        instalacion = paginas['instalacion']
+        self.assertEqual(instalacion.titulo, 'Instalación')
+        self.assertIn('<em>fuerte</em>', instalacion.contenido)
+        self.assertEqual(instalacion.extracto, 'Otro Texto fuerte.')
+        self.assertEqual(sorted(e.nombre for e in instalacion.etiquetas.all()), ['Django', 'guia', 'python'])
+        self.assertEqual(paginas['uso-mas'].contenido, '<p>Hola</p>')
+        self.assertEqual(Etiqueta.objects.get(nombre='guia').num_paginas, 2)
+
+    def test_slug_del_front_matter_se_normaliza(self):
+        fuente = self._escribir({
+            'a.md': '---\nslug: Mi Página\n---\n# A\n',
+            'b.md': '---\nslug: ¿?\n---\n# Título de B\n',
+        })
+        paginas = self._importar(fuente)
+        self.assertEqual(set(paginas), {'mi-pagina', 'titulo-de-b'})
+        respuesta = self.client.get(f'/proyectos/{self.proyecto.slug}/mi-pagina/')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_colisiones_de_slug(self):
+        Pagina.objects.create(titulo='Intro', autor=self.ana, proyecto=self.proyecto)
+        fuente = self._escribir({
+            '1.md': '# Intro\n', '2.md': '---\nslug: intro\n---\n# Otra\n', '3.md': '# Intro\n',
+        })
+        paginas = self._importar(fuente, '--lote', '2')
+        self.assertEqual(sorted(paginas), ['intro', 'intro-1', 'intro-2', 'intro-3'])
+
+    def test_zip(self):
+        ruta = os.path.join(self.temporal, 'docs.zip')
+        with zipfile.ZipFile(ruta, 'w') as zf:
+            zf.writestr('a/uno.md', '# Uno\n')
+            zf.writestr('b/dos.htm', '<h1>Dos</h1><p>x</p>')
+            zf.writestr('imagen.png', b'\x89PNG')
+        paginas = self._importar(ruta)
+        self.assertEqual({p.titulo for p in paginas.values()}, {'Uno', 'Dos'})
+
+    def test_con_manifiesto(self):
+        fuente = self._escribir({
+            'manifest.json': json.dumps({'paginas': [
+                {'ruta': 'privada.html', 'titulo': 'Privada', 'slug': 'Página Privada',
+                 'etiquetas': ['interna'], 'es_publica': False},
+            ]}),
+            'privada.html': '<p><img src="media/uploads/foto.png"></p>',
+            'media/uploads/foto.png': b'png',
+            'sin-manifiesto.html': '<p>no se importa</p>',
+        })
+        paginas = self._importar(fuente)
+        self.assertEqual(list(paginas), ['pagina-privada'])
+        pagina = paginas['pagina-privada']
+        self.assertFalse(pagina.es_publica)
+        self.assertEqual([e.nombre for e in pagina.etiquetas.all()], ['interna'])
+        self.assertIn('src="/media/uploads/foto.png"', pagina.contenido)
+        with open(os.path.join(self.temporal, 'media', 'uploads', 'foto.png'), 'rb') as f:
+            self.assertEqual(f.read(), b'png')
+
+    def test_normalizar_slug(self):
+        self.assertEqual(importacion.normalizar_slug('Mi Página'), 'mi-pagina')
+        self.assertEqual(importacion.normalizar_slug(None), '')
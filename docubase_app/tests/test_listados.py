@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from docubase_app import listados
+from docubase_app.models import Etiqueta, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class PaginacionPorCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='x')
+        etiquetas = [Etiqueta.objects.create(nombre=f'e{i}') for i in range(3)]
+        for i in range(30):
+            proyecto = Proyecto.objects.create(titulo=f'P{i}', descripcion='<p>hola</p>', autor=cls.ana,
+                                               es_publico=i != 5)
+            proyecto.etiquetas.add(etiquetas[i % 3])
+        # Fechas repetidas: el desempate por id no debe perder ni repetir filas.
+        Proyecto.objects.filter(titulo__in=['P10', 'P11', 'P12']).update(fecha_actualizacion=timezone.now())
+
+    def _recorrer(self, tamano):
+        vistos, cursor = [], None
+        while True:
+            proyectos, cursor = listados.pagina_por_cursor(listados.proyectos_para_tarjetas(), cursor, tamano)
+            vistos += [p.titulo for p in proyectos]
+            if cursor is None:
+                return vistos
+
+    def test_recorre_cada_proyecto_publico_una_vez_en_orden(self):
+        esperado = list(listados.proyectos_para_tarjetas().values_list('titulo', flat=True))
+        self.assertEqual(len(esperado), 29)
+        for tamano in (1, 4, 29, 50):
+            self.assertEqual(self._recorrer(tamano), esperado)
+
+    def test_formatos_json_y_parcial(self):
+        respuesta = self.client.get('/proyectos/')
+        self.assertEqual(len(respuesta.context['proyectos']), listados.TAMANO_PAGINA)
+        cursor = respuesta.context['siguiente_cursor']
+        datos = self.client.get('/proyectos/', {'formato': 'json', 'cursor': cursor}).json()
+        self.assertEqual(len(datos['resultados']), 29 - listados.TAMANO_PAGINA)
+        self.assertIsNone(datos['siguiente_cursor'])
+        self.assertEqual(len(datos['resultados'][0]['etiquetas']), 1)
+        parcial = self.client.get('/proyectos/', {'formato': 'parcial', 'cursor': cursor})
+        self.assertEqual(parcial['X-Siguiente-Cursor'], '')
+
+    def test_cursor_invalido_da_400(self):
+        self.assertEqual(self.client.get('/proyectos/', {'cursor': 'zz!'}).status_code, 400)
+
+    def test_las_consultas_no_crecen_con_los_proyectos(self):
+        with CaptureQueriesContext(connection) as antes:
+            self.client.get('/proyectos/')
+        for i in range(10):
+            Proyecto.objects.create(titulo=f'Q{i}', autor=self.ana).etiquetas.add(Etiqueta.objects.get(nombre='e0'))
+        with CaptureQueriesContext(connection) as despues:
+            self.client.get('/proyectos/')
+        self.assertEqual(len(despues), len(antes))
@@ -0,0 +1,101 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from docubase_app import miniaturas
+from docubase_app.models import Job, Proyecto
+
+
+def _png(ancho, alto, modo='RGBA'):
+    salida = io.BytesIO()
+    Image.new(modo, (ancho, alto), (10, 120, 200, 128) if modo == 'RGBA' else 'red').save(salida, 'PNG')
+    return salida.getvalue()
+
+
+# Sin tareas síncronas: las miniaturas se generan a mano, como lo haría el worker.
+@override_settings(TAREAS_SINCRONAS=False)
+class MiniaturasTests(TestCase):
+    def setUp(self):
+        temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temporal)
+        self.enterContext(override_settings(MEDIA_ROOT=temporal))
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyecto = self._proyecto('Guía', _png(1000, 500))
+
+    def _proyecto(self, titulo, datos):
+        return Proyecto.objects.create(titulo=titulo, descripcion='d', autor=self.ana,
+                                       imagen=SimpleUploadedFile('foto.png', datos))
+
+    def test_una_imagen_nueva_encola_la_tarea(self):
+        self.assertEqual(self.proyecto.imagen_hash, '')
+        self.assertTrue(Job.objects.filter(tarea='miniaturas', argumentos={'proyecto_id': self.proyecto.pk}).exists())
+
+    def test_variantes_sin_ampliar_y_compartidas(self):
+        self.assertTrue(miniaturas.generar_para_proyecto(self.proyecto.pk))
+        self.proyecto.refresh_from_db()
+        self.assertEqual(self.proyecto.imagen_anchos, [320, 640, 960])
+        for ancho in self.proyecto.imagen_anchos:
+            for extension in ('webp', 'jpg'):
+                nombre = miniaturas.nombre_variante(self.proyecto.imagen_hash, ancho, extension)
+                with default_storage.open(nombre) as archivo, Image.open(archivo) as imagen:
+                    self.assertEqual(imagen.size, (ancho, ancho // 2))
+        urls = miniaturas.variantes(self.proyecto)
+        self.assertEqual([ancho for _, ancho in urls['webp']], [320, 640, 960])
+
+        # La misma imagen en otro proyecto reutiliza las variantes.
+        otro = self._proyecto('Otro', _png(1000, 500))
+        with mock.patch.object(default_storage, 'save') as guardar:
+            miniaturas.generar_para_proyecto(otro.pk)
+        guardar.assert_not_called()
+        otro.refresh_from_db()
+        self.assertEqual(otro.imagen_hash, self.proyecto.imagen_hash)
+
+        pequena = self._proyecto('Pequeña', _png(100, 80, 'P'))
+        miniaturas.generar_para_proyecto(pequena.pk)
+        pequena.refresh_from_db()
+        self.assertEqual(pequena.imagen_anchos, [100])
+
+    def test_no_registra_si_la_imagen_cambio_mientras_se_generaba(self):
+        generar = miniaturas.generar_variantes
+
+        def y_cambia_la_imagen(archivo):
+            resultado = generar(archivo)
+            proyecto = Proyecto.objects.get(pk=self.proyecto.pk)
+            proyecto.imagen = SimpleUploadedFile('otra.png', _png(50, 50))
+            proyecto.save()
+            return resultado
+
+        with mock.patch.object(miniaturas, 'generar_variantes', y_cambia_la_imagen):
+            self.assertFalse(miniaturas.generar_para_proyecto(self.proyecto.pk))
+        self.proyecto.refresh_from_db()
+        self.assertEqual((self.proyecto.imagen_hash, self.proyecto.imagen_anchos), ('', []))
+
+    def test_cambia_el_etag_del_listado_y_del_detalle_sin_invalidar_la_cache(self):
+        urls = ('/proyectos/', '/proyectos/?formato=parcial', f'/proyectos/{self.proyecto.slug}/')
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        fecha = self.proyecto.fecha_actualizacion
+        # En producción la tarea se ejecuta en otro proceso: su invalidación
+        # de la caché no debe hacer falta.
+        with mock.patch('docubase_app.fragmentos.invalidar'):
+            miniaturas.generar_para_proyecto(self.proyecto.pk)
+        self.proyecto.refresh_from_db()
+        self.assertEqual(self.proyecto.fecha_actualizacion, fecha)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertContains(respuesta, f'{self.proyecto.imagen_hash}-320.webp')
+
+    def test_comando_generar_miniaturas(self):
+        self._proyecto('Otro', _png(400, 300, 'RGB'))
+        call_command('generar_miniaturas', stdout=io.StringIO())
+        self.assertFalse(Proyecto.objects.filter(imagen_hash='').exists())
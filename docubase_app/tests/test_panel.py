@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from docubase_app import panel
+from docubase_app.models import Comentario, Pagina, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class PanelTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches[settings.PANEL_CACHE_ALIAS].clear)
+        self.ana = User.objects.create_user('ana', password='x')
+        self.beto = User.objects.create_user('beto', password='x')
+        for i in range(3):
+            proyecto = Proyecto.objects.create(titulo=f'P{i}', descripcion='d', autor=self.ana)
+            for j in range(i):
+                pagina = Pagina.objects.create(titulo=f'{i}.{j}', contenido='<p>uno dos</p>', autor=self.ana,
+                                               proyecto=proyecto)
+                Comentario.objects.create(texto='c', autor=self.beto, pagina=pagina)
+        self.pagina = pagina
+
+    def test_totales_por_proyecto_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            totales = {p.titulo: (p.num_paginas, p.num_comentarios, p.num_archivos)
+                       for p in panel.proyectos_con_totales(self.ana)}
+        self.assertEqual(totales, {'P0': (0, 0, 0), 'P1': (1, 1, 0), 'P2': (2, 2, 0)})
+
+    def test_resumen_en_la_cache_compartida_y_se_invalida_al_escribir(self):
+        esperado = {'proyectos': 3, 'paginas': 3, 'palabras': 6, 'comentarios': 3}
+        datos = panel.resumen(self.ana)
+        self.assertEqual({clave: datos[clave] for clave in esperado}, esperado)
+        self.assertEqual(caches[settings.PANEL_CACHE_ALIAS].get(f'panel:resumen:{self.ana.pk}'), datos)
+        with self.assertNumQueries(0):
+            panel.resumen(self.ana)
+
+        # Un comentario de otro usuario cambia el resumen del autor del proyecto.
+        Comentario.objects.create(texto='otro', autor=self.beto, pagina=self.pagina)
+        self.assertEqual(panel.resumen(self.ana)['comentarios'], 4)
+        self.pagina.delete()
+        self.assertEqual(panel.resumen(self.ana)['paginas'], 2)
+
+    def test_dashboard(self):
+        self.client.force_login(self.ana)
+        respuesta = self.client.get('/dashboard/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['resumen']['proyectos'], 3)
+        self.assertEqual(respuesta.context['primer_proyecto'].titulo, 'P2')
@@ -0,0 +1,45 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from docubase_app.models import Pagina, Proyecto
+
+
+@override_settings(RENDIMIENTO_MUESTREO=1.0, TAREAS_SINCRONAS=True)
+class MedicionTests(TestCase):
+    URL = '/proyectos/p/x/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='x', is_staff=True)
+        proyecto = Proyecto.objects.create(titulo='P', descripcion='d', autor=cls.ana)
+        Pagina.objects.create(titulo='x', contenido='y', autor=cls.ana, proyecto=proyecto)
+
+    def test_registra_cada_peticion_medida(self):
+        with self.assertLogs('docubase_app.rendimiento', 'INFO') as logs:
+            self.client.get(self.URL)
+        linea = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((linea['ruta'], linea['estado']), ('pagina_detalle', 200))
+        self.assertGreater(linea['consultas'], 0)
+        self.client.force_login(self.ana)
+        with self.assertLogs('docubase_app.rendimiento', 'INFO'):
+            estadisticas = self.client.get('/estadisticas/rendimiento/').json()
+        self.assertIn('pagina_detalle', estadisticas['rutas'])
+
+    @override_settings(RENDIMIENTO_SERVER_TIMING=False)
+    def test_sin_server_timing_no_se_publican_los_tiempos(self):
+        with self.assertLogs('docubase_app.rendimiento', 'INFO'):
+            self.assertNotIn('Server-Timing', self.client.get(self.URL))
+
+    @override_settings(RENDIMIENTO_SERVER_TIMING=True)
+    def test_server_timing(self):
+        with self.assertLogs('docubase_app.rendimiento', 'INFO'):
+            respuesta = self.client.get(self.URL)
+        self.assertIn('db;dur=', respuesta['Server-Timing'])
+        self.assertIn('plantillas;dur=', respuesta['Server-Timing'])
+
+    @override_settings(RENDIMIENTO_MUESTREO=0.0, RENDIMIENTO_SERVER_TIMING=True)
+    def test_fuera_de_la_muestra_no_se_mide(self):
+        with self.assertNoLogs('docubase_app.rendimiento'):
+            self.assertNotIn('Server-Timing', self.client.get(self.URL))
@@ -0,0 +1,151 @@
+import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from docubase_app import replicas
+from docubase_app.models import Pagina, Proyecto
+
+
+@override_settings(REPLICAS=['replica1'])
+class RouterReplicasTests(SimpleTestCase):
+    """Decisiones del router y del middleware, sin tocar ninguna base."""
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict(replicas._salud, clear=True))
+        replicas._salud['replica1'] = replicas.Salud(True, 0.0, timezone.now())
+        # La comprobación de salud ya está hecha.
+        self.enterContext(mock.patch.object(replicas, '_ultima_comprobacion', time.monotonic()))
+
+    def _pedir(self, metodo='get', cookies=None, escribe=False, decorador=None):
+        lecturas = []
+
+        def vista(request):
+            lecturas.append(router.db_for_read(Proyecto))
+            if escribe:
+                router.db_for_write(Proyecto)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), metodo)('/')
+        request.COOKIES.update(cookies or {})
+        response = replicas.ReplicasMiddleware(decorador(vista) if decorador else vista)(request)
+        return lecturas[0], response
+
+    def test_las_lecturas_get_van_a_una_replica_sana(self):
+        lectura, response = self._pedir()
+        self.assertEqual(lectura, 'replica1')
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+
+    def test_una_escritura_abre_la_ventana_de_primaria(self):
+        lectura, response = self._pedir('post', escribe=True)
+        self.assertEqual(lectura, replicas.PRIMARIA)
+        cookie = response.cookies[replicas.COOKIE]
+        self.assertEqual(cookie['max-age'], replicas.ventana_primaria())
+        self.assertTrue(cookie['httponly'])
+        lectura, _ = self._pedir(cookies={replicas.COOKIE: '1'})
+        self.assertEqual(lectura, replicas.PRIMARIA)
+
+    def test_usar_primaria(self):
+        lectura, _ = self._pedir(decorador=replicas.usar_primaria)
+        self.assertEqual(lectura, replicas.PRIMARIA)
+
+    def test_sin_replicas_sanas_lee_de_la_primaria(self):
+        replicas._salud['replica1'] = replicas.Salud(False, None, timezone.now(), 'caída')
+        lectura, _ = self._pedir()
+        self.assertEqual(lectura, replicas.PRIMARIA)
+
+    def test_fuera_de_una_peticion_todo_va_a_la_primaria(self):
+        self.assertEqual(router.db_for_read(Proyecto), replicas.PRIMARIA)
+
+    def test_lo_relacionado_se_lee_de_la_base_del_objeto(self):
+        proyecto = Proyecto()
+        proyecto._state.db = 'replica2'
+        self.assertEqual(replicas.RouterReplicas().db_for_read(Pagina, instance=proyecto), replicas.PRIMARIA)
+        token = replicas._peticion.set(replicas._Peticion('replica1'))
+        try:
+            self.assertEqual(replicas.RouterReplicas().db_for_read(Pagina, instance=proyecto), 'replica2')
+        finally:
+            replicas._peticion.reset(token)
+
+    def test_solo_se_migra_la_primaria(self):
+        self.assertTrue(replicas.RouterReplicas().allow_migrate(replicas.PRIMARIA, 'docubase_app'))
+        self.assertFalse(replicas.RouterReplicas().allow_migrate('replica1', 'docubase_app'))
+
+
+# La propia primaria hace de réplica: su latido siempre está al día.
+@override_settings(REPLICAS=['default'])
+class SaludReplicasTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.dict(replicas._salud, clear=True))
+        self.enterContext(mock.patch.object(replicas, '_ultima_comprobacion', 0.0))
+
+    def test_una_replica_al_dia_esta_sana(self):
+        replicas.comprobar()
+        estado = replicas.estado()['replicas']['default']
+        self.assertTrue(estado['sana'])
+        self.assertLess(estado['retraso_s'], 5)
+        self.assertEqual(replicas.sanas(), ['default'])
+
+    @override_settings(REPLICAS_RETRASO_MAXIMO=10)
+    def test_una_replica_retrasada_se_descarta(self):
+        replicas.latir(timezone.now() - timezone.timedelta(seconds=60))
+        with mock.patch.object(replicas, 'latir'), self.assertLogs('docubase_app.replicas', 'WARNING'):
+            replicas._salud['default'] = replicas.Salud(True, 0.0, timezone.now())
+            replicas.comprobar()
+        self.assertEqual(replicas.sanas(), [])
+        self.assertGreaterEqual(replicas.estado()['replicas']['default']['retraso_s'], 60)
+
+
+class _Cuenta:
+    """execute_wrapper que cuenta las consultas de una conexión."""
+    def __init__(self):
+        self.consultas = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas += 1
+        return execute(sql, params, many, context)
+
+
+@skipUnless(settings.REPLICAS, 'Hace falta DATABASE_REPLICAS (por ejemplo, un archivo SQLite).')
+@override_settings(TAREAS_SINCRONAS=True)
+class ReplicasDeExtremoAExtremoTests(TransactionTestCase):
+    """Con réplicas reales; en los tests son espejo de 'default' (ver settings)."""
+    databases = {'default', *settings.REPLICAS}
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict(replicas._salud, clear=True))
+        self.enterContext(mock.patch.object(replicas, '_ultima_comprobacion', 0.0))
+        self.replica = settings.REPLICAS[0]
+        self.enterContext(self.assertLogs('docubase_app.rendimiento', 'INFO'))
+        self.ana = User.objects.create_user('ana', password='x')
+        proyecto = Proyecto.objects.create(titulo='Alfa', autor=self.ana, descripcion='<p>desc</p>')
+        Pagina.objects.create(titulo='P', autor=self.ana, proyecto=proyecto, contenido='<p>x</p>')
+
+    def _contar(self, url):
+        primaria, replica = _Cuenta(), _Cuenta()
+        with connections['default'].execute_wrapper(primaria), connections[self.replica].execute_wrapper(replica):
+            respuesta = self.client.get(url)
+        return respuesta, primaria.consultas, replica.consultas
+
+    def test_lecturas_anonimas_en_la_replica_y_escrituras_fijan_la_primaria(self):
+        respuesta, _, en_replica = self._contar('/proyectos/alfa/p/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertGreater(en_replica, 0)
+
+        self.client.force_login(self.ana)
+        respuesta = self.client.post('/proyectos/alfa/p/comentar/', {'texto': 'hola'})
+        self.assertIn(replicas.COOKIE, respuesta.cookies)
+        respuesta, _, en_replica = self._contar('/proyectos/alfa/p/')
+        self.assertEqual(en_replica, 0)
+        self.assertContains(respuesta, 'hola')
+
+        self.client.cookies.pop(replicas.COOKIE)
+        _, _, en_replica = self._contar('/proyectos/alfa/p/editar/')
+        self.assertEqual(en_replica, 0)
+        _, _, en_replica = self._contar('/buscar/?q=alfa')
+        self.assertGreater(en_replica, 0)
@@ -0,0 +1,81 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from docubase_app import revisiones
+from docubase_app.models import Pagina, Proyecto, Revision
+
+
+class DeltasTests(TestCase):
+    def test_el_delta_reconstruye_el_texto_nuevo(self):
+        anterior = '<p>uno</p><p>dos</p>\n<p>tres</p>'
+        nuevo = '<p>uno</p><p>DOS</p>\n<p>tres</p><p>cuatro</p>'
+        operaciones, anadidos, eliminados = revisiones.calcular_delta(anterior, nuevo)
+        self.assertEqual(revisiones.aplicar_delta(anterior, operaciones), nuevo)
+        self.assertGreater(anadidos, 0)
+        self.assertGreater(eliminados, 0)
+        self.assertEqual(''.join(revisiones.trocear(nuevo)), nuevo)
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class HistorialTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='x')
+        proyecto = Proyecto.objects.create(titulo='P', descripcion='d', autor=cls.ana)
+        cls.pagina = Pagina.objects.create(titulo='x', contenido='<p>hola</p>', autor=cls.ana, proyecto=proyecto)
+        cls.base = ''.join(f'<p>linea {i}</p>\n' for i in range(500))
+
+    def _editar(self, veces):
+        versiones = []
+        for i in range(veces):
+            self.pagina.contenido = self.base.replace(f'linea {i}<', f'cambiada {i}<') + f'<p>fin {i}</p>'
+            self.pagina.save()
+            revisiones.registrar(self.pagina, self.ana)
+            versiones.append(self.pagina.contenido)
+        return versiones
+
+    def _url(self, sufijo=''):
+        return f'/proyectos/{self.pagina.proyecto.slug}/{self.pagina.slug}/revisiones/{sufijo}'
+
+    def test_cadena_de_deltas_con_completas_periodicas(self):
+        versiones = self._editar(revisiones.INTERVALO_COMPLETA + 5)
+        for numero, texto in enumerate(versiones, 1):
+            self.assertEqual(revisiones.reconstruir(self.pagina.pk, numero), texto)
+        delta = Revision.objects.get(pagina=self.pagina, numero=2)
+        self.assertFalse(delta.es_completa)
+        self.assertLess(len(delta.datos), 200)
+        completa = Revision.objects.get(pagina=self.pagina, numero=revisiones.INTERVALO_COMPLETA + 2)
+        self.assertTrue(completa.es_completa)
+
+    def test_sin_cambios_no_registra(self):
+        self._editar(1)
+        self.assertIsNone(revisiones.registrar(self.pagina, self.ana))
+
+    def test_registra_el_estado_previo_desconocido(self):
+        revisiones.registrar(self.pagina, self.ana, anterior=('x', '<p>importada</p>'))
+        self.assertEqual(revisiones.reconstruir(self.pagina.pk, 1), '<p>importada</p>')
+        self.assertEqual(revisiones.reconstruir(self.pagina.pk, 2), '<p>hola</p>')
+
+    def test_vistas_y_restaurar(self):
+        versiones = self._editar(5)
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(self._url()).status_code, 200)
+        self.assertContains(self.client.get(self._url('5/')), 'cambiada 4')
+        self.assertRedirects(self.client.post(self._url('3/restaurar/')),
+                             f'/proyectos/{self.pagina.proyecto.slug}/{self.pagina.slug}/',
+                             fetch_redirect_response=False)
+        self.pagina.refresh_from_db()
+        self.assertEqual(self.pagina.contenido, versiones[2])
+        self.assertEqual(Revision.objects.filter(pagina=self.pagina).count(), 6)
+
+    def test_podar_y_compactar_conservan_las_revisiones(self):
+        versiones = self._editar(45)
+        call_command('podar_revisiones', conservar=10, compactar=True, stdout=mock.Mock())
+        self.assertEqual(Revision.objects.filter(pagina=self.pagina).count(), 10)
+        with mock.patch.object(revisiones, 'INTERVALO_COMPLETA', 3):
+            call_command('podar_revisiones', conservar=100, compactar=True, stdout=mock.Mock())
+        for numero in range(36, 46):
+            self.assertEqual(revisiones.reconstruir(self.pagina.pk, numero), versiones[numero - 1])
@@ -0,0 +1,163 @@
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+
+from docubase_app import sindicacion
+from docubase_app.models import Pagina, Proyecto
+
+SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+def _cuerpo(respuesta):
+    return b''.join(respuesta.streaming_content).decode()
+
+
+class SindicacionTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyecto = Proyecto.objects.create(titulo='A & B', descripcion='d', autor=self.ana)
+        self.privado = Proyecto.objects.create(titulo='Privado', descripcion='d', autor=self.ana, es_publico=False)
+        self.paginas = [Pagina.objects.create(titulo=f'P<{i}>', contenido='<p>hola</p>', autor=self.ana,
+                                              proyecto=self.proyecto) for i in range(5)]
+        self.oculta = Pagina.objects.create(titulo='oculta', contenido='x', autor=self.ana,
+                                            proyecto=self.proyecto, es_publica=False)
+        self.en_privado = Pagina.objects.create(titulo='en privado', contenido='x', autor=self.ana,
+                                                proyecto=self.privado)
+
+    def _xml(self, url, **kwargs):
+        respuesta = self.client.get(url, **kwargs)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, ElementTree.fromstring(_cuerpo(respuesta))
+
+    def _fechar(self, modelo, pk, fecha):
+        modelo.objects.filter(pk=pk).update(fecha_actualizacion=fecha)
+
+    def test_indice_y_sitemaps_solo_con_lo_publico(self):
+        respuesta, indice = self._xml('/sitemap.xml')
+        sitemaps = [e.text for e in indice.iter(f'{SITEMAP}loc')]
+        self.assertEqual(sitemaps, ['http://testserver/sitemap-proyectos-0.xml',
+                                    'http://testserver/sitemap-paginas-0.xml'])
+        self.assertEqual(self.client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+
+        _, sitemap = self._xml('/sitemap-paginas-0.xml')
+        self.assertEqual([e.text for e in sitemap.iter(f'{SITEMAP}loc')],
+                         [f'http://testserver/proyectos/{self.proyecto.slug}/{p.slug}/' for p in self.paginas])
+        _, sitemap = self._xml('/sitemap-proyectos-0.xml')
+        self.assertEqual([e.text for e in sitemap.iter(f'{SITEMAP}loc')],
+                         [f'http://testserver/proyectos/{self.proyecto.slug}/'])
+        self.assertEqual(self.client.get('/sitemap-paginas-1.xml').status_code, 404)
+        self.assertEqual(self.client.get('/sitemap-otra-0.xml').status_code, 404)
+
+    def test_sitemap_cambia_al_editar_una_pagina_de_su_bloque(self):
+        respuesta, _ = self._xml('/sitemap-paginas-0.xml')
+        self._fechar(Pagina, self.paginas[0].pk, self.paginas[0].fecha_actualizacion + timedelta(hours=1))
+        self.assertEqual(self.client.get('/sitemap-paginas-0.xml',
+                                         HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+    def test_limites_de_los_bloques(self):
+        Pagina.objects.all().delete()
+        for pk in (2, 3, 5, 6):
+            Pagina.objects.create(pk=pk, titulo=f'p{pk}', contenido='x', autor=self.ana, proyecto=self.proyecto)
+        with mock.patch.object(sindicacion, 'URLS_POR_SITEMAP', 3):
+            bloques = {bloque: list(sindicacion._en_bloque(Pagina.objects.all(), bloque).values_list('pk', flat=True)
+                                    .order_by('pk')) for bloque in range(4)}
+            self.assertEqual(bloques, {0: [2], 1: [3, 5], 2: [6], 3: []})
+            _, indice = self._xml('/sitemap.xml')
+            self.assertEqual([e.text for e in indice.iter(f'{SITEMAP}loc')][1:], [
+                f'http://testserver/sitemap-paginas-{bloque}.xml' for bloque in range(3)])
+            _, sitemap = self._xml('/sitemap-paginas-1.xml')
+            self.assertEqual([e.text.rstrip('/').rsplit('/', 1)[1] for e in sitemap.iter(f'{SITEMAP}loc')],
+                             ['p3', 'p5'])
+            self.assertEqual(self.client.get('/sitemap-paginas-3.xml').status_code, 404)
+
+    def test_feed_atom(self):
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        for i, pagina in enumerate(self.paginas):
+            self._fechar(Pagina, pagina.pk, base + timedelta(days=i))
+        self._fechar(Pagina, self.oculta.pk, base + timedelta(days=30))
+        url = f'/proyectos/{self.proyecto.slug}/feed.atom'
+
+        respuesta, feed = self._xml(url)
+        self.assertTrue(respuesta['Content-Type'].startswith('application/atom+xml'))
+        self.assertEqual(feed.find(f'{ATOM}title').text, 'A & B')
+        entradas = feed.findall(f'{ATOM}entry')
+        self.assertEqual([e.find(f'{ATOM}title').text for e in entradas], [f'P<{i}>' for i in reversed(range(5))])
+        self.assertEqual(entradas[0].find(f'{ATOM}id').text,
+                         f'tag:testserver,{self.paginas[4].fecha_creacion:%Y-%m-%d}:pagina:{self.paginas[4].pk}')
+        self.assertEqual(entradas[0].find(f'{ATOM}link').get('href'),
+                         f'http://testserver/proyectos/{self.proyecto.slug}/{self.paginas[4].slug}/')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+
+        # El id de la entrada no depende del slug.
+        Pagina.objects.filter(pk=self.paginas[4].pk).update(slug='otro')
+        self._fechar(Pagina, self.paginas[4].pk, base + timedelta(days=10))
+        _, feed = self._xml(url)
+        self.assertEqual(feed.find(f'{ATOM}entry').find(f'{ATOM}id').text, entradas[0].find(f'{ATOM}id').text)
+
+        with mock.patch.object(sindicacion, 'ENTRADAS_FEED', 2):
+            _, feed = self._xml(url)
+        self.assertEqual(len(feed.findall(f'{ATOM}entry')), 2)
+        self.assertEqual(self.client.get(f'/proyectos/{self.privado.slug}/feed.atom').status_code, 404)
+
+    def _cambios(self, **parametros):
+        respuesta = self.client.get('/api/v1/cambios/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return [json.loads(linea) for linea in _cuerpo(respuesta).splitlines()]
+
+    def test_feed_de_cambios_en_orden_y_continuable(self):
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        self._fechar(Proyecto, self.proyecto.pk, base + timedelta(seconds=2, microseconds=500))
+        for i, pagina in enumerate(self.paginas):
+            self._fechar(Pagina, pagina.pk, base + timedelta(seconds=i, microseconds=i + 1))
+
+        lineas = self._cambios()
+        self.assertEqual([(l['tipo'], l['datos'].get('titulo')) for l in lineas[:-1]], [
+            ('pagina', 'P<0>'), ('pagina', 'P<1>'), ('pagina', 'P<2>'), ('proyecto', 'A & B'),
+            ('pagina', 'P<3>'), ('pagina', 'P<4>'),
+        ])
+        self.assertEqual(lineas[-1]['tipo'], 'fin')
+        hasta = lineas[-1]['datos']['hasta']
+        # Con microsegundos: la siguiente llamada no repite el último cambio.
+        self.assertEqual(hasta, (base + timedelta(seconds=4, microseconds=5)).isoformat())
+        self.assertEqual(self._cambios(desde=hasta), [{'tipo': 'fin', 'datos': {'hasta': hasta}}])
+
+        self._fechar(Pagina, self.paginas[1].pk, base + timedelta(minutes=1))
+        lineas = self._cambios(desde=hasta)
+        self.assertEqual([(l['tipo'], l['datos'].get('titulo')) for l in lineas[:-1]], [('pagina', 'P<1>')])
+        self.assertEqual(lineas[-1]['datos']['hasta'], (base + timedelta(minutes=1)).isoformat())
+
+        desde = (base + timedelta(seconds=2, microseconds=3)).isoformat()
+        self.assertEqual([l['datos'].get('titulo') for l in self._cambios(desde=desde)[:-1]],
+                         ['A & B', 'P<3>', 'P<4>', 'P<1>'])
+        self.assertEqual(self.client.get('/api/v1/cambios/', {'desde': 'ayer'}).status_code, 400)
+
+    def test_cambios_hasta_la_version_precomprobada(self):
+        # Un cambio posterior a la versión calculada va en la siguiente llamada, no en esta.
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        for i, pagina in enumerate(self.paginas):
+            self._fechar(Pagina, pagina.pk, base + timedelta(seconds=i))
+        self._fechar(Proyecto, self.proyecto.pk, base)
+        request = RequestFactory().get('/api/v1/cambios/')
+        hasta = base + timedelta(seconds=2)
+        lineas = [json.loads(l) for l in sindicacion.generar_cambios(self.ana, None, hasta, request)]
+        self.assertEqual([l['datos'].get('titulo') for l in lineas], ['A & B', 'P<0>', 'P<1>', 'P<2>', None])
+        lineas = [json.loads(l) for l in sindicacion.generar_cambios(
+            self.ana, hasta, base + timedelta(seconds=4), request)]
+        self.assertEqual([l['datos'].get('titulo') for l in lineas], ['P<3>', 'P<4>', None])
+        self.assertEqual([json.loads(l) for l in sindicacion.generar_cambios(self.ana, hasta, None, request)],
+                         [{'tipo': 'fin', 'datos': {'hasta': hasta.isoformat()}}])
+
+    def test_cambios_segun_el_usuario(self):
+        titulos = [l['datos'].get('titulo') for l in self._cambios()[:-1]]
+        self.assertNotIn('oculta', titulos)
+        self.assertNotIn('en privado', titulos)
+        self.assertNotIn('Privado', titulos)
+        self.client.force_login(self.ana)
+        titulos = [l['datos'].get('titulo') for l in self._cambios()[:-1]]
+        self.assertEqual(len(titulos), 2 + 7)
+        self.assertIn('en privado', titulos)
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from docubase_app import slugs
+from docubase_app.models import Pagina, Proyecto
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class SlugsUnicosTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        self.proyecto = Proyecto.objects.create(titulo='Intro', autor=self.ana)
+
+    def _pagina(self, titulo='Introducción', **campos):
+        return Pagina(titulo=titulo, autor=self.ana, proyecto=self.proyecto, **campos)
+
+    def test_sufijos_y_slug_estable_al_editar(self):
+        creados = []
+        for _ in range(3):
+            pagina = self._pagina()
+            pagina.save()
+            creados.append(pagina.slug)
+        self.assertEqual(creados, ['introduccion', 'introduccion-1', 'introduccion-2'])
+        pagina = Pagina.objects.get(slug='introduccion-1')
+        pagina.titulo = 'Otra cosa'
+        pagina.save()
+        self.assertEqual(pagina.slug, 'introduccion-1')
+        # El mismo slug en otro proyecto no choca.
+        otro = Proyecto.objects.create(titulo='Otro', autor=self.ana)
+        self.assertEqual(Pagina.objects.create(titulo='Introducción', autor=self.ana, proyecto=otro).slug,
+                         'introduccion')
+
+    def test_colision_concurrente_se_reintenta(self):
+        self._pagina().save()
+        leer = slugs.slugs_ocupados
+        llamadas = []
+
+        def atrasada(queryset, bases, excluir_pk=None):
+            # La primera lectura no ve el slug que otro guardado ya tomó.
+            llamadas.append(bases)
+            return set() if len(llamadas) == 1 else leer(queryset, bases, excluir_pk)
+
+        with mock.patch.object(slugs, 'slugs_ocupados', atrasada):
+            pagina = self._pagina()
+            pagina.save()
+        self.assertEqual(pagina.slug, 'introduccion-1')
+        self.assertEqual(len(llamadas), 2)
+
+    def test_se_rinde_tras_max_intentos(self):
+        self._pagina().save()
+        with mock.patch.object(slugs, 'slugs_ocupados', return_value=set()) as ocupados:
+            with self.assertRaises(IntegrityError):
+                self._pagina().save()
+        self.assertEqual(ocupados.call_count, slugs.MAX_INTENTOS)
+
+    def test_otros_errores_de_integridad_no_se_reintentan(self):
+        proyecto = Proyecto(titulo='Sin autor')
+        with mock.patch.object(slugs, 'slugs_ocupados', wraps=slugs.slugs_ocupados) as ocupados:
+            with self.assertRaises(IntegrityError):
+                proyecto.save()
+        self.assertEqual(ocupados.call_count, 1)
+
+    def test_asignar_slugs_por_lotes(self):
+        self._pagina().save()
+        self._pagina('Introducción 2').save()
+        nuevas = [self._pagina() for _ in range(3)] + [self._pagina('¿?'), self._pagina('¿?')]
+        with self.assertNumQueries(1):
+            slugs.asignar_slugs(nuevas, Pagina.objects.filter(proyecto=self.proyecto))
+        self.assertEqual([pagina.slug for pagina in nuevas],
+                         ['introduccion-1', 'introduccion-3', 'introduccion-4', 'pagina', 'pagina-1'])
+        Pagina.objects.bulk_create(nuevas)
+
+    def test_asignar_slugs_agrupa_las_consultas(self):
+        nuevas = [self._pagina(f'Tema {i}') for i in range(slugs.BASES_POR_CONSULTA + 1)]
+        with self.assertNumQueries(2):
+            slugs.asignar_slugs(nuevas, Pagina.objects.all())
+        self.assertEqual(len({pagina.slug for pagina in nuevas}), len(nuevas))
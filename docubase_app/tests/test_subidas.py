@@ -0,0 +1,112 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from docubase_app import subidas
+from docubase_app.almacenamiento import AlmacenamientoPorContenido
+from docubase_app.models import Archivo, Contenido, Pagina, Proyecto, Subida
+
+
+class SubidasTests(TestCase):
+    def setUp(self):
+        temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temporal)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=os.path.join(temporal, 'media'), SUBIDAS_DIR=os.path.join(temporal, 'parciales'),
+            TAREAS_SINCRONAS=True))
+        self.addCleanup(subidas._hashes.clear)
+        self.ana = User.objects.create_user('ana', password='x')
+        self.client.force_login(self.ana)
+        proyecto = Proyecto.objects.create(titulo='P', descripcion='d', autor=self.ana)
+        self.pagina = Pagina.objects.create(titulo='x', contenido='y', autor=self.ana, proyecto=proyecto)
+
+    def _crear(self, tamano, nombre='doc.pdf'):
+        respuesta = self.client.post('/subidas/', {'nombre': nombre, 'tamano': tamano, 'pagina': self.pagina.pk})
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        return respuesta.json()['url']
+
+    def _put(self, url, datos, inicio, total):
+        return self.client.put(url, datos, content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {inicio}-{inicio + len(datos) - 1}/{total}')
+
+    def _subir(self, datos, trozo, nombre='doc.pdf'):
+        url = self._crear(len(datos), nombre)
+        recibido = 0
+        while recibido < len(datos):
+            respuesta = self._put(url, datos[recibido:recibido + trozo], recibido, len(datos))
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            recibido = respuesta.json()['recibido']
+            # Cada trozo lo atiende un proceso "nuevo": el hash se reconstruye del parcial.
+            subidas._hashes.clear()
+        return respuesta.json()
+
+    def test_subida_por_trozos_y_deduplicada(self):
+        datos = os.urandom(5500)
+        primera = self._subir(datos, 1000)
+        self.assertTrue(primera['completa'])
+        archivo = Archivo.objects.get(pk=primera['archivo']['id'])
+        self.assertEqual(archivo.contenido.sha256, hashlib.sha256(datos).hexdigest())
+        self.assertEqual(archivo.archivo.read(), datos)
+        self.assertEqual(archivo.tipo_mime, 'application/pdf')
+
+        segunda = self._subir(datos, 4000)
+        self.assertEqual(Contenido.objects.get().referencias, 2)
+        archivo.delete()
+        self.assertEqual(Contenido.objects.get().referencias, 1)
+        nombre = Contenido.objects.get().archivo.name
+        Archivo.objects.get(pk=segunda['archivo']['id']).delete()
+        self.assertFalse(Contenido.objects.exists())
+        self.assertFalse(default_storage.exists(nombre))
+
+    def test_tipo_guardado_segun_lista_permitida(self):
+        respuesta = self._subir(b'<script>alert(1)</script>', 1000, 'x.html')
+        self.assertEqual(Archivo.objects.get(pk=respuesta['archivo']['id']).tipo_mime, 'application/octet-stream')
+        self.assertEqual(subidas.tipo_guardado('dibujo.svg'), 'application/octet-stream')
+        self.assertEqual(subidas.tipo_guardado('sin-extension'), 'application/octet-stream')
+        self.assertEqual(subidas.tipo_guardado('foto.PNG'), 'image/png')
+
+    def test_reanuda_tras_un_trozo_cortado(self):
+        datos = os.urandom(3000)
+        url = self._crear(len(datos))
+        subida = Subida.objects.get()
+        # El cuerpo se corta a los 700 bytes de los 2000 anunciados.
+        subidas.recibir_trozo(subida, 0, 2000, io.BytesIO(datos[:700]))
+        estado = self.client.get(url).json()
+        self.assertEqual(estado['recibido'], 700)
+        respuesta = self._put(url, datos[700:], 700, len(datos))
+        self.assertTrue(respuesta.json()['completa'])
+        self.assertEqual(Archivo.objects.get().archivo.read(), datos)
+
+    def test_desplazamiento_equivocado_da_409(self):
+        url = self._crear(10, 'b')
+        respuesta = self._put(url, b'12345', 5, 10)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()['recibido'], 0)
+
+    def test_un_trozo_atrasado_no_trunca_lo_recibido(self):
+        datos = os.urandom(2000)
+        self._crear(len(datos))
+        atrasada = Subida.objects.get()
+        subidas.recibir_trozo(Subida.objects.get(), 0, 1000, io.BytesIO(datos[:1000]))
+        # `atrasada` aún cree que no se ha recibido nada.
+        with self.assertRaises(subidas.ErrorSubida) as contexto:
+            subidas.recibir_trozo(atrasada, 0, 1000, io.BytesIO(b'x' * 1000))
+        self.assertEqual(contexto.exception.estado, 409)
+        with open(subidas.ruta_parcial(atrasada), 'rb') as parcial:
+            self.assertEqual(parcial.read(), datos[:1000])
+        subidas.recibir_trozo(Subida.objects.get(), 1000, 1000, io.BytesIO(datos[1000:]))
+        self.assertEqual(Archivo.objects.get().contenido.sha256, hashlib.sha256(datos).hexdigest())
+
+    def test_almacenamiento_por_contenido(self):
+        almacenamiento = AlmacenamientoPorContenido(location=os.path.join(subidas.directorio_parciales(), 'ck'))
+        primero = almacenamiento.save('uploads/a.PNG', SimpleUploadedFile('a.PNG', b'abc'))
+        segundo = almacenamiento.save('uploads/b.png', SimpleUploadedFile('b.png', b'abc'))
+        self.assertEqual(primero, segundo)
+        self.assertTrue(primero.endswith(hashlib.sha256(b'abc').hexdigest() + '.png'))
@@ -0,0 +1,126 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from docubase_app import busqueda, tareas
+from docubase_app.models import Job, Pagina, Proyecto
+
+
+class _PoolEnLinea:
+    """Ejecuta cada trabajo en el acto, en el hilo del test."""
+    def submit(self, funcion, *args):
+        futuro = Future()
+        futuro.set_result(funcion(*args))
+        return futuro
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class _PoolRoto(_PoolEnLinea):
+    """Un pool de procesos en el que murió un proceso: nada llega a ejecutarse."""
+    def __init__(self, aceptar=1):
+        self.aceptar = aceptar
+
+    def submit(self, funcion, *args):
+        if not self.aceptar:
+            raise BrokenProcessPool('pool roto')
+        self.aceptar -= 1
+        futuro = Future()
+        futuro.set_exception(BrokenProcessPool('un proceso del pool murió'))
+        return futuro
+
+
+@override_settings(TAREAS_SINCRONAS=False)
+class ColaDeTareasTests(TestCase):
+    def setUp(self):
+        # El pool cierra sus conexiones al terminar; aquí es la del test.
+        self.enterContext(mock.patch('docubase_app.tareas.connections'))
+        self.enterContext(mock.patch.dict(tareas._registro))
+        self.llamadas = []
+
+        @tareas.tarea('falla')
+        def falla():
+            self.llamadas.append('falla')
+            raise RuntimeError('fallo de prueba')
+
+    def test_deduplica_por_clave_y_ejecuta_en_el_worker(self):
+        ana = User.objects.create_user('ana')
+        proyecto = Proyecto.objects.create(titulo='Alfa', descripcion='zorro', autor=ana)
+        pagina = Pagina.objects.create(titulo='Beta', contenido='zorro', autor=ana, proyecto=proyecto)
+        for i in range(3):
+            pagina.titulo = f'Beta {i}'
+            pagina.save()
+        self.assertEqual(Job.objects.filter(clave=f'indexar:pagina:{pagina.pk}').count(), 1)
+        self.assertEqual(busqueda.buscar('zorro', ana).count(), 0)
+        self.assertEqual(tareas.procesar_lote(_PoolEnLinea(), 10), 2)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(busqueda.buscar('zorro', ana).count(), 2)
+
+    def test_el_trabajo_se_deshace_con_la_transaccion(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            tareas.encolar('falla', clave='f')
+            raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_reintenta_con_espera_y_acaba_fallido(self):
+        tareas.encolar('falla', clave='f', max_intentos=2)
+        with self.assertLogs('docubase_app.tareas', 'WARNING'):
+            self.assertEqual(tareas.procesar_lote(_PoolEnLinea(), 5), 1)
+        trabajo = Job.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (Job.PENDIENTE, 1))
+        self.assertIn('fallo de prueba', trabajo.ultimo_error)
+        # Aún no ha pasado la espera.
+        self.assertEqual(tareas.procesar_lote(_PoolEnLinea(), 5), 0)
+        Job.objects.update(ejecutar_despues=timezone.now())
+        with self.assertLogs('docubase_app.tareas', 'WARNING'):
+            tareas.procesar_lote(_PoolEnLinea(), 5)
+        self.assertEqual(Job.objects.get().estado, Job.FALLIDO)
+        self.assertEqual(self.llamadas, ['falla', 'falla'])
+        # Un trabajo fallido no impide encolar otro con la misma clave.
+        tareas.encolar('falla', clave='f')
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_recupera_trabajos_de_un_worker_muerto(self):
+        tareas.encolar('falla', max_intentos=5)
+        self.assertEqual(len(tareas.reclamar(5)), 1)
+        self.assertEqual(tareas.reclamar(5), [])
+        Job.objects.update(bloqueado_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([t.intentos for t in tareas.reclamar(5)], [2])
+
+    def test_la_espera_crece_exponencialmente(self):
+        with mock.patch('docubase_app.tareas.random.uniform', return_value=1):
+            self.assertEqual([tareas.espera(n) for n in (1, 2, 3)],
+                             [tareas.ESPERA_BASE, 2 * tareas.ESPERA_BASE, 4 * tareas.ESPERA_BASE])
+            self.assertEqual(tareas.espera(50), tareas.ESPERA_MAXIMA)
+
+    def test_un_pool_roto_no_tumba_el_worker(self):
+        @tareas.tarea('anota')
+        def anota(numero):
+            self.llamadas.append(numero)
+
+        for i in range(3):
+            tareas.encolar('anota', numero=i)
+        with self.assertLogs('docubase_app.tareas', 'WARNING'), self.assertRaises(BrokenProcessPool):
+            tareas.procesar_lote(_PoolRoto(aceptar=1), 5)
+        # Los tres vuelven a la cola, con su error y sin haberse ejecutado.
+        self.assertEqual(set(Job.objects.values_list('estado', flat=True)), {Job.PENDIENTE})
+        self.assertTrue(all('BrokenProcessPool' in e for e in Job.objects.values_list('ultimo_error', flat=True)))
+        self.assertEqual(self.llamadas, [])
+
+        # El worker sustituye el pool roto y sigue trabajando.
+        Job.objects.update(ejecutar_despues=timezone.now())
+        pools = iter([_PoolRoto(aceptar=0), _PoolEnLinea()])
+        with mock.patch.object(tareas, '_crear_pool', side_effect=lambda *args: next(pools)), \
+                mock.patch.object(tareas, 'espera', return_value=0), \
+                self.assertLogs('docubase_app.tareas', 'WARNING') as logs:
+            self.assertEqual(tareas.trabajar(una_vez=True), 3)
+        self.assertTrue(any('se crea otro' in linea for linea in logs.output))
+        self.assertEqual(sorted(self.llamadas), [0, 1, 2])
+        self.assertFalse(Job.objects.exists())
@@ -0,0 +1,47 @@
+"""
+Utilidades para convertir el HTML enriquecido de CKEditor en texto plano.
+
+Se comparten entre los filtros de plantilla, el motor de búsqueda y cualquier
+otro proceso que necesite el contenido sin etiquetas.
+"""
+import re
+from html import unescape
+
+from django.utils.html import strip_tags
+
+# Etiquetas de bloque que separan palabras; se sustituyen por un espacio para
+# que '<p>uno</p><p>dos</p>' no se convierta en 'unodos'.
+_CIERRES_DE_BLOQUE = re.compile(r'<(?:br|/p|/div|/li|/h[1-6]|/td|/th|/tr|/blockquote|/pre)\b[^>]*>', re.IGNORECASE)
+_ESPACIOS = re.compile(r'\s+')
+
+
+def html_a_texto(valor):
+    """
+    Quita las etiquetas HTML, decodifica las entidades (&aacute; -> á) y
+    colapsa los espacios y saltos de línea en uno solo.
+    """
+    if not valor:
+        return ''
+    texto = _CIERRES_DE_BLOQUE.sub(' ', valor)
+    texto = unescape(strip_tags(texto))
+    return _ESPACIOS.sub(' ', texto).strip()
+
+
+def truncar(texto, chars):
+    """Trunca el texto a `chars` caracteres añadiendo '...' si se recorta."""
+    if len(texto) > chars:
+        return texto[:chars] + '...'
+    return texto
+
+
+# Longitud máxima del extracto que se guarda en `Proyecto` y `Pagina`.
+LONGITUD_EXTRACTO = 300
+
+
+def resumir(valor):
+    """
+    Devuelve `(extracto, num_palabras)` para un HTML enriquecido: el texto
+    plano truncado a LONGITUD_EXTRACTO caracteres y el número de palabras.
+    """
+    texto = html_a_texto(valor)
+    return truncar(texto, LONGITUD_EXTRACTO), len(texto.split())
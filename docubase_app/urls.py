@@ -1,14 +1,20 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from .views import netaudit_verify
 from django.contrib.auth import views as auth_views
 
 
+def _lectura(vista):
+    """La versión asíncrona de `vista` (ver views.py) si VISTAS_ASINCRONAS está activo."""
+    return getattr(views, 'a' + vista.__name__) if settings.VISTAS_ASINCRONAS else vista
+
+
 urlpatterns = [
     # URLs de la página de inicio y lista de proyectos
     path('netaudit-verify.txt', netaudit_verify),
-    path('', views.index, name='index'),
-    path('proyectos/', views.proyectos_lista, name='proyectos_lista'),
+    path('', _lectura(views.index), name='index'),
+    path('proyectos/', _lectura(views.proyectos_lista), name='proyectos_lista'),
 
     # URLs de autenticación
     path('register/', views.register, name='register'),
@@ -21,17 +27,45 @@ urlpatterns = [
 
     # URLs del panel de control
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('estadisticas/cache/', views.estadisticas_cache, name='estadisticas_cache'),
+    path('estadisticas/rendimiento/', views.estadisticas_rendimiento, name='estadisticas_rendimiento'),
+    path('estadisticas/replicas/', views.estadisticas_replicas, name='estadisticas_replicas'),
+
+    # Sitemaps y feeds para crawlers y réplicas (ver sindicacion.py)
+    path('sitemap.xml', views.sitemap_indice, name='sitemap_indice'),
+    path('sitemap-<slug:serie>-<int:bloque>.xml', views.sitemap, name='sitemap'),
+    path('proyectos/<slug:proyecto_slug>/feed.atom', views.proyecto_feed, name='proyecto_feed'),
+    path('api/v1/cambios/', views.api_cambios, name='api_cambios'),
+
+    # API JSON de solo lectura (ver api.py)
+    path('api/v1/proyectos/<int:pk>/volcado/', views.api_volcado, name='api_volcado'),
+    path('api/v1/<str:recurso>/', views.api_lista, name='api_lista'),
+    path('api/v1/<str:recurso>/<int:pk>/', views.api_detalle, name='api_detalle'),
+
+    # Subidas de archivos por trozos
+    path('subidas/', views.subida_crear, name='subida_crear'),
+    path('subidas/<uuid:subida_id>/', views.subida_detalle, name='subida_detalle'),
     
     # URLs de proyectos (ordenadas de más específica a más general)
     path('proyectos/crear/', views.crear_proyecto, name='crear_proyecto'),
     path('proyectos/<slug:proyecto_slug>/editar/', views.editar_proyecto, name='editar_proyecto'),
+    path('proyectos/<slug:proyecto_slug>/exportar.zip', views.exportar_proyecto, name='exportar_proyecto'),
     
     # URLs de páginas (ordenadas de más específica a más general)
     path('proyectos/<slug:proyecto_slug>/crear-pagina/', views.crear_pagina, name='crear_pagina'),
     path('proyectos/<slug:proyecto_slug>/<slug:pagina_slug>/editar/', views.editar_pagina, name='editar_pagina'),
-    path('proyectos/<slug:proyecto_slug>/<slug:pagina_slug>/', views.pagina_detalle, name='pagina_detalle'),
+    path('proyectos/<slug:proyecto_slug>/<slug:pagina_slug>/comentar/', views.comentar, name='comentar'),
+    path('proyectos/<slug:proyecto_slug>/<slug:pagina_slug>/revisiones/', views.pagina_revisiones, name='pagina_revisiones'),
+    path('proyectos/<slug:proyecto_slug>/<slug:pagina_slug>/revisiones/<int:numero>/', views.revision_diferencias, name='revision_diferencias'),
+    path('proyectos/<slug:proyecto_slug>/<slug:pagina_slug>/revisiones/<int:numero>/restaurar/', views.revision_restaurar, name='revision_restaurar'),
+    path('proyectos/<slug:proyecto_slug>/<slug:pagina_slug>/', _lectura(views.pagina_detalle), name='pagina_detalle'),
 
     # La URL de detalle de proyecto va al final para que no cause conflictos
-    path('proyectos/<slug:proyecto_slug>/', views.proyecto_detalle, name='proyecto_detalle'),
-    path('buscar/', views.buscar_proyectos, name='buscar_proyectos'),
+    path('proyectos/<slug:proyecto_slug>/', _lectura(views.proyecto_detalle), name='proyecto_detalle'),
+    path('buscar/', _lectura(views.buscar_proyectos), name='buscar_proyectos'),
+
+    # Media de usuario con comprobación de visibilidad (ver entrega.py)
+    path(settings.MEDIA_URL.lstrip('/') + '<path:ruta>', views.servir_media, name='servir_media'),
+    # `path` y no `str`: el nombre de una etiqueta puede contener "/".
+    path('etiquetas/<path:nombre>/', views.etiqueta_detalle, name='etiqueta_detalle'),
 ]
\ No newline at end of file
@@ -1,21 +1,42 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth.decorators import login_required
-from .models import Proyecto, Pagina, Comentario, Etiqueta
-from .forms import CustomUserCreationForm, ProyectoForm, PaginaForm
+from django.contrib.auth.decorators import login_required, user_passes_test
+from .models import Proyecto, Pagina, Comentario, Etiqueta, Revision, SlugAntiguo, Subida
+from .forms import CustomUserCreationForm, ProyectoForm, PaginaForm, ComentarioForm
+from . import (api, asincrono, busqueda, comentarios, entrega, etiquetas, exportacion_proyecto, fragmentos, listados,
+               panel, rendimiento, replicas, revisiones, sindicacion, subidas)
+from .condicional import Estado, condicional, estado_precomprobado, mas_reciente
+from .replicas import usar_primaria
 from django.utils.text import slugify
-from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.core.exceptions import BadRequest
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Count, Max, OuterRef, Q, Subquery
 from django.contrib.auth import views as auth_views
-from django.http import FileResponse
+from django.http import Http404, HttpResponse, HttpResponsePermanentRedirect, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
+from django.core.paginator import Paginator
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header, urlencode
 import os
 from django.conf import settings
 
+# Número de resultados por página en la búsqueda.
+RESULTADOS_POR_PAGINA = 20
+# Revisiones por página del historial.
+REVISIONES_POR_PAGINA = 50
+
 
 # --- Vistas principales ---
 def netaudit_verify(request):
     filepath = os.path.join(settings.BASE_DIR, 'docubase_app', 'static', 'netaudit-verify.txt')
-    return FileResponse(open(filepath, 'rb'), content_type='text/plain')
+    # Con ETag y caché: las comprobaciones repetidas reciben un 304 sin leer el archivo.
+    return entrega.servir_ruta(request, filepath, entrega.Entrega(
+        'netaudit-verify.txt', tipo='text/plain', publico=True, tipo_confiable=True))
 
 def index(request):
     """
@@ -24,43 +45,155 @@ def index(request):
     Muestra los 3 proyectos públicos más recientes para dar la bienvenida
     a los visitantes.
     """
-    # Obtiene los 3 proyectos públicos más recientes
-    proyectos_recientes = Proyecto.objects.filter(es_publico=True).order_by('-fecha_actualizacion')[:3]
+    # Obtiene los 3 proyectos públicos más recientes, con autor y etiquetas precargados
+    proyectos_recientes = listados.proyectos_para_tarjetas()[:3]
     context = {'proyectos_recientes': proyectos_recientes}
     return render(request, 'docubase_app/index.html', context)
 
+def _version_lista():
+    # Las miniaturas se registran sin tocar `fecha_actualizacion` (ver
+    # miniaturas.py), pero cambian las URLs de las tarjetas: cuentan los
+    # proyectos que ya las tienen. Una imagen nueva vacía `imagen_hash` desde
+    # save(), que sí cambia la fecha.
+    return {'ultima': Max('fecha_actualizacion'), 'total': Count('id'),
+            'con_miniaturas': Count('id', filter=~Q(imagen_hash=''))}
+
+def _estado_lista(request, datos):
+    if datos['ultima'] is None:
+        return None
+    # Los parámetros (cursor, formato) forman parte de la versión de la respuesta.
+    return Estado(datos['ultima'], (datos['ultima'], datos['total'], datos['con_miniaturas'],
+                                    request.GET.urlencode()))
+
+def _precomprobar_lista(request):
+    """Última edición y número de proyectos públicos, con una sola consulta agregada."""
+    return _estado_lista(request, Proyecto.objects.filter(es_publico=True).aggregate(**_version_lista()))
+
+@condicional(_precomprobar_lista)
 def proyectos_lista(request):
     """
     Muestra una lista de todos los proyectos públicos.
+
+    Pagina por cursor (ver `listados.py`): el parámetro `cursor` indica dónde
+    continuar. Con `formato=parcial` devuelve solo las tarjetas (para el
+    scroll infinito) y con `formato=json` los mismos datos en JSON; en ambos
+    casos el cursor siguiente viaja en la respuesta.
+
+    Cada parámetro `etiqueta` (se puede repetir) restringe la lista a los
+    proyectos que tienen esa etiqueta; las facetas del lateral son las
+    etiquetas más usadas según sus contadores (ver `etiquetas.py`).
     """
-    proyectos = Proyecto.objects.all()
-    context = {'proyectos': proyectos}
+    seleccionadas = etiquetas.normalizar(request.GET.getlist('etiqueta'))
+    proyectos, siguiente_cursor = listados.pagina_por_cursor(
+        _proyectos_filtrados(seleccionadas), request.GET.get('cursor'))
+    formato = request.GET.get('formato')
+
+    if formato == 'json':
+        return _lista_json(request, proyectos, siguiente_cursor)
+
+    context = _contexto_lista(proyectos, siguiente_cursor, seleccionadas)
+    if formato == 'parcial':
+        return _con_cursor(render(request, 'docubase_app/proyectos_tarjetas.html', context), siguiente_cursor)
+    context['facetas'] = _facetas(seleccionadas)
     return render(request, 'docubase_app/projects.html', context)
 
-def buscar_proyectos(request):
+def _proyectos_filtrados(seleccionadas):
+    return listados.filtrar_por_etiquetas(listados.proyectos_para_tarjetas(), seleccionadas)
+
+def _lista_json(request, proyectos, siguiente_cursor):
+    return JsonResponse({
+        'resultados': [listados.proyecto_a_dict(p, request) for p in proyectos],
+        'siguiente_cursor': siguiente_cursor,
+    })
+
+def _contexto_lista(proyectos, siguiente_cursor, seleccionadas):
+    return {
+        'proyectos': proyectos,
+        'siguiente_cursor': siguiente_cursor,
+        'seleccionadas': seleccionadas,
+        # Parámetros de filtro que deben conservar "Cargar más" y el scroll infinito.
+        'filtros': urlencode([('etiqueta', nombre) for nombre in seleccionadas]),
+    }
+
+def _con_cursor(response, siguiente_cursor):
+    # El script de scroll infinito lee el siguiente cursor de esta cabecera.
+    response['X-Siguiente-Cursor'] = siguiente_cursor or ''
+    return response
+
+def _etiquetas_sin_faceta(lista, seleccionadas):
+    """Las etiquetas seleccionadas que no están entre las facetas de `lista`."""
+    vistas = {e.nombre for e in lista}
+    return Etiqueta.objects.filter(nombre__in=[n for n in seleccionadas if n not in vistas])
+
+def _facetas(seleccionadas):
+    """
+    Etiquetas más usadas, cada una con la URL que la añade o la quita del
+    filtro actual. Las seleccionadas siempre aparecen, aunque no estén entre
+    las más usadas.
     """
-    Gestiona la búsqueda de proyectos.
+    lista = list(etiquetas.facetas())
+    lista[:0] = _etiquetas_sin_faceta(lista, seleccionadas)
+    return _enlaces_facetas(lista, seleccionadas)
 
-    Filtra los proyectos basándose en un término de búsqueda (`query`)
-    proporcionado en la URL. La búsqueda se realiza en el título,
-    descripción, nombre de autor y etiquetas del proyecto.
+def _enlaces_facetas(lista, seleccionadas):
+    resultado = []
+    for etiqueta in lista:
+        activa = etiqueta.nombre in seleccionadas
+        nombres = [n for n in seleccionadas if n != etiqueta.nombre] if activa else [*seleccionadas, etiqueta.nombre]
+        resultado.append({
+            'etiqueta': etiqueta,
+            'activa': activa,
+            'url': '?' + urlencode([('etiqueta', n) for n in nombres]),
+        })
+    return resultado
+
+def etiqueta_detalle(request, nombre):
     """
-    # Obtiene el parámetro 'q' de la URL (ej: /buscar/?q=python)
-    query = request.GET.get('q')
-    # Filtra usando Q objects para combinar búsquedas con un OR lógico.
-    # .distinct() evita resultados duplicados si un proyecto coincide en múltiples campos (ej. título y etiqueta).
-    proyectos = Proyecto.objects.filter(
-        Q(titulo__icontains=query) |
-        Q(descripcion__icontains=query) |
-        Q(autor__username__icontains=query) |
-        Q(etiquetas__nombre__icontains=query)
-    ).distinct()
-    # Pasa los proyectos encontrados y la query original a la plantilla.
+    Muestra los proyectos públicos con una etiqueta (paginados por cursor,
+    como `proyectos_lista`) y las páginas públicas más recientes que la usan.
+    """
+    etiqueta = get_object_or_404(Etiqueta, nombre=nombre)
+    proyectos, siguiente_cursor = listados.pagina_por_cursor(
+        listados.proyectos_para_tarjetas().filter(etiquetas=etiqueta), request.GET.get('cursor'))
+    paginas = []
+    if not request.GET.get('cursor'):
+        paginas = (
+            etiqueta.paginas.filter(es_publica=True, proyecto__es_publico=True)
+            .select_related('proyecto')
+            .only('titulo', 'slug', 'extracto', 'fecha_actualizacion', 'proyecto__titulo', 'proyecto__slug')
+            .order_by('-fecha_actualizacion')[:etiquetas.NUM_PAGINAS_ETIQUETA]
+        )
     context = {
+        'etiqueta': etiqueta,
         'proyectos': proyectos,
+        'siguiente_cursor': siguiente_cursor,
+        'paginas': paginas,
+    }
+    return render(request, 'docubase_app/tag_detail.html', context)
+
+def buscar_proyectos(request):
+    """
+    Gestiona la búsqueda de proyectos y páginas.
+
+    Consulta el índice de texto completo (ver `busqueda.py`) con el término
+    `q` de la URL. Los resultados se ordenan por relevancia, se paginan y
+    llevan un fragmento con las coincidencias resaltadas. Solo se muestra el
+    contenido público o el del propio usuario.
+    """
+    return render(request, 'docubase_app/search_results.html', _contexto_busqueda(request))
+
+def _contexto_busqueda(request):
+    # Obtiene el parámetro 'q' de la URL (ej: /buscar/?q=python)
+    query = request.GET.get('q', '').strip()
+    # La consulta es perezosa: el paginador solo ejecuta un COUNT y la página pedida.
+    paginator = Paginator(busqueda.buscar(query, usuario=request.user), RESULTADOS_POR_PAGINA)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return {
+        'resultados': page_obj.object_list,
+        'page_obj': page_obj,
+        'total': paginator.count,
         'query': query
     }
-    return render(request, 'docubase_app/search_results.html', context)
 
 # --- Vistas de Proyectos ---
 
@@ -69,13 +202,25 @@ def dashboard(request):
     """
     Muestra el panel de control personal del usuario autenticado.
 
-    Lista todos los proyectos creados por el usuario actual.
+    Lista, paginados, los proyectos del usuario con sus totales (páginas,
+    comentarios, archivos y última edición) calculados en una sola consulta,
+    las páginas editadas recientemente y un resumen cacheado (ver `panel.py`).
     """
     # El decorador @login_required asegura que solo usuarios autenticados puedan acceder.
-    proyectos_del_usuario = request.user.proyectos.all()
-    context = {'proyectos': proyectos_del_usuario}
+    paginator = Paginator(panel.proyectos_con_totales(request.user), panel.PROYECTOS_POR_PAGINA)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    proyectos = list(page_obj.object_list)
+    context = {
+        'proyectos': proyectos,
+        'page_obj': page_obj,
+        # Proyecto para el acceso rápido "Nueva Página" (el más reciente).
+        'primer_proyecto': proyectos[0] if proyectos else None,
+        'paginas_recientes': panel.paginas_recientes(request.user),
+        'resumen': panel.resumen(request.user),
+    }
     return render(request, 'docubase_app/dashboard.html', context)
 
+@usar_primaria
 @login_required
 def crear_proyecto(request):
     """
@@ -92,8 +237,9 @@ def crear_proyecto(request):
             proyecto = form.save(commit=False) 
             # Asigna el usuario actual como el autor del proyecto.
             proyecto.autor = request.user
-            # Ahora form.save() se encargará de guardar el objeto y sus relaciones m2m
-            form.save()
+            proyecto.save()
+            # Con commit=False las etiquetas se guardan aparte, ya con el proyecto en la BD.
+            form.save_m2m()
             return redirect('dashboard')
     else:
         form = ProyectoForm()
@@ -101,6 +247,7 @@ def crear_proyecto(request):
     context = {'form': form, 'titulo_pagina': 'Crear Nuevo Proyecto'}
     return render(request, 'docubase_app/crear_proyecto.html', context)
 
+@usar_primaria
 @login_required
 def editar_proyecto(request, proyecto_slug):
     """
@@ -127,22 +274,131 @@ def editar_proyecto(request, proyecto_slug):
     context = {'form': form, 'proyecto': proyecto}
     return render(request, 'docubase_app/editar_proyecto.html', context)
 
+def _consulta_proyecto(proyecto_slug):
+    return (
+        Proyecto.objects.filter(slug=proyecto_slug)
+        .only(*fragmentos.CAMPOS_PROYECTO, 'es_publico')
+        .annotate(ultima_pagina=Max('paginas__fecha_actualizacion'), num_paginas=Count('paginas'))
+    )
+
+def _precomprobar_proyecto(request, proyecto_slug):
+    """
+    Versión de un proyecto: su fecha, la de su página editada más
+    recientemente, el número de páginas (para detectar borrados), el hash de
+    sus miniaturas y la generación de sus fragmentos, que cambia con lo que no
+    toca la fecha (etiquetas renombradas). La misma consulta trae las columnas
+    que usa la vista.
+    """
+    proyecto = _consulta_proyecto(proyecto_slug).first()
+    if proyecto is None:
+        return None
+    return _estado_proyecto(proyecto, fragmentos.generacion('proyecto', proyecto.pk))
+
+def _estado_proyecto(proyecto, generacion):
+    partes = (proyecto.pk, proyecto.fecha_actualizacion, proyecto.ultima_pagina, proyecto.num_paginas,
+              proyecto.imagen_hash, generacion)
+    return Estado(mas_reciente(proyecto.fecha_actualizacion, proyecto.ultima_pagina), partes,
+                  proyecto.es_publico, objeto=proyecto)
+
+@condicional(_precomprobar_proyecto)
 def proyecto_detalle(request, proyecto_slug):
     """
     Muestra los detalles de un proyecto específico y lista sus páginas.
 
-    Accesible para cualquier usuario si el proyecto es público.
+    Accesible para cualquier usuario si el proyecto es público. El detalle y
+    la lista de páginas salen de la caché de fragmentos (ver `fragmentos.py`);
+    el proyecto lo lee la precomprobación de `condicional`, solo con las
+    columnas que necesita la parte por usuario.
     """
-    proyecto = get_object_or_404(Proyecto, slug=proyecto_slug)
-    paginas = proyecto.paginas.all()
-    context = {
+    proyecto = _objeto_precomprobado(request, 'No existe el proyecto.')
+    context = _contexto_proyecto(request, proyecto, fragmentos.fragmentos_proyecto(proyecto))
+    return render(request, 'docubase_app/project_detail.html', context)
+
+def _objeto_precomprobado(request, mensaje):
+    """El objeto que leyó la precomprobación, o 404 si no existe."""
+    estado = estado_precomprobado(request)
+    if estado is None:
+        raise Http404(mensaje)
+    return estado.objeto
+
+def _contexto_proyecto(request, proyecto, fragmentos_proyecto):
+    return {
         'proyecto': proyecto,
-        'paginas': paginas
+        'fragmentos': fragmentos_proyecto,
+        'puede_editar': request.user.is_authenticated and request.user.pk == proyecto.autor_id,
     }
-    return render(request, 'docubase_app/project_detail.html', context)
+
+@require_http_methods(['GET', 'HEAD'])
+def exportar_proyecto(request, proyecto_slug):
+    """
+    Descarga el proyecto entero (lo que el usuario puede ver) como ZIP,
+    generado según se envía (ver `exportacion_proyecto.py`). Con
+    `formato=markdown` las páginas se convierten a Markdown.
+    """
+    proyecto = api.RECURSOS['proyectos'].visibles(request.user).filter(slug=proyecto_slug).first()
+    if proyecto is None:
+        raise Http404('No existe el proyecto.')
+    formato = request.GET.get('formato', 'html')
+    if formato not in exportacion_proyecto.FORMATOS:
+        raise BadRequest(f'Formato desconocido: {formato}.')
+    response = StreamingHttpResponse(
+        exportacion_proyecto.generar_zip(proyecto, request.user, formato), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(
+        True, exportacion_proyecto.nombre_zip(proyecto, formato))
+    if not proyecto.es_publico:
+        patch_cache_control(response, private=True)
+    return response
 
 # --- Vistas de Páginas ---
 
+def redirigir_slug_antiguo(vista):
+    """
+    Decorador para las vistas GET de una página: si responden 404 y
+    `pagina_slug` es un slug antiguo de una página del proyecto (ver
+    `SlugAntiguo`) que ninguna otra ha vuelto a tomar, redirige de forma
+    permanente a la misma URL con el slug actual. Solo cuesta una consulta
+    en las respuestas 404.
+    """
+    def slug_actual(proyecto_slug, pagina_slug):
+        return (SlugAntiguo.objects.filter(proyecto__slug=proyecto_slug, slug=pagina_slug)
+                .exclude(proyecto__paginas__slug=pagina_slug)
+                .values_list('pagina__slug', flat=True))
+
+    def redireccion(request, actual):
+        url = reverse(request.resolver_match.view_name,
+                      kwargs={**request.resolver_match.kwargs, 'pagina_slug': actual})
+        if request.META.get('QUERY_STRING'):
+            url += '?' + request.META['QUERY_STRING']
+        return HttpResponsePermanentRedirect(url)
+
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura_asincrona(request, proyecto_slug, pagina_slug, **kwargs):
+            try:
+                return await vista(request, proyecto_slug, pagina_slug, **kwargs)
+            except Http404:
+                if request.method not in ('GET', 'HEAD'):
+                    raise
+                actual = await slug_actual(proyecto_slug, pagina_slug).afirst()
+                if actual is None:
+                    raise
+                return redireccion(request, actual)
+        return envoltura_asincrona
+
+    @wraps(vista)
+    def envoltura(request, proyecto_slug, pagina_slug, **kwargs):
+        try:
+            return vista(request, proyecto_slug, pagina_slug, **kwargs)
+        except Http404:
+            if request.method not in ('GET', 'HEAD'):
+                raise
+            actual = slug_actual(proyecto_slug, pagina_slug).first()
+            if actual is None:
+                raise
+            return redireccion(request, actual)
+    return envoltura
+
+@usar_primaria
 @login_required
 def crear_pagina(request, proyecto_slug):
     """
@@ -159,8 +415,10 @@ def crear_pagina(request, proyecto_slug):
             # Asigna el proyecto y el autor.
             pagina.proyecto = proyecto
             pagina.autor = request.user
-            # Ahora sí, guarda la página en la base de datos.
+            # Ahora sí, guarda la página en la base de datos y después sus etiquetas.
             pagina.save()
+            form.save_m2m()
+            revisiones.registrar(pagina, request.user)
             return redirect('proyecto_detalle', proyecto_slug=proyecto_slug)
     else:
         form = PaginaForm()
@@ -168,7 +426,9 @@ def crear_pagina(request, proyecto_slug):
     context = {'form': form, 'proyecto': proyecto}
     return render(request, 'docubase_app/crear_pagina.html', context)
 
+@usar_primaria
 @login_required
+@redirigir_slug_antiguo
 def editar_pagina(request, proyecto_slug, pagina_slug):
     """
     Gestiona la edición de una página existente.
@@ -179,10 +439,14 @@ def editar_pagina(request, proyecto_slug, pagina_slug):
     pagina = get_object_or_404(Pagina, slug=pagina_slug, proyecto__slug=proyecto_slug, autor=request.user)
 
     if request.method == 'POST':
+        # El formulario modifica la instancia al validar: se guarda antes el
+        # estado previo para el historial.
+        anterior = (pagina.titulo, pagina.contenido)
         form = PaginaForm(request.POST, instance=pagina)
         if form.is_valid():
-            pagina_editada = form.save(commit=False) # No es estrictamente necesario commit=False aquí.
-            pagina_editada.save()
+            # form.save() guarda la página y, después, sus etiquetas.
+            pagina_editada = form.save()
+            revisiones.registrar(pagina_editada, request.user, anterior=anterior)
             return redirect('pagina_detalle', proyecto_slug=proyecto_slug, pagina_slug=pagina_editada.slug)
     else:
         form = PaginaForm(instance=pagina)
@@ -190,15 +454,495 @@ def editar_pagina(request, proyecto_slug, pagina_slug):
     context = {'form': form, 'pagina': pagina, 'proyecto_slug': proyecto_slug}
     return render(request, 'docubase_app/editar_pagina.html', context)
 
+def _precomprobar_pagina(request, proyecto_slug, pagina_slug):
+    """
+    Versión de una página: su fecha, la de su proyecto (cuyo título
+    muestra), la de sus comentarios (el último publicado y la generación
+    que cambia al crear o borrar uno) y las generaciones de los fragmentos
+    de la página y del proyecto, que cambian con lo que no toca las fechas
+    (adjuntos, etiquetas renombradas). La misma consulta trae las columnas
+    que usa la vista.
+    """
+    pagina = _consulta_pagina(proyecto_slug, pagina_slug).first()
+    if pagina is None:
+        return None
+    return _estado_pagina(pagina, _generaciones_pagina(pagina))
+
+def _consulta_pagina(proyecto_slug, pagina_slug):
+    ultimo_comentario = Comentario.objects.filter(pagina=OuterRef('pk')).order_by('-pk')
+    return (
+        Pagina.objects.filter(slug=pagina_slug, proyecto__slug=proyecto_slug)
+        .select_related('proyecto')
+        .only(*fragmentos.CAMPOS_PAGINA, 'es_publica',
+              'proyecto__fecha_actualizacion', 'proyecto__es_publico')
+        .annotate(fecha_comentario=Subquery(ultimo_comentario.values('fecha_creacion')[:1]))
+    )
+
+def _generaciones_pagina(pagina):
+    return fragmentos.generaciones(
+        ('pagina', pagina.pk), ('proyecto', pagina.proyecto_id), ('comentarios', pagina.pk))
+
+def _estado_pagina(pagina, generaciones):
+    fecha_proyecto = pagina.proyecto.fecha_actualizacion
+    return Estado(mas_reciente(pagina.fecha_actualizacion, fecha_proyecto, pagina.fecha_comentario),
+                  (pagina.pk, pagina.fecha_actualizacion, fecha_proyecto, *generaciones),
+                  pagina.es_publica and pagina.proyecto.es_publico, objeto=pagina)
+
+@redirigir_slug_antiguo
+@condicional(_precomprobar_pagina)
 def pagina_detalle(request, proyecto_slug, pagina_slug):
     """
     Muestra el contenido de una página específica.
+
+    El cuerpo de la página sale de la caché de fragmentos; el contenido
+    completo solo se lee de la base de datos cuando el fragmento no está.
+    Los comentarios se cargan aparte, por hilos (`?hilos=<cursor>`) y con un
+    número fijo de consultas (ver `comentarios.py`).
     """
-    pagina = get_object_or_404(
-        Pagina, slug=pagina_slug, proyecto__slug=proyecto_slug)
-    context = {'pagina': pagina}
+    pagina = _objeto_precomprobado(request, 'No existe la página.')
+    hilos, siguiente = comentarios.hilos(pagina, desde=_cursor_hilos(request))
+    context = _contexto_pagina(request, pagina, fragmentos.fragmento_pagina(pagina), hilos, siguiente)
     return render(request, 'docubase_app/page_detail.html', context)
 
+def _cursor_hilos(request):
+    cursor = request.GET.get('hilos', '')
+    return int(cursor) if cursor.isdigit() else 0
+
+def _contexto_pagina(request, pagina, fragmento, hilos, siguiente):
+    return {
+        'pagina': pagina,
+        'fragmento': fragmento,
+        'puede_editar': request.user.is_authenticated and request.user.pk == pagina.autor_id,
+        'hilos': hilos,
+        'siguientes_hilos': siguiente,
+        'comentario_form': ComentarioForm(pagina=pagina) if request.user.is_authenticated else None,
+    }
+
+@login_required
+@require_POST
+def comentar(request, proyecto_slug, pagina_slug):
+    """
+    Publica un comentario, o una respuesta si se envía `comentario_padre`,
+    en una página que el usuario puede ver. No toca la caché de la página:
+    solo cambia la versión de sus comentarios (ver `signals.py`).
+    """
+    pagina = _pagina_visible(request, proyecto_slug, pagina_slug)
+    form = ComentarioForm(request.POST, pagina=pagina)
+    url = reverse('pagina_detalle', kwargs={'proyecto_slug': proyecto_slug, 'pagina_slug': pagina_slug})
+    if not form.is_valid():
+        return redirect(f'{url}#comentarios')
+    comentario = form.save(commit=False)
+    comentario.pagina, comentario.autor = pagina, request.user
+    comentario.save()
+    return redirect(f'{url}#comentario-{comentario.pk}')
+
+# --- Historial de revisiones ---
+
+def _pagina_visible(request, proyecto_slug, pagina_slug):
+    """La página si el usuario puede verla (pública o suya); si no, 404."""
+    pagina = get_object_or_404(
+        Pagina.objects.select_related('proyecto').only(
+            'titulo', 'slug', 'autor_id', 'es_publica', 'proyecto__slug', 'proyecto__titulo', 'proyecto__es_publico'),
+        slug=pagina_slug, proyecto__slug=proyecto_slug)
+    if not (pagina.es_publica and pagina.proyecto.es_publico) and request.user.pk != pagina.autor_id:
+        raise Http404('No existe la página.')
+    return pagina
+
+@redirigir_slug_antiguo
+def pagina_revisiones(request, proyecto_slug, pagina_slug):
+    """
+    Historial de una página. Solo lee los campos de resumen de cada
+    revisión (nunca `datos`) y pagina por número: `?antes=<n>` continúa con
+    las revisiones anteriores a la n.
+    """
+    pagina = _pagina_visible(request, proyecto_slug, pagina_slug)
+    consulta = (Revision.objects.filter(pagina=pagina).select_related('autor')
+                .only('numero', 'titulo', 'fecha', 'nota', 'tamano', 'anadidos', 'eliminados',
+                      'es_completa', 'autor__username').order_by('-numero'))
+    antes = request.GET.get('antes', '')
+    if antes.isdigit():
+        consulta = consulta.filter(numero__lt=int(antes))
+    lista = list(consulta[:REVISIONES_POR_PAGINA + 1])
+    context = {
+        'pagina': pagina,
+        'revisiones': lista[:REVISIONES_POR_PAGINA],
+        'siguiente': lista[REVISIONES_POR_PAGINA - 1].numero if len(lista) > REVISIONES_POR_PAGINA else None,
+        'puede_editar': request.user.is_authenticated and request.user.pk == pagina.autor_id,
+    }
+    return render(request, 'docubase_app/revisiones.html', context)
+
+@redirigir_slug_antiguo
+def revision_diferencias(request, proyecto_slug, pagina_slug, numero):
+    """
+    Compara lado a lado la revisión `numero` con la anterior, o con la
+    indicada en `?con=<n>`.
+    """
+    pagina = _pagina_visible(request, proyecto_slug, pagina_slug)
+    revision = get_object_or_404(Revision.objects.select_related('autor').defer('datos'), pagina=pagina, numero=numero)
+    con = request.GET.get('con', '')
+    otra = int(con) if con.isdigit() else numero - 1
+    if otra == numero or not Revision.objects.filter(pagina=pagina, numero=otra).exists():
+        otra = None
+    antigua, nueva = sorted([otra, numero]) if otra is not None else (None, numero)
+    context = {
+        'pagina': pagina,
+        'revision': revision,
+        'antigua': antigua,
+        'nueva': nueva,
+        'filas': revisiones.comparar(
+            revisiones.reconstruir(pagina.pk, antigua) if antigua else '',
+            revisiones.reconstruir(pagina.pk, nueva)),
+        'puede_editar': request.user.is_authenticated and request.user.pk == pagina.autor_id,
+    }
+    return render(request, 'docubase_app/revision_diferencias.html', context)
+
+@login_required
+@require_POST
+def revision_restaurar(request, proyecto_slug, pagina_slug, numero):
+    """Vuelve la página a una revisión anterior (solo su autor)."""
+    pagina = get_object_or_404(Pagina, slug=pagina_slug, proyecto__slug=proyecto_slug, autor=request.user)
+    try:
+        revisiones.restaurar(pagina, numero, request.user)
+    except Revision.DoesNotExist:
+        raise Http404('No existe la revisión.')
+    return redirect('pagina_detalle', proyecto_slug=proyecto_slug, pagina_slug=pagina.slug)
+
+# --- Vistas asíncronas ---
+# Versiones para ASGI de las vistas de lectura más usadas, que `urls.py` usa
+# en lugar de las síncronas con VISTAS_ASINCRONAS. Leen con el ORM asíncrono
+# y solo pasan por un hilo para lo que no lo tiene: la búsqueda (SQL crudo),
+# la caché de fragmentos y las plantillas (ver `asincrono.py`).
+
+async def aindex(request):
+    """Versión asíncrona de `index`."""
+    proyectos_recientes = [p async for p in listados.proyectos_para_tarjetas()[:3]]
+    return await asincrono.arender(request, 'docubase_app/index.html', {'proyectos_recientes': proyectos_recientes})
+
+async def _aprecomprobar_lista(request):
+    return _estado_lista(request, await Proyecto.objects.filter(es_publico=True).aaggregate(**_version_lista()))
+
+@condicional(_aprecomprobar_lista)
+async def aproyectos_lista(request):
+    """Versión asíncrona de `proyectos_lista`."""
+    seleccionadas = etiquetas.normalizar(request.GET.getlist('etiqueta'))
+    proyectos, siguiente_cursor = await listados.apagina_por_cursor(
+        _proyectos_filtrados(seleccionadas), request.GET.get('cursor'))
+    formato = request.GET.get('formato')
+
+    if formato == 'json':
+        return _lista_json(request, proyectos, siguiente_cursor)
+
+    context = _contexto_lista(proyectos, siguiente_cursor, seleccionadas)
+    if formato == 'parcial':
+        return _con_cursor(
+            await asincrono.arender(request, 'docubase_app/proyectos_tarjetas.html', context), siguiente_cursor)
+    lista = [e async for e in etiquetas.facetas()]
+    lista[:0] = [e async for e in _etiquetas_sin_faceta(lista, seleccionadas)]
+    context['facetas'] = _enlaces_facetas(lista, seleccionadas)
+    return await asincrono.arender(request, 'docubase_app/projects.html', context)
+
+async def abuscar_proyectos(request):
+    """
+    Versión asíncrona de `buscar_proyectos`. El índice se consulta con SQL
+    crudo, que no tiene versión asíncrona: la búsqueda entera va a un hilo.
+    """
+    context = await sync_to_async(_contexto_busqueda)(request)
+    return await asincrono.arender(request, 'docubase_app/search_results.html', context)
+
+async def _aprecomprobar_proyecto(request, proyecto_slug):
+    proyecto = await _consulta_proyecto(proyecto_slug).afirst()
+    if proyecto is None:
+        return None
+    return _estado_proyecto(proyecto, await sync_to_async(fragmentos.generacion)('proyecto', proyecto.pk))
+
+@condicional(_aprecomprobar_proyecto)
+async def aproyecto_detalle(request, proyecto_slug):
+    """Versión asíncrona de `proyecto_detalle`."""
+    proyecto = _objeto_precomprobado(request, 'No existe el proyecto.')
+    fragmentos_proyecto = await sync_to_async(fragmentos.fragmentos_proyecto)(proyecto)
+    context = _contexto_proyecto(request, proyecto, fragmentos_proyecto)
+    return await asincrono.arender(request, 'docubase_app/project_detail.html', context)
+
+async def _aprecomprobar_pagina(request, proyecto_slug, pagina_slug):
+    pagina = await _consulta_pagina(proyecto_slug, pagina_slug).afirst()
+    if pagina is None:
+        return None
+    return _estado_pagina(pagina, await sync_to_async(_generaciones_pagina)(pagina))
+
+@redirigir_slug_antiguo
+@condicional(_aprecomprobar_pagina)
+async def apagina_detalle(request, proyecto_slug, pagina_slug):
+    """Versión asíncrona de `pagina_detalle`."""
+    pagina = _objeto_precomprobado(request, 'No existe la página.')
+    hilos, siguiente = await comentarios.ahilos(pagina, desde=_cursor_hilos(request))
+    fragmento = await sync_to_async(fragmentos.fragmento_pagina)(pagina)
+    context = _contexto_pagina(request, pagina, fragmento, hilos, siguiente)
+    return await asincrono.arender(request, 'docubase_app/page_detail.html', context)
+
+# --- API JSON (ver api.py) ---
+
+def _api_errores(vista):
+    """Responde en JSON a los errores de parámetros y a los 404 de la API."""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        try:
+            return vista(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404 as error:
+            return JsonResponse({'error': str(error)}, status=404)
+    return envoltura
+
+def _precomprobar_api(request, recurso, pk=None):
+    """
+    Versión de la respuesta: agregados de las filas que devolvería, sin
+    leerlas (ver `api.version`). Los parámetros forman parte de la versión.
+    """
+    peticion = api.leer_peticion(api.obtener_recurso(recurso), request.GET)
+    filtro = {'pk': pk} if pk is not None else {'pk__gt': peticion.cursor}
+    resultado = api.version(peticion, request.user, **filtro)
+    if resultado is None:
+        return None
+    ultima, partes = resultado
+    return Estado(ultima, (*partes, request.GET.urlencode()), objeto=peticion)
+
+@_api_errores
+@require_http_methods(['GET', 'HEAD'])
+@condicional(_precomprobar_api)
+def api_lista(request, recurso):
+    """
+    Listado de un recurso, paginado por cursor. Admite `fields`,
+    `fields[<recurso>]`, `include`, `cursor`, `limite` y los filtros de
+    cada recurso (ver `api.RECURSOS`).
+    """
+    estado = estado_precomprobado(request)
+    peticion = estado.objeto if estado else api.leer_peticion(api.obtener_recurso(recurso), request.GET)
+    objetos, siguiente = api.pagina(peticion, request.user) if estado else ([], None)
+    return JsonResponse({
+        'datos': [api.serializar_peticion(objeto, peticion, request) for objeto in objetos],
+        'siguiente_cursor': siguiente,
+        'siguiente': request.build_absolute_uri(
+            '?' + urlencode({**request.GET.dict(), 'cursor': siguiente})) if siguiente else None,
+    }, json_dumps_params={'ensure_ascii': False})
+
+@_api_errores
+@require_http_methods(['GET', 'HEAD'])
+@condicional(_precomprobar_api)
+def api_detalle(request, recurso, pk):
+    """Un objeto de un recurso, con los mismos `fields` e `include` que los listados."""
+    estado = estado_precomprobado(request)
+    if estado is None:
+        raise Http404('No existe el objeto.')
+    peticion = estado.objeto
+    objeto = api.consulta(peticion, request.user).get(pk=pk)
+    return JsonResponse({'datos': api.serializar_peticion(objeto, peticion, request)},
+                        json_dumps_params={'ensure_ascii': False})
+
+def _precomprobar_volcado(request, pk):
+    proyecto = api.RECURSOS['proyectos'].visibles(request.user).filter(pk=pk).first()
+    if proyecto is None:
+        return None
+    ultima, partes = api.version_volcado(proyecto, request.user)
+    return Estado(ultima, (*partes, request.GET.urlencode()), proyecto.es_publico, objeto=proyecto)
+
+@_api_errores
+@require_http_methods(['GET', 'HEAD'])
+@condicional(_precomprobar_volcado)
+def api_volcado(request, pk):
+    """
+    Proyecto completo en NDJSON (ver `api.volcar_proyecto`), enviado según se
+    genera. Con `desde=<fecha ISO>` solo lo que cambió después.
+    """
+    estado = estado_precomprobado(request)
+    if estado is None:
+        raise Http404('No existe el proyecto.')
+    desde = request.GET.get('desde')
+    if desde and parse_datetime(desde) is None:
+        raise BadRequest('Fecha "desde" inválida.')
+    response = StreamingHttpResponse(
+        api.volcar_proyecto(estado.objeto, request, parse_datetime(desde) if desde else None),
+        content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="proyecto-{pk}.ndjson"'
+    return response
+
+# --- Sitemaps y feeds (ver sindicacion.py) ---
+
+def _precomprobar_indice_sitemaps(request):
+    version = sindicacion.version_indice()
+    return Estado(*version) if version else None
+
+@require_http_methods(['GET', 'HEAD'])
+@condicional(_precomprobar_indice_sitemaps)
+def sitemap_indice(request):
+    """Índice de sitemaps: uno por bloque de ids de proyectos o páginas públicos."""
+    return StreamingHttpResponse(sindicacion.generar_indice(request.build_absolute_uri('/')[:-1]),
+                                 content_type='application/xml; charset=utf-8')
+
+def _precomprobar_sitemap(request, serie, bloque):
+    version = sindicacion.version_sitemap(serie, bloque)
+    return Estado(*version) if version else None
+
+@require_http_methods(['GET', 'HEAD'])
+@condicional(_precomprobar_sitemap)
+def sitemap(request, serie, bloque):
+    """Las URLs públicas de un bloque de proyectos o de páginas, enviadas según se leen."""
+    if estado_precomprobado(request) is None:
+        raise Http404('No existe el sitemap.')
+    return StreamingHttpResponse(sindicacion.generar_sitemap(serie, bloque, request.build_absolute_uri('/')[:-1]),
+                                 content_type='application/xml; charset=utf-8')
+
+def _precomprobar_feed(request, proyecto_slug):
+    proyecto = (Proyecto.objects.filter(slug=proyecto_slug, es_publico=True)
+                .only('titulo', 'slug', 'extracto', 'fecha_actualizacion').first())
+    if proyecto is None:
+        return None
+    return Estado(*sindicacion.version_feed(proyecto), objeto=proyecto)
+
+@require_http_methods(['GET', 'HEAD'])
+@condicional(_precomprobar_feed)
+def proyecto_feed(request, proyecto_slug):
+    """Feed Atom con las últimas páginas públicas de un proyecto público."""
+    estado = estado_precomprobado(request)
+    if estado is None:
+        raise Http404('No existe el proyecto.')
+    return StreamingHttpResponse(
+        sindicacion.generar_feed(estado.objeto, estado.ultima_modificacion, request),
+        content_type='application/atom+xml; charset=utf-8')
+
+def _leer_desde(request):
+    desde = request.GET.get('desde')
+    if not desde:
+        return None
+    fecha = parse_datetime(desde)
+    if fecha is None:
+        raise BadRequest('Fecha "desde" inválida.')
+    return timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
+
+def _precomprobar_cambios(request):
+    version = sindicacion.version_cambios(request.user, _leer_desde(request))
+    return Estado(*version) if version else None
+
+@_api_errores
+@require_http_methods(['GET', 'HEAD'])
+@condicional(_precomprobar_cambios)
+def api_cambios(request):
+    """
+    Proyectos y páginas actualizados después de `desde=<fecha ISO>` (o
+    todos), en NDJSON y en orden de fecha. La última línea (`fin`) trae la
+    fecha que hay que usar como `desde` en la siguiente llamada.
+    """
+    estado = estado_precomprobado(request)
+    hasta = estado.ultima_modificacion if estado else None
+    return StreamingHttpResponse(
+        sindicacion.generar_cambios(request.user, _leer_desde(request), hasta, request),
+        content_type='application/x-ndjson; charset=utf-8')
+
+# --- Media ---
+
+@require_http_methods(['GET', 'HEAD'])
+def servir_media(request, ruta):
+    """
+    Sirve un archivo de media (imágenes, miniaturas, adjuntos, subidas de
+    CKEditor) si el usuario puede verlo, con soporte de rangos, ETag y
+    descarga delegada al servidor web (ver `entrega.py`).
+    """
+    datos = entrega.resolver(ruta, request.user)
+    response = entrega.servir(request, datos) if datos else None
+    if response is None:
+        raise Http404('No existe el archivo.')
+    return response
+
+# --- Subidas de archivos por trozos ---
+
+def _subida_a_dict(subida):
+    datos = {
+        'id': str(subida.pk),
+        'url': reverse('subida_detalle', kwargs={'subida_id': subida.pk}),
+        'nombre': subida.nombre,
+        'tamano': subida.tamano,
+        'recibido': subida.recibido,
+        'tamano_trozo': subidas.TAMANO_TROZO,
+        'completa': subida.archivo_id is not None,
+    }
+    if subida.archivo_id:
+        datos['archivo'] = {'id': subida.archivo_id, 'url': subida.archivo.archivo.url}
+    return datos
+
+@login_required
+@require_POST
+def subida_crear(request):
+    """
+    Inicia una subida por trozos (ver `subidas.py`). Recibe `nombre`,
+    `tamano` y, opcionalmente, `pagina` (id de una página del usuario).
+    Devuelve en JSON la URL a la que enviar los trozos.
+    """
+    try:
+        tamano = int(request.POST.get('tamano', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Falta el tamaño del archivo.'}, status=400)
+    pagina = None
+    if request.POST.get('pagina'):
+        pagina = get_object_or_404(Pagina.objects.only('pk'), pk=request.POST['pagina'], autor=request.user)
+    try:
+        subida = subidas.crear(request.user, request.POST.get('nombre', ''), tamano, pagina)
+    except subidas.ErrorSubida as error:
+        return JsonResponse({'error': str(error)}, status=error.estado)
+    return JsonResponse(_subida_a_dict(subida), status=201)
+
+@usar_primaria
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PUT', 'DELETE'])
+def subida_detalle(request, subida_id):
+    """
+    GET devuelve el estado de la subida (para reanudarla desde `recibido`).
+    PUT añade un trozo: el cuerpo son los bytes y `Content-Range` indica su
+    posición. El cuerpo se lee por bloques del flujo de la petición, nunca
+    entero en memoria. DELETE cancela la subida.
+    """
+    subida = get_object_or_404(Subida.objects.select_related('archivo'), pk=subida_id, usuario=request.user)
+    if request.method == 'DELETE':
+        if not subida.archivo_id:
+            subidas.eliminar_parcial(subida)
+        subida.delete()
+        return HttpResponse(status=204)
+    if request.method == 'PUT':
+        try:
+            inicio, fin, total = subidas.parsear_content_range(request.headers.get('Content-Range'))
+            if total != subida.tamano:
+                raise subidas.ErrorSubida('El tamaño total no coincide con el de la subida.')
+            subidas.recibir_trozo(subida, inicio, fin - inicio, request)
+        except subidas.ErrorSubida as error:
+            datos = _subida_a_dict(Subida.objects.get(pk=subida.pk))
+            datos['error'] = str(error)
+            return JsonResponse(datos, status=error.estado)
+    return JsonResponse(_subida_a_dict(subida))
+
+@user_passes_test(lambda u: u.is_staff)
+def estadisticas_cache(request):
+    """
+    Devuelve en JSON los contadores de la caché de fragmentos de este proceso.
+    Solo para el personal (staff).
+    """
+    return JsonResponse(fragmentos.estadisticas())
+
+@user_passes_test(lambda u: u.is_staff)
+def estadisticas_rendimiento(request):
+    """
+    Devuelve en JSON los percentiles de tiempo y las medias de consultas por
+    nombre de URL de las peticiones medidas por este proceso (ver
+    `rendimiento.py`). Solo para el personal (staff).
+    """
+    return JsonResponse(rendimiento.estadisticas())
+
+@user_passes_test(lambda u: u.is_staff)
+def estadisticas_replicas(request):
+    """
+    Devuelve en JSON la salud y el retraso de cada réplica de la base de
+    datos según la última comprobación de este proceso (ver `replicas.py`).
+    Solo para el personal (staff).
+    """
+    return JsonResponse(replicas.estado())
+
 # --- Vistas de Autenticación (las dejamos aquí para que estén organizadas) ---
 
 def register(request):
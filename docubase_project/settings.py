@@ -42,7 +42,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise con modo asíncrono, para no obligar a pasar por un hilo bajo ASGI (ver docubase_app/asincrono.py).
+    'docubase_app.asincrono.EstaticosMiddleware',
+    # Mide consultas y tiempos de una muestra de peticiones (ver docubase_app/rendimiento.py).
+    'docubase_app.rendimiento.MedicionMiddleware',
+    # Lecturas a las réplicas y primaria fija tras escribir (ver docubase_app/replicas.py).
+    'docubase_app.replicas.ReplicasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +95,60 @@ if 'DATABASE_URL' in os.environ:
         conn_max_age=600, ssl_require=True
     )
 
+# Réplicas de solo lectura (ver docubase_app/replicas.py): DATABASE_REPLICAS es
+# una lista de URLs separadas por comas, que se registran como 'replica1',
+# 'replica2'... Las opciones de conexión van en la URL (p. ej.
+# `?sslmode=require&connect_timeout=2`). En local se pueden simular con copias
+# de db.sqlite3 (`sqlite:///replica1.sqlite3`) que `sincronizar_replicas` pone
+# al día. En los tests las réplicas son espejos de 'default'.
+REPLICAS = []
+for numero, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    alias = f'replica{numero}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['docubase_app.replicas.RouterReplicas']
+# Una réplica que va más de estos segundos por detrás de la primaria no se usa;
+# el retraso y la salud se comprueban cada REPLICAS_INTERVALO segundos. Tras
+# escribir, un cliente lee de la primaria durante la suma de ambos.
+REPLICAS_RETRASO_MAXIMO = int(os.environ.get('REPLICAS_RETRASO_MAXIMO', '30'))
+REPLICAS_INTERVALO = 5
+
+
+# Caché
+# La caché de fragmentos de `pagina_detalle` y `proyecto_detalle` usa su propio
+# alias. Por defecto es local en memoria, lo que solo vale en desarrollo: en
+# producción tiene que ser un backend compartido por todos los procesos (p. ej.
+# FRAGMENTOS_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y
+# FRAGMENTOS_CACHE_LOCATION=redis://...), o `manage.py check` falla (ver
+# EXIGIR_CACHE_COMPARTIDA y docubase_app/comprobaciones.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragmentos': {
+        'BACKEND': os.environ.get('FRAGMENTOS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('FRAGMENTOS_CACHE_LOCATION', 'docubase-fragmentos'),
+    },
+}
+FRAGMENTOS_CACHE_ALIAS = 'fragmentos'
+# El resumen del panel (ver panel.py) también se invalida desde otros procesos:
+# comparte la caché de fragmentos, con claves `panel:...`.
+PANEL_CACHE_ALIAS = FRAGMENTOS_CACHE_ALIAS
+# Si es True, `manage.py check` exige que esas cachés sean compartidas. Se fija aquí
+# y no se deduce de DEBUG en la comprobación porque el runner de tests pone
+# DEBUG a False antes de ejecutarla.
+EXIGIR_CACHE_COMPARTIDA = os.environ.get('EXIGIR_CACHE_COMPARTIDA', '0' if DEBUG else '1') == '1'
+# Segundos que se conserva cada fragmento (las claves cambian al editar).
+FRAGMENTOS_CACHE_TTL = 60 * 60 * 24
+
+
+# Versión desplegada. Forma parte de los ETag de las vistas de documentación,
+# para que un despliegue con plantillas nuevas no se quede con 304 antiguos.
+# Render la expone en RENDER_GIT_COMMIT.
+VERSION_DESPLIEGUE = os.environ.get('RENDER_GIT_COMMIT', 'local')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -132,9 +191,72 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Anchos de las miniaturas de las imágenes de proyecto (ver docubase_app/miniaturas.py).
+MINIATURAS_ANCHOS = (320, 640, 960, 1280)
+
+# Cola de tareas (ver docubase_app/tareas.py). En producción el trabajo posterior
+# al guardado lo ejecuta `manage.py run_worker`; en desarrollo, por defecto, se
+# ejecuta en el acto para no necesitar un worker.
+TAREAS_SINCRONAS = os.environ.get('TAREAS_SINCRONAS', '1' if DEBUG else '0') == '1'
+
+
+# Vistas asíncronas (ver docubase_app/asincrono.py): con '1', las vistas de
+# lectura más usadas (inicio, lista, búsqueda y detalles) se sirven con sus
+# versiones async y el ORM asíncrono. Solo tiene sentido bajo un servidor ASGI
+# (`uvicorn docubase_project.asgi:application`); con gunicorn y workers
+# síncronos cada petición tendría que crear un bucle de eventos.
+VISTAS_ASINCRONAS = os.environ.get('VISTAS_ASINCRONAS', '0') == '1'
+
 
 # CKEditor configuration
 CKEDITOR_UPLOAD_PATH = 'uploads/'
+# Guarda cada subida una sola vez por hash de contenido (ver docubase_app/almacenamiento.py).
+CKEDITOR_STORAGE_BACKEND = 'docubase_app.almacenamiento.AlmacenamientoPorContenido'
+
+# Entrega de media (ver docubase_app/entrega.py). Con 'x-accel' (nginx) o
+# 'x-sendfile' (Apache) Django solo comprueba permisos y el servidor web envía
+# los bytes. Para nginx, MEDIA_PREFIJO_INTERNO es una location `internal` que
+# apunta a MEDIA_ROOT.
+MEDIA_DESCARGA_DELEGADA = os.environ.get('MEDIA_DESCARGA_DELEGADA', '')
+MEDIA_PREFIJO_INTERNO = os.environ.get('MEDIA_PREFIJO_INTERNO', '/media-interna/')
+
+# Medición de rendimiento (ver docubase_app/rendimiento.py): fracción de
+# peticiones medidas, si se envía la cabecera Server-Timing, cuántos tiempos
+# por URL se guardan para los percentiles y a partir de cuántas consultas
+# duplicadas la línea de log pasa a WARNING. Server-Timing enseña a cualquier
+# cliente los tiempos y consultas de la base de datos: por defecto solo se
+# envía en desarrollo.
+RENDIMIENTO_MUESTREO = float(os.environ.get('RENDIMIENTO_MUESTREO', '1.0' if DEBUG else '0.05'))
+RENDIMIENTO_SERVER_TIMING = os.environ.get('RENDIMIENTO_SERVER_TIMING', '1' if DEBUG else '0') == '1'
+RENDIMIENTO_VENTANA = 1000
+RENDIMIENTO_UMBRAL_DUPLICADAS = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Una línea JSON por petición medida.
+        'docubase_app.rendimiento': {
+            'handlers': ['consola'],
+            'level': os.environ.get('RENDIMIENTO_LOG_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Historial de páginas (ver docubase_app/revisiones.py): cada cuántas
+# revisiones se guarda una completa; como mucho se aplican tantos deltas para
+# reconstruir una revisión. Tras cambiarlo, `podar_revisiones --compactar`.
+REVISIONES_INTERVALO_COMPLETA = 20
+
+# Subidas de archivos por trozos (ver docubase_app/subidas.py): directorio de
+# los archivos parciales (fuera de MEDIA_ROOT, no deben servirse) y límites.
+SUBIDAS_DIR = os.environ.get('SUBIDAS_DIR', os.path.join(BASE_DIR, 'subidas_parciales'))
+SUBIDAS_TAMANO_TROZO = 8 * 1024 * 1024
+SUBIDAS_TAMANO_MAXIMO = 2 * 1024 ** 3
 
 
 # Default primary key field type